@@ -0,0 +1,29 @@
+"""chatty -- write lines to stdout at a fixed rate.
+
+Used as a program by the system benchmarks.
+
+Usage: python chatty.py <megabytes per second> [<line length>]
+"""
+
+import os
+import sys
+import time
+
+def main(args):
+    rate = float(args[0]) * 1024 * 1024
+    if len(args) > 1:
+        length = int(args[1])
+    else:
+        length = 100
+    line = b'x' * (length - 1) + b'\n'
+    chunk = line * max(1, 8192 // length)
+    started = time.time()
+    written = 0
+    while True:
+        written += os.write(1, chunk)
+        ahead = written / rate - (time.time() - started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,30 @@
+"""listener -- an event listener that acknowledges every event.
+
+Used as an event listener by the system benchmarks.  One byte is
+appended to the counter file for each event received, so the number
+of events delivered to all listeners is the size of that file.
+
+Usage: python listener.py <counter file>
+"""
+
+import os
+import sys
+
+def main(args):
+    fd = os.open(args[0], os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    stdin = sys.stdin
+    stdout = sys.stdout
+    while True:
+        stdout.write('READY\n')
+        stdout.flush()
+        line = stdin.readline()
+        if not line:
+            break
+        headers = dict([ x.split(':') for x in line.split() ])
+        stdin.read(int(headers['len']))
+        os.write(fd, b'.')
+        stdout.write('RESULT 2\nOK')
+        stdout.flush()
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
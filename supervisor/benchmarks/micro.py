@@ -0,0 +1,273 @@
+"""In-process benchmarks of the code that supervisord runs for every
+line of output, every log record, every event and every XML-RPC call.
+
+Each benchmark builds the real objects from a generated configuration
+file and calls the code under test ``number`` times in a row.
+"""
+
+import functools
+import os
+import timeit
+
+from supervisor import events
+from supervisor import loggers
+from supervisor.compat import as_string
+from supervisor.compat import xmlrpclib
+from supervisor.dispatchers import POutputDispatcher
+from supervisor.events import ProcessCommunicationStdoutEvent
+from supervisor.options import ServerOptions
+from supervisor.rpcinterface import SupervisorNamespaceRPCInterface
+from supervisor.supervisord import Supervisor
+from supervisor.xmlrpc import supervisor_xmlrpc_handler
+from supervisor.xmlrpc import xmlrpc_marshal
+
+def measure(func, number, repeat=3):
+    """ Call func() number times, repeat times over, and return the
+    timings of the fastest run """
+    timings = []
+    for i in range(repeat):
+        started = timeit.default_timer()
+        for j in range(number):
+            func()
+        timings.append(timeit.default_timer() - started)
+    best = min(timings) or 1e-9
+    return {
+        'number': number,
+        'repeat': repeat,
+        'best': best,
+        'ops_per_sec': number / best,
+        'usec_per_op': best / number * 1000000,
+        }
+
+CONFIG = """\
+[supervisord]
+logfile=%(tempdir)s/supervisord.log
+childlogdir=%(tempdir)s
+loglevel=info
+
+[program:chatty]
+command=%(command)s
+numprocs=%(programs)s
+process_name=%%(program_name)s_%%(process_num)s
+stdout_logfile=%(tempdir)s/%%(program_name)s_%%(process_num)s.log
+stdout_logfile_maxbytes=%(maxbytes)s
+stdout_events_enabled=%(events)s
+"""
+
+def make_options(tempdir, programs=1, events=False, maxbytes='50MB',
+                 command='/bin/cat'):
+    """ Return ServerOptions realized from a generated configuration """
+    filename = os.path.join(tempdir, 'micro.conf')
+    with open(filename, 'w') as f:
+        f.write(CONFIG % {'tempdir': tempdir, 'programs': programs,
+                          'events': str(events).lower(),
+                          'maxbytes': maxbytes, 'command': command})
+    options = ServerOptions()
+    options.realize(args=['-c', filename])
+    options.make_logger()
+    return options
+
+def make_output_dispatcher(options, fd=-1):
+    group = options.process_group_configs[0].make_group()
+    process = list(group.processes.values())[0]
+    # unless an fd is given, record_output is fed directly
+    return POutputDispatcher(process, ProcessCommunicationStdoutEvent, fd)
+
+def bench_record_output(tempdir, number, line_length=100):
+    """ POutputDispatcher.record_output for one line of output """
+    options = make_options(tempdir)
+    dispatcher = make_output_dispatcher(options)
+    line = b'x' * (line_length - 1) + b'\n'
+    def func():
+        dispatcher.buffer.append(line)
+        dispatcher.record_output()
+    try:
+        return measure(func, number)
+    finally:
+        dispatcher.close()
+        options.close_logger()
+
+def bench_record_output_events(tempdir, number, line_length=100):
+    """ POutputDispatcher.record_output with stdout_events_enabled and
+    one subscriber to the resulting events """
+    options = make_options(tempdir, events=True)
+    dispatcher = make_output_dispatcher(options)
+    line = b'x' * (line_length - 1) + b'\n'
+    received = []
+    def callback(event):
+        received.append(len(event.data))
+    events.subscribe(events.ProcessLogStdoutEvent, callback)
+    def func():
+        dispatcher.buffer.append(line)
+        dispatcher.record_output()
+        del received[:]
+    try:
+        return measure(func, number)
+    finally:
+        events.unsubscribe(events.ProcessLogStdoutEvent, callback)
+        dispatcher.close()
+        options.close_logger()
+
+def bench_read_output(tempdir, number, chunk_size=4096):
+    """ POutputDispatcher.handle_read_event for a chunk of output lines
+    waiting in a pipe """
+    options = make_options(tempdir)
+    r, w = os.pipe()
+    dispatcher = make_output_dispatcher(options, r)
+    chunk = (b'x' * 99 + b'\n') * (chunk_size // 100)
+    def func():
+        os.write(w, chunk)
+        dispatcher.handle_read_event()
+    try:
+        return measure(func, number)
+    finally:
+        os.close(r)
+        os.close(w)
+        dispatcher.close()
+        options.close_logger()
+
+def bench_rotating_emit_child(tempdir, number, line_length=100):
+    """ RotatingFileHandler.emit for a child log record (raw bytes) """
+    filename = os.path.join(tempdir, 'child.log')
+    handler = loggers.RotatingFileHandler(filename, maxBytes=50 * 1024 * 1024,
+                                          backupCount=1)
+    record = loggers.LogRecord(loggers.LevelsByName.INFO,
+                               b'x' * (line_length - 1) + b'\n')
+    try:
+        return measure(lambda: handler.emit(record), number)
+    finally:
+        handler.close()
+
+def bench_rotating_emit_main(tempdir, number):
+    """ RotatingFileHandler.emit for a formatted main log record """
+    filename = os.path.join(tempdir, 'main.log')
+    handler = loggers.RotatingFileHandler(filename, maxBytes=50 * 1024 * 1024,
+                                          backupCount=1)
+    handler.setFormat('%(asctime)s %(levelname)s %(message)s\n')
+    def func():
+        # a new record each time; the formatted record is cached
+        record = loggers.LogRecord(loggers.LevelsByName.INFO,
+                                   'success: %(name)s entered RUNNING state',
+                                   name='chatty')
+        handler.emit(record)
+    try:
+        return measure(func, number)
+    finally:
+        handler.close()
+
+def bench_log_main(tempdir, number):
+    """ Logger.info to a rotating main log, from the call to the record
+    written (records per second) """
+    logger = loggers.getLogger(loggers.LevelsByName.INFO)
+    loggers.handle_file(logger, os.path.join(tempdir, 'main.log'),
+                        '%(asctime)s %(levelname)s %(message)s\n',
+                        rotating=True, maxbytes=50 * 1024 * 1024, backups=1)
+    def func():
+        logger.info('success: %(name)s entered RUNNING state', name='chatty')
+    try:
+        return measure(func, number)
+    finally:
+        logger.close()
+
+def bench_log_filtered(tempdir, number):
+    """ Logger.debug when no handler of the logger takes debug records """
+    logger = loggers.getLogger(loggers.LevelsByName.DEBG)
+    loggers.handle_file(logger, os.path.join(tempdir, 'main.log'),
+                        '%(asctime)s %(levelname)s %(message)s\n')
+    for handler in logger.handlers:
+        handler.setLevel(loggers.LevelsByName.INFO)
+    def func():
+        logger.debug('%(name)s still running', name='chatty')
+    try:
+        return measure(func, number)
+    finally:
+        logger.close()
+
+def bench_notify(tempdir, number, subscribers=10):
+    """ events.notify for an event that none of the subscribers but one
+    are interested in """
+    received = []
+    callbacks = []
+    for i in range(subscribers - 1):
+        callbacks.append((events.ProcessStateEvent, received.append))
+    callbacks.append((events.Tick5Event, received.append))
+    for type, callback in callbacks:
+        events.subscribe(type, callback)
+    event = events.Tick5Event(0, None)
+    def func():
+        events.notify(event)
+        del received[:]
+    try:
+        return measure(func, number)
+    finally:
+        for type, callback in callbacks:
+            events.unsubscribe(type, callback)
+
+def bench_xmlrpc(tempdir, number, programs=100):
+    """ The XML-RPC handler (unmarshal, call, marshal) for
+    supervisor.getAllProcessInfo with a number of processes """
+    options = make_options(tempdir, programs=programs)
+    supervisord = Supervisor(options)
+    for config in options.process_group_configs:
+        supervisord.add_process_group(config)
+    interface = SupervisorNamespaceRPCInterface(supervisord)
+    handler = supervisor_xmlrpc_handler(supervisord,
+                                        [('supervisor', interface)])
+    request = as_string(xmlrpclib.dumps((), 'supervisor.getAllProcessInfo'))
+    def func():
+        params, method = handler.loads(request)
+        value = handler.call(method, params)
+        xmlrpc_marshal(value)
+    try:
+        return measure(func, number)
+    finally:
+        options.close_logger()
+
+def bench_spawn(tempdir, number, minfds, spawn_method='fork'):
+    """ Subprocess.spawn of /bin/true until the child has exited, which
+    includes closing the fds up to minfds in the child before exec() """
+    options = make_options(tempdir, command='/bin/true')
+    options.minfds = minfds
+    options.spawn_method = spawn_method
+    group = options.process_group_configs[0].make_group()
+    process = list(group.processes.values())[0]
+    process.config.create_autochildlogs()
+    def func():
+        pid = process.spawn()
+        status = os.waitpid(pid, 0)[1]
+        process.finish(pid, status)
+    try:
+        return measure(func, number)
+    finally:
+        options.close_logger()
+
+BENCHMARKS = (
+    ('record_output', bench_record_output, 100000),
+    ('record_output_events', bench_record_output_events, 50000),
+    ('read_output', bench_read_output, 50000),
+    ('rotating_emit_child', bench_rotating_emit_child, 100000),
+    ('rotating_emit_main', bench_rotating_emit_main, 50000),
+    ('log_main', bench_log_main, 50000),
+    ('log_filtered', bench_log_filtered, 200000),
+    ('notify', bench_notify, 200000),
+    ('xmlrpc_getAllProcessInfo', bench_xmlrpc, 200),
+    ('spawn_minfds_1024', functools.partial(bench_spawn, minfds=1024), 200),
+    ('spawn_minfds_100000', functools.partial(bench_spawn, minfds=100000),
+     200),
+    )
+
+def run(tempdir, scale=1.0, names=None, report=None):
+    """ Run the benchmarks and return a map of name to timings.  The
+    number of calls made by each benchmark is multiplied by scale. """
+    results = {}
+    for name, func, number in BENCHMARKS:
+        if names and name not in names:
+            continue
+        directory = os.path.join(tempdir, name)
+        os.mkdir(directory)
+        results[name] = func(directory, max(1, int(number * scale)))
+        if report is not None:
+            report('%-28s %12.0f ops/s %10.2f usec/op' % (
+                name, results[name]['ops_per_sec'],
+                results[name]['usec_per_op']))
+    return results
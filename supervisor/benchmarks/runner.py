@@ -0,0 +1,214 @@
+"""benchmarks -- measure the hot paths of supervisord.
+
+Usage: python -m supervisor.benchmarks [options] [micro] [system]
+       python -m supervisor.benchmarks compare OLD.json NEW.json
+
+The "micro" suite times the code that runs for every line of output,
+log record, event and XML-RPC call in-process.  The "system" suite runs
+a real supervisord with generated configurations and measures startup,
+spawn latency, output throughput, event delivery and XML-RPC latency
+from the outside.
+Both suites run when none is given.  Nothing outside of a temporary
+directory is touched and no external services are needed.
+
+Options:
+-o/--output FILE -- write the results as JSON to FILE
+-b/--benchmark NAME -- only run the named benchmark or scenario (repeatable)
+-s/--scale FACTOR -- multiply the iterations of micro benchmarks by FACTOR
+-d/--duration SECONDS -- measuring window of the system scenarios (5)
+-p/--programs NUM -- idle programs for the startup, spawn and rpc scenarios (50)
+-c/--chatty NUM -- chatty programs for the output scenario (4)
+-r/--rate MB -- megabytes per second written by each chatty program (1.0)
+-l/--listeners NUM -- event listeners in the pool of the events scenario (4)
+-n/--calls NUM -- calls per method in the rpc scenario (500)
+-h/--help -- print this usage message and exit
+
+The results of two runs, e.g. on two commits, are compared with the
+"compare" command, which prints the relative change of every number.
+"""
+
+import getopt
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from supervisor.options import VERSION
+
+SUITES = ('micro', 'system')
+
+def usage(msg=None, exitcode=2):
+    sys.stderr.write(__doc__)
+    if msg:
+        sys.stderr.write('\nError: %s\n' % msg)
+    sys.exit(exitcode)
+
+def git_revision():
+    """ Return the commit of the source tree being benchmarked, if it is
+    a git checkout """
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        with open(os.devnull, 'w') as devnull:
+            output = subprocess.check_output(
+                ['git', 'rev-parse', 'HEAD'], cwd=here, stderr=devnull)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode('ascii').strip()
+
+def metadata():
+    return {
+        'supervisor_version': VERSION,
+        'git_revision': git_revision(),
+        'python_version': platform.python_version(),
+        'python_implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'time': time.time(),
+        }
+
+def run(suites, names=None, scale=1.0, params=None, report=None):
+    """ Run the suites and return the results with their metadata """
+    from supervisor.benchmarks import micro
+    from supervisor.benchmarks import system
+    results = {'metadata': metadata()}
+    tempdir = tempfile.mkdtemp(prefix='supervisor-benchmarks-')
+    try:
+        if 'micro' in suites:
+            directory = os.path.join(tempdir, 'micro')
+            os.mkdir(directory)
+            results['micro'] = micro.run(directory, scale=scale,
+                                         names=names, report=report)
+        if 'system' in suites:
+            directory = os.path.join(tempdir, 'system')
+            os.mkdir(directory)
+            results['system'] = system.run(directory, names=names,
+                                           params=params, report=report)
+    finally:
+        shutil.rmtree(tempdir, ignore_errors=True)
+    return results
+
+def flatten(results, prefix=''):
+    """ Return a map of dotted name to number for every number in the
+    results, skipping the metadata """
+    flat = {}
+    for key, value in results.items():
+        if not prefix and key == 'metadata':
+            continue
+        name = prefix + key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+def compare(old, new):
+    """ Return (name, old, new, relative change) for every number in
+    both results """
+    old = flatten(old)
+    new = flatten(new)
+    rows = []
+    for name in sorted(set(old) & set(new)):
+        if old[name]:
+            change = (new[name] - old[name]) / float(old[name])
+        else:
+            change = None
+        rows.append((name, old[name], new[name], change))
+    return rows
+
+def format_comparison(rows):
+    lines = []
+    for name, old, new, change in rows:
+        if change is None:
+            change = ''
+        else:
+            change = '%+.1f%%' % (change * 100)
+        lines.append('%-60s %14.6g %14.6g %8s' % (name, old, new, change))
+    return '\n'.join(lines)
+
+def write_stdout(msg):
+    sys.stdout.write(msg + '\n')
+    sys.stdout.flush()
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+
+    if args and args[0] == 'compare':
+        if len(args) != 3:
+            usage('compare needs two result files')
+        loaded = []
+        for filename in args[1:]:
+            with open(filename) as f:
+                loaded.append(json.load(f))
+        write_stdout(format_comparison(compare(*loaded)))
+        return
+
+    short_args = 'ho:b:s:d:p:c:r:l:n:'
+    long_args = ['help', 'output=', 'benchmark=', 'scale=', 'duration=',
+                 'programs=', 'chatty=', 'rate=', 'listeners=', 'calls=']
+    try:
+        # options may follow the suites, e.g. "micro -s 0.05"
+        opts, suites = getopt.gnu_getopt(args, short_args, long_args)
+    except getopt.error as exc:
+        usage(str(exc))
+
+    output = None
+    names = []
+    scale = 1.0
+    duration = 5.0
+    programs = 50
+    chatty = 4
+    rate = 1.0
+    listeners = 4
+    calls = 500
+    try:
+        for opt, arg in opts:
+            if opt in ('-h', '--help'):
+                usage(exitcode=0)
+            elif opt in ('-o', '--output'):
+                output = arg
+            elif opt in ('-b', '--benchmark'):
+                names.append(arg)
+            elif opt in ('-s', '--scale'):
+                scale = float(arg)
+            elif opt in ('-d', '--duration'):
+                duration = float(arg)
+            elif opt in ('-p', '--programs'):
+                programs = int(arg)
+            elif opt in ('-c', '--chatty'):
+                chatty = int(arg)
+            elif opt in ('-r', '--rate'):
+                rate = float(arg)
+            elif opt in ('-l', '--listeners'):
+                listeners = int(arg)
+            elif opt in ('-n', '--calls'):
+                calls = int(arg)
+    except ValueError as exc:
+        usage(str(exc))
+
+    for suite in suites:
+        if suite not in SUITES:
+            usage('unknown suite %r' % suite)
+    if not suites:
+        suites = SUITES
+
+    params = {
+        'startup': {'programs': programs},
+        'spawn': {'programs': programs},
+        'output': {'chatty': chatty, 'rate': rate, 'duration': duration},
+        'events': {'listeners': listeners, 'duration': duration},
+        'rpc': {'programs': programs, 'calls': calls},
+        }
+    results = run(suites, names=names, scale=scale, params=params,
+                  report=write_stdout)
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        write_stdout('results written to %s' % output)
+
+if __name__ == '__main__':
+    main()
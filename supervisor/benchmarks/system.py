@@ -0,0 +1,355 @@
+"""Benchmarks that run a real supervisord with a generated configuration
+and measure it from the outside through XML-RPC and /proc.
+
+Every scenario starts its own supervisord in a temporary directory, so
+nothing but a local Python interpreter and /bin/cat is needed.
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+import supervisor
+from supervisor.compat import xmlrpclib
+from supervisor.xmlrpc import SupervisorTransport
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+
+SUPERVISORD_CONFIG = """\
+[supervisord]
+logfile=%(tempdir)s/supervisord.log
+pidfile=%(tempdir)s/supervisord.pid
+childlogdir=%(tempdir)s
+loglevel=info
+nodaemon=true
+silent=true
+spawn_method=%(spawn_method)s
+
+[unix_http_server]
+file=%(tempdir)s/supervisor.sock
+
+[rpcinterface:supervisor]
+supervisor.rpcinterface_factory = supervisor.rpcinterface:make_main_rpcinterface
+"""
+
+IDLE_PROGRAM = """
+[program:idle]
+command=/bin/cat
+numprocs=%(programs)s
+process_name=%%(program_name)s_%%(process_num)s
+startsecs=0
+"""
+
+CHATTY_PROGRAM = """
+[program:chatty]
+command=%(python)s %(here)s/chatty.py %(rate)s %(line_length)s
+numprocs=%(chatty)s
+process_name=%%(program_name)s_%%(process_num)s
+startsecs=0
+stdout_logfile=%(tempdir)s/%%(program_name)s_%%(process_num)s.log
+stdout_logfile_maxbytes=%(maxbytes)s
+stdout_events_enabled=%(events)s
+"""
+
+LISTENER_POOL = """
+[eventlistener:listeners]
+command=%(python)s %(here)s/listener.py %(tempdir)s/events.count
+numprocs=%(listeners)s
+process_name=%%(program_name)s_%%(process_num)s
+events=PROCESS_LOG_STDOUT
+buffer_size=%(buffer_size)s
+"""
+
+def percentile(values, fraction):
+    """ Return the value below which the given fraction of values lie """
+    if not values:
+        return None
+    values = sorted(values)
+    index = int(round(fraction * (len(values) - 1)))
+    return values[index]
+
+def latency_summary(values):
+    return {
+        'count': len(values),
+        'mean': float(sum(values)) / len(values),
+        'p50': percentile(values, 0.50),
+        'p95': percentile(values, 0.95),
+        'p99': percentile(values, 0.99),
+        'max': max(values),
+        }
+
+def cpu_time(pid):
+    """ Return the user plus system CPU time used by pid in seconds, or
+    None if it cannot be read (no /proc) """
+    try:
+        with open('/proc/%d/stat' % pid) as f:
+            stat = f.read()
+    except (IOError, OSError):
+        return None
+    # the command name may contain spaces, so skip past its parenthesis
+    fields = stat[stat.rindex(')') + 2:].split()
+    ticks = os.sysconf(os.sysconf_names['SC_CLK_TCK'])
+    return (int(fields[11]) + int(fields[12])) / float(ticks)
+
+class Supervisord:
+    """ A supervisord subprocess running from a temporary directory """
+
+    def __init__(self, tempdir, config):
+        self.tempdir = tempdir
+        self.configfile = os.path.join(tempdir, 'supervisord.conf')
+        with open(self.configfile, 'w') as f:
+            f.write(config)
+        self.popen = None
+        self.started = None
+        self.rpc = self.make_proxy()
+
+    def make_proxy(self):
+        transport = SupervisorTransport(
+            None, None,
+            'unix://' + os.path.join(self.tempdir, 'supervisor.sock'))
+        return xmlrpclib.ServerProxy('http://127.0.0.1', transport=transport)
+
+    def start(self):
+        env = os.environ.copy()
+        # run the supervisor package being benchmarked, installed or not
+        path = os.path.dirname(os.path.dirname(supervisor.__file__))
+        env['PYTHONPATH'] = os.pathsep.join(
+            [path] + [p for p in [env.get('PYTHONPATH')] if p])
+        self.started = time.time()
+        self.popen = subprocess.Popen(
+            [sys.executable, '-m', 'supervisor.supervisord',
+             '-c', self.configfile],
+            env=env, cwd=self.tempdir)
+
+    def wait_until_running(self, timeout=60):
+        """ Wait until every process is RUNNING; return the time it took
+        since start() """
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.popen.poll() is not None:
+                raise RuntimeError('supervisord exited with %s; see %s' % (
+                    self.popen.returncode,
+                    os.path.join(self.tempdir, 'supervisord.log')))
+            try:
+                infos = self.rpc.supervisor.getAllProcessInfo()
+            except Exception:
+                # not listening yet; the failed connection can't be reused
+                self.rpc = self.make_proxy()
+                infos = None
+            if infos and all([i['statename'] == 'RUNNING' for i in infos]):
+                return time.time() - self.started
+            time.sleep(0.02)
+        raise RuntimeError('processes not running after %s seconds' % timeout)
+
+    def cpu_time(self):
+        return cpu_time(self.popen.pid)
+
+    def stop(self, timeout=60):
+        """ Shut supervisord down; return the time it took """
+        if self.popen is None or self.popen.poll() is not None:
+            return None
+        started = time.time()
+        try:
+            self.rpc.supervisor.shutdown()
+        except Exception:
+            self.popen.terminate()
+        deadline = started + timeout
+        while self.popen.poll() is None:
+            if time.time() > deadline:
+                self.popen.kill()
+                self.popen.wait()
+                return None
+            time.sleep(0.01)
+        return time.time() - started
+
+def make_config(tempdir, programs=0, chatty=0, rate=1.0, line_length=100,
+                maxbytes='50MB', events=False, listeners=0, buffer_size=1000,
+                spawn_method='auto'):
+    values = {
+        'tempdir': tempdir,
+        'here': HERE,
+        'python': sys.executable,
+        'programs': programs,
+        'chatty': chatty,
+        'rate': rate,
+        'line_length': line_length,
+        'maxbytes': maxbytes,
+        'events': str(events).lower(),
+        'listeners': listeners,
+        'buffer_size': buffer_size,
+        'spawn_method': spawn_method,
+        }
+    config = SUPERVISORD_CONFIG % values
+    if programs:
+        config += IDLE_PROGRAM % values
+    if chatty:
+        config += CHATTY_PROGRAM % values
+    if listeners:
+        config += LISTENER_POOL % values
+    return config
+
+def measure_window(server, duration):
+    """ Reset the main loop counters, wait for duration seconds and
+    return the counters and the CPU time used by supervisord """
+    server.rpc.supervisor.getLoopStats(True)
+    cpu_before = server.cpu_time()
+    time.sleep(duration)
+    stats = server.rpc.supervisor.getLoopStats()
+    cpu_after = server.cpu_time()
+    if cpu_before is None or cpu_after is None:
+        cpu_percent = None
+    else:
+        cpu_percent = (cpu_after - cpu_before) / duration * 100
+    return stats, cpu_percent
+
+def loop_summary(stats):
+    return {
+        'iterations': stats['iterations'],
+        'poll_time': stats['poll_time'],
+        'work_time': stats['work_time'],
+        'max_latency': stats['max_latency'],
+        'latency_buckets': stats['latency_buckets'],
+        'latency_counts': stats['latency_counts'],
+        }
+
+def scenario_startup(tempdir, programs=50):
+    """ Time to start programs idle processes and to shut them down """
+    server = Supervisord(tempdir, make_config(tempdir, programs=programs))
+    server.start()
+    try:
+        startup = server.wait_until_running()
+    finally:
+        shutdown = server.stop()
+    return {
+        'programs': programs,
+        'startup_seconds': startup,
+        'shutdown_seconds': shutdown,
+        }
+
+def scenario_spawn(tempdir, programs=50):
+    """ Time spent creating each child, once with spawn_method=fork and
+    once with posix_spawn() where the platform supports it """
+    result = {'programs': programs}
+    for spawn_method in ('fork', 'auto'):
+        directory = os.path.join(tempdir, spawn_method)
+        os.mkdir(directory)
+        server = Supervisord(directory, make_config(
+            directory, programs=programs, spawn_method=spawn_method))
+        server.start()
+        try:
+            startup = server.wait_until_running()
+            spawns = server.rpc.supervisor.getSpawnQueue()['spawns']
+        finally:
+            server.stop()
+        for method, stats in spawns.items():
+            result[method + '_startup_seconds'] = startup
+            result[method + '_count'] = stats['count']
+            result[method + '_mean_usec'] = (
+                stats['time'] / stats['count'] * 1000000)
+            result[method + '_max_usec'] = stats['max_time'] * 1000000
+    return result
+
+def scenario_output(tempdir, chatty=4, rate=1.0, duration=5.0,
+                    line_length=100):
+    """ Throughput and main loop latency while chatty children each
+    write rate MB/s to stdout """
+    server = Supervisord(tempdir, make_config(
+        tempdir, chatty=chatty, rate=rate, line_length=line_length))
+    server.start()
+    try:
+        server.wait_until_running()
+        stats, cpu_percent = measure_window(server, duration)
+    finally:
+        server.stop()
+    nbytes = sum([p['bytes_read'] for p in stats['processes']])
+    result = {
+        'chatty': chatty,
+        'rate_mb_per_sec': rate,
+        'duration': duration,
+        'expected_mb_per_sec': chatty * rate,
+        'mb_per_sec': nbytes / duration / (1024 * 1024),
+        'cpu_percent': cpu_percent,
+        }
+    result.update(loop_summary(stats))
+    return result
+
+def scenario_events(tempdir, listeners=4, rate=0.5, duration=5.0):
+    """ Events delivered to an event listener pool for the output of a
+    chatty child with stdout_events_enabled """
+    server = Supervisord(tempdir, make_config(
+        tempdir, chatty=1, rate=rate, events=True, listeners=listeners))
+    counter = os.path.join(tempdir, 'events.count')
+    server.start()
+    try:
+        server.wait_until_running()
+        before = os.path.exists(counter) and os.path.getsize(counter) or 0
+        stats, cpu_percent = measure_window(server, duration)
+        after = os.path.exists(counter) and os.path.getsize(counter) or 0
+    finally:
+        server.stop()
+    result = {
+        'listeners': listeners,
+        'rate_mb_per_sec': rate,
+        'duration': duration,
+        'events_per_sec': (after - before) / duration,
+        'cpu_percent': cpu_percent,
+        }
+    result.update(loop_summary(stats))
+    return result
+
+def scenario_rpc(tempdir, programs=50, calls=500):
+    """ Latency of bursts of XML-RPC calls made back to back """
+    server = Supervisord(tempdir, make_config(tempdir, programs=programs))
+    server.start()
+    try:
+        server.wait_until_running()
+        result = {'programs': programs, 'calls': calls}
+        for method in ('getState', 'getAllProcessInfo'):
+            func = getattr(server.rpc.supervisor, method)
+            latencies = []
+            started = time.time()
+            for i in range(calls):
+                called = time.time()
+                func()
+                latencies.append(time.time() - called)
+            elapsed = time.time() - started
+            summary = latency_summary(latencies)
+            summary['calls_per_sec'] = calls / elapsed
+            result[method] = summary
+    finally:
+        server.stop()
+    return result
+
+SCENARIOS = (
+    ('startup', scenario_startup),
+    ('spawn', scenario_spawn),
+    ('output', scenario_output),
+    ('events', scenario_events),
+    ('rpc', scenario_rpc),
+    )
+
+def run(tempdir, names=None, params=None, report=None):
+    """ Run the scenarios and return a map of name to results.  params
+    maps a scenario name to the keyword arguments to run it with. """
+    results = {}
+    for name, func in SCENARIOS:
+        if names and name not in names:
+            continue
+        directory = os.path.join(tempdir, name)
+        os.mkdir(directory)
+        kw = (params or {}).get(name, {})
+        results[name] = func(directory, **kw)
+        if report is not None:
+            report('%-10s %s' % (name, format_result(results[name])))
+    return results
+
+def format_result(result):
+    parts = []
+    for key in sorted(result):
+        value = result[key]
+        if isinstance(value, float):
+            parts.append('%s=%.4g' % (key, value))
+        elif isinstance(value, (int, str)):
+            parts.append('%s=%s' % (key, value))
+    return ' '.join(parts)
@@ -439,6 +439,24 @@ def auto_restart(value):
         raise ValueError("invalid 'autorestart' value %r" % value)
     return computed_value
 
+def event_loop(value):
+    value = str(value).lower()
+    if value not in ('native', 'asyncio'):
+        raise ValueError("invalid 'event_loop' value %r" % value)
+    return value
+
+def spawn_method(value):
+    value = str(value).lower()
+    if value not in ('auto', 'fork'):
+        raise ValueError("invalid 'spawn_method' value %r" % value)
+    return value
+
+def log_compression(value):
+    value = str(value).lower()
+    if value not in ('none', 'gzip', 'zstd'):
+        raise ValueError("invalid 'childlog_compression' value %r" % value)
+    return value
+
 def profile_options(value):
     options = [x.lower() for x in list_of_strings(value) ]
     sort_options = []
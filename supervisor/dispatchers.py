@@ -1,7 +1,7 @@
 import errno
-from supervisor.medusa.asynchat_25 import find_prefix_at_end
 from supervisor.medusa.asyncore_25 import compact_traceback
 
+from supervisor.compat import as_bytes
 from supervisor.compat import as_string
 from supervisor.events import notify
 from supervisor.events import EventRejectedEvent
@@ -11,11 +11,12 @@ from supervisor.states import EventListenerStates
 from supervisor.states import getEventListenerStateDescription
 from supervisor import loggers
 
-class PDispatcher:
+class PDispatcher(object):
     """ Asyncore dispatcher for mainloop, representing a process channel
     (stdin, stdout, or stderr).  This class is abstract. """
 
     closed = False # True if close() has been called
+    edge_triggered = False # True if handle_read_event drains the fd
 
     def __init__(self, process, channel, fd):
         self.process = process  # process which "owns" this dispatcher
@@ -63,6 +64,219 @@ class PDispatcher:
     def flush(self):
         pass
 
+class OutputBuffer:
+    """
+    The output of one channel of a process that has been read but not
+    logged yet.
+
+    The data lives in a preallocated bytearray between ``start`` and
+    ``end``.  Output is read straight into the free space after ``end``
+    (see reserve() and commit()) and handed out as memoryviews of the
+    bytearray (see take()), so it is not copied on its way from the pipe
+    to the logs.  Once everything has been taken, the next read starts at
+    the front again; data that is left over (e.g. the start of a capture
+    token) is moved to the front when the free space runs out.
+
+    The size of the reads starts small and doubles every time a read
+    fills the space offered to it, up to ``maxsize``, so that processes
+    which write little don't hold on to large buffers.
+    """
+
+    initial_readsize = 4096
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.readsize = min(self.initial_readsize, maxsize)
+        self.buf = bytearray()
+        self.view = memoryview(self.buf)
+        self.start = 0
+        self.end = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def getvalue(self):
+        return bytes(self.buf[self.start:self.end])
+
+    def clear(self):
+        self.start = self.end = 0
+
+    def find(self, token):
+        """ Return the offset of token in the pending data or -1 """
+        index = self.buf.find(token, self.start, self.end)
+        if index != -1:
+            index -= self.start
+        return index
+
+    def prefix_at_end(self, token):
+        """ Return the length of the longest start of token that the
+        pending data ends with """
+        buf, start, end = self.buf, self.start, self.end
+        size = min(len(token) - 1, end - start)
+        while size and not buf.endswith(token[:size], start, end):
+            size -= 1
+        return size
+
+    def newlines(self, size):
+        """ Return the number of newlines in the first size bytes of the
+        pending data """
+        return self.buf.count(b'\n', self.start, self.start + size)
+
+    def take(self, size):
+        """ Remove size bytes from the front of the pending data and return
+        them as a memoryview.  The view is only valid until the next call
+        to reserve(). """
+        start = self.start
+        view = self.view[start:start + size]
+        if start + size == self.end:
+            self.start = self.end = 0
+        else:
+            self.start = start + size
+        return view
+
+    def reserve(self, size=None):
+        """ Return a memoryview of the free space the next read should
+        fill in, making room for it if needed.  The space is readsize
+        bytes long unless another size is given. """
+        if size is None:
+            size = self.readsize
+        end = self.end
+        if len(self.buf) - end < size:
+            buf = self.buf
+            pending = end - self.start
+            if len(buf) - pending >= size:
+                # move the pending data to the front.  a bytearray can't
+                # be resized while views of it exist, but this keeps its
+                # size
+                buf[:pending] = buf[self.start:end]
+            else:
+                self.buf = bytearray(pending + size)
+                self.buf[:pending] = buf[self.start:end]
+                self.view = memoryview(self.buf)
+            self.start = 0
+            self.end = end = pending
+        return self.view[end:end + size]
+
+    def commit(self, size):
+        """ Account for size bytes read into the space from reserve() """
+        self.end += size
+        if size == self.readsize and size < self.maxsize:
+            self.readsize = min(size * 2, self.maxsize)
+
+    def append(self, data):
+        size = len(data)
+        self.reserve(size)[:] = data
+        self.end += size
+
+class OutputRing:
+    """
+    The last ``maxbytes`` bytes of the output of one channel of a process
+    (see the ``stdout_ring_bytes`` option), kept in memory so that they
+    can be read without a log file.
+
+    The ring belongs to the process and outlives its dispatchers, so the
+    output of a process that has exited is still there.  The bytearray
+    grows up to ``maxbytes`` as output is written, then the oldest bytes
+    are overwritten in place; ``end`` is where the next byte goes.
+
+    Output is addressed by offsets that count every byte ever written to
+    the ring (see read()), like the offsets of a log file that is never
+    rotated.  Only the last ``maxbytes`` of them can still be read.
+    """
+
+    def __init__(self, maxbytes):
+        self.maxbytes = maxbytes
+        self.buf = bytearray()
+        self.end = 0
+        self.written = 0 # bytes ever written, the offset of the end
+
+    def __len__(self):
+        return len(self.buf)
+
+    def first(self):
+        """ Return the offset of the oldest byte that is kept """
+        return self.written - len(self.buf)
+
+    def write(self, data):
+        size = len(data)
+        self.written += size
+        maxbytes = self.maxbytes
+        if size > maxbytes:
+            data = data[size - maxbytes:]
+            size = maxbytes
+        buf = self.buf
+        room = maxbytes - len(buf)
+        if room > 0:
+            # still growing
+            buf += data[:room]
+            if size <= room:
+                self.end = len(buf) % maxbytes
+                return
+            data = data[room:]
+            size -= room
+            self.end = 0
+        end = self.end
+        head = min(size, maxbytes - end)
+        buf[end:end + head] = data[:head]
+        buf[:size - head] = data[head:]
+        self.end = (end + size) % maxbytes
+
+    def read(self, start=0, stop=None):
+        """ Return the output between the offsets start and stop that is
+        still kept """
+        kept = len(self.buf)
+        start = max(start, self.written - kept)
+        if stop is None or stop > self.written:
+            stop = self.written
+        size = stop - start
+        if size <= 0:
+            return b''
+        buf = self.buf
+        i = (self.end - (self.written - start)) % kept
+        if i + size <= kept:
+            return bytes(buf[i:i + size])
+        return bytes(buf[i:]) + bytes(buf[:i + size - kept])
+
+    def tail(self, offset, length):
+        """ Like tailFile(), for the output kept by the ring """
+        size = self.written
+        overflow = False
+        if size > (offset + length):
+            overflow = True
+            offset = size - 1
+        if (offset + length) > size:
+            if offset > (size - 1):
+                length = 0
+            offset = size - length
+        if offset < 0:
+            offset = 0
+        if length < 0:
+            length = 0
+        return [self.read(offset, offset + length), size, overflow]
+
+    def lines(self, count):
+        """ Return the last count lines of the output.  A line whose start
+        is no longer kept is left out; the last line may not be finished
+        yet. """
+        data = self.read()
+        if self.first() > 0:
+            newline = data.find(b'\n')
+            if newline != -1:
+                data = data[newline + 1:]
+        start = len(data)
+        if data.endswith(b'\n'):
+            start -= 1
+        for i in range(count):
+            start = data.rfind(b'\n', 0, start)
+            if start == -1:
+                return data
+        return data[start + 1:]
+
+    def clear(self):
+        """ Forget the output kept so far, but not how much was written """
+        self.buf = bytearray()
+        self.end = 0
+
 class POutputDispatcher(PDispatcher):
     """
     Dispatcher for one channel (stdout or stderr) of one process.
@@ -79,7 +293,10 @@ class POutputDispatcher(PDispatcher):
     normallog = None # the "normal" (non-capture) logger
     capturelog = None # the logger used while we're in capturemode
     capturemode = False # are we capturing process event data
-    output_buffer = b'' # data waiting to be logged
+    buffer = None # OutputBuffer holding data waiting to be logged
+    ring = None # OutputRing of the process for this channel, if any
+    indexed = False # the normal log is indexed, newlines are counted for it
+    edge_triggered = True
 
     def __init__(self, process, event_type, fd):
         """
@@ -92,11 +309,13 @@ class POutputDispatcher(PDispatcher):
         self.event_type = event_type
         self.fd = fd
         self.channel = self.event_type.channel
+        self.buffer = OutputBuffer(self.process.config.options.readfd_size)
 
         self._init_normallog()
         self._init_capturelog()
 
         self.childlog = self.normallog
+        self.ring = self.process.output_rings.get(self.channel)
 
         # all code below is purely for minor speedups
         begintoken = self.event_type.BEGIN_TOKEN
@@ -108,6 +327,32 @@ class POutputDispatcher(PDispatcher):
         self.log_to_mainlog = config.options.loglevel <= self.mainlog_level
         self.stdout_events_enabled = config.stdout_events_enabled
         self.stderr_events_enabled = config.stderr_events_enabled
+        self.splice_handler = self._get_splice_handler()
+
+    def _get_splice_handler(self):
+        """
+        Return the file handler of the normal log if the output of this
+        channel goes nowhere but to that file, so that it can be moved
+        from the pipe to the file with splice() instead of being read and
+        logged.  Return None otherwise.
+        """
+        config = self.process.config
+        if (self.capturelog is not None or
+                self.ring is not None or
+                self.normallog is None or
+                self.log_to_mainlog or
+                config.options.strip_ansi or
+                getattr(config, '%s_events_enabled' % self.channel)):
+            return None
+        handlers = self.normallog.handlers
+        if len(handlers) != 1:
+            return None # also logged to syslog
+        handler = handlers[0]
+        if not isinstance(handler, loggers.FileHandler):
+            return None
+        if not handler.can_splice():
+            return None
+        return handler
 
     def _init_normallog(self):
         """
@@ -120,6 +365,9 @@ class POutputDispatcher(PDispatcher):
         logfile = getattr(config, '%s_logfile' % channel)
         maxbytes = getattr(config, '%s_logfile_maxbytes' % channel)
         backups = getattr(config, '%s_logfile_backups' % channel)
+        buffer_size = getattr(config, '%s_logfile_buffer_size' % channel)
+        flush_interval = getattr(config, '%s_logfile_flush_interval' % channel)
+        index_every = getattr(config, '%s_logfile_index_bytes' % channel)
         to_syslog = getattr(config, '%s_syslog' % channel)
 
         if logfile or to_syslog:
@@ -132,8 +380,14 @@ class POutputDispatcher(PDispatcher):
                 fmt='%(message)s',
                 rotating=not not maxbytes, # optimization
                 maxbytes=maxbytes,
-                backups=backups
+                backups=backups,
+                buffer_size=buffer_size,
+                flush_interval=flush_interval,
+                flushes=config.options.log_flushes,
+                archive=config.options.log_archive,
+                index_every=index_every,
             )
+            self.indexed = index_every > 0
 
         if to_syslog:
             loggers.handle_syslog(
@@ -170,13 +424,41 @@ class POutputDispatcher(PDispatcher):
                 for handler in log.handlers:
                     handler.reopen()
 
-    def _log(self, data):
+    def flushlogs(self):
+        if self.normallog is not None:
+            for handler in self.normallog.handlers:
+                handler.flush()
+
+    def _get_output_buffer(self):
+        return self.buffer.getvalue()
+
+    def _set_output_buffer(self, data):
+        self.buffer.clear()
+        self.buffer.append(as_bytes(data))
+
+    # the pending data as bytes, for code that predates self.buffer
+    output_buffer = property(_get_output_buffer, _set_output_buffer)
+
+    def _log(self, data, newlines=None):
         if data:
             config = self.process.config
+            if self.channel == 'stdout':
+                events_enabled = self.stdout_events_enabled
+            else:
+                events_enabled = self.stderr_events_enabled
+            if isinstance(data, memoryview) and (config.options.strip_ansi or
+                                                 self.log_to_mainlog or
+                                                 events_enabled):
+                # the main log and events need data of their own, the
+                # view is overwritten by the next read
+                data = data.tobytes()
             if config.options.strip_ansi:
                 data = stripEscapes(data)
+                newlines = None
+            if self.ring is not None and not self.capturemode:
+                self.ring.write(data)
             if self.childlog:
-                self.childlog.info(data)
+                self.childlog.info(data, newlines=newlines)
             if self.log_to_mainlog:
                 if not isinstance(data, bytes):
                     text = data
@@ -189,54 +471,53 @@ class POutputDispatcher(PDispatcher):
                 config.options.logger.log(
                     self.mainlog_level, msg, name=config.name,
                     channel=self.channel, data=text)
-            if self.channel == 'stdout':
-                if self.stdout_events_enabled:
+            if events_enabled:
+                if self.channel == 'stdout':
                     notify(
                         ProcessLogStdoutEvent(self.process,
                             self.process.pid, data)
                     )
-            else: # channel == stderr
-                if self.stderr_events_enabled:
+                else: # channel == stderr
                     notify(
                         ProcessLogStderrEvent(self.process,
                             self.process.pid, data)
                     )
 
+    def _log_output(self, size):
+        """ Log the first size bytes of the buffer """
+        buffer = self.buffer
+        newlines = None
+        if self.indexed and not self.capturemode:
+            # counted in the buffer, the view doesn't say where it is
+            newlines = buffer.newlines(size)
+        self._log(buffer.take(size), newlines)
+
     def record_output(self):
+        buffer = self.buffer
         if self.capturelog is None:
             # shortcut trying to find capture data
-            data = self.output_buffer
-            self.output_buffer = b''
-            self._log(data)
+            self._log_output(len(buffer))
             return
 
-        if self.capturemode:
-            token, tokenlen = self.endtoken_data
-        else:
-            token, tokenlen = self.begintoken_data
+        while 1:
+            if self.capturemode:
+                token, tokenlen = self.endtoken_data
+            else:
+                token, tokenlen = self.begintoken_data
 
-        if len(self.output_buffer) <= tokenlen:
-            return # not enough data
+            if len(buffer) <= tokenlen:
+                return # not enough data
 
-        data = self.output_buffer
-        self.output_buffer = b''
+            index = buffer.find(token)
+            if index == -1:
+                # keep what may be the start of a token split across reads
+                keep = buffer.prefix_at_end(token)
+                self._log_output(len(buffer) - keep)
+                return
 
-        try:
-            before, after = data.split(token, 1)
-        except ValueError:
-            after = None
-            index = find_prefix_at_end(data, token)
-            if index:
-                self.output_buffer = self.output_buffer + data[-index:]
-                data = data[:-index]
-            self._log(data)
-        else:
-            self._log(before)
+            self._log_output(index)
+            buffer.take(tokenlen)
             self.toggle_capturemode()
-            self.output_buffer = after
-
-        if after:
-            self.record_output()
 
     def toggle_capturemode(self):
         self.capturemode = not self.capturemode
@@ -268,17 +549,78 @@ class POutputDispatcher(PDispatcher):
     def readable(self):
         if self.closed:
             return False
+        # see Subprocess.throttle_output()
+        return not self.process.output_throttled
+
+    def _splice(self, options, count):
+        """ Splice up to count bytes of output to the log file and return
+        the number of bytes moved, or None if the file can't be spliced
+        to.  In that case the output is read and logged from then on. """
+        try:
+            size = self.splice_handler.splice(self.fd, count)
+        except OSError as why:
+            if why.args[0] in (errno.EWOULDBLOCK, errno.EBADF, errno.EINTR):
+                return 0 # like readfd()
+            options.logger.debug(
+                'cannot splice output of %s to %s, reading it instead: %s' % (
+                self, self.splice_handler.baseFilename, why))
+            self.splice_handler = None
+            return None
+        return size
+
+    def _splice_output(self, options):
+        """ Handle a read event by splicing.  Return False if nothing was
+        done because the log file can't be spliced to. """
+        count = options.readfd_size
+        size = self._splice(options, count)
+        if size is None:
+            return False
+        if not size:
+            # EOF, see handle_read_event()
+            self.close()
+            return True
+        # drain the pipe if edge-triggered, see handle_read_event().  if
+        # splicing stops working halfway, the output that is left is read
+        # on the next read event
+        drain = options.poller.is_edge_triggered(self.fd)
+        while self.process.output_read(size) and drain and size >= count:
+            size = self._splice(options, count)
+            if not size:
+                break
         return True
 
     def handle_read_event(self):
-        data = self.process.config.options.readfd(self.fd)
-        self.output_buffer += data
+        options = self.process.config.options
+        if self.splice_handler is not None:
+            if self._splice_output(options):
+                return
+        buffer = self.buffer
+        readsize = buffer.readsize
+        size = options.readfd_into(self.fd, buffer.reserve())
+        buffer.commit(size)
+        reading = self.process.output_read(size)
         self.record_output()
-        if not data:
+        if not size:
             # if we get no data back from the pipe, it means that the
             # child process has ended.  See
             # mail.python.org/pipermail/python-dev/2004-August/046850.html
             self.close()
+            return
+        if not options.poller.is_edge_triggered(self.fd):
+            # the poller reports the fd again while data is waiting
+            return
+        # a full read means there may be more data waiting in the pipe.
+        # keep reading until a short read so that the fd is drained, as
+        # the poller won't report it again until more is written.  an
+        # empty read here is not treated as EOF because it may just mean
+        # EAGAIN; EOF will be seen on the next read event or when reaped.
+        # the process may also be throttled, the rest is then read later.
+        while reading and size >= readsize:
+            readsize = buffer.readsize
+            size = options.readfd_into(self.fd, buffer.reserve())
+            buffer.commit(size)
+            reading = self.process.output_read(size)
+            self.record_output()
 
 class PEventListenerDispatcher(PDispatcher):
     """ An output dispatcher that monitors and changes a process'
@@ -303,9 +645,10 @@ class PEventListenerDispatcher(PDispatcher):
         logfile = getattr(process.config, '%s_logfile' % channel)
 
         if logfile:
-            maxbytes = getattr(process.config, '%s_logfile_maxbytes' % channel)
-            backups = getattr(process.config, '%s_logfile_backups' % channel)
-            self.childlog = process.config.options.getLogger()
+            config = process.config
+            maxbytes = getattr(config, '%s_logfile_maxbytes' % channel)
+            backups = getattr(config, '%s_logfile_backups' % channel)
+            self.childlog = config.options.getLogger()
             loggers.handle_file(
                 self.childlog,
                 logfile,
@@ -313,6 +656,13 @@ class PEventListenerDispatcher(PDispatcher):
                 rotating=not not maxbytes, # optimization
                 maxbytes=maxbytes,
                 backups=backups,
+                buffer_size=getattr(config, '%s_logfile_buffer_size' % channel),
+                flush_interval=getattr(config,
+                                       '%s_logfile_flush_interval' % channel),
+                flushes=config.options.log_flushes,
+                archive=config.options.log_archive,
+                index_every=getattr(config,
+                                    '%s_logfile_index_bytes' % channel),
             )
 
     def removelogs(self):
@@ -326,6 +676,11 @@ class PEventListenerDispatcher(PDispatcher):
             for handler in self.childlog.handlers:
                 handler.reopen()
 
+    def flushlogs(self):
+        if self.childlog is not None:
+            for handler in self.childlog.handlers:
+                handler.flush()
+
 
     def writable(self):
         return False
@@ -337,6 +692,7 @@ class PEventListenerDispatcher(PDispatcher):
 
     def handle_read_event(self):
         data = self.process.config.options.readfd(self.fd)
+        self.process.bytes_read += len(data)
         if data:
             self.state_buffer += data
             procname = self.process.config.name
@@ -473,6 +829,9 @@ class PEventListenerDispatcher(PDispatcher):
         process.config.options.logger.debug(msg)
 
         process.listener_state = new_state
+        if new_state == EventListenerStates.READY:
+            # the pool may be able to dispatch buffered events now
+            process.schedule_transition()
         if new_state == EventListenerStates.UNKNOWN:
             msg = ('%s: has entered the UNKNOWN state and will no longer '
                    'receive events, this usually indicates the process '
@@ -511,6 +870,29 @@ class PInputDispatcher(PDispatcher):
                 else:
                     raise
 
+class PPidfdDispatcher(PDispatcher):
+    """
+    Dispatcher for the pidfd (Linux) of a running process.  The pidfd
+    becomes readable when the process exits.  The process is not reaped
+    here: Supervisor.reap, which runs after the events of each iteration
+    of the main loop, reaps it in the same iteration along with every
+    other child that exited, and counts it in its reap statistics.
+    """
+
+    def __init__(self, process, fd, pid):
+        PDispatcher.__init__(self, process, 'pidfd', fd)
+        self.pid = pid
+
+    def readable(self):
+        return not self.closed
+
+    def writable(self):
+        return False
+
+    def handle_read_event(self):
+        # the pidfd stays readable until the process is reaped
+        self.close()
+
 ANSI_ESCAPE_BEGIN = b'\x1b['
 ANSI_TERMINATORS = (b'H', b'f', b'A', b'B', b'C', b'D', b'R', b's', b'u', b'J',
                     b'K', b'h', b'l', b'p', b'm')
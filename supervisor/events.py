@@ -52,6 +52,27 @@ class ProcessLogStdoutEvent(ProcessLogEvent):
 class ProcessLogStderrEvent(ProcessLogEvent):
     channel = 'stderr'
 
+class ProcessOutputThrottledEvent(Event):
+    """ The output of a process is not read for a while because the
+    process went over its output_rate_limit """
+    def __init__(self, process, pid, until):
+        self.process = process
+        self.pid = pid
+        self.until = until # when its output will be read again
+
+    def payload(self):
+        groupname = ''
+        if self.process.group is not None:
+            groupname = self.process.group.config.name
+        config = self.process.config
+        return 'processname:%s groupname:%s pid:%s rate:%s burst:%s until:%s' % (
+            config.name,
+            groupname,
+            self.pid,
+            config.output_rate_limit,
+            config.output_rate_burst or config.output_rate_limit,
+            self.until)
+
 class ProcessCommunicationEvent(Event):
     """ Abstract """
     # event mode tokens
@@ -214,6 +235,7 @@ class EventTypes:
     PROCESS_LOG = ProcessLogEvent
     PROCESS_LOG_STDOUT = ProcessLogStdoutEvent
     PROCESS_LOG_STDERR = ProcessLogStderrEvent
+    PROCESS_OUTPUT_THROTTLED = ProcessOutputThrottledEvent
     REMOTE_COMMUNICATION = RemoteCommunicationEvent
     SUPERVISOR_STATE_CHANGE = SupervisorStateChangeEvent # abstract
     SUPERVISOR_STATE_CHANGE_RUNNING = SupervisorRunningEvent
@@ -16,6 +16,7 @@ from supervisor.compat import urllib
 from supervisor.compat import sha1
 from supervisor.compat import as_bytes
 from supervisor.compat import as_string
+from supervisor.logreader import CHUNK_SIZE
 from supervisor.medusa import asyncore_25 as asyncore
 from supervisor.medusa import http_date
 from supervisor.medusa import http_server
@@ -349,6 +350,11 @@ class deferring_http_channel(http_server.http_channel):
                 self.last_writable_check = now
                 return True
             else:
+                timers = getattr(self.server, 'timers', None)
+                if timers is not None:
+                    # wake up the main loop when the deferred is due
+                    timers.schedule(self.last_writable_check + self.delay,
+                                    self)
                 return False
 
         return http_server.http_channel.writable(self)
@@ -468,6 +474,7 @@ class deferring_http_channel(http_server.http_channel):
 class supervisor_http_server(http_server.http_server):
     channel_class = deferring_http_channel
     ip = None
+    timers = None # the main loop's TimerHeap, for deferring channels
 
     def prebind(self, sock, logger_object):
         """ Override __init__ to do logger setup earlier so it can
@@ -660,10 +667,12 @@ class tail_f_producer:
             self.sz = 0
             return "==> File truncated <==\n"
         if bytes_added > 0:
-            self.file.seek(-bytes_added, 2)
-            bytes = self.file.read(bytes_added)
-            self.sz = newsz
-            return bytes
+            # no more than a chunk at a time however far behind we are
+            self.file.seek(self.sz)
+            bytes = self.file.read(min(bytes_added, CHUNK_SIZE))
+            if bytes:
+                self.sz += len(bytes)
+                return bytes
         return NOT_DONE_YET
 
     def _open(self):
@@ -688,6 +697,25 @@ class tail_f_producer:
     def _fsize(self):
         return os.fstat(self.file.fileno())[stat.ST_SIZE]
 
+class output_ring_producer:
+    """ Like tail_f_producer, for the output of a process kept in memory
+    (see supervisor.dispatchers.OutputRing) """
+    def __init__(self, request, ring, head):
+        self.request = weakref.ref(request)
+        self.ring = ring
+        self.delay = 0.1
+        self.offset = max(ring.written - head, 0)
+
+    def more(self):
+        ring = self.ring
+        # output that is no longer kept is skipped
+        start = max(self.offset, ring.first())
+        if start >= ring.written:
+            return NOT_DONE_YET
+        bytes = ring.read(start, start + CHUNK_SIZE)
+        self.offset = start + len(bytes)
+        return bytes
+
 class logtail_handler:
     IDENT = 'Logtail HTTP Request Handler'
     path = '/logtail'
@@ -734,9 +762,14 @@ class logtail_handler:
             request.error(404) # not found
             return
 
+        ring = process.output_rings.get(channel)
         logfile = getattr(process.config, '%s_logfile' % channel, None)
 
-        if logfile is None or not os.path.exists(logfile):
+        if ring is not None:
+            # the recent output is kept in memory, no need for the logfile
+            producer = output_ring_producer(request, ring, 1024)
+
+        elif logfile is None or not os.path.exists(logfile):
             # we return 404 because no logfile is a temporary condition.
             # if the process has never been started, no logfile will exist
             # on disk.  a logfile of None is also a temporary condition,
@@ -744,8 +777,11 @@ class logtail_handler:
             request.error(404) # not found
             return
 
-        mtime = os.stat(logfile)[stat.ST_MTIME]
-        request['Last-Modified'] = http_date.build_http_date(mtime)
+        else:
+            mtime = os.stat(logfile)[stat.ST_MTIME]
+            request['Last-Modified'] = http_date.build_http_date(mtime)
+            producer = tail_f_producer(request, logfile, 1024)
+
         request['Content-Type'] = 'text/plain;charset=utf-8'
         # the lack of a Content-Length header makes the outputter
         # send a 'Transfer-Encoding: chunked' response
@@ -753,7 +789,7 @@ class logtail_handler:
         # tell reverse proxy server (e.g., nginx) to disable proxy buffering
         # (see also http://nginx.org/en/docs/http/ngx_http_proxy_module.html#proxy_buffering)
 
-        request.push(tail_f_producer(request, logfile, 1024))
+        request.push(producer)
 
         request.done()
 
@@ -811,6 +847,8 @@ def make_http_servers(options, supervisord):
         else:
             raise ValueError('Cannot determine socket type %r' % family)
 
+        hs.timers = options.timers
+
         from supervisor.xmlrpc import supervisor_xmlrpc_handler
         from supervisor.xmlrpc import SystemNamespaceRPCInterface
         from supervisor.web import supervisor_ui_handler
@@ -0,0 +1,238 @@
+"""Compression and retention of rotated child logs in a background thread
+(see the ``childlog_compression`` and ``childlog_budget`` options of the
+[supervisord] section)."""
+
+import collections
+import errno
+import gzip
+import os
+import re
+import shutil
+import threading
+import time
+
+try:
+    from compression import zstd # Python 3.14+
+except ImportError:
+    try:
+        import zstandard as zstd
+    except ImportError:
+        zstd = None
+
+# compression -> (extension, function opening a file to compress into)
+COMPRESSORS = {'gzip': ('.gz', gzip.open)}
+if zstd is not None:
+    COMPRESSORS['zstd'] = ('.zst', zstd.open)
+
+def implements_zstd():
+    return zstd is not None
+
+# the seconds supervisord waits for the worker before it exits
+SHUTDOWN_WAIT = 5
+
+# the rotated segments of a log are named after the time of the rotation,
+# e.g. "app.log.20240131-123456.789012", followed by ".gz" or ".zst" once
+# compressed.  ".tmp" is a compression that was cut short and ".idx" the
+# index of a segment (see supervisor.logindex).
+_SEGMENT = r'\.\d{8}-\d{6}\.\d{6}(\.gz|\.zst|\.idx)?(\.tmp)?$'
+_ANY_SEGMENT = re.compile(r'.+' + _SEGMENT)
+
+def uncompressed_name(path):
+    """ Return the name of the segment path before it was compressed """
+    for extension in ('.gz', '.zst'):
+        if path.endswith(extension):
+            return path[:-len(extension)]
+    return path
+
+def segment_name(filename, now):
+    """ Return the name under which filename is rotated at now """
+    second = int(now)
+    return '%s.%s.%06d' % (filename,
+                           time.strftime('%Y%m%d-%H%M%S',
+                                         time.localtime(second)),
+                           (now - second) * 1000000)
+
+def segments(filename):
+    """ Return the segments of filename, oldest first, including their
+    indexes and the compressions that are not done yet """
+    dirname, basename = os.path.split(filename)
+    pattern = re.compile(re.escape(basename) + _SEGMENT)
+    paths = [os.path.join(dirname, name)
+             for name in _listdir(dirname) if pattern.match(name)]
+    return _oldest_first(paths)[0]
+
+def _listdir(dirname):
+    try:
+        return os.listdir(dirname)
+    except OSError as why:
+        if why.args[0] != errno.ENOENT:
+            raise
+        return []
+
+def _oldest_first(paths):
+    """ Return paths sorted by time of rotation and their sizes, leaving
+    out those that are gone """
+    stats = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError as why:
+            if why.args[0] != errno.ENOENT:
+                raise
+            continue
+        # the name breaks ties, it is the time of the rotation too
+        stats.append((st.st_mtime, path, st.st_size))
+    stats.sort()
+    return ([path for mtime, path, size in stats],
+            [size for mtime, path, size in stats])
+
+class LogArchive:
+    """
+    The rotated segments of child logs that are compressed and removed
+    by a background thread.
+
+    RotatingFileHandler renames the log to segment_name() when it is
+    rotated, which is the only file operation done by the main loop, and
+    calls add().  A worker thread, started when there is work and gone
+    when there is none left, then compresses the segments of the log,
+    removes the oldest ones beyond its number of backups, and removes
+    the oldest segments of all logs in ``childlogdir`` until they use
+    no more than ``childlog_budget`` bytes.
+
+    The worker doesn't log: what it has done is kept until the main loop
+    calls report().  It may be holding the lock when supervisord forks a
+    child, and the child inherits it locked, so the child must not use
+    the archive before it execs (see Subprocess._spawn_as_child()).
+    """
+
+    def __init__(self, options):
+        self.options = options
+        self.lock = threading.Lock()
+        self.jobs = collections.deque() # (filename, backups)
+        self.worker = None
+        self.messages = collections.deque() # (logger method name, message)
+
+    def enabled(self):
+        return (self.options.childlog_compression != 'none' or
+                self.options.childlog_budget > 0)
+
+    def add(self, filename, backups):
+        """ Have the segments of filename archived in the background """
+        with self.lock:
+            if (filename, backups) not in self.jobs:
+                self.jobs.append((filename, backups))
+            if self.worker is None:
+                self.worker = self._start_worker()
+
+    def _start_worker(self):
+        worker = threading.Thread(target=self.work,
+                                  name='supervisor log archive')
+        worker.daemon = True
+        worker.start()
+        return worker
+
+    def work(self):
+        """ Archive until there is nothing left to do """
+        while 1:
+            with self.lock:
+                if not self.jobs:
+                    self.worker = None
+                    return
+                filename, backups = self.jobs.popleft()
+            try:
+                self.archive(filename, backups)
+                self.apply_budget()
+            except Exception as e:
+                self.messages.append(
+                    ('warn', 'failed to archive %s: %s' % (filename, e)))
+
+    def wait(self, timeout=None):
+        """ Wait for the worker to be done, for up to timeout seconds.
+        Return False if it is still working. """
+        with self.lock:
+            worker = self.worker
+        if worker is not None:
+            worker.join(timeout)
+            return not worker.is_alive()
+        return True
+
+    def report(self):
+        """ Log what the worker has done since the last call """
+        while self.messages:
+            level, message = self.messages.popleft()
+            getattr(self.options.logger, level)(message)
+
+    def segments(self, filename):
+        """ Return the segments of filename, oldest first """
+        return segments(filename)
+
+    def archive(self, filename, backups):
+        segments = []
+        indexes = []
+        for path in self.segments(filename):
+            if path.endswith('.tmp'):
+                # its segment was not removed, it is compressed again
+                self._remove(path)
+            elif path.endswith('.idx'):
+                indexes.append(path)
+            else:
+                segments.append(path)
+        for path in segments[:-backups]:
+            self._remove(path)
+        # the index of a segment goes with it
+        kept = set([uncompressed_name(path) for path in segments[-backups:]])
+        for path in indexes:
+            if path[:-len('.idx')] not in kept:
+                self._remove(path)
+        compression = self.options.childlog_compression
+        if compression == 'none':
+            return
+        for path in segments[-backups:]:
+            if not path.endswith(('.gz', '.zst')):
+                self.compress(path, compression)
+
+    def compress(self, path, compression):
+        extension, open_compressed = COMPRESSORS[compression]
+        target = path + extension
+        tmp = target + '.tmp'
+        try:
+            with open(path, 'rb') as src:
+                with open_compressed(tmp, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, 1 << 16)
+            # the segment keeps the time of the rotation
+            st = os.stat(path)
+            os.utime(tmp, (st.st_atime, st.st_mtime))
+            os.rename(tmp, target)
+        except (IOError, OSError):
+            self._remove(tmp)
+            raise
+        self._remove(path)
+        self.messages.append(('debug', 'compressed %s' % path))
+
+    def apply_budget(self):
+        budget = self.options.childlog_budget
+        if budget <= 0:
+            return
+        dirname = self.options.childlogdir
+        paths = [os.path.join(dirname, name)
+                 for name in _listdir(dirname)
+                 if _ANY_SEGMENT.match(name)]
+        paths, sizes = _oldest_first(paths)
+        used = sum(sizes)
+        for path, size in zip(paths, sizes):
+            if used <= budget:
+                break
+            if self._remove(path):
+                used -= size
+                self.messages.append(
+                    ('info', 'removed %s, rotated logs in %s use more than '
+                     'childlog_budget (%d bytes)' % (path, dirname, budget)))
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError as why:
+            if why.args[0] != errno.ENOENT:
+                raise
+            return False
+        return True
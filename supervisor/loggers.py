@@ -9,14 +9,23 @@ idiosyncratic and a bit slow for our purposes (we don't use threads).
 
 import os
 import errno
+import re
+import stat
 import sys
 import time
 import traceback
 
 from supervisor.compat import syslog
+from supervisor.compat import PY2
 from supervisor.compat import long
 from supervisor.compat import is_text_stream
 from supervisor.compat import as_string
+from supervisor.logarchive import segment_name
+from supervisor.logindex import LogIndex
+from supervisor.logindex import sidecar_name
+
+# moves data between a pipe and a file in the kernel (Linux, python 3.10+)
+splice = getattr(os, 'splice', None)
 
 class LevelsByName:
     CRIT = 50   # messages that probably require immediate user attention
@@ -49,8 +58,81 @@ def getLevelNumByDescription(description):
     num = getattr(LevelsByDescription, description, None)
     return num
 
+class AscTime:
+    """ Renders times like '2024-01-31 12:34:56,789'.  The part up to the
+    seconds only changes once a second, so it is kept from call to call
+    rather than asked of strftime() for every record. """
+
+    def __init__(self):
+        self.second = None
+        self.prefix = None
+
+    def __call__(self, now):
+        second = long(now)
+        if second != self.second:
+            self.prefix = time.strftime("%Y-%m-%d %H:%M:%S",
+                                        time.localtime(second))
+            self.second = second
+        return '%s,%03d' % (self.prefix, (now - second) * 1000)
+
+asctime = AscTime()
+
+# fields of the '%(name)s' kind, which Formatter can fill in by position
+_SIMPLE_FIELD = re.compile(r'%\((\w+)\)s')
+
+class Formatter:
+    """
+    Formats a LogRecord with a format string such as
+    '%(asctime)s %(levelname)s %(message)s\n'.
+
+    The format string is compiled once: its fields are looked up in
+    advance and replaced by positional ones, so that only the fields it
+    uses are computed for a record and no dict is built to format it.
+    Format strings with other kinds of fields (e.g. '%(message)r') are
+    formatted with LogRecord.asdict() instead.
+    """
+
+    def __init__(self, fmt):
+        self.fmt = fmt
+        names = []
+        def positional(match):
+            names.append(match.group(1))
+            return '%s'
+        template = _SIMPLE_FIELD.sub(positional, fmt)
+        getters = []
+        for name in names:
+            getter = LogRecord.fields.get(name)
+            if getter is None:
+                break
+            getters.append(getter)
+        if (len(getters) == len(names) and
+                template.replace('%%', '').count('%') == len(names)):
+            self.template = template
+            self.getters = tuple(getters)
+            self.format = self._format_positional
+        else:
+            self.format = self._format_dict
+
+    def _format_positional(self, record):
+        return self.template % tuple([getter(record)
+                                      for getter in self.getters])
+
+    def _format_dict(self, record):
+        return self.fmt % record.asdict()
+
+_formatters = {}
+
+def getFormatter(fmt):
+    """ Return the Formatter for fmt, which is shared by all handlers that
+    use the same format string """
+    formatter = _formatters.get(fmt)
+    if formatter is None:
+        formatter = _formatters[fmt] = Formatter(fmt)
+    return formatter
+
 class Handler:
     fmt = '%(message)s'
+    formatter = None # Formatter of fmt, see setFormat()
     level = LevelsByName.INFO
 
     def __init__(self, stream=None):
@@ -59,6 +141,7 @@ class Handler:
 
     def setFormat(self, fmt):
         self.fmt = fmt
+        self.formatter = getFormatter(fmt)
 
     def setLevel(self, level):
         self.level = level
@@ -89,13 +172,20 @@ class Handler:
     def emit(self, record):
         try:
             binary = (self.fmt == '%(message)s' and
-                      isinstance(record.msg, bytes) and
+                      isinstance(record.msg, (bytes, memoryview)) and
                       (not record.kw or record.kw == {'exc_info': None}))
             binary_stream = not is_text_stream(self.stream)
+            newlines = None
             if binary:
                 msg = record.msg
+                newlines = record.newlines
+                if PY2 and isinstance(msg, memoryview):
+                    msg = msg.tobytes()
             else:
-                msg = self.fmt % record.asdict()
+                formatter = self.formatter
+                if formatter is None or formatter.fmt != self.fmt:
+                    formatter = self.formatter = getFormatter(self.fmt)
+                msg = formatter.format(record)
                 if binary_stream:
                     msg = msg.encode('utf-8')
             try:
@@ -106,10 +196,15 @@ class Handler:
                 # which deliberately raises an exception the first
                 # time it's called. So just do it again
                 self.stream.write(msg)
-            self.flush()
+            self.written(msg, newlines)
         except:
             self.handleError()
 
+    def written(self, data, newlines=None):
+        """ Called by emit() after data was written to the stream, with
+        the number of newlines in it if they were counted """
+        self.flush()
+
     def handleError(self):
         ei = sys.exc_info()
         traceback.print_exception(ei[0], ei[1], ei[2], None, sys.stderr)
@@ -151,13 +246,33 @@ class BoundIO:
 
 class FileHandler(Handler):
     """File handler which supports reopening of logs.
+
+    If buffer_size is not 0, records are written behind: they are kept
+    in a buffer of that size and only written to the file when it is
+    full, when the file is rotated, reopened or closed, or when
+    flush_interval seconds have passed since the first record that
+    wasn't flushed.  The latter is driven by flushes, a FlushSchedule.
+
+    If index_every is not 0 and the file is a regular file, a checkpoint
+    is written to its index (see supervisor.logindex) every index_every
+    bytes.
     """
+    splice_fd = None # the file opened without O_APPEND, see _splice()
+    size = 0 # the size of the file including the records not flushed
 
-    def __init__(self, filename, mode='ab'):
+    def __init__(self, filename, mode='ab', buffer_size=0, flush_interval=0,
+                 flushes=None, index_every=0):
         Handler.__init__(self)
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.flushes = flushes
+        self.baseFilename = filename
+        self.index = None
+        if index_every:
+            self.index = LogIndex(sidecar_name(filename), index_every)
 
         try:
-            self.stream = open(filename, mode)
+            self.stream = self._open(mode)
         except OSError as e:
             if mode == 'ab' and e.errno == errno.ESPIPE:
                 # Python 3 can't open special files like
@@ -165,20 +280,105 @@ class FileHandler(Handler):
                 # that fails with ESPIPE. Retry in 'w' mode.
                 # See: http://bugs.python.org/issue27805
                 mode = 'wb'
-                self.stream = open(filename, mode)
+                self.stream = self._open(mode)
             else:
                 raise
 
-        self.baseFilename = filename
         self.mode = mode
 
+    def _open(self, mode):
+        stream = open(self.baseFilename, mode, self.buffer_size or -1)
+        st = os.fstat(stream.fileno())
+        self.size = st.st_size
+        if self.index is not None:
+            if stat.S_ISREG(st.st_mode):
+                self.index.open(self.baseFilename, self.size)
+            else:
+                # e.g. /dev/stdout, offsets in it mean nothing
+                self.index = None
+        return stream
+
+    def written(self, data, newlines=None):
+        if self.index is not None:
+            self.index.written(data, self.size, newlines)
+        self.size += len(data)
+        if not self.buffer_size:
+            self.flush()
+        elif self.flushes is not None and self.flush_interval:
+            self.flushes.add(self)
+
+    def flush(self):
+        if self.flushes is not None:
+            self.flushes.discard(self)
+        Handler.flush(self)
+
+    def close(self):
+        if self.flushes is not None:
+            self.flushes.discard(self)
+        self._close_splice_fd()
+        if self.index is not None:
+            self.index.close()
+        Handler.close(self)
+
+    def _close_splice_fd(self):
+        if self.splice_fd is not None:
+            os.close(self.splice_fd)
+            self.splice_fd = None
+
+    def _open_splice_fd(self):
+        # splice() refuses files opened with O_APPEND, like the stream, so
+        # the file is opened again.  it must still be the file of the
+        # stream and a regular file, or the write offset means nothing.
+        fd = os.open(self.baseFilename, os.O_WRONLY)
+        st = os.fstat(fd)
+        stream_st = os.fstat(self.stream.fileno())
+        if (not stat.S_ISREG(st.st_mode) or
+                (st.st_dev, st.st_ino) != (stream_st.st_dev, stream_st.st_ino)):
+            os.close(fd)
+            raise OSError(errno.EINVAL, 'cannot splice to %s' %
+                          self.baseFilename)
+        self.splice_fd = fd
+
+    def _splice(self, fd, count):
+        """ Move up to count bytes from the pipe fd to the end of the file
+        without copying them to user space.  Return the number of bytes
+        moved and the size of the file after the move. """
+        if self.splice_fd is None:
+            self._open_splice_fd()
+        if self.buffer_size:
+            # records written behind go first
+            self.flush()
+        # the end of the file is looked up every time, rather than kept,
+        # in case the file is also appended to by someone else or was
+        # truncated (e.g. by logrotate's copytruncate)
+        end = os.fstat(self.splice_fd).st_size
+        moved = splice(fd, self.splice_fd, count, offset_dst=end,
+                       flags=os.SPLICE_F_NONBLOCK)
+        self.size = end + moved
+        return moved, self.size
+
+    def splice(self, fd, count):
+        """ Move up to count bytes from the pipe fd to the end of the file
+        with os.splice() and return the number of bytes moved.  Raises
+        OSError if the file can't be spliced to (see can_splice()). """
+        return self._splice(fd, count)[0]
+
+    def can_splice(self):
+        # a splice writes to the file right away, records written behind
+        # are better off read and kept in the buffer.  the newlines of
+        # what is spliced can't be counted for the index.
+        return (splice is not None and not self.closed and
+                not self.buffer_size and self.index is None)
+
     def reopen(self):
         self.close()
-        self.stream = open(self.baseFilename, self.mode)
+        self.stream = self._open(self.mode)
         self.closed = False
 
     def remove(self):
         self.close()
+        if self.index is not None:
+            self.index.remove()
         try:
             os.remove(self.baseFilename)
         except OSError as why:
@@ -187,7 +387,8 @@ class FileHandler(Handler):
 
 class RotatingFileHandler(FileHandler):
     def __init__(self, filename, mode='ab', maxBytes=512*1024*1024,
-                 backupCount=10):
+                 backupCount=10, buffer_size=0, flush_interval=0,
+                 flushes=None, archive=None, index_every=0):
         """
         Open the specified file and use it as the stream for logging.
 
@@ -207,12 +408,22 @@ class RotatingFileHandler(FileHandler):
         respectively.
 
         If maxBytes is zero, rollover never occurs.
+
+        The size of the file is counted as records are written rather
+        than asked of the file, so that records written behind (see
+        FileHandler) count too.
+
+        If archive is an enabled LogArchive, the file is instead renamed
+        after the time of the rollover and its backups are compressed
+        and removed in the background, see supervisor.logarchive.
         """
         if maxBytes > 0:
             mode = 'ab' # doesn't make sense otherwise!
-        FileHandler.__init__(self, filename, mode)
+        FileHandler.__init__(self, filename, mode, buffer_size,
+                             flush_interval, flushes, index_every)
         self.maxBytes = maxBytes
         self.backupCount = backupCount
+        self.archive = archive
         self.counter = 0
         self.every = 10
 
@@ -226,6 +437,16 @@ class RotatingFileHandler(FileHandler):
         FileHandler.emit(self, record)
         self.doRollover()
 
+    def splice(self, fd, count):
+        """
+        Move data from the pipe fd to the file as FileHandler.splice() does,
+        catering for rollover.  The size of the file is known from the
+        splice, the stream is not asked for it.
+        """
+        moved, size = self._splice(fd, count)
+        self.doRollover(size)
+        return moved
+
     def _remove(self, fn): # pragma: no cover
         # this is here to service stubbing in unit tests
         return os.remove(fn)
@@ -254,46 +475,151 @@ class RotatingFileHandler(FileHandler):
             if why.args[0] != errno.ENOENT:
                 raise
 
-    def doRollover(self):
+    def moveIndex(self, sfn, dfn):
+        """ Move the index of the log sfn, which was renamed to dfn, with
+        it.  An index left over for dfn is removed. """
+        sidx = sidecar_name(sfn)
+        didx = sidecar_name(dfn)
+        if self._exists(sidx):
+            self.removeAndRename(sidx, didx)
+        elif self._exists(didx):
+            try:
+                self._remove(didx)
+            except OSError as why:
+                if why.args[0] != errno.ENOENT:
+                    raise
+
+    def doRollover(self, size=None):
         """
-        Do a rollover, as described in __init__().
+        Do a rollover, as described in __init__().  size is the size of
+        the file if the caller knows it better than self.size.
         """
         if self.maxBytes <= 0:
             return
 
-        if not (self.stream.tell() >= self.maxBytes):
+        if size is None:
+            size = self.size
+        if not (size >= self.maxBytes):
             return
 
+        if self.flushes is not None:
+            self.flushes.discard(self)
+        self._close_splice_fd()
         self.stream.close()
-        if self.backupCount > 0:
+        if self.index is not None:
+            self.index.close()
+        if self.backupCount > 0 and self.archive is not None and (
+                self.archive.enabled()):
+            # a single rename, the archive does the rest in the background
+            dfn = segment_name(self.baseFilename, time.time())
+            try:
+                self._rename(self.baseFilename, dfn)
+            except OSError as why:
+                # the active log was removed by someone else
+                if why.args[0] != errno.ENOENT:
+                    raise
+            if self.index is not None:
+                self.moveIndex(self.baseFilename, dfn)
+            self.archive.add(self.baseFilename, self.backupCount)
+        elif self.backupCount > 0:
             for i in range(self.backupCount - 1, 0, -1):
                 sfn = "%s.%d" % (self.baseFilename, i)
                 dfn = "%s.%d" % (self.baseFilename, i + 1)
                 if os.path.exists(sfn):
                     self.removeAndRename(sfn, dfn)
+                    if self.index is not None:
+                        self.moveIndex(sfn, dfn)
             dfn = self.baseFilename + ".1"
             self.removeAndRename(self.baseFilename, dfn)
-        self.stream = open(self.baseFilename, 'wb')
+            if self.index is not None:
+                self.moveIndex(self.baseFilename, dfn)
+        self.stream = self._open('wb')
+
+class FlushSchedule:
+    """
+    The file handlers whose records are written behind and not flushed
+    yet, with the time by which each must be flushed.  The deadlines are
+    scheduled on timers, the TimerHeap of supervisord's main loop, which
+    only calls back the handlers that are due.
+    """
+
+    def __init__(self, timers):
+        self.timers = timers
+        self.deadlines = {} # handler -> time by which to flush it
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def add(self, handler):
+        """ Flush handler flush_interval seconds from now, unless it is
+        already due earlier """
+        if handler not in self.deadlines:
+            self._schedule(handler, time.time() + handler.flush_interval)
+
+    def discard(self, handler):
+        if self.deadlines.pop(handler, None) is not None:
+            self.timers.cancel(handler)
+
+    def reschedule(self, now):
+        """ Schedule every deadline again after the timers were cleared.
+        If the clock moved backward, no handler is flushed later than
+        flush_interval seconds from now. """
+        for handler, deadline in list(self.deadlines.items()):
+            deadline = min(deadline, now + handler.flush_interval)
+            self._schedule(handler, deadline)
+
+    def flush(self, handler):
+        self.discard(handler)
+        try:
+            handler.flush()
+        except:
+            handler.handleError()
+
+    def _schedule(self, handler, deadline):
+        self.deadlines[handler] = deadline
+        self.timers.schedule(deadline, handler,
+                             lambda: self.flush(handler))
 
 class LogRecord:
+    message = None # the formatted message, see getMessage()
+    newlines = None # in msg, if counted by the caller of Logger.log()
+    asctime = None # the time of the first use of the record, see getAscTime()
+
     def __init__(self, level, msg, **kw):
         self.level = level
         self.msg = msg
         self.kw = kw
         self.dictrepr = None
 
-    def asdict(self):
-        if self.dictrepr is None:
-            now = time.time()
-            msecs = (now - long(now)) * 1000
-            part1 = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
-            asctime = '%s,%03d' % (part1, msecs)
-            levelname = LOG_LEVELS_BY_NUM[self.level]
-            msg = as_string(self.msg)
+    def getMessage(self):
+        msg = self.message
+        if msg is None:
+            msg = self.msg
+            if isinstance(msg, memoryview):
+                msg = msg.tobytes()
+            msg = as_string(msg)
             if self.kw:
                 msg = msg % self.kw
-            self.dictrepr = {'message':msg, 'levelname':levelname,
-                             'asctime':asctime}
+            self.message = msg
+        return msg
+
+    def getLevelName(self):
+        return LOG_LEVELS_BY_NUM[self.level]
+
+    def getAscTime(self):
+        if self.asctime is None:
+            self.asctime = asctime(time.time())
+        return self.asctime
+
+    # the fields that format strings may use (see Formatter)
+    fields = {'message': getMessage, 'levelname': getLevelName,
+              'asctime': getAscTime}
+
+    def asdict(self):
+        if self.dictrepr is None:
+            self.dictrepr = {'message':self.getMessage(),
+                             'levelname':self.getLevelName(),
+                             'asctime':self.getAscTime()}
         return self.dictrepr
 
 class Logger:
@@ -338,10 +664,14 @@ class Logger:
         if LevelsByName.CRIT >= self.level:
             self.log(LevelsByName.CRIT, msg, **kw)
 
-    def log(self, level, msg, **kw):
-        record = LogRecord(level, msg, **kw)
+    def log(self, level, msg, newlines=None, **kw):
+        # the record is only made if a handler takes it
+        record = None
         for handler in self.handlers:
             if level >= handler.level:
+                if record is None:
+                    record = LogRecord(level, msg, **kw)
+                    record.newlines = newlines
                 handler.emit(record)
 
     def addHandler(self, hdlr):
@@ -367,7 +697,8 @@ class SyslogHandler(Handler):
 
     def emit(self, record):
         try:
-            params = record.asdict()
+            # the dict of the record is shared with the other handlers
+            params = record.asdict().copy()
             message = params['message']
             for line in message.rstrip('\n').split('\n'):
                 params['message'] = line
@@ -407,16 +738,23 @@ def handle_syslog(logger, fmt):
     handler.setLevel(logger.level)
     logger.addHandler(handler)
 
-def handle_file(logger, filename, fmt, rotating=False, maxbytes=0, backups=0):
+def handle_file(logger, filename, fmt, rotating=False, maxbytes=0, backups=0,
+                buffer_size=0, flush_interval=0, flushes=None, archive=None,
+                index_every=0):
     """Attach a new file handler to an existing Logger. If the filename
-    is the magic name of 'syslog' then make it a syslog handler instead."""
+    is the magic name of 'syslog' then make it a syslog handler instead.
+    See FileHandler for buffer_size, flush_interval, flushes and
+    index_every and RotatingFileHandler for archive."""
     if filename == 'syslog': # TODO remove this
         handler = SyslogHandler()
     else:
         if rotating is False:
-            handler = FileHandler(filename)
+            handler = FileHandler(filename, 'ab', buffer_size,
+                                  flush_interval, flushes, index_every)
         else:
-            handler = RotatingFileHandler(filename, 'a', maxbytes, backups)
+            handler = RotatingFileHandler(filename, 'a', maxbytes, backups,
+                                          buffer_size, flush_interval,
+                                          flushes, archive, index_every)
     handler.setFormat(fmt)
     handler.setLevel(logger.level)
     logger.addHandler(handler)
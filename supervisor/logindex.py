@@ -0,0 +1,291 @@
+"""Sparse index of a child log file (see the ``stdout_logfile_index_bytes``
+option of the [program:x] section), kept in a sidecar file next to it.
+
+The index is a list of checkpoints, one per line of the sidecar::
+
+  <time> <offset> <lines>
+
+meaning that the first ``offset`` bytes of the log, which hold ``lines``
+newlines, were written at or before ``time`` and that everything after
+them was written at or after ``time``.  A checkpoint is added before
+writing to the log once at least ``every`` bytes were written since the
+previous one, so the reader of a range of time or of lines only has to
+read up to ``every`` bytes more than it asked for.
+"""
+
+import bisect
+import errno
+import os
+import threading
+import time
+
+# the most lines read at once by read_lines(), and the most bytes it
+# reads for them
+MAX_LINES = 10000
+MAX_READ = 1 << 24
+
+def sidecar_name(filename):
+    """ Return the name of the index of the log file filename """
+    return filename + '.idx'
+
+def read_checkpoints(filename):
+    """ Return the checkpoints (time, offset, lines) in the index file
+    filename, or an empty list if it can't be read.  A last line that was
+    cut short is ignored. """
+    try:
+        with open(filename, 'rb') as f:
+            data = f.read()
+    except (IOError, OSError):
+        return []
+    checkpoints = []
+    for line in data.split(b'\n')[:-1]:
+        try:
+            when, offset, lines = line.split()
+            checkpoints.append((float(when), int(offset), int(lines)))
+        except ValueError:
+            return []
+    return checkpoints
+
+def count_lines(filename, start, end, chunk_size=1 << 16):
+    """ Return the number of newlines between offsets start and end of
+    the file filename """
+    lines = 0
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        left = end - start
+        while left > 0:
+            data = f.read(min(chunk_size, left))
+            if not data:
+                break
+            lines += data.count(b'\n')
+            left -= len(data)
+    return lines
+
+def range_of_time(checkpoints, start, end, size):
+    """ Return the offsets between which the log of size bytes holds
+    everything written between the times start and end """
+    times = [checkpoint[0] for checkpoint in checkpoints]
+    # the last checkpoint at or before start
+    i = bisect.bisect_right(times, start) - 1
+    first = checkpoints[i][1] if i >= 0 else 0
+    # the first checkpoint after end
+    j = bisect.bisect_right(times, end)
+    last = checkpoints[j][1] if j < len(checkpoints) else size
+    return first, max(first, min(last, size))
+
+def ranges_of_time(files, start, end):
+    """ Return (path, first, last) for the files of a log that hold
+    everything written between the times start and end, oldest first,
+    given the files as (path, checkpoints, size), oldest first too.  The
+    files without an index, and those older than them, are left out. """
+    ranges = []
+    for path, checkpoints, size in reversed(files):
+        if not checkpoints:
+            break
+        first, last = range_of_time(checkpoints, start, end, size)
+        if first < last:
+            ranges.append((path, first, last))
+        if checkpoints[0][0] <= start:
+            break # the older files were written before start
+    ranges.reverse()
+    return ranges
+
+def line_checkpoint(checkpoints, line):
+    """ Return (offset, lines) of the last checkpoint before the start of
+    the line numbered line (counting from 0).  A checkpoint with as many
+    newlines before it as line may be in the middle of the line. """
+    numbers = [checkpoint[2] for checkpoint in checkpoints]
+    i = bisect.bisect_left(numbers, line) - 1
+    if i < 0:
+        return 0, 0
+    return checkpoints[i][1], checkpoints[i][2]
+
+def read_lines(filename, checkpoints, first, count, chunk_size=1 << 16,
+               max_read=MAX_READ):
+    """ Return up to count lines of the log file filename, starting with
+    the line numbered first (counting from 0).  The last line may be cut
+    short if it is still being written, or if max_read bytes were read.
+    Raise ValueError if the first line is not within max_read bytes of
+    the last checkpoint before it. """
+    offset, lines = line_checkpoint(checkpoints, first)
+    skip = first - lines # newlines before the first line
+    parts = []
+    with open(filename, 'rb') as f:
+        f.seek(offset)
+        while count > 0 and max_read > 0:
+            data = f.read(min(chunk_size, max_read))
+            if not data:
+                break
+            max_read -= len(data)
+            start = 0
+            while skip > 0:
+                i = data.find(b'\n', start)
+                if i < 0:
+                    break
+                start = i + 1
+                skip -= 1
+            if skip > 0:
+                if max_read <= 0:
+                    raise ValueError('line %d is too far after the last '
+                                     'checkpoint before it' % first)
+                continue
+            end = start
+            while count > 0:
+                i = data.find(b'\n', end)
+                if i < 0:
+                    end = len(data)
+                    break
+                end = i + 1
+                count -= 1
+            parts.append(data[start:end])
+    return b''.join(parts)
+
+class LineCounter:
+    """
+    Counts the newlines between offsets start and end of a log file in a
+    thread.  Once done is true, count is their number, or None if the
+    log couldn't be read.
+
+    The thread shares nothing but its result with the main loop, and a
+    child that supervisord forks while it runs closes the descriptor of
+    the log it inherits before it execs (see Subprocess._spawn_as_child()).
+    """
+
+    done = False
+    count = None
+
+    def __init__(self, logfile, start, end):
+        self.logfile = logfile
+        self.range = (start, end)
+
+    def start(self):
+        counter = threading.Thread(target=self.run,
+                                   name='supervisor log index')
+        counter.daemon = True
+        counter.start()
+        return counter
+
+    def run(self):
+        try:
+            self.count = count_lines(self.logfile, *self.range)
+        except (IOError, OSError):
+            pass
+        self.done = True
+
+class LogIndex:
+    """
+    Writes the index of a log file as FileHandler writes to the log.
+
+    The index of a log that is opened again, e.g. by a new supervisord,
+    is carried on if it still matches the log; otherwise a new index is
+    started.  Either way, the newlines already in the log after the last
+    checkpoint are counted by a LineCounter, so that opening a large log
+    doesn't hold up the main loop.  The checkpoints are held back until
+    they are counted, and readers of the index meanwhile read the log
+    from the last checkpoint that was written.
+    """
+
+    fd = None
+    counter = None # LineCounter of the newlines already in the log
+    pending = None # checkpoints held back until the counter is done
+
+    def __init__(self, filename, every):
+        self.filename = filename # of the index
+        self.every = every
+        self.offset = 0 # of the last checkpoint
+        self.lines = 0 # newlines written to the log
+
+    def open(self, logfile, size):
+        """ Called when the log file, of size bytes, is opened """
+        self.close()
+        checkpoints = read_checkpoints(self.filename)
+        if checkpoints and checkpoints[-1][1] <= size:
+            when, self.offset, lines = checkpoints[-1]
+            flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT
+            self.fd = os.open(self.filename, flags, 0o644)
+            self.count(logfile, self.offset, size, lines)
+            return
+        flags = os.O_WRONLY | os.O_TRUNC | os.O_CREAT
+        self.fd = os.open(self.filename, flags, 0o644)
+        self.offset = 0
+        self.lines = 0
+        if size:
+            # what is in the log was written at some time before now
+            self.checkpoint(0, 0, 0)
+            self.count(logfile, 0, size, 0)
+            self.checkpoint(os.path.getmtime(logfile), size, 0)
+        else:
+            self.checkpoint(time.time(), 0, 0)
+
+    def count(self, logfile, start, end, lines):
+        """ Have the newlines of the log between start and end counted,
+        lines being the number of newlines before start """
+        if start == end:
+            self.lines = lines
+            return
+        # until they are counted, the lines of the checkpoints are
+        # counted from end, and self.base is what they are short of
+        self.base = lines
+        self.lines = 0
+        self.pending = []
+        self.counter = LineCounter(logfile, start, end)
+        self.counter.start()
+
+    def counted(self):
+        """ Write the checkpoints held back once the counter is done """
+        if self.counter is None or not self.counter.done:
+            return
+        count = self.counter.count
+        pending = self.pending
+        self.counter = None
+        self.pending = None
+        if count is None:
+            # the log couldn't be read, the index ends here
+            os.close(self.fd)
+            self.fd = None
+            return
+        lines = self.base + count
+        for when, offset, checkpoint_lines in pending:
+            self.checkpoint(when, offset, checkpoint_lines + lines)
+        self.lines += lines
+
+    def written(self, data, offset, newlines=None):
+        """ Called before data is written to the log at offset, with the
+        number of newlines in it if the writer counted them """
+        if self.counter is not None:
+            self.counted()
+        if offset - self.offset >= self.every:
+            self.checkpoint(time.time(), offset, self.lines)
+        if newlines is None:
+            if isinstance(data, memoryview):
+                data = data.tobytes()
+            newlines = data.count(b'\n')
+        self.lines += newlines
+
+    def checkpoint(self, when, offset, lines):
+        self.offset = offset
+        if self.pending is not None:
+            self.pending.append((when, offset, lines))
+        elif self.fd is not None:
+            line = '%.6f %d %d\n' % (when, offset, lines)
+            os.write(self.fd, line.encode('ascii'))
+
+    def close(self):
+        if self.counter is not None:
+            self.counted()
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        # checkpoints that are still held back are lost, the lines of
+        # the log after the last one written are counted when it is
+        # opened again
+        self.counter = None
+        self.pending = None
+
+    def remove(self):
+        self.close()
+        try:
+            os.remove(self.filename)
+        except OSError as why:
+            if why.args[0] != errno.ENOENT:
+                raise
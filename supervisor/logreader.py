@@ -0,0 +1,121 @@
+"""Reading of ranges of log files in bounded chunks, so that the memory
+used by supervisord to serve a read of a log doesn't grow with its length
+(see supervisor.xmlrpc.xmlrpc_string_producer)."""
+
+import codecs
+import os
+
+# the most read from a log at once
+CHUNK_SIZE = 1 << 16
+
+class LogSlice:
+    """
+    A range of bytes of a log file, as read by readFile().
+
+    The file is opened and the range fixed when the slice is made, and
+    the slice is read later, one chunk at a time.  A log that is rotated
+    in the meantime is still read through the descriptor of the file
+    that was renamed, and one that is truncated ends the slice early:
+    nothing written to the log after the slice was made is part of it.
+    """
+
+    fd = None
+
+    def __init__(self, filename, offset, length):
+        """ Raise ValueError('FAILED') if filename can't be opened, or
+        ValueError('BAD_ARGUMENTS') if offset and length don't make a
+        range (see readFile()) """
+        try:
+            self.fd = os.open(filename, os.O_RDONLY)
+            size = os.fstat(self.fd).st_size
+        except OSError:
+            self.close()
+            raise ValueError('FAILED')
+        try:
+            self.start, self.end = self._range(size, offset, length)
+        except ValueError:
+            self.close()
+            raise
+
+    def __del__(self):
+        self.close()
+
+    def __len__(self):
+        return self.end - self.start
+
+    def _range(self, size, offset, length):
+        if offset < 0:
+            # negative offset returns offset bytes from tail of the file
+            if length:
+                raise ValueError('BAD_ARGUMENTS')
+            return max(size + offset, 0), size
+        if length < 0:
+            raise ValueError('BAD_ARGUMENTS')
+        if length == 0:
+            return offset, max(offset, size)
+        return offset, max(offset, min(offset + length, size))
+
+    def chunks(self, chunk_size=CHUNK_SIZE):
+        """ Yield the bytes of the slice, up to chunk_size at a time """
+        position = self.start
+        while position < self.end and self.fd is not None:
+            os.lseek(self.fd, position, os.SEEK_SET)
+            data = os.read(self.fd, min(chunk_size, self.end - position))
+            if not data:
+                break # the log was truncated
+            position += len(data)
+            yield data
+
+    def read(self):
+        """ Return the bytes of the slice at once and close it, raising
+        ValueError('FAILED') if the log can't be read """
+        try:
+            return b''.join(self.chunks())
+        except OSError:
+            raise ValueError('FAILED')
+        finally:
+            self.close()
+
+    def text(self):
+        """ Return the slice read at once as text, replacing what isn't
+        UTF-8, and close it, raising ValueError('FAILED') if the log
+        can't be read """
+        return self.read().decode('utf-8', 'replace')
+
+    def text_chunks(self, chunk_size=CHUNK_SIZE):
+        """ Yield the slice as UTF-8, up to about chunk_size bytes at a
+        time, with what isn't UTF-8 replaced as by text() """
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        for chunk in self.chunks(chunk_size):
+            data = decoder.decode(chunk)
+            if data:
+                yield data.encode('utf-8')
+        data = decoder.decode(b'', True)
+        if data:
+            yield data.encode('utf-8')
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+class LogSlices(LogSlice):
+    """
+    A range of a log that spans several of its files, e.g. a backup and
+    the log itself, made of a LogSlice of each, read one after another.
+    """
+
+    def __init__(self, slices):
+        self.slices = slices
+
+    def __len__(self):
+        return sum([len(logslice) for logslice in self.slices])
+
+    def chunks(self, chunk_size=CHUNK_SIZE):
+        for logslice in self.slices:
+            for data in logslice.chunks(chunk_size):
+                yield data
+
+    def close(self):
+        for logslice in getattr(self, 'slices', ()):
+            logslice.close()
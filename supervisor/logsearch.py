@@ -0,0 +1,287 @@
+"""Search of child logs and of their rotated backups in a background
+thread (see supervisor.rpcinterface searchProcessLog()).
+
+A search is done one page at a time: it stops after a number of
+matching lines, of bytes read or of seconds, and returns a continuation
+token with which the next page is searched.  The token points into the file that
+was being read, which it finds again after the log was rotated, and
+its backups renamed or compressed, in the meantime."""
+
+import errno
+import os
+import threading
+import time
+import zlib
+
+from supervisor.logarchive import COMPRESSORS
+from supervisor.logarchive import segments
+from supervisor.logarchive import uncompressed_name
+from supervisor.logreader import CHUNK_SIZE
+
+# the most matching lines returned at once
+MAX_MATCHES = 1000
+
+# the longest pattern searched for, in characters
+MAX_PATTERN = 1024
+
+# the longest piece of a line searched at once.  re holds the GIL while
+# it matches, so a pattern that backtracks a lot keeps the main loop
+# waiting for a time that grows with the length of what it is matched to.
+MAX_LINE = 1 << 13
+
+# the most seconds spent searching a page
+MAX_TIME = 1.0
+
+# the seconds after which a page that isn't done is given up on
+HARD_STOP = 30
+
+# the bytes at the start of a file that tell it from the other files of
+# the same log
+FINGERPRINT_SIZE = 1024
+
+# extension -> function opening a compressed file
+_OPENERS = dict(COMPRESSORS.values())
+
+def log_files(filename, backups):
+    """ Return the files holding the log filename, oldest first: the
+    newest backups of its numbered backups and rotated segments, and
+    filename itself """
+    if backups <= 0:
+        return [filename]
+    paths = ['%s.%d' % (filename, i) for i in range(backups, 0, -1)]
+    paths = [path for path in paths if os.path.exists(path)]
+    seen = set()
+    for path in segments(filename):
+        if path.endswith(('.idx', '.tmp')):
+            continue
+        name = uncompressed_name(path)
+        if name not in seen:
+            # a segment listed both before and after it was compressed
+            seen.add(name)
+            paths.append(path)
+    return paths[-backups:] + [filename]
+
+def open_log(path):
+    """ Open the log file path for reading, decompressing it if it is
+    compressed, including if it was compressed since it was listed.
+    Return (file, the name of the file), or (None, None) if it is gone
+    or can't be decompressed. """
+    name = uncompressed_name(path)
+    candidates = [path]
+    if name == path:
+        candidates.extend([path + extension for extension in _OPENERS])
+    for candidate in candidates:
+        extension = candidate[len(name):]
+        if extension and extension not in _OPENERS:
+            continue
+        opener = _OPENERS.get(extension, open)
+        try:
+            return opener(candidate, 'rb'), candidate
+        except (IOError, OSError) as why:
+            if why.args[0] != errno.ENOENT:
+                raise
+    return None, None
+
+def is_compressed(path):
+    return uncompressed_name(path) != path
+
+def fingerprint(f, size):
+    """ Return the checksum of the first size bytes of the file f """
+    f.seek(0)
+    return zlib.crc32(f.read(size)) & 0xffffffff
+
+def iter_lines(f, offset, max_line=CHUNK_SIZE):
+    """ Yield (offset, line, complete) for the lines of the file f read
+    from offset on.  A line longer than max_line is yielded in pieces,
+    and the last line of the file is not complete if it doesn't end
+    with a newline. """
+    buf = b''
+    while 1:
+        data = f.read(CHUNK_SIZE)
+        if not data:
+            break
+        buf += data
+        start = 0
+        while 1:
+            end = buf.find(b'\n', start, start + max_line)
+            if end == -1:
+                if len(buf) - start < max_line:
+                    break
+                end = start + max_line - 1
+            yield offset, buf[start:end + 1], True
+            offset += end + 1 - start
+            start = end + 1
+        buf = buf[start:]
+    if buf:
+        yield offset, buf, False
+
+def make_token(ino, offset, checksum):
+    return '%d:%d:%d' % (ino, offset, checksum)
+
+def parse_token(token):
+    """ Return (ino, offset, checksum) of token, raising ValueError if
+    it is not a token """
+    ino, offset, checksum = [int(part) for part in token.split(':')]
+    if ino < 0 or offset < 0 or checksum < 0:
+        raise ValueError(token)
+    return ino, offset, checksum
+
+class LogSearch:
+    """
+    A page of the search of the log filename, and of up to backups of
+    its numbered backups, for the lines that the compiled regular
+    expression regex finds something in, done in a thread.
+
+    The search starts where token (see make_token()) points, or at the
+    start of the oldest file of the log if token is empty, and stops
+    after max_matches matching lines, max_bytes bytes read or max_time
+    seconds, or as soon as it can after stop() is called.  The last
+    line of filename is left for later if it is still being written.
+
+    Once done is true, result is a dictionary with the matching lines
+    ('matches', each a dictionary of the 'logfile' it was read from,
+    its 'offset' in it, and the 'line' itself without its newline), the
+    'token' with which to search the next page, and 'eof', true if the
+    search got to the end of the log, in which case token searches what
+    is written to the log from then on.  If the search failed, result is
+    None and error says why.
+
+    Only one search of a log runs at a time.  The thread only holds the
+    class lock to claim or free the log, and a child forked meanwhile
+    never takes it (see Subprocess._spawn_as_child()).
+    """
+
+    done = False
+    stopped = False
+    result = None
+    error = None
+
+    lock = threading.Lock()
+    running = {} # filename -> LogSearch
+
+    def __init__(self, filename, backups, regex, token='',
+                 max_matches=100, max_bytes=1 << 24, max_time=MAX_TIME):
+        self.filename = filename
+        self.backups = backups
+        self.regex = regex
+        self.token = token
+        self.max_matches = max_matches
+        self.max_bytes = max_bytes
+        self.max_time = max_time
+
+    def start(self):
+        """ Start the search in a thread and return it, or return None
+        if another search of the log is running """
+        with self.lock:
+            if self.filename in self.running:
+                return None
+            self.running[self.filename] = self
+        worker = threading.Thread(target=self.work,
+                                  name='supervisor log search')
+        worker.daemon = True
+        worker.start()
+        return worker
+
+    def stop(self):
+        """ Have the thread give up on the page, which leaves result
+        None """
+        self.stopped = True
+
+    def work(self):
+        try:
+            self.result = self.search()
+        except Exception as e:
+            self.error = 'failed to search %s: %s' % (self.filename, e)
+        with self.lock:
+            # the next page can be searched as soon as this one is done
+            self.running.pop(self.filename, None)
+        self.done = True
+
+    def search(self):
+        deadline = time.time() + self.max_time
+        paths = log_files(self.filename, self.backups)
+        index, offset = self.resume(paths)
+        matches = []
+        scanned = 0
+        token = ''
+        for index in range(index, len(paths)):
+            f, path = open_log(paths[index])
+            if f is None:
+                offset = 0
+                continue
+            try:
+                ino = 0
+                if not is_compressed(path):
+                    st = os.fstat(f.fileno())
+                    ino = st.st_ino
+                    if offset > st.st_size:
+                        offset = 0 # it was truncated
+                if offset:
+                    f.seek(offset)
+                live = index == len(paths) - 1
+                for offset, line, complete in iter_lines(f, offset,
+                                                         MAX_LINE):
+                    if self.stopped:
+                        return None
+                    if live and not complete:
+                        break
+                    if self.regex.search(line):
+                        matches.append({
+                            'logfile': path,
+                            'offset': offset,
+                            'line': line.rstrip(b'\n').decode('utf-8',
+                                                              'replace'),
+                            })
+                    offset += len(line)
+                    scanned += len(line)
+                    if (len(matches) >= self.max_matches or
+                            scanned >= self.max_bytes or
+                            time.time() >= deadline):
+                        token = self.tell(f, ino, offset)
+                        return {'matches': matches, 'token': token,
+                                'eof': False}
+                token = self.tell(f, ino, offset)
+            finally:
+                f.close()
+            offset = 0
+        return {'matches': matches, 'token': token, 'eof': True}
+
+    def tell(self, f, ino, offset):
+        """ Return the token of offset in the file f """
+        checksum = fingerprint(f, min(offset, FINGERPRINT_SIZE))
+        return make_token(ino, offset, checksum)
+
+    def resume(self, paths):
+        """ Return the index in paths of the file the token points into
+        and the offset at which to resume in it """
+        if not self.token:
+            return 0, 0
+        ino, offset, checksum = parse_token(self.token)
+        size = min(offset, FINGERPRINT_SIZE)
+        # the file is where it was or has been renamed...
+        for index, path in enumerate(paths):
+            try:
+                same = os.stat(path).st_ino == ino
+            except OSError:
+                continue
+            if same and self.identify(path, size) == (checksum, False):
+                return index, offset
+        # ...or has been compressed since, which is most likely for the
+        # newest backups
+        for index in range(len(paths) - 1, -1, -1):
+            if size and self.identify(paths[index], size) == (checksum, True):
+                return index, offset
+        # the oldest files of the log are removed first: the file is
+        # older than all that are left
+        return 0, 0
+
+    def identify(self, path, size):
+        """ Return (fingerprint, whether it is compressed) of the log
+        file path, or (None, None) if it is gone """
+        f, path = open_log(path)
+        if f is None:
+            return None, None
+        try:
+            return fingerprint(f, size), is_compressed(path)
+        finally:
+            f.close()
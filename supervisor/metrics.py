@@ -0,0 +1,230 @@
+"""Sampling of the CPU time, memory and open files of the processes run
+by supervisord.  The samples are read from /proc, so they are only
+available on Linux."""
+
+import array
+import io
+import os
+import time
+
+# the columns of MetricsTable.  times are in seconds, sizes in bytes.
+FIELDS = (
+    'sampled', # time of the sample
+    'starttime', # start time of the pid, in clock ticks since boot
+    'utime', # user CPU time
+    'stime', # system CPU time
+    'cpu_percent', # CPU usage since the previous sample
+    'rss', # resident set size
+    'vms', # virtual memory size
+    'shared', # resident shared pages
+    'num_fds', # open file descriptors, -1 if they can't be counted
+    )
+
+def implements_proc():
+    return os.path.exists('/proc/self/statm')
+
+class MetricsTable:
+    """ The latest sample of each pid.  Samples are kept column-wise in
+    one array per field, at a slot of the pid that is reused once the
+    pid is gone. """
+
+    def __init__(self):
+        self.slots = {} # pid -> slot
+        self.free = [] # slots of pids that are gone
+        self.columns = {}
+        for name in FIELDS:
+            self.columns[name] = array.array('d')
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, pid):
+        return pid in self.slots
+
+    def pids(self):
+        return list(self.slots.keys())
+
+    def slot(self, pid):
+        """ Return the slot of pid, allocating it if needed """
+        slot = self.slots.get(pid)
+        if slot is None:
+            if self.free:
+                slot = self.free.pop()
+                for column in self.columns.values():
+                    column[slot] = 0
+            else:
+                slot = len(self.columns['sampled'])
+                for column in self.columns.values():
+                    column.append(0)
+            self.slots[pid] = slot
+        return slot
+
+    def remove(self, pid):
+        slot = self.slots.pop(pid, None)
+        if slot is not None:
+            self.free.append(slot)
+
+    def get(self, pid):
+        """ Return the sample of pid as a dict or None """
+        slot = self.slots.get(pid)
+        if slot is None:
+            return None
+        sample = {}
+        for name, column in self.columns.items():
+            sample[name] = column[slot]
+        return sample
+
+class ProcessSampler:
+    """
+    Samples the processes every ``metrics_interval`` seconds (an option
+    of the [supervisord] section) in one pass driven by the main loop.
+
+    /proc/<pid>/stat is read for every pid.  When the CPU time and the
+    state of a pid haven't changed since the previous pass, its memory
+    and fds are assumed not to have changed either and reading
+    /proc/<pid>/statm and listing /proc/<pid>/fd is skipped, except on
+    every ``refresh_every`` pass.  Every file is read into a buffer that
+    is reused from pass to pass.
+    """
+
+    refresh_every = 10
+
+    def __init__(self, options):
+        self.options = options
+        self.available = implements_proc()
+        if self.available:
+            self.clock_ticks = float(os.sysconf('SC_CLK_TCK'))
+            self.page_size = os.sysconf('SC_PAGE_SIZE')
+        self.buffers = {'stat': bytearray(1024), 'statm': bytearray(256)}
+        self.states = {} # pid -> (state, utime ticks, stime ticks)
+        self.table = MetricsTable()
+        self.passes = 0
+        self.last_pass = None # time of the last pass
+        self.last_duration = 0 # time taken by the last pass
+        self.skipped = 0 # pids whose statm and fds were not read again
+
+    def enabled(self):
+        return self.available and self.options.metrics_interval > 0
+
+    def run(self, pgroups, now):
+        """ Called by the main loop on every iteration; sample if a pass
+        is due and make sure the main loop wakes up for the next one """
+        if not self.enabled():
+            return
+        interval = self.options.metrics_interval
+        last = self.last_pass
+        # sample right away if the clock moved backward
+        if last is None or now >= last + interval or now < last:
+            self.sample(pgroups, now)
+            last = now
+        self.options.timers.schedule(last + interval, self)
+
+    def sample(self, pgroups, now):
+        seen = set()
+        for group in pgroups:
+            for process in group.processes.values():
+                pid = process.pid
+                if pid:
+                    seen.add(pid)
+                    self.sample_pid(pid, now)
+        for pid in self.table.pids():
+            if pid not in seen:
+                self.forget(pid)
+        self.passes += 1
+        self.last_pass = now
+        self.last_duration = max(time.time() - now, 0)
+
+    def forget(self, pid):
+        self.table.remove(pid)
+        self.states.pop(pid, None)
+
+    def read(self, path, name):
+        """ Read the file at path into the buffer called name and return
+        its contents, or None if it can't be read (the pid is gone) """
+        buf = self.buffers[name]
+        while 1:
+            try:
+                with io.open(path, 'rb', buffering=0) as f:
+                    n = f.readinto(buf)
+            except (IOError, OSError):
+                return None
+            if n < len(buf):
+                return bytes(buf[:n])
+            # it may have been cut short
+            buf = self.buffers[name] = bytearray(len(buf) * 2)
+
+    def count_fds(self, pid):
+        try:
+            return len(os.listdir('/proc/%d/fd' % pid))
+        except OSError:
+            # e.g. the process runs as another user
+            return -1
+
+    def sample_pid(self, pid, now):
+        stat = self.read('/proc/%d/stat' % pid, 'stat')
+        if stat is None:
+            self.forget(pid)
+            return
+        # the command name may contain spaces, so skip past its parenthesis
+        fields = stat[stat.rindex(b')') + 2:].split()
+        state = fields[0]
+        utime = int(fields[11])
+        stime = int(fields[12])
+        starttime = int(fields[19])
+
+        table = self.table
+        columns = table.columns
+        new = pid not in table
+        slot = table.slot(pid)
+        if not new and columns['starttime'][slot] != starttime:
+            # the pid was reused by another process
+            new = True
+        if new:
+            cpu_percent = 0.0
+        else:
+            elapsed = now - columns['sampled'][slot]
+            previous = self.states[pid]
+            used = (utime + stime - previous[1] - previous[2]) / self.clock_ticks
+            if elapsed > 0:
+                cpu_percent = used / elapsed * 100
+            else:
+                cpu_percent = columns['cpu_percent'][slot]
+
+        key = (state, utime, stime)
+        refresh = self.passes % self.refresh_every == 0
+        if new or refresh or self.states.get(pid) != key:
+            statm = self.read('/proc/%d/statm' % pid, 'statm')
+            if statm is None:
+                self.forget(pid)
+                return
+            sizes = statm.split()
+            columns['vms'][slot] = int(sizes[0]) * self.page_size
+            columns['rss'][slot] = int(sizes[1]) * self.page_size
+            columns['shared'][slot] = int(sizes[2]) * self.page_size
+            columns['num_fds'][slot] = self.count_fds(pid)
+        else:
+            self.skipped += 1
+
+        self.states[pid] = key
+        columns['sampled'][slot] = now
+        columns['starttime'][slot] = starttime
+        columns['utime'][slot] = utime / self.clock_ticks
+        columns['stime'][slot] = stime / self.clock_ticks
+        columns['cpu_percent'][slot] = cpu_percent
+
+    def get(self, pid):
+        """ Return the latest sample of pid as a dict or None """
+        if not pid:
+            return None
+        return self.table.get(pid)
+
+    def as_dict(self):
+        return {
+            'available': self.available,
+            'interval': self.options.metrics_interval,
+            'passes': self.passes,
+            'last_pass': self.last_pass or 0,
+            'last_duration': self.last_duration,
+            'skipped': self.skipped,
+            'sampled': len(self.table),
+            }
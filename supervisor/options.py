@@ -2,6 +2,7 @@ import socket
 import getopt
 import os
 import sys
+import time
 import tempfile
 import errno
 import signal
@@ -49,11 +50,20 @@ from supervisor.datatypes import Automatic
 from supervisor.datatypes import Syslog
 from supervisor.datatypes import auto_restart
 from supervisor.datatypes import profile_options
+from supervisor.datatypes import event_loop
+from supervisor.datatypes import spawn_method
+from supervisor.datatypes import log_compression
 
+from supervisor.logreader import LogSlice
+
+from supervisor import logarchive
 from supervisor import loggers
 from supervisor import states
 from supervisor import xmlrpc
 from supervisor import poller
+from supervisor import ratelimit
+from supervisor import scheduler
+from supervisor import timers
 
 def _read_version_txt():
     mydir = os.path.abspath(os.path.dirname(__file__))
@@ -62,6 +72,8 @@ def _read_version_txt():
         return f.read().strip()
 VERSION = _read_version_txt()
 
+readv = getattr(os, 'readv', None) # python 3.3+
+
 def normalize_path(v):
     return os.path.normpath(os.path.abspath(os.path.expanduser(v)))
 
@@ -404,6 +416,7 @@ class ServerOptions(Options):
     httpservers = ()
     unlink_pidfile = False
     unlink_socketfiles = False
+    signal_wakeup = None # SignalWakeupDispatcher while signals are set
     mood = states.SupervisorStates.RUNNING
 
     def __init__(self):
@@ -446,6 +459,18 @@ class ServerOptions(Options):
                  "", "profile_options=", profile_options, default=None)
         self.add("silent", "supervisord.silent",
                  "s", "silent", flag=1, default=0)
+        self.add("epoll_edge_triggered", "supervisord.epoll_edge_triggered",
+                 default=False)
+        self.add("event_loop", "supervisord.event_loop", default='native')
+        self.add("max_concurrent_spawns", "supervisord.max_concurrent_spawns",
+                 default=0)
+        self.add("spawn_method", "supervisord.spawn_method", default='auto')
+        self.add("metrics_interval", "supervisord.metrics_interval",
+                 default=0)
+        self.add("childlog_compression", "supervisord.childlog_compression",
+                 default='none')
+        self.add("childlog_budget", "supervisord.childlog_budget",
+                 default=0)
         self.pidhistory = {}
         self.process_group_configs = []
         self.parse_criticals = []
@@ -453,6 +478,13 @@ class ServerOptions(Options):
         self.parse_infos = []
         self.signal_receiver = SignalReceiver()
         self.poller = poller.Poller(self)
+        self.dispatcher_registry = poller.DispatcherRegistry(self.poller)
+        self.timers = timers.TimerHeap()
+        self.spawn_scheduler = scheduler.SpawnScheduler(self)
+        self.log_flushes = loggers.FlushSchedule(self.timers)
+        self.output_resumes = ratelimit.ResumeSchedule(self.timers)
+        self.log_archive = logarchive.LogArchive(self)
+        self.fds_made_noninheritable = False
 
     def version(self, dummy):
         """Print version to stdout and exit(0).
@@ -645,6 +677,31 @@ class ServerOptions(Options):
         section.childlogdir = existing_directory(get('childlogdir', tempdir))
         section.nocleanup = boolean(get('nocleanup', 'false'))
         section.strip_ansi = boolean(get('strip_ansi', 'false'))
+        section.epoll_edge_triggered = boolean(
+            get('epoll_edge_triggered', 'false'))
+        section.event_loop = event_loop(get('event_loop', 'native'))
+        if section.event_loop == 'asyncio' and not poller.implements_asyncio():
+            raise ValueError("event_loop 'asyncio' requires Python 3.4 or "
+                             "later")
+        section.max_concurrent_spawns = integer(
+            get('max_concurrent_spawns', 0))
+        if section.max_concurrent_spawns < 0:
+            raise ValueError('[supervisord] section sets invalid '
+                             'max_concurrent_spawns (%d)' %
+                             section.max_concurrent_spawns)
+        section.spawn_method = spawn_method(get('spawn_method', 'auto'))
+        section.metrics_interval = integer(get('metrics_interval', 0))
+        if section.metrics_interval < 0:
+            raise ValueError('[supervisord] section sets invalid '
+                             'metrics_interval (%d)' %
+                             section.metrics_interval)
+        section.childlog_compression = log_compression(
+            get('childlog_compression', 'none'))
+        if (section.childlog_compression == 'zstd' and
+                not logarchive.implements_zstd()):
+            raise ValueError("childlog_compression 'zstd' requires Python "
+                             "3.14 or later or the zstandard package")
+        section.childlog_budget = byte_size(get('childlog_budget', '0'))
 
         environ_str = get('environment', '', do_expand=False)
         environ_str = expand(environ_str, expansions, 'environment')
@@ -690,6 +747,8 @@ class ServerOptions(Options):
             group_name = process_or_group_name(section.split(':', 1)[1])
             programs = list_of_strings(get(section, 'programs', None))
             priority = integer(get(section, 'priority', 999))
+            max_concurrent_spawns = self._max_concurrent_spawns(parser,
+                                                                section)
             group_processes = []
             for program in programs:
                 program_section = "program:%s" % program
@@ -708,7 +767,8 @@ class ServerOptions(Options):
 
                 group_processes.extend(processes)
             groups.append(
-                ProcessGroupConfig(self, group_name, priority, group_processes)
+                ProcessGroupConfig(self, group_name, priority, group_processes,
+                                   max_concurrent_spawns)
                 )
 
         # process "normal" homogeneous groups
@@ -720,8 +780,11 @@ class ServerOptions(Options):
             priority = integer(get(section, 'priority', 999))
             processes=self.processes_from_section(parser, section, program_name,
                                                   ProcessConfig)
+            max_concurrent_spawns = self._max_concurrent_spawns(parser,
+                                                                section)
             groups.append(
-                ProcessGroupConfig(self, program_name, priority, processes)
+                ProcessGroupConfig(self, program_name, priority, processes,
+                                   max_concurrent_spawns)
                 )
 
         # process "event listener" homogeneous groups
@@ -771,11 +834,13 @@ class ServerOptions(Options):
 
             processes=self.processes_from_section(parser, section, pool_name,
                                                   EventListenerConfig)
+            max_concurrent_spawns = self._max_concurrent_spawns(parser,
+                                                                section)
 
             groups.append(
                 EventListenerPoolConfig(self, pool_name, priority, processes,
                                         buffer_size, pool_events,
-                                        result_handler)
+                                        result_handler, max_concurrent_spawns)
                 )
 
         # process fastcgi homogeneous groups
@@ -832,14 +897,23 @@ class ServerOptions(Options):
 
             processes=self.processes_from_section(parser, section, program_name,
                                                   FastCGIProcessConfig)
+            max_concurrent_spawns = self._max_concurrent_spawns(parser,
+                                                                section)
             groups.append(
                 FastCGIGroupConfig(self, program_name, priority, processes,
-                                   socket_config)
+                                   socket_config, max_concurrent_spawns)
                 )
 
         groups.sort()
         return groups
 
+    def _max_concurrent_spawns(self, parser, section):
+        value = integer(parser.saneget(section, 'max_concurrent_spawns', 0))
+        if value < 0:
+            raise ValueError('[%s] section sets invalid max_concurrent_spawns '
+                             '(%d)' % (section, value))
+        return value
+
     def parse_fcgi_socket(self, sock, proc_uid, socket_owner, socket_mode,
             socket_backlog):
         if sock.startswith('unix://'):
@@ -922,6 +996,10 @@ class ServerOptions(Options):
         stdout_events = boolean(get(section, 'stdout_events_enabled','false'))
         stderr_cmaxbytes = byte_size(get(section,'stderr_capture_maxbytes','0'))
         stderr_events = boolean(get(section, 'stderr_events_enabled','false'))
+        stdout_ring_bytes = byte_size(get(section, 'stdout_ring_bytes', '0'))
+        stderr_ring_bytes = byte_size(get(section, 'stderr_ring_bytes', '0'))
+        output_rate_limit = byte_size(get(section, 'output_rate_limit', '0'))
+        output_rate_burst = byte_size(get(section, 'output_rate_burst', '0'))
         serverurl = get(section, 'serverurl', None)
         if serverurl and serverurl.strip().upper() == 'AUTO':
             serverurl = None
@@ -985,6 +1063,20 @@ class ServerOptions(Options):
                 maxbytes = byte_size(get(section, mb_key, '50MB'))
                 logfiles[mb_key] = maxbytes
 
+                bs_key = '%s_logfile_buffer_size' % k
+                logfiles[bs_key] = byte_size(get(section, bs_key, '0'))
+
+                fi_key = '%s_logfile_flush_interval' % k
+                flush_interval = integer(get(section, fi_key, 1))
+                if flush_interval < 0:
+                    raise ValueError(
+                        'Invalid %s value %d (must be >= 0)' % (
+                        fi_key, flush_interval))
+                logfiles[fi_key] = flush_interval
+
+                ix_key = '%s_logfile_index_bytes' % k
+                logfiles[ix_key] = byte_size(get(section, ix_key, '0'))
+
                 sy_key = '%s_syslog' % k
                 syslog = boolean(get(section, sy_key, False))
                 logfiles[sy_key] = syslog
@@ -1036,13 +1128,27 @@ class ServerOptions(Options):
                 stdout_events_enabled = stdout_events,
                 stdout_logfile_backups=logfiles['stdout_logfile_backups'],
                 stdout_logfile_maxbytes=logfiles['stdout_logfile_maxbytes'],
+                stdout_logfile_buffer_size=logfiles['stdout_logfile_buffer_size'],
+                stdout_logfile_flush_interval=logfiles[
+                    'stdout_logfile_flush_interval'],
+                stdout_logfile_index_bytes=logfiles[
+                    'stdout_logfile_index_bytes'],
                 stdout_syslog=logfiles['stdout_syslog'],
+                stdout_ring_bytes=stdout_ring_bytes,
                 stderr_logfile=logfiles['stderr_logfile'],
                 stderr_capture_maxbytes = stderr_cmaxbytes,
                 stderr_events_enabled = stderr_events,
                 stderr_logfile_backups=logfiles['stderr_logfile_backups'],
                 stderr_logfile_maxbytes=logfiles['stderr_logfile_maxbytes'],
+                stderr_logfile_buffer_size=logfiles['stderr_logfile_buffer_size'],
+                stderr_logfile_flush_interval=logfiles[
+                    'stderr_logfile_flush_interval'],
+                stderr_logfile_index_bytes=logfiles[
+                    'stderr_logfile_index_bytes'],
                 stderr_syslog=logfiles['stderr_syslog'],
+                stderr_ring_bytes=stderr_ring_bytes,
+                output_rate_limit=output_rate_limit,
+                output_rate_burst=output_rate_burst,
                 stopsignal=stopsignal,
                 stopwaitsecs=stopwaitsecs,
                 stopasgroup=stopasgroup,
@@ -1210,7 +1316,15 @@ class ServerOptions(Options):
                     self._try_unlink(socketname)
         if self.unlink_pidfile:
             self._try_unlink(self.pidfile)
+        self.close_signal_wakeup()
         self.poller.close()
+        # a segment left half compressed is compressed again the next
+        # time its log is archived, see LogArchive.archive()
+        if not self.log_archive.wait(logarchive.SHUTDOWN_WAIT):
+            self.logger.info('stopped waiting for rotated logs to be '
+                             'archived, they will be after the next '
+                             'rotation')
+        self.log_archive.report()
 
     def _try_unlink(self, path):
         try:
@@ -1245,6 +1359,7 @@ class ServerOptions(Options):
         self.logger.close()
 
     def setsignals(self):
+        self.open_signal_wakeup()
         receive = self.signal_receiver.receive
         signal.signal(signal.SIGTERM, receive)
         signal.signal(signal.SIGINT, receive)
@@ -1256,6 +1371,33 @@ class ServerOptions(Options):
     def get_signal(self):
         return self.signal_receiver.get_signal()
 
+    def pop_sigchld_time(self):
+        return self.signal_receiver.pop_sigchld_time()
+
+    def open_signal_wakeup(self):
+        """ Create a pipe that the signal handler writes to and register
+        its read end with the poller, so that a signal (e.g. SIGCHLD when
+        a child exits) interrupts poll() right away instead of being
+        noticed when it times out. """
+        self.close_signal_wakeup()
+        r, w = os.pipe()
+        for fd in (r, w):
+            flags = fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NDELAY
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags)
+            flags = fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC
+            fcntl.fcntl(fd, fcntl.F_SETFD, flags)
+        self.signal_wakeup = SignalWakeupDispatcher(self, r, w)
+        self.dispatcher_registry.add(r, self.signal_wakeup)
+        self.signal_receiver.set_wakeup_fd(w)
+
+    def close_signal_wakeup(self):
+        wakeup = self.signal_wakeup
+        if wakeup is not None:
+            self.signal_receiver.set_wakeup_fd(None)
+            self.dispatcher_registry.remove(wakeup.fd, wakeup)
+            wakeup.close()
+            self.signal_wakeup = None
+
     def openhttpservers(self, supervisord):
         try:
             self.httpservers = self.make_http_servers(supervisord)
@@ -1306,6 +1448,16 @@ class ServerOptions(Options):
     def get_socket_map(self):
         return asyncore.socket_map
 
+    def make_poller(self):
+        """ Replace the default poller with the one selected by the
+        event_loop option.  This is called after cleanup_fds(), which
+        would close the file descriptors of the new poller, and before
+        anything is registered with the default poller. """
+        if self.event_loop == 'asyncio':
+            self.poller.close()
+            self.poller = poller.AsyncioPoller(self)
+            self.dispatcher_registry = poller.DispatcherRegistry(self.poller)
+
     def cleanup_fds(self):
         # try to close any leaked file descriptors (for reload)
         start = 5
@@ -1314,7 +1466,23 @@ class ServerOptions(Options):
     def kill(self, pid, signal):
         os.kill(pid, signal)
 
-    def waitpid(self):
+    def pidfd_open(self, pid):
+        """ Return a pidfd referring to the child process pid, or None if
+        pidfds are not supported (they need Linux 5.3+ and Python 3.9+).
+        The pidfd becomes readable when the process exits. """
+        if not (hasattr(os, 'pidfd_open') and
+                hasattr(signal, 'pidfd_send_signal')):
+            return None
+        try:
+            return os.pidfd_open(pid)
+        except OSError:
+            # ENOSYS on older kernels
+            return None
+
+    def pidfd_send_signal(self, pidfd, sig):
+        signal.pidfd_send_signal(pidfd, sig)
+
+    def waitpid(self, pid=-1):
         # Need pthread_sigmask here to avoid concurrent sigchld, but Python
         # doesn't offer in Python < 3.4.  There is still a race condition here;
         # we can get a sigchld while we're sitting in the waitpid call.
@@ -1325,7 +1493,7 @@ class ServerOptions(Options):
         # appears to be true, or at least stopping 50 processes at once never
         # left zombies laying around.
         try:
-            pid, sts = os.waitpid(-1, os.WNOHANG)
+            pid, sts = os.waitpid(pid, os.WNOHANG)
         except OSError as exc:
             code = exc.args[0]
             if code not in (errno.ECHILD, errno.EINTR):
@@ -1505,12 +1673,65 @@ class ServerOptions(Options):
         except OSError:
             pass
 
+    def _open_fds(self, low, high):
+        """ Return the open fds from low up to high, or None if they
+        cannot be listed.  Listing /proc/self/fd costs the same whatever
+        minfds is, whereas trying every fd up to minfds takes one system
+        call per fd. """
+        try:
+            names = os.listdir('/proc/self/fd')
+        except OSError:
+            return None
+        # includes the fd that was used to list the directory, which is
+        # closed by now
+        fds = []
+        for name in names:
+            fd = int(name)
+            if low <= fd < high:
+                fds.append(fd)
+        return fds
+
+    def close_child_fds(self, low=3):
+        """ Close the fds from low up to minfds in a child before exec() """
+        fds = self._open_fds(low, self.minfds)
+        if fds is None:
+            # Python uses close_range() or closefrom() for this where
+            # they are available
+            os.closerange(low, self.minfds)
+            return
+        for fd in fds:
+            self.close_fd(fd)
+
     def fork(self):
         return os.fork()
 
     def dup2(self, frm, to):
         return os.dup2(frm, to)
 
+    def can_posix_spawn(self):
+        """ Return True if children may be spawned with posix_spawn()
+        (Python 3.8+) instead of fork() and exec() """
+        return self.spawn_method == 'auto' and hasattr(os, 'posix_spawn')
+
+    def posix_spawn(self, filename, argv, env, file_actions):
+        """ Spawn a child in a new process group and return its pid """
+        if not self.fds_made_noninheritable:
+            # children started with fork() close every fd above 2, but
+            # posix_spawn() relies on close-on-exec.  supervisord opens
+            # its own fds non-inheritable, so only the ones it inherited
+            # need to be changed, once.
+            fds = self._open_fds(3, self.minfds)
+            if fds is None:
+                fds = range(3, self.minfds)
+            for fd in fds:
+                try:
+                    os.set_inheritable(fd, False)
+                except OSError:
+                    pass
+            self.fds_made_noninheritable = True
+        return os.posix_spawn(filename, argv, env, file_actions=file_actions,
+                              setpgroup=0)
+
     def setpgrp(self):
         return os.setpgrp()
 
@@ -1572,15 +1793,33 @@ class ServerOptions(Options):
             if hasattr(handler, 'reopen'):
                 handler.reopen()
 
+    readfd_size = 2 << 16 # 128K
+
     def readfd(self, fd):
         try:
-            data = os.read(fd, 2 << 16) # 128K
+            data = os.read(fd, self.readfd_size)
         except OSError as why:
             if why.args[0] not in (errno.EWOULDBLOCK, errno.EBADF, errno.EINTR):
                 raise
             data = b''
         return data
 
+    def readfd_into(self, fd, buffer):
+        """ Like readfd() but read into buffer, a writable memoryview, and
+        return the number of bytes read """
+        try:
+            if readv is not None:
+                size = readv(fd, [buffer])
+            else:
+                data = os.read(fd, len(buffer))
+                size = len(data)
+                buffer[:size] = data
+        except OSError as why:
+            if why.args[0] not in (errno.EWOULDBLOCK, errno.EBADF, errno.EINTR):
+                raise
+            size = 0
+        return size
+
     def chdir(self, dir):
         os.chdir(dir)
 
@@ -1859,9 +2098,14 @@ class ProcessConfig(Config):
         'stdout_logfile', 'stdout_capture_maxbytes',
         'stdout_events_enabled', 'stdout_syslog',
         'stdout_logfile_backups', 'stdout_logfile_maxbytes',
+        'stdout_logfile_buffer_size', 'stdout_logfile_flush_interval',
+        'stdout_logfile_index_bytes', 'stdout_ring_bytes',
         'stderr_logfile', 'stderr_capture_maxbytes',
         'stderr_logfile_backups', 'stderr_logfile_maxbytes',
+        'stderr_logfile_buffer_size', 'stderr_logfile_flush_interval',
+        'stderr_logfile_index_bytes', 'stderr_ring_bytes',
         'stderr_events_enabled', 'stderr_syslog',
+        'output_rate_limit', 'output_rate_burst',
         'stopsignal', 'stopwaitsecs', 'stopasgroup', 'killasgroup',
         'exitcodes', 'redirect_stderr' ]
     optional_param_names = [ 'environment', 'serverurl' ]
@@ -1872,6 +2116,7 @@ class ProcessConfig(Config):
             setattr(self, name, params[name])
         for name in self.optional_param_names:
             setattr(self, name, params.get(name, None))
+        self.clear_spawn_plan()
 
     def __eq__(self, other):
         if not isinstance(other, ProcessConfig):
@@ -1885,6 +2130,12 @@ class ProcessConfig(Config):
 
         return True
 
+    def clear_spawn_plan(self):
+        '''Forget the filename, argv and environment that were cached by
+        the process to spawn it again without searching $PATH.'''
+        self.spawn_plan = None
+        self.spawn_environment = None
+
     def get_path(self):
         '''Return a list corresponding to $PATH that is configured to be set
         in the process environment, or the system default.'''
@@ -1971,11 +2222,13 @@ class FastCGIProcessConfig(ProcessConfig):
         return dispatchers, p
 
 class ProcessGroupConfig(Config):
-    def __init__(self, options, name, priority, process_configs):
+    def __init__(self, options, name, priority, process_configs,
+                 max_concurrent_spawns=0):
         self.options = options
         self.name = name
         self.priority = priority
         self.process_configs = process_configs
+        self.max_concurrent_spawns = max_concurrent_spawns
 
     def __eq__(self, other):
         if not isinstance(other, ProcessGroupConfig):
@@ -1987,6 +2240,8 @@ class ProcessGroupConfig(Config):
             return False
         if self.process_configs != other.process_configs:
             return False
+        if self.max_concurrent_spawns != other.max_concurrent_spawns:
+            return False
 
         return True
 
@@ -2000,7 +2255,7 @@ class ProcessGroupConfig(Config):
 
 class EventListenerPoolConfig(Config):
     def __init__(self, options, name, priority, process_configs, buffer_size,
-                 pool_events, result_handler):
+                 pool_events, result_handler, max_concurrent_spawns=0):
         self.options = options
         self.name = name
         self.priority = priority
@@ -2008,6 +2263,7 @@ class EventListenerPoolConfig(Config):
         self.buffer_size = buffer_size
         self.pool_events = pool_events
         self.result_handler = result_handler
+        self.max_concurrent_spawns = max_concurrent_spawns
 
     def __eq__(self, other):
         if not isinstance(other, EventListenerPoolConfig):
@@ -2018,7 +2274,8 @@ class EventListenerPoolConfig(Config):
             (self.process_configs == other.process_configs) and
             (self.buffer_size == other.buffer_size) and
             (self.pool_events == other.pool_events) and
-            (self.result_handler == other.result_handler)):
+            (self.result_handler == other.result_handler) and
+            (self.max_concurrent_spawns == other.max_concurrent_spawns)):
             return True
 
         return False
@@ -2032,13 +2289,15 @@ class EventListenerPoolConfig(Config):
         return EventListenerPool(self)
 
 class FastCGIGroupConfig(ProcessGroupConfig):
-    def __init__(self, options, name, priority, process_configs, socket_config):
+    def __init__(self, options, name, priority, process_configs, socket_config,
+                 max_concurrent_spawns=0):
         ProcessGroupConfig.__init__(
             self,
             options,
             name,
             priority,
             process_configs,
+            max_concurrent_spawns,
             )
         self.socket_config = socket_config
 
@@ -2058,36 +2317,7 @@ class FastCGIGroupConfig(ProcessGroupConfig):
 def readFile(filename, offset, length):
     """ Read length bytes from the file named by filename starting at
     offset """
-
-    absoffset = abs(offset)
-    abslength = abs(length)
-
-    try:
-        with open(filename, 'rb') as f:
-            if absoffset != offset:
-                # negative offset returns offset bytes from tail of the file
-                if length:
-                    raise ValueError('BAD_ARGUMENTS')
-                f.seek(0, 2)
-                sz = f.tell()
-                pos = int(sz - absoffset)
-                if pos < 0:
-                    pos = 0
-                f.seek(pos)
-                data = f.read(absoffset)
-            else:
-                if abslength != length:
-                    raise ValueError('BAD_ARGUMENTS')
-                if length == 0:
-                    f.seek(offset)
-                    data = f.read()
-                else:
-                    f.seek(offset)
-                    data = f.read(length)
-    except (OSError, IOError):
-        raise ValueError('FAILED')
-
-    return data
+    return LogSlice(filename, offset, length).read()
 
 def tailFile(filename, offset, length):
     """
@@ -2183,18 +2413,87 @@ def _init_signames():
 class SignalReceiver:
     def __init__(self):
         self._signals_recvd = []
+        self._wakeup_fd = None
+        self._sigchld_time = None
 
     def receive(self, sig, frame):
+        if sig == signal.SIGCHLD and self._sigchld_time is None:
+            # time of the first SIGCHLD since the last reap, used to
+            # measure how long exited children wait to be reaped
+            self._sigchld_time = time.time()
         if sig not in self._signals_recvd:
             self._signals_recvd.append(sig)
+        self._wakeup()
 
     def get_signal(self):
         if self._signals_recvd:
             sig = self._signals_recvd.pop(0)
+            if self._signals_recvd:
+                # only one signal is handled per main loop iteration;
+                # make sure the next poll doesn't wait for the others
+                self._wakeup()
         else:
             sig = None
         return sig
 
+    def pop_sigchld_time(self):
+        when = self._sigchld_time
+        self._sigchld_time = None
+        return when
+
+    def set_wakeup_fd(self, fd):
+        self._wakeup_fd = fd
+
+    def _wakeup(self):
+        if self._wakeup_fd is not None:
+            try:
+                os.write(self._wakeup_fd, b'\0')
+            except OSError:
+                # EAGAIN means the pipe is full, so a wakeup is pending
+                pass
+
+class SignalWakeupDispatcher:
+    """ Dispatcher for the read end of the pipe that SignalReceiver
+    writes to when a signal arrives.  It only exists to wake up the main
+    loop; the signals themselves are handled by Supervisor.handle_signal.
+    """
+
+    closed = False
+    edge_triggered = False
+
+    def __init__(self, options, fd, wakeup_fd):
+        self.options = options
+        self.fd = fd
+        self.wakeup_fd = wakeup_fd
+
+    def __repr__(self):
+        return '<%s at %s (fd %s)>' % (self.__class__.__name__, id(self),
+                                       self.fd)
+
+    def readable(self):
+        return not self.closed
+
+    def writable(self):
+        return False
+
+    def handle_read_event(self):
+        self.options.readfd(self.fd)
+
+    def handle_write_event(self):
+        pass
+
+    def handle_error(self):
+        self.options.logger.critical(
+            'uncaptured python exception in %r, signals will no longer '
+            'wake up the main loop' % self)
+        self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.options.close_fd(self.fd)
+            self.options.close_fd(self.wakeup_fd)
+
 # miscellaneous utility functions
 
 def expand(s, expansions, name):
@@ -1,8 +1,16 @@
 import select
 import errno
 
+try:
+    import asyncio
+except ImportError: # Python < 3.4
+    asyncio = None
+
 class BasePoller:
 
+    # the number of times the poller dropped all of its registrations
+    resets = 0
+
     def __init__(self, options):
         self.options = options
         self.initialize()
@@ -25,6 +33,17 @@ class BasePoller:
     def poll(self, timeout):
         raise NotImplementedError
 
+    def set_edge_triggered(self, fd, edge_triggered):
+        """ Called when the dispatcher for fd is able (edge_triggered=True)
+        or unable to drain its file descriptor until it would block.
+        Only pollers that support edge-triggered notification use this. """
+        pass
+
+    def is_edge_triggered(self, fd):
+        """ Return True if fd is registered edge-triggered, in which case
+        its dispatcher must drain it """
+        return False
+
     def before_daemonize(self):
         pass
 
@@ -55,6 +74,7 @@ class SelectPoller(BasePoller):
 
     def unregister_all(self):
         self._init_fdsets()
+        self.resets += 1
 
     def poll(self, timeout):
         try:
@@ -219,13 +239,368 @@ class KQueuePoller(BasePoller):
         self._kqueue.close()
         self._kqueue = None
 
+class EPollPoller(BasePoller):
+    '''
+    Wrapper for select.epoll().  The interest set lives in the kernel and
+    is only changed with EPOLL_CTL_MOD when a file descriptor becomes or
+    stops being readable/writable, so poll() does not copy the whole set
+    of file descriptors into the kernel on every call.
+
+    File descriptors whose dispatchers drain them until they would block
+    are registered edge-triggered if the ``epoll_edge_triggered`` option
+    is enabled.
+    '''
+
+    max_events = 1000
+
+    def initialize(self):
+        self._epoll = select.epoll()
+        self.READ = select.EPOLLIN | select.EPOLLPRI | select.EPOLLHUP
+        self.WRITE = select.EPOLLOUT
+        self.readables = set()
+        self.writables = set()
+        self.edge_triggered = set()
+
+    def register_readable(self, fd):
+        registered = self._registered(fd)
+        self.readables.add(fd)
+        self._epoll_control(fd, registered)
+
+    def register_writable(self, fd):
+        registered = self._registered(fd)
+        self.writables.add(fd)
+        self._epoll_control(fd, registered)
+
+    def unregister_readable(self, fd):
+        registered = self._registered(fd)
+        self.readables.discard(fd)
+        self._epoll_control(fd, registered)
+
+    def unregister_writable(self, fd):
+        registered = self._registered(fd)
+        self.writables.discard(fd)
+        self._epoll_control(fd, registered)
+
+    def set_edge_triggered(self, fd, edge_triggered):
+        if edge_triggered and self.options.epoll_edge_triggered:
+            if fd in self.edge_triggered:
+                return
+            self.edge_triggered.add(fd)
+        else:
+            if fd not in self.edge_triggered:
+                return
+            self.edge_triggered.discard(fd)
+        registered = self._registered(fd)
+        if registered:
+            self._epoll_control(fd, registered)
+
+    def is_edge_triggered(self, fd):
+        return fd in self.edge_triggered
+
+    def _registered(self, fd):
+        return fd in self.readables or fd in self.writables
+
+    def _eventmask(self, fd):
+        eventmask = 0
+        if fd in self.readables:
+            eventmask |= self.READ
+            if fd in self.edge_triggered:
+                eventmask |= select.EPOLLET
+        if fd in self.writables:
+            eventmask |= self.WRITE
+        return eventmask
+
+    def _epoll_control(self, fd, registered):
+        eventmask = self._eventmask(fd)
+        try:
+            if not eventmask:
+                if registered:
+                    self._epoll.unregister(fd)
+                return
+            if registered:
+                try:
+                    self._epoll.modify(fd, eventmask)
+                except (IOError, OSError) as error:
+                    if error.errno != errno.ENOENT:
+                        raise
+                    # the kernel dropped the fd when it was closed; the
+                    # same fd number has since been reused
+                    self._epoll.register(fd, eventmask)
+            else:
+                try:
+                    self._epoll.register(fd, eventmask)
+                except (IOError, OSError) as error:
+                    if error.errno != errno.EEXIST:
+                        raise
+                    self._epoll.modify(fd, eventmask)
+        except (IOError, OSError) as error:
+            if error.errno in (errno.EBADF, errno.ENOENT):
+                self.options.logger.blather('%s encountered in epoll. '
+                                            'Invalid file descriptor %s' % (
+                                            errno.errorcode[error.errno], fd))
+                if eventmask:
+                    self.readables.discard(fd)
+                    self.writables.discard(fd)
+            else:
+                raise
+
+    def poll(self, timeout):
+        readables, writables = [], []
+
+        try:
+            events = self._epoll.poll(timeout, self.max_events)
+        except (IOError, OSError) as error:
+            if error.errno == errno.EINTR:
+                self.options.logger.blather('EINTR encountered in poll')
+                return readables, writables
+            raise
+
+        for fd, eventmask in events:
+            if eventmask & select.EPOLLERR:
+                # report errors to whichever handler is interested so
+                # that it can find out about the error on its own
+                eventmask |= self.READ | self.WRITE
+            if eventmask & self.READ and fd in self.readables:
+                readables.append(fd)
+            if eventmask & self.WRITE and fd in self.writables:
+                writables.append(fd)
+
+        return readables, writables
+
+    def close(self):
+        self._epoll.close()
+        self._epoll = None
+
+class AsyncioPoller(BasePoller):
+    '''
+    A poller that waits on an asyncio event loop, or on a uvloop event
+    loop if uvloop is installed.  Used when the ``event_loop`` option is
+    ``asyncio``.
+
+    Only the wait is done by the loop: its readers and writers merely
+    record which file descriptors are ready.  The main loop of
+    supervisord still dispatches the events, runs its timers and handles
+    signals (through the self-pipe) itself, so process dispatchers and
+    medusa channels are used unchanged.  poll() runs the loop until a
+    registered file descriptor is ready or the timeout expires, so
+    callbacks and tasks scheduled on ``self.loop`` (e.g. by an RPC
+    interface plugin) run while supervisord is waiting.  They must not
+    block, since supervisord doesn't handle events while they run.
+    '''
+
+    def initialize(self):
+        self.loop = self._new_event_loop()
+        self.loop.set_exception_handler(self._handle_exception)
+        self.readables = set()
+        self.writables = set()
+        self._ready_readables = []
+        self._ready_writables = []
+
+    def _new_event_loop(self):
+        try:
+            import uvloop
+        except ImportError:
+            return asyncio.new_event_loop()
+        return uvloop.new_event_loop()
+
+    def register_readable(self, fd):
+        if fd not in self.readables:
+            self._control(self.loop.add_reader, fd, self._on_readable, fd)
+            self.readables.add(fd)
+
+    def register_writable(self, fd):
+        if fd not in self.writables:
+            self._control(self.loop.add_writer, fd, self._on_writable, fd)
+            self.writables.add(fd)
+
+    def unregister_readable(self, fd):
+        if fd in self.readables:
+            self.readables.discard(fd)
+            self._control(self.loop.remove_reader, fd)
+
+    def unregister_writable(self, fd):
+        if fd in self.writables:
+            self.writables.discard(fd)
+            self._control(self.loop.remove_writer, fd)
+
+    def _control(self, method, fd, *args):
+        try:
+            try:
+                method(fd, *args)
+            except (IOError, OSError) as error:
+                if error.errno != errno.ENOENT:
+                    raise
+                # the kernel dropped the fd when it was closed and the
+                # fd number has since been reused; the loop forgot about
+                # it when the error was raised, so try again
+                method(fd, *args)
+        except (ValueError, IOError, OSError) as error:
+            self.options.logger.blather('%s encountered in asyncio loop. '
+                                        'Invalid file descriptor %s' % (
+                                        error, fd))
+
+    def _handle_exception(self, loop, context):
+        # e.g. an exception raised by a task that a plugin scheduled
+        self.options.logger.error('uncaught exception in asyncio loop: %s' %
+                                  context.get('exception',
+                                              context.get('message')))
+
+    def _on_readable(self, fd):
+        self._ready_readables.append(fd)
+        self.loop.stop()
+
+    def _on_writable(self, fd):
+        self._ready_writables.append(fd)
+        self.loop.stop()
+
+    def poll(self, timeout):
+        # stop() takes effect after the callbacks that are ready in the
+        # same iteration of the loop have run, so every fd that is ready
+        # is returned, not only the first one
+        handle = self.loop.call_later(timeout, self.loop.stop)
+        try:
+            self.loop.run_forever()
+        finally:
+            handle.cancel()
+        readables, self._ready_readables = self._ready_readables, []
+        writables, self._ready_writables = self._ready_writables, []
+        return readables, writables
+
+    def close(self):
+        self.loop.close()
+
+class DispatcherRegistry:
+    '''
+    Persistent map of file descriptors to dispatchers used by the main
+    loop.  Process dispatchers are added when a process is spawned and
+    removed when it is reaped.  Interest in a file descriptor is only
+    pushed to the poller when the readable/writable state of its
+    dispatcher actually changes, so an idle main loop iteration does not
+    need to look at every dispatcher.
+    '''
+
+    def __init__(self, poller):
+        self.poller = poller
+        self.map = {} # fd -> dispatcher
+        self.sockets = {} # fd -> dispatcher for entries from the socket map
+        self.pending = set() # fds whose interest must be re-evaluated
+        self.resets = poller.resets # of the poller when last in sync
+
+    def __contains__(self, fd):
+        return fd in self.map
+
+    def __len__(self):
+        return len(self.map)
+
+    def get(self, fd, default=None):
+        return self.map.get(fd, default)
+
+    def add(self, fd, dispatcher):
+        self.map[fd] = dispatcher
+        self.pending.add(fd)
+        self.poller.set_edge_triggered(
+            fd, getattr(dispatcher, 'edge_triggered', False))
+
+    def remove(self, fd, dispatcher=None):
+        # the dispatcher check protects a file descriptor number which
+        # has already been reused by another dispatcher
+        current = self.map.get(fd)
+        if current is None:
+            return
+        if dispatcher is not None and current is not dispatcher:
+            return
+        del self.map[fd]
+        self.pending.discard(fd)
+        self._set_interest(fd, False, False)
+
+    def add_dispatchers(self, dispatchers):
+        for fd, dispatcher in dispatchers.items():
+            self.add(fd, dispatcher)
+
+    def remove_dispatchers(self, dispatchers):
+        for fd, dispatcher in dispatchers.items():
+            self.remove(fd, dispatcher)
+
+    def touch(self, fd):
+        """ Mark the dispatcher for fd as possibly having changed its
+        readable/writable state outside of its own event handlers """
+        if fd in self.map:
+            self.pending.add(fd)
+
+    def update(self, fd):
+        """ Re-evaluate the dispatcher for fd and push any change in
+        interest to the poller """
+        self.pending.discard(fd)
+        dispatcher = self.map.get(fd)
+        if dispatcher is None:
+            self._set_interest(fd, False, False)
+        else:
+            self._set_interest(fd, dispatcher.readable(),
+                               dispatcher.writable())
+
+    def resync(self):
+        """ Re-evaluate every dispatcher, e.g. after the poller has
+        dropped all of its registrations """
+        self.pending.update(self.map)
+
+    def update_pending(self):
+        if self.poller.resets != self.resets:
+            # the poller dropped all of its registrations
+            self.resets = self.poller.resets
+            self.resync()
+        while self.pending:
+            self.update(self.pending.pop())
+
+    def update_sockets(self, socket_map):
+        """ Synchronize with the asyncore socket map.  HTTP channels
+        come and go and change their interest on their own, so every
+        socket is re-evaluated on each call. """
+        sockets = self.sockets
+        for fd, dispatcher in list(sockets.items()):
+            if socket_map.get(fd) is not dispatcher:
+                del sockets[fd]
+                self.remove(fd, dispatcher)
+        for fd, dispatcher in socket_map.items():
+            if sockets.get(fd) is not dispatcher:
+                sockets[fd] = dispatcher
+                self.map[fd] = dispatcher
+            self.update(fd)
+
+    def _set_interest(self, fd, readable, writable):
+        poller = self.poller
+        if readable:
+            if fd not in poller.readables:
+                poller.register_readable(fd)
+        elif fd in poller.readables:
+            self._unregister(poller.unregister_readable, fd)
+        if writable:
+            if fd not in poller.writables:
+                poller.register_writable(fd)
+        elif fd in poller.writables:
+            self._unregister(poller.unregister_writable, fd)
+
+    def _unregister(self, unregister, fd):
+        try:
+            unregister(fd)
+        except (KeyError, ValueError, OSError):
+            # the poller may have already forgotten about a closed fd
+            pass
+
 def implements_poll():
     return hasattr(select, 'poll')
 
 def implements_kqueue():
     return hasattr(select, 'kqueue')
 
-if implements_kqueue():
+def implements_epoll():
+    return hasattr(select, 'epoll')
+
+def implements_asyncio():
+    return asyncio is not None
+
+if implements_epoll():
+    Poller = EPollPoller
+elif implements_kqueue():
     Poller = KQueuePoller
 elif implements_poll():
     Poller = PollPoller
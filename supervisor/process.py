@@ -23,13 +23,22 @@ from supervisor.options import signame
 from supervisor.options import ProcessException, BadCommand
 
 from supervisor.dispatchers import EventListenerStates
+from supervisor.dispatchers import OutputRing
+from supervisor.dispatchers import PPidfdDispatcher
 
 from supervisor import events
 
 from supervisor.datatypes import RestartUnconditionally
 
+from supervisor.ratelimit import TokenBucket
+
 from supervisor.socket_manager import SocketManager
 
+def _stat_key(st):
+    """ Return what tells whether the executable in a spawn plan has been
+    replaced or changed since it was looked up """
+    return (st.st_dev, st.st_ino, st.st_mtime, st.st_ctime)
+
 @functools.total_ordering
 class Subprocess(object):
 
@@ -52,9 +61,18 @@ class Subprocess(object):
     backoff = 0 # backoff counter (to startretries)
     dispatchers = None # asyncore output dispatchers (keyed by fd)
     pipes = None # map of channel name to file descriptor #
+    pidfd_dispatcher = None # PPidfdDispatcher while running, if supported
     exitstatus = None # status attached to dead process by finish()
     spawnerr = None # error message attached by spawn() if any
     group = None # ProcessGroup instance if process is in the group
+    bytes_read = 0 # bytes read from the process' output (see getLoopStats)
+    read_time = 0 # seconds spent handling read events of its dispatchers
+    output_limit = None # TokenBucket if its output_rate_limit is set
+    output_throttled = False # True while its output is not read
+    throttled_since = None # time at which its output was throttled
+    throttled = 0 # times its output was throttled (see getLoopStats)
+    throttled_time = 0 # seconds during which its output was not read
+    output_rings = None # map of channel name to OutputRing of its output
 
     def __init__(self, config):
         """Constructor.
@@ -65,17 +83,29 @@ class Subprocess(object):
         self.dispatchers = {}
         self.pipes = {}
         self.state = ProcessStates.STOPPED
+        self.output_rings = {}
+        for channel in ('stdout', 'stderr'):
+            ring_bytes = getattr(config, '%s_ring_bytes' % channel)
+            if ring_bytes:
+                self.output_rings[channel] = OutputRing(ring_bytes)
 
     def removelogs(self):
         for dispatcher in self.dispatchers.values():
             if hasattr(dispatcher, 'removelogs'):
                 dispatcher.removelogs()
+        for ring in self.output_rings.values():
+            ring.clear()
 
     def reopenlogs(self):
         for dispatcher in self.dispatchers.values():
             if hasattr(dispatcher, 'reopenlogs'):
                 dispatcher.reopenlogs()
 
+    def flushlogs(self):
+        for dispatcher in self.dispatchers.values():
+            if hasattr(dispatcher, 'flushlogs'):
+                dispatcher.flushlogs()
+
     def drain(self):
         for dispatcher in self.dispatchers.values():
             # note that we *must* call readable() for every
@@ -87,6 +117,56 @@ class Subprocess(object):
             if dispatcher.writable():
                 dispatcher.handle_write_event()
 
+    def output_read(self, size):
+        """ Called by the output dispatchers with the number of bytes of
+        output they read.  Return False if no more output should be read
+        for now because the process went over its output_rate_limit. """
+        self.bytes_read += size
+        limit = self.output_limit
+        if limit is None or not size:
+            return True
+        now = time.time()
+        if limit.consume(size, now):
+            return True
+        self.throttle_output(now, limit.refilled_at(now))
+        return False
+
+    def throttle_output(self, now, until):
+        """ Stop reading the output of the process until the given time.
+        Its dispatchers are not readable in the meantime, so their fds
+        are removed from the poller and the pipes fill up, which blocks
+        the process when it writes more. """
+        options = self.config.options
+        options.output_resumes.add(self, now, until)
+        if self.output_throttled:
+            return
+        self.output_throttled = True
+        self.throttled_since = now
+        self.throttled += 1
+        self._touch_output()
+        options.logger.debug(
+            'throttled output of %s for %.3f seconds' % (
+            as_string(self.config.name), until - now))
+        events.notify(events.ProcessOutputThrottledEvent(self, self.pid,
+                                                         until))
+
+    def resume_output(self, now=None):
+        """ Read the output of the process again """
+        if not self.output_throttled:
+            return
+        if now is None:
+            now = time.time()
+        self.output_throttled = False
+        self.throttled_time += max(now - self.throttled_since, 0)
+        self.throttled_since = None
+        self.config.options.output_resumes.discard(self)
+        self._touch_output()
+
+    def _touch_output(self):
+        registry = self.config.options.dispatcher_registry
+        for fd in self.dispatchers:
+            registry.touch(fd)
+
     def write(self, chars):
         if not self.pid or self.killing:
             raise OSError(errno.EPIPE, "Process already closed")
@@ -100,12 +180,26 @@ class Subprocess(object):
             raise OSError(errno.EPIPE, "Process' stdin channel is closed")
 
         dispatcher.input_buffer += chars
+        # anything left in the buffer must be written by the main loop
+        self.config.options.dispatcher_registry.touch(stdin_fd)
         dispatcher.flush() # this must raise EPIPE if the pipe is closed
 
     def get_execv_args(self):
         """Internal: turn a program name into a file name, using $PATH,
         make sure it exists / is executable, raising a ProcessException
-        if not """
+        if not.  The result is cached in the config and reused for as
+        long as the file is not replaced or changed. """
+        plan = self.config.spawn_plan
+        if plan is not None:
+            filename, commandargs, key = plan
+            try:
+                st = self.config.options.stat(filename)
+            except OSError:
+                st = None
+            if st is not None and _stat_key(st) == key:
+                return filename, commandargs[:]
+            self.config.spawn_plan = None
+
         try:
             commandargs = shlex.split(self.config.command)
         except ValueError as e:
@@ -146,6 +240,8 @@ class Subprocess(object):
         # method call here only to service unit tests
         self.config.options.check_execv_args(filename, commandargs, st)
 
+        if st is not None:
+            self.config.spawn_plan = (filename, commandargs[:], _stat_key(st))
         return filename, commandargs
 
     event_map = {
@@ -171,6 +267,11 @@ class Subprocess(object):
             self.backoff += 1
             self.delay = now + self.backoff
 
+        # the new state may have work for transition() to do right away
+        self.schedule_transition()
+        self.config.options.spawn_scheduler.state_changed(
+            self, old_state, new_state)
+
         event_class = self.event_map.get(new_state)
         if event_class is not None:
             event = event_class(self, old_state, expected)
@@ -237,6 +338,11 @@ class Subprocess(object):
             self.change_state(ProcessStates.BACKOFF)
             return
 
+        env = self._get_environment()
+        started = time.time()
+        if self._can_posix_spawn():
+            return self._spawn_with_posix_spawn(filename, argv, env, started)
+
         try:
             pid = options.fork()
         except OSError as why:
@@ -256,34 +362,125 @@ class Subprocess(object):
             return
 
         if pid != 0:
+            options.spawn_scheduler.record_spawn('fork', time.time() - started)
             return self._spawn_as_parent(pid)
 
         else:
-            return self._spawn_as_child(filename, argv)
+            return self._spawn_as_child(filename, argv, env)
+
+    def _can_posix_spawn(self):
+        """ posix_spawn() can't switch the user or set the directory or
+        umask of the child, so programs that need any of these are always
+        started with fork() """
+        config = self.config
+        return (config.options.can_posix_spawn() and config.uid is None and
+                config.directory is None and config.umask is None)
+
+    def _spawn_with_posix_spawn(self, filename, argv, env, started):
+        options = self.config.options
+        processname = as_string(self.config.name)
+        file_actions = [(os.POSIX_SPAWN_DUP2, fd, to)
+                        for to, fd in enumerate(self._get_child_fds())]
+        try:
+            pid = options.posix_spawn(filename, argv, env, file_actions)
+        except (OSError, ValueError) as why:
+            code = why.args[0]
+            if code == errno.EAGAIN:
+                # process table full
+                msg  = ('Too many processes in process table to spawn \'%s\'' %
+                        processname)
+            elif isinstance(why, OSError):
+                msg = "couldn't exec %s: %s" % (
+                      argv[0], errno.errorcode.get(code, code))
+            else:
+                # e.g. a null byte in the environment
+                msg = "couldn't exec %s: %s" % (argv[0], why)
+            self.record_spawnerr(msg)
+            self._assertInState(ProcessStates.STARTING)
+            self.change_state(ProcessStates.BACKOFF)
+            options.close_parent_pipes(self.pipes)
+            options.close_child_pipes(self.pipes)
+            return
+        options.spawn_scheduler.record_spawn('posix_spawn',
+                                             time.time() - started)
+        return self._spawn_as_parent(pid)
+
+    def request_spawn(self):
+        """Spawn the subprocess now, or queue the spawn with the spawn
+        scheduler if too many processes are starting already.
+
+        Return True if the subprocess was spawned.
+        """
+        if not self.config.options.spawn_scheduler.request(self):
+            return False
+        self.spawn()
+        return True
 
     def _spawn_as_parent(self, pid):
         # Parent
         self.pid = pid
         options = self.config.options
         options.close_child_pipes(self.pipes)
+        options.dispatcher_registry.add_dispatchers(self.dispatchers)
+        rate = self.config.output_rate_limit
+        if rate:
+            burst = self.config.output_rate_burst or rate
+            self.output_limit = TokenBucket(rate, burst, time.time())
+        pidfd = options.pidfd_open(pid)
+        if pidfd is not None:
+            self.pidfd_dispatcher = PPidfdDispatcher(self, pidfd, pid)
+            options.dispatcher_registry.add(pidfd, self.pidfd_dispatcher)
         options.logger.info('spawned: \'%s\' with pid %s' % (as_string(self.config.name), pid))
         self.spawnerr = None
         self.delay = time.time() + self.config.startsecs
         options.pidhistory[pid] = self
         return pid
 
-    def _prepare_child_fds(self):
-        options = self.config.options
-        options.dup2(self.pipes['child_stdin'], 0)
-        options.dup2(self.pipes['child_stdout'], 1)
+    def _get_child_fds(self):
+        """ Return the fds that become the stdin, stdout and stderr of
+        the child """
         if self.config.redirect_stderr:
-            options.dup2(self.pipes['child_stdout'], 2)
+            stderr = self.pipes['child_stdout']
         else:
-            options.dup2(self.pipes['child_stderr'], 2)
-        for i in range(3, options.minfds):
-            options.close_fd(i)
+            stderr = self.pipes['child_stderr']
+        return self.pipes['child_stdin'], self.pipes['child_stdout'], stderr
+
+    def _get_environment(self):
+        """ Return the environment of the child.  It is cached in the
+        config for as long as the environment of supervisord is the
+        same. """
+        environ = dict(os.environ)
+        cached = self.config.spawn_environment
+        if cached is not None and cached[0] == environ:
+            return cached[1]
+        env = environ.copy()
+        env['SUPERVISOR_ENABLED'] = '1'
+        serverurl = self.config.serverurl
+        if serverurl is None: # unset
+            serverurl = self.config.options.serverurl # might still be None
+        if serverurl:
+            env['SUPERVISOR_SERVER_URL'] = serverurl
+        env['SUPERVISOR_PROCESS_NAME'] = self.config.name
+        if self.group:
+            env['SUPERVISOR_GROUP_NAME'] = self.group.config.name
+        if self.config.environment is not None:
+            env.update(self.config.environment)
+        self.config.spawn_environment = (environ, env)
+        return env
 
-    def _spawn_as_child(self, filename, argv):
+    def _prepare_child_fds(self):
+        options = self.config.options
+        for to, fd in enumerate(self._get_child_fds()):
+            options.dup2(fd, to)
+        options.close_child_fds()
+
+    def _spawn_as_child(self, filename, argv, env):
+        # supervisord may be running background threads when it forks,
+        # e.g. the one of its LogArchive, a LineCounter or a LogSearch.
+        # only the forking thread exists in the child and the locks that
+        # the others held stay locked forever, so until execve the child
+        # must not log, take a lock or use anything shared with those
+        # threads: it only makes system calls through options.
         options = self.config.options
         try:
             # prevent child from receiving signals sent to the
@@ -307,20 +504,6 @@ class Subprocess(object):
                 options.write(2, "supervisor: " + msg)
                 return # finally clause will exit the child process
 
-            # set environment
-            env = os.environ.copy()
-            env['SUPERVISOR_ENABLED'] = '1'
-            serverurl = self.config.serverurl
-            if serverurl is None: # unset
-                serverurl = self.config.options.serverurl # might still be None
-            if serverurl:
-                env['SUPERVISOR_SERVER_URL'] = serverurl
-            env['SUPERVISOR_PROCESS_NAME'] = self.config.name
-            if self.group:
-                env['SUPERVISOR_GROUP_NAME'] = self.group.config.name
-            if self.config.environment is not None:
-                env.update(self.config.environment)
-
             # change directory
             cwd = self.config.directory
             try:
@@ -464,7 +647,10 @@ class Subprocess(object):
 
         try:
             try:
-                options.kill(pid, sig)
+                if killasgroup:
+                    options.kill(pid, sig)
+                else:
+                    self._send_signal(sig)
             except OSError as exc:
                 if exc.errno == errno.ESRCH:
                     msg = ("unable to signal %s (pid %s), it probably just exited "
@@ -512,7 +698,7 @@ class Subprocess(object):
 
         try:
             try:
-                options.kill(self.pid, sig)
+                self._send_signal(sig)
             except OSError as exc:
                 if exc.errno == errno.ESRCH:
                     msg = ("unable to signal %s (pid %s), it probably just now exited "
@@ -533,10 +719,34 @@ class Subprocess(object):
 
         return None
 
+    def _send_signal(self, sig):
+        options = self.config.options
+        if self.pidfd_dispatcher is not None:
+            # a pidfd always refers to our child, even if its pid has
+            # been reused after it was reaped
+            options.pidfd_send_signal(self.pidfd_dispatcher.fd, sig)
+        else:
+            options.kill(self.pid, sig)
+
+    def _close_pidfd(self):
+        dispatcher = self.pidfd_dispatcher
+        if dispatcher is not None:
+            options = self.config.options
+            options.dispatcher_registry.remove(dispatcher.fd, dispatcher)
+            dispatcher.close()
+            options.close_fd(dispatcher.fd)
+            self.pidfd_dispatcher = None
+
     def finish(self, pid, sts):
         """ The process was reaped and we need to report and manage its state
         """
+        # the output left in its pipes is read whatever its output limit
+        self.output_limit = None
+        self.resume_output()
         self.drain()
+        # the last output must not wait for the flush interval of a log
+        # that is written behind
+        self.flushlogs()
 
         es, msg = decode_wait_status(sts)
 
@@ -613,6 +823,9 @@ class Subprocess(object):
                 self.config.options.logger.warn(msg)
 
         self.pid = 0
+        self._close_pidfd()
+        self.config.options.dispatcher_registry.remove_dispatchers(
+            self.dispatchers)
         self.config.options.close_parent_pipes(self.pipes)
         self.pipes = {}
         self.dispatchers = {}
@@ -664,23 +877,23 @@ class Subprocess(object):
         if self.config.options.mood > SupervisorStates.RESTARTING:
             # dont start any processes if supervisor is shutting down
             if state == ProcessStates.EXITED:
-                if self.config.autorestart:
+                if self.config.autorestart and not self.administrative_stop:
                     if self.config.autorestart is RestartUnconditionally:
                         # EXITED -> STARTING
-                        self.spawn()
+                        self.request_spawn()
                     else: # autorestart is RestartWhenExitUnexpected
                         if self.exitstatus not in self.config.exitcodes:
                             # EXITED -> STARTING
-                            self.spawn()
+                            self.request_spawn()
             elif state == ProcessStates.STOPPED and not self.laststart:
-                if self.config.autostart:
+                if self.config.autostart and not self.administrative_stop:
                     # STOPPED -> STARTING
-                    self.spawn()
+                    self.request_spawn()
             elif state == ProcessStates.BACKOFF:
                 if self.backoff <= self.config.startretries:
                     if now > self.delay:
                         # BACKOFF -> STARTING
-                        self.spawn()
+                        self.request_spawn()
 
         processname = as_string(self.config.name)
         if state == ProcessStates.STARTING:
@@ -717,6 +930,30 @@ class Subprocess(object):
                                                           self.pid))
                 self.kill(signal.SIGKILL)
 
+        deadline = self.get_transition_deadline()
+        if deadline is not None:
+            self.schedule_transition(deadline)
+
+    def get_transition_deadline(self):
+        """ Return the time at which transition() will next have timed
+        work to do for the current state, or None """
+        state = self.state
+        if state == ProcessStates.STARTING:
+            return self.laststart + self.config.startsecs
+        if state in (ProcessStates.BACKOFF, ProcessStates.STOPPING):
+            return self.delay
+        return None
+
+    def schedule_transition(self, when=None):
+        """ Ask the main loop to call transition() for this process no
+        later than `when` (a time.time() value; default is now) """
+        if when is None:
+            when = time.time()
+        if self.group is None:
+            self.config.options.timers.schedule(when, self, self.transition)
+        else:
+            self.group.schedule_transition(self, when)
+
 class FastCGISubprocess(Subprocess):
     """Extends Subprocess class to handle FastCGI subprocesses"""
 
@@ -761,22 +998,13 @@ class FastCGISubprocess(Subprocess):
         self.after_finish()
         return retval
 
-    def _prepare_child_fds(self):
+    def _get_child_fds(self):
         """
-        Overrides Subprocess._prepare_child_fds()
+        Overrides Subprocess._get_child_fds()
         The FastCGI socket needs to be set to file descriptor 0 in the child
         """
-        sock_fd = self.fcgi_sock.fileno()
-
-        options = self.config.options
-        options.dup2(sock_fd, 0)
-        options.dup2(self.pipes['child_stdout'], 1)
-        if self.config.redirect_stderr:
-            options.dup2(self.pipes['child_stdout'], 2)
-        else:
-            options.dup2(self.pipes['child_stderr'], 2)
-        for i in range(3, options.minfds):
-            options.close_fd(i)
+        stdin, stdout, stderr = Subprocess._get_child_fds(self)
+        return self.fcgi_sock.fileno(), stdout, stderr
 
 @functools.total_ordering
 class ProcessGroupBase(object):
@@ -839,7 +1067,15 @@ class ProcessGroupBase(object):
         return dispatchers
 
     def before_remove(self):
-        pass
+        timers = self.config.options.timers
+        spawn_scheduler = self.config.options.spawn_scheduler
+        for process in self.processes.values():
+            timers.cancel(process)
+            spawn_scheduler.cancel(process)
+        timers.cancel(self)
+
+    def schedule_transition(self, process, when):
+        self.config.options.timers.schedule(when, process, process.transition)
 
 class ProcessGroup(ProcessGroupBase):
     def transition(self):
@@ -899,11 +1135,20 @@ class EventListenerPool(ProcessGroupBase):
                     self.last_dispatch = now;
 
                 if now - self.last_dispatch < self.dispatch_throttle:
+                    if self.event_buffer:
+                        self.schedule_transition(
+                            None, self.last_dispatch + self.dispatch_throttle)
                     return
             self.dispatch()
 
     def before_remove(self):
         self._unsubscribe()
+        ProcessGroupBase.before_remove(self)
+
+    def schedule_transition(self, process, when):
+        # dispatching events depends on the state of all of the pool's
+        # processes, so the pool is always transitioned as a whole
+        self.config.options.timers.schedule(when, self, self.transition)
 
     def dispatch(self):
         while self.event_buffer:
@@ -945,6 +1190,7 @@ class EventListenerPool(ProcessGroupBase):
             self.event_buffer.insert(0, event)
         else:
             self.event_buffer.append(event)
+        self.schedule_transition(None, time.time())
 
     def _dispatchEvent(self, event):
         pool_serial = event.pool_serials[self.config.name]
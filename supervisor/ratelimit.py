@@ -0,0 +1,81 @@
+"""Limiting of the rate at which supervisord reads the output of the
+processes it runs (see the ``output_rate_limit`` option of the
+[program:x] section)."""
+
+class TokenBucket:
+    """
+    A budget of up to ``burst`` bytes that is refilled at ``rate`` bytes
+    per second.
+
+    The output that has been read is taken from the budget after the
+    fact, so the budget can go into debt by up to one read.  Once it is
+    used up, no more output should be read until it is full again (see
+    refilled_at()), which keeps the average rate at or below ``rate``.
+    """
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.updated) * self.rate)
+        # if the clock moved backward, refill from now on
+        self.updated = now
+
+    def consume(self, size, now):
+        """ Take size bytes from the budget and return True if some of it
+        is left """
+        self.refill(now)
+        self.tokens -= size
+        return self.tokens > 0
+
+    def refilled_at(self, now):
+        """ Return the time at which the budget will be full again """
+        self.refill(now)
+        return now + float(self.burst - self.tokens) / self.rate
+
+class ResumeSchedule:
+    """
+    The processes whose output is not read because they went over their
+    output_rate_limit, with the time at which to read it again.  The
+    deadlines are scheduled on timers, the TimerHeap of supervisord's
+    main loop, which only calls back the processes that are due.
+    """
+
+    def __init__(self, timers):
+        self.timers = timers
+        # id(process) -> (process, time it was added, time to resume it,
+        # timer callback).  processes compare by priority, so they can't
+        # be the keys, and they have their own deadlines on the timers,
+        # so the callback is the subject of the deadline to resume them.
+        self.entries = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, process):
+        return id(process) in self.entries
+
+    def add(self, process, now, deadline):
+        self.discard(process)
+        resume = lambda: process.resume_output()
+        self.entries[id(process)] = (process, now, deadline, resume)
+        self.timers.schedule(deadline, resume, resume)
+
+    def discard(self, process):
+        entry = self.entries.pop(id(process), None)
+        if entry is not None:
+            self.timers.cancel(entry[3])
+
+    def reschedule(self, now):
+        """ Schedule every deadline again after the timers were cleared.
+        If the clock moved backward, every process is resumed now. """
+        for process, added, deadline, resume in list(self.entries.values()):
+            if now < added:
+                process.resume_output(now)
+            else:
+                self.timers.schedule(deadline, resume, resume)
@@ -1,4 +1,6 @@
 import os
+import re
+import sys
 import time
 import datetime
 import errno
@@ -14,7 +16,25 @@ from supervisor.datatypes import (
     signal_number,
     )
 
-from supervisor.options import readFile
+from supervisor.logindex import MAX_LINES
+from supervisor.logindex import ranges_of_time
+from supervisor.logindex import read_checkpoints
+from supervisor.logindex import read_lines
+from supervisor.logindex import sidecar_name
+
+from supervisor.logreader import LogSlice
+from supervisor.logreader import LogSlices
+
+from supervisor.logarchive import uncompressed_name
+
+from supervisor.logsearch import HARD_STOP
+from supervisor.logsearch import LogSearch
+from supervisor.logsearch import MAX_MATCHES
+from supervisor.logsearch import MAX_PATTERN
+from supervisor.logsearch import is_compressed
+from supervisor.logsearch import log_files
+from supervisor.logsearch import parse_token
+
 from supervisor.options import tailFile
 from supervisor.options import BadCommand
 from supervisor.options import NotExecutable
@@ -46,6 +66,9 @@ from supervisor.states import (
 
 API_VERSION  = '3.0'
 
+# the offsets of tailProcessOutput() are 31 bit, like XML-RPC integers
+_OFFSET_MASK = 0x7fffffff
+
 class SupervisorNamespaceRPCInterface:
     def __init__(self, supervisord):
         self.supervisord = supervisord
@@ -107,26 +130,149 @@ class SupervisorNamespaceRPCInterface:
         self._update('getPID')
         return self.supervisord.options.get_pid()
 
-    def readLog(self, offset, length):
-        """ Read length bytes from the main log starting at offset
+    def getReapStats(self, reset=False):
+        """ Return statistics about how supervisord reaps exited children
 
-        @param int offset         offset to start reading from.
-        @param int length         number of bytes to read from the log.
-        @return string result     Bytes of log
+        @param boolean reset  Reset the counters after reading them
+        @return struct A struct with the reap counters and lag (seconds)
         """
-        self._update('readLog')
+        self._update('getReapStats')
+        stats = self.supervisord.reap_stats
+        data = stats.as_dict()
+        # counters of a long running supervisord may not fit in an int
+        for key in ('batches', 'reaped', 'unknown', 'last_batch_size',
+                    'max_batch_size'):
+            data[key] = capped_int(data[key])
+        if reset:
+            stats.reset()
+        return data
 
-        logfile = self.supervisord.options.logfile
+    def getLoopStats(self, reset=False):
+        """ Return counters about the time spent in the supervisord main loop
 
-        if logfile is None or not os.path.exists(logfile):
-            raise RPCError(Faults.NO_FILE, logfile)
+        @param boolean reset  Reset the counters after reading them
+        @return struct A struct with the main loop counters
+        """
+        self._update('getLoopStats')
+        stats = self.supervisord.loop_stats
+        data = stats.as_dict()
+        # counters of a long running supervisord may not fit in an int
+        data['iterations'] = capped_int(data['iterations'])
+        data['latency_counts'] = [capped_int(n) for n in data['latency_counts']]
+        for counters in data['dispatchers'].values():
+            counters['read_events'] = capped_int(counters['read_events'])
+            counters['write_events'] = capped_int(counters['write_events'])
+        processes = []
+        for group, process in self._getAllProcesses():
+            processes.append({
+                'name': process.config.name,
+                'group': group.config.name,
+                'bytes_read': capped_int(process.bytes_read),
+                'read_time': process.read_time,
+                'throttled': capped_int(process.throttled),
+                'throttled_time': process.throttled_time,
+                })
+            if reset:
+                process.bytes_read = 0
+                process.read_time = 0
+                process.throttled = 0
+                process.throttled_time = 0
+        data['processes'] = processes
+        if reset:
+            stats.reset()
+        return data
 
+    def getSpawnQueue(self):
+        """ Return the state of the spawn scheduler, which limits the
+        number of processes that are starting at the same time
+
+        @return struct A struct with the number of starting and queued processes
+        """
+        self._update('getSpawnQueue')
+        return self.supervisord.options.spawn_scheduler.as_dict()
+
+    def getProcessMetrics(self):
+        """ Return the CPU time, memory and open files of every running
+        process, as sampled every metrics_interval seconds
+
+        @return struct A struct with the state of the sampler and the samples
+        """
+        self._update('getProcessMetrics')
+        sampler = self.supervisord.process_sampler
+        data = sampler.as_dict()
+        data['passes'] = capped_int(data['passes'])
+        data['skipped'] = capped_int(data['skipped'])
+        data['last_pass'] = capped_int(data['last_pass'])
+        processes = []
+        for group, process in self._getAllProcesses(lexical=True):
+            sample = sampler.get(process.pid)
+            if sample is None:
+                continue
+            info = {
+                'name': process.config.name,
+                'group': group.config.name,
+                'pid': process.pid,
+                }
+            info.update(self._interpretProcessMetrics(sample))
+            processes.append(info)
+        data['processes'] = processes
+        return data
+
+    def _interpretProcessMetrics(self, sample):
+        return {
+            'cpu_percent': sample['cpu_percent'],
+            'utime': sample['utime'],
+            'stime': sample['stime'],
+            # sizes in bytes may not fit in an int
+            'rss_kb': capped_int(sample['rss'] // 1024),
+            'vms_kb': capped_int(sample['vms'] // 1024),
+            'shared_kb': capped_int(sample['shared'] // 1024),
+            'num_fds': int(sample['num_fds']),
+            'sampled': capped_int(sample['sampled']),
+            }
+
+    # The methods reading logs return strings.  Each has a private
+    # variant, named by its "streamed" attribute, that the XML-RPC
+    # handler calls instead to get a LogSlice it sends as it is read
+    # (see supervisor.xmlrpc.traverse).
+
+    def _makeLogSlice(self, logfile, offset, length):
+        try:
+            return LogSlice(logfile, offset, length)
+        except ValueError as inst:
+            why = inst.args[0]
+            raise RPCError(getattr(Faults, why))
+
+    def _readLogSlice(self, logslice):
+        if not isinstance(logslice, LogSlice):
+            return logslice
         try:
-            return as_string(readFile(logfile, int(offset), int(length)))
+            return logslice.text()
         except ValueError as inst:
             why = inst.args[0]
             raise RPCError(getattr(Faults, why))
 
+    def _sliceLog(self, offset, length):
+        self._update('readLog')
+
+        logfile = self.supervisord.options.logfile
+
+        if logfile is None or not os.path.exists(logfile):
+            raise RPCError(Faults.NO_FILE, logfile)
+
+        return self._makeLogSlice(logfile, int(offset), int(length))
+
+    def readLog(self, offset, length):
+        """ Read length bytes from the main log starting at offset
+
+        @param int offset         offset to start reading from.
+        @param int length         number of bytes to read from the log.
+        @return string result     Bytes of log
+        """
+        return self._readLogSlice(self._sliceLog(offset, length))
+
+    readLog.streamed = '_sliceLog'
+
     readMainLog = readLog # b/w compatibility with releases before 2.1
 
     def clearLog(self):
@@ -195,6 +341,12 @@ class SupervisorNamespaceRPCInterface:
 
         added, changed, removed = self.supervisord.diff_to_active()
 
+        # the processes of unchanged groups look up their executables
+        # and build their environments again on their next spawn
+        for group in self.supervisord.process_groups.values():
+            for process in group.processes.values():
+                process.config.clear_spawn_plan()
+
         added = [group.name for group in added]
         changed = [group.name for group in changed]
         removed = [group.name for group in removed]
@@ -305,7 +457,28 @@ class SupervisorNamespaceRPCInterface:
             raise RPCError(Faults.FAILED,
                            "%s is in an unknown process state" % name)
 
-        process.spawn()
+        spawn_scheduler = self.supervisord.options.spawn_scheduler
+        if not process.request_spawn():
+            # too many processes are starting; the spawn was queued and
+            # is done by the main loop once a slot is free
+            if not wait:
+                return True
+
+            def onqueued():
+                if spawn_scheduler.is_queued(process):
+                    return NOT_DONE_YET
+                if process.spawnerr:
+                    raise RPCError(Faults.SPAWN_ERROR, name)
+                state = process.get_state()
+                if state not in (ProcessStates.STARTING, ProcessStates.RUNNING):
+                    raise RPCError(Faults.ABNORMAL_TERMINATION, name)
+                if state == ProcessStates.RUNNING:
+                    return True
+                return NOT_DONE_YET
+
+            onqueued.delay = 0.05
+            onqueued.rpcinterface = self
+            return onqueued # deferred
 
         # We call reap() in order to more quickly obtain the side effects of
         # process.finish(), which reap() eventually ends up calling.  This
@@ -410,6 +583,13 @@ class SupervisorNamespaceRPCInterface:
             return self.stopProcessGroup(group_name, wait)
 
         if process.get_state() not in RUNNING_STATES:
+            spawn_scheduler = self.supervisord.options.spawn_scheduler
+            if spawn_scheduler.cancel(process):
+                # the process was waiting for a spawn slot; it is stopped
+                # now and must not be autostarted or restarted later
+                process.administrative_stop = True
+                process.change_state(ProcessStates.STOPPED)
+                return True
             raise RPCError(Faults.NOT_RUNNING, name)
 
         msg = process.stop()
@@ -463,7 +643,7 @@ class SupervisorNamespaceRPCInterface:
         processes.sort()
         processes = [ (group, process) for process in processes ]
 
-        killall = make_allfunc(processes, isRunning, self.stopProcess,
+        killall = make_allfunc(processes, isStoppable, self.stopProcess,
                                wait=wait)
 
         killall.delay = 0.05
@@ -480,7 +660,7 @@ class SupervisorNamespaceRPCInterface:
 
         processes = self._getAllProcesses()
 
-        killall = make_allfunc(processes, isRunning, self.stopProcess,
+        killall = make_allfunc(processes, isStoppable, self.stopProcess,
                                wait=wait)
 
         killall.delay = 0.05
@@ -588,7 +768,11 @@ class SupervisorNamespaceRPCInterface:
                      'stdout_logfile': pconfig.stdout_logfile,
                      'stdout_logfile_backups': pconfig.stdout_logfile_backups,
                      'stdout_logfile_maxbytes': pconfig.stdout_logfile_maxbytes,
+                     'stdout_logfile_buffer_size': pconfig.stdout_logfile_buffer_size,
+                     'stdout_logfile_flush_interval': pconfig.stdout_logfile_flush_interval,
+                     'stdout_logfile_index_bytes': pconfig.stdout_logfile_index_bytes,
                      'stdout_syslog': pconfig.stdout_syslog,
+                     'stdout_ring_bytes': pconfig.stdout_ring_bytes,
                      'stopsignal': int(pconfig.stopsignal), # enum on py3
                      'stopwaitsecs': pconfig.stopwaitsecs,
                      'stderr_capture_maxbytes': pconfig.stderr_capture_maxbytes,
@@ -596,7 +780,13 @@ class SupervisorNamespaceRPCInterface:
                      'stderr_logfile': pconfig.stderr_logfile,
                      'stderr_logfile_backups': pconfig.stderr_logfile_backups,
                      'stderr_logfile_maxbytes': pconfig.stderr_logfile_maxbytes,
+                     'stderr_logfile_buffer_size': pconfig.stderr_logfile_buffer_size,
+                     'stderr_logfile_flush_interval': pconfig.stderr_logfile_flush_interval,
+                     'stderr_logfile_index_bytes': pconfig.stderr_logfile_index_bytes,
                      'stderr_syslog': pconfig.stderr_syslog,
+                     'stderr_ring_bytes': pconfig.stderr_ring_bytes,
+                     'output_rate_limit': pconfig.output_rate_limit,
+                     'output_rate_burst': pconfig.output_rate_burst,
                      'serverurl': pconfig.serverurl,
                     }
 
@@ -689,6 +879,10 @@ class SupervisorNamespaceRPCInterface:
 
         description = self._interpretProcessInfo(info)
         info['description'] = description
+
+        sample = self.supervisord.process_sampler.get(process.pid)
+        if sample is not None:
+            info.update(self._interpretProcessMetrics(sample))
         return info
 
     def _now(self): # pragma: no cover
@@ -710,7 +904,7 @@ class SupervisorNamespaceRPCInterface:
             output.append(self.getProcessInfo(name))
         return output
 
-    def _readProcessLog(self, name, offset, length, channel):
+    def _sliceProcessLog(self, name, offset, length, channel):
         group, process = self._getGroupAndProcess(name)
 
         if process is None:
@@ -721,11 +915,11 @@ class SupervisorNamespaceRPCInterface:
         if logfile is None or not os.path.exists(logfile):
             raise RPCError(Faults.NO_FILE, logfile)
 
-        try:
-            return as_string(readFile(logfile, int(offset), int(length)))
-        except ValueError as inst:
-            why = inst.args[0]
-            raise RPCError(getattr(Faults, why))
+        return self._makeLogSlice(logfile, int(offset), int(length))
+
+    def _sliceProcessStdoutLog(self, name, offset, length):
+        self._update('readProcessStdoutLog')
+        return self._sliceProcessLog(name, offset, length, 'stdout')
 
     def readProcessStdoutLog(self, name, offset, length):
         """ Read length bytes from name's stdout log starting at offset
@@ -735,11 +929,17 @@ class SupervisorNamespaceRPCInterface:
         @param int length         number of bytes to read from the log.
         @return string result     Bytes of log
         """
-        self._update('readProcessStdoutLog')
-        return self._readProcessLog(name, offset, length, 'stdout')
+        return self._readLogSlice(
+            self._sliceProcessStdoutLog(name, offset, length))
+
+    readProcessStdoutLog.streamed = '_sliceProcessStdoutLog'
 
     readProcessLog = readProcessStdoutLog # b/c alias
 
+    def _sliceProcessStderrLog(self, name, offset, length):
+        self._update('readProcessStderrLog')
+        return self._sliceProcessLog(name, offset, length, 'stderr')
+
     def readProcessStderrLog(self, name, offset, length):
         """ Read length bytes from name's stderr log starting at offset
 
@@ -748,8 +948,240 @@ class SupervisorNamespaceRPCInterface:
         @param int length         number of bytes to read from the log.
         @return string result     Bytes of log
         """
-        self._update('readProcessStderrLog')
-        return self._readProcessLog(name, offset, length, 'stderr')
+        return self._readLogSlice(
+            self._sliceProcessStderrLog(name, offset, length))
+
+    readProcessStderrLog.streamed = '_sliceProcessStderrLog'
+
+    def _getProcessLogfile(self, name, channel):
+        group, process = self._getGroupAndProcess(name)
+
+        if process is None:
+            raise RPCError(Faults.BAD_NAME, name)
+
+        if channel not in ('stdout', 'stderr'):
+            raise RPCError(Faults.BAD_ARGUMENTS,
+                           'channel must be stdout or stderr')
+
+        logfile = getattr(process.config, '%s_logfile' % channel)
+
+        if logfile is None or not os.path.exists(logfile):
+            raise RPCError(Faults.NO_FILE, logfile)
+
+        return process, logfile
+
+    def _readIndex(self, process, channel, logfile):
+        # an index left over from when it was enabled doesn't count
+        if not getattr(process.config, '%s_logfile_index_bytes' % channel):
+            return []
+        return read_checkpoints(sidecar_name(logfile))
+
+    def _sliceProcessLogByTime(self, name, channel, start, end):
+        self._update('readProcessLogByTime')
+
+        process, logfile = self._getProcessLogfile(name, channel)
+
+        if end < start:
+            raise RPCError(Faults.BAD_ARGUMENTS, 'end is before start')
+
+        current = self._readIndex(process, channel, logfile)
+        if not current:
+            raise RPCError(Faults.FAILED, 'no index of %s' % logfile)
+
+        # the range may start in the backups of the log, each of which
+        # has kept its index
+        backups = getattr(process.config, '%s_logfile_backups' % channel)
+        files = []
+        for path in log_files(logfile, backups):
+            checkpoints = current
+            if path != logfile:
+                checkpoints = read_checkpoints(
+                    sidecar_name(uncompressed_name(path)))
+            size = sys.maxsize # of a compressed backup, unknown
+            if not is_compressed(path):
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    if path == logfile:
+                        raise RPCError(Faults.FAILED, logfile)
+                    checkpoints = [] # gone since it was listed
+            files.append((path, checkpoints, size))
+
+        slices = []
+        for path, first, last in ranges_of_time(files, start, end):
+            if is_compressed(path):
+                raise RPCError(Faults.FAILED,
+                               '%s is compressed and can\'t be read '
+                               'by time' % path)
+            slices.append(self._makeLogSlice(path, first, last - first))
+        if not slices:
+            return ''
+        if len(slices) == 1:
+            return slices[0]
+        return LogSlices(slices)
+
+    def readProcessLogByTime(self, name, channel, start, end):
+        """ Read what was written to the log of a channel of name between
+        the times start and end, as found with the index of the log (see
+        the ``stdout_logfile_index_bytes`` option).  The data returned
+        may start up to that many bytes before start and end as many
+        bytes after end.  A range that starts before the log was last
+        rotated is read from its backups too (up to
+        ``stdout_logfile_backups`` of them), as far back as they were
+        indexed; it fails if it needs a backup that was compressed.
+
+        @param string name        the name of the process (or 'group:name')
+        @param string channel     'stdout' or 'stderr'
+        @param int start          UNIX timestamp to start reading from
+        @param int end            UNIX timestamp to stop reading at
+        @return string result     Bytes of log
+        """
+        return self._readLogSlice(
+            self._sliceProcessLogByTime(name, channel, start, end))
+
+    readProcessLogByTime.streamed = '_sliceProcessLogByTime'
+
+    def readProcessLogLines(self, name, channel, first, count):
+        """ Read count lines of the log of a channel of name, starting
+        with the line numbered first (the first line of the log is 0).
+        The index of the log (see the ``stdout_logfile_index_bytes``
+        option) is used to find the line, and the call fails if the log
+        is not indexed.  At most 10000 lines, and 16 MiB of the log, are
+        read at once.  Fewer lines are returned if the log has no more,
+        and the last line may be cut short if it is still being written
+        or if the limit was reached.
+
+        @param string name        the name of the process (or 'group:name')
+        @param string channel     'stdout' or 'stderr'
+        @param int first          the number of the first line to read
+        @param int count          the number of lines to read
+        @return string result     Bytes of log
+        """
+        self._update('readProcessLogLines')
+
+        process, logfile = self._getProcessLogfile(name, channel)
+
+        if first < 0 or count < 0:
+            raise RPCError(Faults.BAD_ARGUMENTS,
+                           'first and count must be >= 0')
+
+        checkpoints = self._readIndex(process, channel, logfile)
+        if not checkpoints:
+            raise RPCError(Faults.FAILED, 'no index of %s' % logfile)
+
+        try:
+            data = read_lines(logfile, checkpoints, int(first),
+                              min(int(count), MAX_LINES))
+        except (IOError, OSError):
+            raise RPCError(Faults.FAILED, logfile)
+        except ValueError as e:
+            raise RPCError(Faults.FAILED, str(e))
+        return as_string(data)
+
+    def searchProcessLog(self, name, channel, pattern, options):
+        """ Search the log of a channel of name, and its rotated backups,
+        for the lines in which the regular expression pattern (in
+        Python's syntax) finds something, oldest first.  The search is
+        done in the background one page at a time, each page ending
+        after a number of matching lines or of bytes searched, or after
+        a second.  options may have:
+
+        'token': where to resume the search, as returned by the
+        previous page (default: '', from the start of the oldest backup)
+
+        'max_matches': the most matching lines in a page (default: 100,
+        at most 1000)
+
+        'max_bytes': the most bytes searched in a page (default: 16 MB)
+
+        'ignore_case': whether the case of letters is ignored (default:
+        false)
+
+        'backups': whether the rotated backups are searched, up to
+        ``stdout_logfile_backups`` of them (default: true)
+
+        The result has the 'matches' (each with the 'logfile' the line
+        was found in, its 'offset' in it and the 'line' itself), the
+        'token' of the next page and 'eof', true if the search got to
+        the end of the log.  The token of the last page searches what
+        is written to the log from then on.  A line that is still being
+        written is left for later, and a line longer than 8 KB is
+        searched in pieces.  Only one search of a log runs at a time: a
+        BUSY fault is returned while one does.  The pattern may have up
+        to 1024 characters.  A page that takes more than 30 seconds,
+        e.g. because of a pattern that backtracks a lot, is given up on
+        with a FAILED fault.  Offsets beyond 2**31-1 are capped to it.
+
+        @param string name        the name of the process (or 'group:name')
+        @param string channel     'stdout' or 'stderr'
+        @param string pattern     the regular expression to search for
+        @param struct options     the options of the search
+        @return struct result     A structure with matches, token and eof
+        """
+        self._update('searchProcessLog')
+
+        process, logfile = self._getProcessLogfile(name, channel)
+
+        if not isinstance(options, dict):
+            raise RPCError(Faults.BAD_ARGUMENTS, 'options must be a struct')
+        unknown = set(options) - set(['token', 'max_matches', 'max_bytes',
+                                      'ignore_case', 'backups'])
+        if unknown:
+            raise RPCError(Faults.BAD_ARGUMENTS,
+                           'unknown options: %s' % ', '.join(sorted(unknown)))
+        try:
+            token = str(options.get('token', ''))
+            if token:
+                parse_token(token)
+            max_matches = int(options.get('max_matches', 100))
+            max_bytes = int(options.get('max_bytes', 1 << 24))
+        except ValueError:
+            raise RPCError(Faults.BAD_ARGUMENTS, 'invalid token or limit')
+        if max_matches <= 0 or max_bytes <= 0:
+            raise RPCError(Faults.BAD_ARGUMENTS,
+                           'max_matches and max_bytes must be > 0')
+
+        if len(pattern) > MAX_PATTERN:
+            raise RPCError(Faults.BAD_ARGUMENTS,
+                           'pattern longer than %d characters' % MAX_PATTERN)
+        flags = re.IGNORECASE if options.get('ignore_case') else 0
+        try:
+            regex = re.compile(as_bytes(pattern), flags)
+        except re.error as e:
+            raise RPCError(Faults.BAD_ARGUMENTS, 'invalid pattern: %s' % e)
+
+        backups = 0
+        if options.get('backups', True):
+            backups = getattr(process.config, '%s_logfile_backups' % channel)
+
+        search = LogSearch(logfile, backups, regex, token,
+                           min(max_matches, MAX_MATCHES), max_bytes)
+        if search.start() is None:
+            raise RPCError(Faults.BUSY,
+                           'the %s log of %s is being searched' % (channel,
+                                                                   name))
+
+        deadline = time.time() + HARD_STOP
+
+        def onsearched():
+            if not search.done:
+                if time.time() < deadline:
+                    return NOT_DONE_YET
+                search.stop()
+                raise RPCError(Faults.FAILED,
+                               'gave up on searching the %s log of %s after '
+                               '%d seconds' % (channel, name, HARD_STOP))
+            if search.error is not None:
+                raise RPCError(Faults.FAILED, search.error)
+            result = search.result
+            for match in result['matches']:
+                # offsets in logs over 2 GB don't fit in an int
+                match['offset'] = capped_int(match['offset'])
+            return result
+
+        onsearched.delay = 0.05
+        onsearched.rpcinterface = self
+        return onsearched # deferred
 
     def _tailProcessLog(self, name, offset, length, channel):
         group, process = self._getGroupAndProcess(name)
@@ -810,6 +1242,68 @@ class SupervisorNamespaceRPCInterface:
         self._update('tailProcessStderrLog')
         return self._tailProcessLog(name, offset, length, 'stderr')
 
+    def _getOutputRing(self, name, channel):
+        group, process = self._getGroupAndProcess(name)
+
+        if process is None:
+            raise RPCError(Faults.BAD_NAME, name)
+
+        if channel not in ('stdout', 'stderr'):
+            raise RPCError(Faults.BAD_ARGUMENTS,
+                           'channel must be stdout or stderr')
+
+        ring = process.output_rings.get(channel)
+        if ring is None:
+            raise RPCError(Faults.FAILED,
+                           'no %s_ring_bytes for %s' % (channel, name))
+        return ring
+
+    def tailProcessOutput(self, name, channel, offset, length):
+        """
+        Tail the recent output of a channel of name that is kept in
+        memory (see the ``stdout_ring_bytes`` option), which works
+        without a log file.  Works like tailProcessStdoutLog(), except
+        that offsets count all the output of the channel since
+        supervisord started the process for the first time, and that
+        output that is no longer kept is skipped.  The offsets wrap
+        around at 2**31 to remain XML-RPC integers.
+
+        @param string name        the name of the process (or 'group:name')
+        @param string channel     'stdout' or 'stderr'
+        @param int offset         offset to start reading from
+        @param int length         maximum number of bytes to return
+        @return array result      [string bytes, int offset, bool overflow]
+        """
+        self._update('tailProcessOutput')
+
+        ring = self._getOutputRing(name, channel)
+        written = ring.written
+        # the offsets of the output that is kept are found from their
+        # last 31 bits
+        offset = written - ((written - int(offset)) & _OFFSET_MASK)
+        data, offset, overflow = ring.tail(offset, int(length))
+        return [as_string(data), offset & _OFFSET_MASK, overflow]
+
+    def readProcessOutputLines(self, name, channel, count):
+        """ Read the last count lines of the output of a channel of name
+        that is kept in memory (see the ``stdout_ring_bytes`` option).
+        A line whose start is no longer kept is left out, and the last
+        line may be cut short if it is still being written.
+
+        @param string name        the name of the process (or 'group:name')
+        @param string channel     'stdout' or 'stderr'
+        @param int count          the number of lines to read
+        @return string result     Bytes of output
+        """
+        self._update('readProcessOutputLines')
+
+        ring = self._getOutputRing(name, channel)
+
+        if count < 0:
+            raise RPCError(Faults.BAD_ARGUMENTS, 'count must be >= 0')
+
+        return as_string(ring.lines(int(count)))
+
     def clearProcessLogs(self, name):
         """ Clear the stdout and stderr logs for the named process and
         reopen them.
@@ -1036,6 +1530,11 @@ def isRunning(process):
 def isNotRunning(process):
     return not isRunning(process)
 
+def isStoppable(process):
+    if isRunning(process):
+        return True
+    return process.config.options.spawn_scheduler.is_queued(process)
+
 def isSignallable(process):
     if process.get_state() in SIGNALLABLE_STATES:
         return True
@@ -0,0 +1,166 @@
+import bisect
+
+from supervisor.compat import as_string
+from supervisor.states import ProcessStates
+from supervisor.states import SupervisorStates
+
+# the states from which Subprocess.spawn() may be called
+SPAWNABLE_STATES = (
+    ProcessStates.STOPPED,
+    ProcessStates.EXITED,
+    ProcessStates.BACKOFF,
+    ProcessStates.FATAL,
+    )
+
+class SpawnScheduler:
+    '''
+    Limits the number of processes that are starting at the same time.
+
+    A process takes a slot when it enters the STARTING state and frees
+    it when it leaves that state, i.e. once it is RUNNING or its start
+    failed.  If spawning a process would take more slots than allowed
+    by ``max_concurrent_spawns`` in the [supervisord] section, or by the
+    ``max_concurrent_spawns`` of the process' group, the spawn is queued
+    instead.  The main loop calls dispatch() once per iteration to spawn
+    queued processes, lowest priority first, as slots are freed.
+
+    A limit of 0 means no limit, and processes are then never queued.
+    '''
+
+    def __init__(self, options):
+        self.options = options
+        self.clear()
+
+    def clear(self):
+        self.queue = [] # (priority, seq, process) in the order to spawn
+        self.queued = {} # id(process) -> queue entry
+        # the process is kept in the values so that its id cannot be
+        # reused by another object while it is tracked here
+        self.starting = {} # id(process) -> (process, group name)
+        self.group_starting = {} # group name -> number of starting processes
+        self.seq = 0
+        self.max_queued = 0 # the longest the queue has been
+        self.dispatched = 0 # spawns that were queued before they were done
+        self.spawns = {} # spawn method -> {count, time, max_time}
+
+    def _group_name(self, process):
+        group = process.group
+        if group is None:
+            return None
+        return group.config.name
+
+    def has_slot(self, process):
+        limit = self.options.max_concurrent_spawns
+        if limit and len(self.starting) >= limit:
+            return False
+        group = process.group
+        if group is not None:
+            group_limit = group.config.max_concurrent_spawns
+            starting = self.group_starting.get(group.config.name, 0)
+            if group_limit and starting >= group_limit:
+                return False
+        return True
+
+    def request(self, process):
+        """ Return True if the process may be spawned right away.
+        Otherwise queue the spawn and return False. """
+        key = id(process)
+        if key in self.queued:
+            return False
+        # processes that are already queued are spawned first
+        if not self.queue and self.has_slot(process):
+            return True
+        self.seq += 1
+        entry = (process.config.priority, self.seq, process)
+        bisect.insort(self.queue, entry)
+        self.queued[key] = entry
+        self.max_queued = max(self.max_queued, len(self.queue))
+        self.options.logger.debug(
+            'queued spawn of %s (%s starting, %s queued)' % (
+            as_string(process.config.name), len(self.starting),
+            len(self.queue)))
+        return False
+
+    def is_queued(self, process):
+        return id(process) in self.queued
+
+    def cancel(self, process):
+        """ Remove the process from the queue.  Return True if it was
+        queued. """
+        entry = self.queued.pop(id(process), None)
+        if entry is None:
+            return False
+        self.queue.remove(entry)
+        return True
+
+    def state_changed(self, process, old_state, new_state):
+        """ Called by Subprocess.change_state() """
+        key = id(process)
+        if new_state == ProcessStates.STARTING:
+            self.cancel(process)
+            name = self._group_name(process)
+            self.starting[key] = (process, name)
+            self.group_starting[name] = self.group_starting.get(name, 0) + 1
+            return
+        if key in self.starting:
+            name = self.starting.pop(key)[1]
+            count = self.group_starting[name] - 1
+            if count:
+                self.group_starting[name] = count
+            else:
+                del self.group_starting[name]
+        # a queued process whose state changed in the meantime (e.g. it
+        # gave up) doesn't want to be spawned anymore
+        self.cancel(process)
+
+    def dispatch(self):
+        """ Spawn as many of the queued processes as there are free
+        slots for """
+        if not self.queue:
+            return
+        if self.options.mood < SupervisorStates.RUNNING:
+            # dont start any processes if supervisor is shutting down
+            return
+        limit = self.options.max_concurrent_spawns
+        for entry in self.queue[:]:
+            if limit and len(self.starting) >= limit:
+                break
+            process = entry[2]
+            if not self.has_slot(process):
+                # its group is full but processes of other groups may fit
+                continue
+            self.cancel(process)
+            if process.pid or process.state not in SPAWNABLE_STATES:
+                continue
+            self.dispatched += 1
+            process.spawn()
+
+    def record_spawn(self, method, elapsed):
+        """ Called by Subprocess.spawn() with the time it took to create
+        a child with the given method ('fork' or 'posix_spawn') """
+        stats = self.spawns.get(method)
+        if stats is None:
+            stats = self.spawns[method] = {'count': 0, 'time': 0.0,
+                                           'max_time': 0.0}
+        stats['count'] += 1
+        stats['time'] += elapsed
+        stats['max_time'] = max(stats['max_time'], elapsed)
+
+    def as_dict(self):
+        queue = []
+        for priority, seq, process in self.queue:
+            group_name = self._group_name(process)
+            queue.append({
+                'name': as_string(process.config.name),
+                'group': group_name is not None and as_string(group_name) or '',
+                'priority': priority,
+                })
+        return {
+            'max_concurrent_spawns': self.options.max_concurrent_spawns,
+            'starting': len(self.starting),
+            'queued': len(self.queue),
+            'max_queued': self.max_queued,
+            'dispatched': self.dispatched,
+            'queue': queue,
+            'spawns': dict([(k, v.copy()) for k, v in self.spawns.items()]),
+            }
@@ -545,6 +545,12 @@ class DefaultControllerPlugin(ControllerPluginBase):
                     output = supervisor.readProcessStderrLog(name,
                                                              -bytes, 0)
             except xmlrpclib.Fault as e:
+                if e.faultCode == xmlrpc.Faults.NO_FILE:
+                    output = self._tailOutputRing(supervisor, name, channel,
+                                                  bytes)
+                    if output is not None:
+                        self.ctl.output(output)
+                        return
                 self.ctl.exitstatus = LSBInitExitStatuses.GENERIC
                 template = '%s: ERROR (%s)'
                 if e.faultCode == xmlrpc.Faults.NO_FILE:
@@ -560,6 +566,15 @@ class DefaultControllerPlugin(ControllerPluginBase):
             else:
                 self.ctl.output(output)
 
+    def _tailOutputRing(self, supervisor, name, channel, bytes):
+        """ Return the last bytes of the output of a process without a
+        log file that is kept in memory, or None if it isn't """
+        try:
+            return supervisor.tailProcessOutput(name, channel, 0, bytes)[0]
+        except xmlrpclib.Fault:
+            # no stdout_ring_bytes, or a supervisord older than 4.4
+            return None
+
     def help_tail(self):
         self.ctl.output(
             "tail [-f] <name> [stdout|stderr] (default stdout)\n"
@@ -44,17 +44,150 @@ from supervisor.options import signame
 from supervisor import events
 from supervisor.states import SupervisorStates
 from supervisor.states import getProcessStateDescription
+from supervisor.metrics import ProcessSampler
+
+class ReapStats:
+    """ Counters kept by Supervisor.reap.  The lag of a batch is the time
+    between the SIGCHLD that announced the first exit and the moment the
+    batch was reaped. """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.batches = 0 # number of reap() calls that reaped something
+        self.reaped = 0 # children reaped, including unknown ones
+        self.unknown = 0 # reaped pids that weren't in the pid history
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.last_lag = 0
+        self.max_lag = 0
+        self.total_lag = 0
+        self.last_reap = 0 # time of the last batch
+
+    def record(self, size, unknown, lag, now):
+        self.batches += 1
+        self.reaped += size
+        self.unknown += unknown
+        self.last_batch_size = size
+        self.max_batch_size = max(self.max_batch_size, size)
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        self.total_lag += lag
+        self.last_reap = now
+
+    def as_dict(self):
+        if self.batches:
+            mean_lag = self.total_lag / self.batches
+        else:
+            mean_lag = 0
+        return {
+            'batches': self.batches,
+            'reaped': self.reaped,
+            'unknown': self.unknown,
+            'last_batch_size': self.last_batch_size,
+            'max_batch_size': self.max_batch_size,
+            'last_lag': self.last_lag,
+            'max_lag': self.max_lag,
+            'mean_lag': mean_lag,
+            'last_reap': self.last_reap,
+            }
+
+class LoopStats:
+    """ Counters kept by Supervisor.runforever.  Time spent waiting in
+    poll() is counted separately from the time spent doing work, and the
+    work time of each iteration is recorded in a latency histogram.  Read
+    and write events are counted per dispatcher class. """
+
+    # upper bounds (seconds) of the latency histogram buckets; the last
+    # bucket counts the iterations that took longer than the last bound
+    latency_buckets = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self, now=None):
+        if now is None:
+            now = time.time()
+        self.since = now
+        self.iterations = 0
+        self.poll_time = 0
+        self.work_time = 0
+        self.max_latency = 0
+        self.latency_counts = [0] * (len(self.latency_buckets) + 1)
+        self.dispatchers = {} # class name -> [reads, read time, writes, write time]
+
+    def record_iteration(self, poll_time, work_time):
+        self.iterations += 1
+        self.poll_time += poll_time
+        self.work_time += work_time
+        if work_time > self.max_latency:
+            self.max_latency = work_time
+        for i, bound in enumerate(self.latency_buckets):
+            if work_time <= bound:
+                break
+        else:
+            i = len(self.latency_buckets)
+        self.latency_counts[i] += 1
+
+    def _counters(self, dispatcher):
+        name = dispatcher.__class__.__name__
+        counters = self.dispatchers.get(name)
+        if counters is None:
+            counters = self.dispatchers[name] = [0, 0, 0, 0]
+        return counters
+
+    def record_read(self, dispatcher, elapsed):
+        counters = self._counters(dispatcher)
+        counters[0] += 1
+        counters[1] += elapsed
+        process = getattr(dispatcher, 'process', None)
+        if process is not None:
+            process.read_time += elapsed
+
+    def record_write(self, dispatcher, elapsed):
+        counters = self._counters(dispatcher)
+        counters[2] += 1
+        counters[3] += elapsed
+
+    def as_dict(self):
+        dispatchers = {}
+        for name, counters in self.dispatchers.items():
+            reads, read_time, writes, write_time = counters
+            dispatchers[name] = {
+                'read_events': reads,
+                'read_time': read_time,
+                'write_events': writes,
+                'write_time': write_time,
+                }
+        return {
+            'since': self.since,
+            'iterations': self.iterations,
+            'poll_time': self.poll_time,
+            'work_time': self.work_time,
+            'max_latency': self.max_latency,
+            'latency_buckets': list(self.latency_buckets),
+            'latency_counts': list(self.latency_counts),
+            'dispatchers': dispatchers,
+            }
 
 class Supervisor:
     stopping = False # set after we detect that we are handling a stop request
     lastshutdownreport = 0 # throttle for delayed process error reports at stop
     process_groups = None # map of process group name to process group object
     stop_groups = None # list used for priority ordered shutdown
+    transition_all = True # transition every group on the next iteration
+    lasttransition = 0 # time of the last transition pass, to detect rollback
+    lastmood = None # mood seen by the last main loop iteration
+    sorted_groups = None # cached priority-ordered list of process groups
 
     def __init__(self, options):
         self.options = options
         self.process_groups = {}
         self.ticks = {}
+        self.reap_stats = ReapStats()
+        self.loop_stats = LoopStats()
+        self.process_sampler = ProcessSampler(options)
 
     def main(self):
         if not self.options.first:
@@ -62,6 +195,8 @@ class Supervisor:
             # first request
             self.options.cleanup_fds()
 
+        self.options.make_poller()
+
         self.options.set_uid_or_exit()
 
         if self.options.first:
@@ -80,6 +215,7 @@ class Supervisor:
     def run(self):
         self.process_groups = {} # clear
         self.stop_groups = None # clear
+        self.options.spawn_scheduler.clear()
         events.clear()
         try:
             for config in self.options.process_group_configs:
@@ -115,6 +251,9 @@ class Supervisor:
         if name not in self.process_groups:
             config.after_setuid()
             self.process_groups[name] = config.make_group()
+            self.sorted_groups = None
+            # new processes may need to be autostarted
+            self.transition_all = True
             events.notify(events.ProcessGroupAddedEvent(name))
             return True
         return False
@@ -124,9 +263,19 @@ class Supervisor:
             return False
         self.process_groups[name].before_remove()
         del self.process_groups[name]
+        self.sorted_groups = None
         events.notify(events.ProcessGroupRemovedEvent(name))
         return True
 
+    def get_sorted_groups(self):
+        """ Return the process groups in priority order.  The list is only
+        rebuilt after a process group was added or removed. """
+        if self.sorted_groups is None:
+            pgroups = list(self.process_groups.values())
+            pgroups.sort()
+            self.sorted_groups = pgroups
+        return self.sorted_groups
+
     def get_process_map(self):
         process_map = {}
         for group in self.process_groups.values():
@@ -173,18 +322,25 @@ class Supervisor:
 
     def runforever(self):
         events.notify(events.SupervisorRunningEvent())
-        timeout = 1 # this cannot be fewer than the smallest TickEvent (5)
-        first_poll = True
+        # the poll timeout is the time until the earliest deadline.  signals
+        # wake up the poller through the signal wakeup pipe and the next
+        # tick is always scheduled, so this cap is only a safety net.
+        max_timeout = 5
 
         socket_map = self.options.get_socket_map()
+        registry = self.options.dispatcher_registry
+        timers = self.options.timers
+        spawn_scheduler = self.options.spawn_scheduler
+        stats = self.loop_stats
 
         while 1:
-            combined_map = {}
-            combined_map.update(socket_map)
-            combined_map.update(self.get_process_map())
+            started = time.time()
+            pgroups = self.get_sorted_groups()
 
-            pgroups = list(self.process_groups.values())
-            pgroups.sort()
+            if self.options.mood != self.lastmood:
+                # autostart and backoff decisions depend on the mood
+                self.lastmood = self.options.mood
+                self.transition_all = True
 
             if self.options.mood < SupervisorStates.RUNNING:
                 if not self.stopping:
@@ -201,36 +357,41 @@ class Supervisor:
                     # killing everything), it's OK to shutdown or reload
                     raise asyncore.ExitNow
 
-            for fd, dispatcher in combined_map.items():
-                if dispatcher.readable():
-                    self.options.poller.register_readable(fd)
-                if dispatcher.writable():
-                    self.options.poller.register_writable(fd)
+            # process dispatchers are kept in the registry as processes
+            # are spawned and reaped; only the dispatchers whose state
+            # may have changed and the (few) http channels are looked at
+            registry.update_sockets(socket_map)
+            registry.update_pending()
 
-            if first_poll:
-                # initial timeout of 0 avoids delaying supervisord startup
-                r, w = self.options.poller.poll(0)
-                first_poll = False
+            if self.transition_all:
+                # a timeout of 0 avoids delaying supervisord startup and
+                # processes in newly added groups
+                timeout = 0
             else:
-                r, w = self.options.poller.poll(timeout)
+                timeout = timers.timeout(time.time(), max_timeout)
+            poll_started = time.time()
+            r, w = self.options.poller.poll(timeout)
+            poll_time = time.time() - poll_started
 
             for fd in r:
-                if fd in combined_map:
+                dispatcher = registry.get(fd)
+                if dispatcher is not None:
                     try:
-                        dispatcher = combined_map[fd]
                         self.options.logger.blather(
                             'read event caused by %(dispatcher)r',
                             dispatcher=dispatcher)
+                        event_started = time.time()
                         dispatcher.handle_read_event()
-                        if not dispatcher.readable():
-                            self.options.poller.unregister_readable(fd)
                     except asyncore.ExitNow:
                         raise
                     except:
-                        combined_map[fd].handle_error()
+                        dispatcher.handle_error()
+                    stats.record_read(dispatcher, time.time() - event_started)
+                    registry.update(fd)
                 else:
-                    # if the fd is not in combined_map, we should unregister it. otherwise,
-                    # it will be polled every time, which may cause 100% cpu usage
+                    # if the fd is not in the registry, we should unregister
+                    # it. otherwise, it will be polled every time, which may
+                    # cause 100% cpu usage
                     self.options.logger.blather('unexpected read event from fd %r' % fd)
                     try:
                         self.options.poller.unregister_readable(fd)
@@ -238,19 +399,20 @@ class Supervisor:
                         pass
 
             for fd in w:
-                if fd in combined_map:
+                dispatcher = registry.get(fd)
+                if dispatcher is not None:
                     try:
-                        dispatcher = combined_map[fd]
                         self.options.logger.blather(
                             'write event caused by %(dispatcher)r',
                             dispatcher=dispatcher)
+                        event_started = time.time()
                         dispatcher.handle_write_event()
-                        if not dispatcher.writable():
-                            self.options.poller.unregister_writable(fd)
                     except asyncore.ExitNow:
                         raise
                     except:
-                        combined_map[fd].handle_error()
+                        dispatcher.handle_error()
+                    stats.record_write(dispatcher, time.time() - event_started)
+                    registry.update(fd)
                 else:
                     self.options.logger.blather('unexpected write event from fd %r' % fd)
                     try:
@@ -258,16 +420,48 @@ class Supervisor:
                     except:
                         pass
 
-            for group in pgroups:
-                group.transition()
-
+            # reap first so that a process which exited can be restarted
+            # in the same iteration as the SIGCHLD that woke us up
             self.reap()
+
+            now = time.time()
+            if now < self.lasttransition:
+                # the system clock moved backward, so the pending deadlines
+                # are too far in the future; let every process readjust
+                self.transition_all = True
+            self.lasttransition = now
+
+            if self.transition_all:
+                self.transition_all = False
+                # every process schedules its next deadline when it is
+                # transitioned.  this also drops deadlines left over from
+                # before a restart, which refer to old process objects.
+                timers.clear()
+                for group in pgroups:
+                    group.transition()
+                self.options.log_flushes.reschedule(now)
+                self.options.output_resumes.reschedule(now)
+            else:
+                # only processes whose deadlines expired or whose state
+                # changed since the last iteration have work to do
+                for callback in timers.pop_expired(now):
+                    callback()
+
+            # spawn the processes that are waiting for a process which
+            # was starting to become RUNNING or fail
+            spawn_scheduler.dispatch()
+
             self.handle_signal()
             self.tick()
+            self.process_sampler.run(pgroups, time.time())
+            self.options.log_archive.report()
 
             if self.options.mood < SupervisorStates.RUNNING:
                 self.ordered_stop_groups_phase_2()
 
+            work_time = time.time() - started - poll_time
+            stats.record_iteration(poll_time, max(work_time, 0))
+
             if self.options.test:
                 break
 
@@ -287,23 +481,44 @@ class Supervisor:
             if this_tick != last_tick:
                 self.ticks[period] = this_tick
                 events.notify(event(this_tick, self))
-
-    def reap(self, once=False, recursionguard=0):
-        if recursionguard == 100:
+        # make sure the main loop wakes up in time for the next tick
+        next_tick = min([timeslice(event.period, now) + event.period
+                         for event in events.TICK_EVENTS])
+        self.options.timers.schedule(next_tick, self)
+
+    def reap(self):
+        """ Reap every child that has exited, then finish the processes in
+        one batch.  Reaping is done in a loop rather than by recursion so
+        a mass exit of children is drained in a single main loop
+        iteration. """
+        # the SIGCHLD timestamp is taken before waitpid() so that a child
+        # which exits while we drain counts toward the next batch instead
+        exited = self.options.pop_sigchld_time()
+        batch = []
+        while True:
+            pid, sts = self.options.waitpid()
+            if not pid:
+                break
+            batch.append((pid, sts))
+        if not batch:
             return
-        pid, sts = self.options.waitpid()
-        if pid:
-            process = self.options.pidhistory.get(pid, None)
+        now = time.time()
+        if exited is None or exited > now:
+            # reaped without a SIGCHLD (e.g. seen through a pidfd) or the
+            # clock moved backward; we don't know how long it waited
+            lag = 0
+        else:
+            lag = now - exited
+        unknown = 0
+        for pid, sts in batch:
+            process = self.options.pidhistory.pop(pid, None)
             if process is None:
+                unknown += 1
                 _, msg = decode_wait_status(sts)
                 self.options.logger.info('reaped unknown pid %s (%s)' % (pid, msg))
             else:
                 process.finish(pid, sts)
-                del self.options.pidhistory[pid]
-            if not once:
-                # keep reaping until no more kids to reap, but don't recurse
-                # infinitely
-                self.reap(once=False, recursionguard=recursionguard+1)
+        self.reap_stats.record(len(batch), unknown, lag, now)
 
     def handle_signal(self):
         sig = self.options.get_signal()
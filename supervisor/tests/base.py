@@ -23,6 +23,8 @@ except ImportError: # pragma: no cover
 class DummyOptions:
     loglevel = 20
     minfds = 5
+    readfd_size = 2 << 16
+    epoll_edge_triggered = False
 
     chdir_exception = None
     fork_exception = None
@@ -49,6 +51,7 @@ class DummyOptions:
         self.mustreopen = False
         self.realizeargs = None
         self.fds_cleaned_up = False
+        self.poller_made = False
         self.rlimit_set = False
         self.setuid_called = False
         self.httpservers_opened = False
@@ -61,14 +64,25 @@ class DummyOptions:
         self.directory = None
         self.waitpid_return = None, None
         self.kills = {}
+        self.pidfd_kills = {}
+        self.pidfd_open_result = None
+        self.waitpid_pids = []
         self._signal = None
+        self.sigchld_time = None
         self.parent_pipes_closed = None
         self.child_pipes_closed = None
         self.forkpid = 0
+        self.spawn_method = 'fork'
+        self.metrics_interval = 0
+        self.childlog_compression = 'none'
+        self.childlog_budget = 0
+        self.posix_spawn_exception = None
+        self.posix_spawn_args = None
         self.pgrp_set = None
         self.duped = {}
         self.written = {}
         self.fds_closed = []
+        self.child_fds_closed = False
         self._exitcode = None
         self.execve_called = False
         self.execv_args = None
@@ -88,6 +102,19 @@ class DummyOptions:
         self.changed_directory = False
         self.umaskset = None
         self.poller = DummyPoller(self)
+        from supervisor.poller import DispatcherRegistry
+        self.dispatcher_registry = DispatcherRegistry(self.poller)
+        from supervisor.timers import TimerHeap
+        self.timers = TimerHeap()
+        self.max_concurrent_spawns = 0
+        from supervisor.scheduler import SpawnScheduler
+        self.spawn_scheduler = SpawnScheduler(self)
+        from supervisor.loggers import FlushSchedule
+        self.log_flushes = FlushSchedule(self.timers)
+        from supervisor.ratelimit import ResumeSchedule
+        self.output_resumes = ResumeSchedule(self.timers)
+        from supervisor.logarchive import LogArchive
+        self.log_archive = LogArchive(self)
         self.silent = False
 
     def getLogger(self, *args, **kw):
@@ -106,6 +133,9 @@ class DummyOptions:
     def cleanup_fds(self):
         self.fds_cleaned_up = True
 
+    def make_poller(self):
+        self.poller_made = True
+
     def set_rlimits_or_exit(self):
         self.rlimits_set = True
         self.parse_infos.append('rlimits_set')
@@ -126,6 +156,11 @@ class DummyOptions:
     def get_signal(self):
         return self._signal
 
+    def pop_sigchld_time(self):
+        when = self.sigchld_time
+        self.sigchld_time = None
+        return when
+
     def get_socket_map(self):
         return self.socket_map
 
@@ -144,14 +179,26 @@ class DummyOptions:
     def write_pidfile(self):
         self.pidfile_written = True
 
-    def waitpid(self):
-        return self.waitpid_return
+    def waitpid(self, pid=-1):
+        self.waitpid_pids.append(pid)
+        result = self.waitpid_return
+        # a child can only be reaped once
+        self.waitpid_return = None, None
+        return result
 
     def kill(self, pid, sig):
         if self.kill_exception is not None:
             raise self.kill_exception
         self.kills[pid] = sig
 
+    def pidfd_open(self, pid):
+        return self.pidfd_open_result
+
+    def pidfd_send_signal(self, pidfd, sig):
+        if self.kill_exception is not None:
+            raise self.kill_exception
+        self.pidfd_kills[pidfd] = sig
+
     def stat(self, filename):
         import os
         return os.stat(filename)
@@ -193,9 +240,22 @@ class DummyOptions:
             raise self.fork_exception
         return self.forkpid
 
+    def can_posix_spawn(self):
+        import os
+        return self.spawn_method == 'auto' and hasattr(os, 'posix_spawn')
+
+    def posix_spawn(self, filename, argv, env, file_actions):
+        if self.posix_spawn_exception is not None:
+            raise self.posix_spawn_exception
+        self.posix_spawn_args = (filename, argv, env, file_actions)
+        return self.forkpid
+
     def close_fd(self, fd):
         self.fds_closed.append(fd)
 
+    def close_child_fds(self):
+        self.child_fds_closed = True
+
     def close_parent_pipes(self, pipes):
         self.parent_pipes_closed = pipes
 
@@ -226,6 +286,12 @@ class DummyOptions:
     def readfd(self, fd):
         return self.readfd_result
 
+    def readfd_into(self, fd, buffer):
+        data = self.readfd(fd)[:len(buffer)]
+        if data:
+            buffer[:len(data)] = data
+        return len(data)
+
     def reopenlogs(self):
         self.logs_reopened = True
 
@@ -264,13 +330,16 @@ class DummyLogger:
         self.closed = False
         self.data = []
 
-    def info(self, msg, **kw):
+    def info(self, msg, newlines=None, **kw):
         if kw:
             msg = msg % kw
+        if isinstance(msg, memoryview):
+            # the data it views is overwritten by the next read
+            msg = msg.tobytes()
         self.data.append(msg)
     warn = debug = critical = trace = error = blather = info
 
-    def log(self, level, msg, **kw):
+    def log(self, level, msg, newlines=None, **kw):
         if kw:
             msg = msg % kw
         self.data.append(msg)
@@ -304,6 +373,11 @@ class DummySupervisor:
             self.process_groups = {}
         else:
             self.process_groups = process_groups
+        from supervisor.supervisord import LoopStats, ReapStats
+        self.reap_stats = ReapStats()
+        self.loop_stats = LoopStats()
+        from supervisor.metrics import ProcessSampler
+        self.process_sampler = ProcessSampler(self.options)
 
     def get_state(self):
         return self.options.mood
@@ -393,6 +467,11 @@ class DummyProcess(object):
     listener_state = None
     group = None
     sent_signal = None
+    bytes_read = 0
+    read_time = 0
+    output_throttled = False
+    throttled = 0
+    throttled_time = 0
 
     def __init__(self, config, state=None):
         self.config = config
@@ -416,12 +495,18 @@ class DummyProcess(object):
         self.pipes = {}
         self.rpipes = {}
         self.dispatchers = {}
+        self.output_rings = {}
         self.finished = None
         self.logs_reopened = False
         self.execv_arg_exception = None
         self.input_fd_drained = None
         self.output_fd_drained = None
         self.transitioned = False
+        self.scheduled_transitions = []
+
+    def output_read(self, size):
+        self.bytes_read += size
+        return True
 
     def reopenlogs(self):
         self.logs_reopened = True
@@ -434,6 +519,9 @@ class DummyProcess(object):
     def get_state(self):
         return self.state
 
+    def change_state(self, new_state, expected=True):
+        self.state = new_state
+
     def stop(self):
         self.stop_called = True
         self.killing = False
@@ -455,6 +543,12 @@ class DummyProcess(object):
         from supervisor.process import ProcessStates
         self.state = ProcessStates.RUNNING
 
+    def request_spawn(self):
+        if not self.config.options.spawn_scheduler.request(self):
+            return False
+        self.spawn()
+        return True
+
     def drain(self):
         self.drained = True
 
@@ -497,6 +591,9 @@ class DummyProcess(object):
     def transition(self):
         self.transitioned = True
 
+    def schedule_transition(self, when=None):
+        self.scheduled_transitions.append(when)
+
     def __eq__(self, other):
         return self.config.priority == other.config.priority
 
@@ -510,11 +607,16 @@ class DummyPConfig:
                  uid=None, stdout_logfile=None, stdout_capture_maxbytes=0,
                  stdout_events_enabled=False,
                  stdout_logfile_backups=0, stdout_logfile_maxbytes=0,
+                 stdout_logfile_buffer_size=0, stdout_logfile_flush_interval=1,
+                 stdout_logfile_index_bytes=0, stdout_ring_bytes=0,
                  stdout_syslog=False,
                  stderr_logfile=None, stderr_capture_maxbytes=0,
                  stderr_events_enabled=False,
                  stderr_logfile_backups=0, stderr_logfile_maxbytes=0,
+                 stderr_logfile_buffer_size=0, stderr_logfile_flush_interval=1,
+                 stderr_logfile_index_bytes=0, stderr_ring_bytes=0,
                  stderr_syslog=False,
+                 output_rate_limit=0, output_rate_burst=0,
                  redirect_stderr=False,
                  stopsignal=None, stopwaitsecs=10, stopasgroup=False, killasgroup=False,
                  exitcodes=(0,), environment=None, serverurl=None):
@@ -532,13 +634,23 @@ class DummyPConfig:
         self.stdout_events_enabled = stdout_events_enabled
         self.stdout_logfile_backups = stdout_logfile_backups
         self.stdout_logfile_maxbytes = stdout_logfile_maxbytes
+        self.stdout_logfile_buffer_size = stdout_logfile_buffer_size
+        self.stdout_logfile_flush_interval = stdout_logfile_flush_interval
+        self.stdout_logfile_index_bytes = stdout_logfile_index_bytes
+        self.stdout_ring_bytes = stdout_ring_bytes
         self.stdout_syslog = stdout_syslog
         self.stderr_logfile = stderr_logfile
         self.stderr_capture_maxbytes = stderr_capture_maxbytes
         self.stderr_events_enabled = stderr_events_enabled
         self.stderr_logfile_backups = stderr_logfile_backups
         self.stderr_logfile_maxbytes = stderr_logfile_maxbytes
+        self.stderr_logfile_buffer_size = stderr_logfile_buffer_size
+        self.stderr_logfile_flush_interval = stderr_logfile_flush_interval
+        self.stderr_logfile_index_bytes = stderr_logfile_index_bytes
+        self.stderr_ring_bytes = stderr_ring_bytes
         self.stderr_syslog = stderr_syslog
+        self.output_rate_limit = output_rate_limit
+        self.output_rate_burst = output_rate_burst
         self.redirect_stderr = redirect_stderr
         if stopsignal is None:
             import signal
@@ -553,6 +665,11 @@ class DummyPConfig:
         self.umask = umask
         self.autochildlogs_created = False
         self.serverurl = serverurl
+        self.clear_spawn_plan()
+
+    def clear_spawn_plan(self):
+        self.spawn_plan = None
+        self.spawn_environment = None
 
     def get_path(self):
         return ["/bin", "/usr/bin", "/usr/local/bin"]
@@ -761,11 +878,18 @@ class DummySupervisorRPCNamespace:
             raise Fault(xmlrpc.Faults.BAD_NAME, 'BAD_NAME')
         elif name == 'FAILED':
             raise Fault(xmlrpc.Faults.FAILED, 'FAILED')
-        elif name == 'NO_FILE':
+        elif name in ('NO_FILE', 'RING'):
             raise Fault(xmlrpc.Faults.NO_FILE, 'NO_FILE')
         a = (channel + ' line\n') * 10
         return a[offset:]
 
+    def tailProcessOutput(self, name, channel, offset, length):
+        from supervisor import xmlrpc
+        if name != 'RING':
+            raise Fault(xmlrpc.Faults.FAILED, 'FAILED')
+        a = (channel + ' output\n') * 10
+        return [a[-length:], len(a), False]
+
     def readProcessStdoutLog(self, name, offset, length):
         return self._read_log('stdout', name, offset, length)
     readProcessLog = readProcessStdoutLog
@@ -1007,10 +1131,12 @@ class DummySupervisorRPCNamespace:
             ]
 
 class DummyPGroupConfig:
-    def __init__(self, options, name='whatever', priority=999, pconfigs=None):
+    def __init__(self, options, name='whatever', priority=999, pconfigs=None,
+                 max_concurrent_spawns=0):
         self.options = options
         self.name = name
         self.priority = priority
+        self.max_concurrent_spawns = max_concurrent_spawns
         if pconfigs is None:
             pconfigs = []
         self.process_configs = pconfigs
@@ -1042,10 +1168,14 @@ class DummyProcessGroup(object):
         self.dispatchers = {}
         self.unstopped_processes = []
         self.before_remove_called = False
+        self.scheduled_transitions = []
 
     def transition(self):
         self.transitioned = True
 
+    def schedule_transition(self, process, when):
+        self.scheduled_transitions.append((process, when))
+
     def before_remove(self):
         self.before_remove_called = True
 
@@ -1104,7 +1234,9 @@ class DummyDispatcher:
     error_handled = False
     logs_reopened = False
     logs_removed = False
+    logs_flushed = False
     closed = False
+    edge_triggered = False
     flushed = False
 
     def __init__(self, readable=False, writable=False, error=False):
@@ -1120,6 +1252,9 @@ class DummyDispatcher:
             def removelogs():
                 self.logs_removed = True
             self.removelogs = removelogs
+            def flushlogs():
+                self.logs_flushed = True
+            self.flushlogs = flushlogs
 
     def readable(self):
         return self._readable
@@ -1179,15 +1314,35 @@ class DummyEvent:
         return 'dummy event'
 
 class DummyPoller:
+    resets = 0
+
     def __init__(self, options):
         self.result = [], []
         self.closed = False
+        self.readables = set()
+        self.writables = set()
+        self.edge_triggered = set()
 
     def register_readable(self, fd):
-        pass
+        self.readables.add(fd)
 
     def register_writable(self, fd):
-        pass
+        self.writables.add(fd)
+
+    def unregister_readable(self, fd):
+        self.readables.discard(fd)
+
+    def unregister_writable(self, fd):
+        self.writables.discard(fd)
+
+    def set_edge_triggered(self, fd, edge_triggered):
+        if edge_triggered:
+            self.edge_triggered.add(fd)
+        else:
+            self.edge_triggered.discard(fd)
+
+    def is_edge_triggered(self, fd):
+        return fd in self.edge_triggered
 
     def poll(self, timeout):
         return self.result
@@ -0,0 +1,169 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from supervisor.compat import StringIO
+
+class MicroTests(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_measure(self):
+        from supervisor.benchmarks.micro import measure
+        calls = []
+        result = measure(lambda: calls.append(1), 10, repeat=2)
+        self.assertEqual(len(calls), 20)
+        self.assertEqual(result['number'], 10)
+        self.assertEqual(result['repeat'], 2)
+        self.assertTrue(result['ops_per_sec'] > 0)
+        self.assertEqual(result['usec_per_op'],
+                         result['best'] / 10 * 1000000)
+
+    def test_run_selected(self):
+        from supervisor import events
+        from supervisor.benchmarks import micro
+        callbacks = events.callbacks[:]
+        lines = []
+        results = micro.run(self.tempdir, scale=0.0001,
+                            names=['record_output_events', 'notify'],
+                            report=lines.append)
+        self.assertEqual(sorted(results.keys()),
+                         ['notify', 'record_output_events'])
+        self.assertEqual(results['notify']['number'], 20)
+        self.assertEqual(len(lines), 2)
+        # benchmarks unsubscribe what they subscribed
+        self.assertEqual(events.callbacks, callbacks)
+        logfile = os.path.join(self.tempdir, 'record_output_events',
+                               'chatty_0.log')
+        self.assertTrue(os.path.getsize(logfile) > 0)
+
+    def test_spawn(self):
+        from supervisor.benchmarks.micro import bench_spawn
+        result = bench_spawn(self.tempdir, 2, minfds=64)
+        self.assertEqual(result['number'], 2)
+        self.assertTrue(result['best'] > 0)
+
+class SystemTests(unittest.TestCase):
+    def test_percentile(self):
+        from supervisor.benchmarks.system import percentile
+        values = list(range(101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([3, 1, 2], 1), 3)
+        self.assertEqual(percentile([], 0.5), None)
+
+    def test_latency_summary(self):
+        from supervisor.benchmarks.system import latency_summary
+        summary = latency_summary([1, 2, 3, 4])
+        self.assertEqual(summary['count'], 4)
+        self.assertEqual(summary['mean'], 2.5)
+        self.assertEqual(summary['max'], 4)
+
+    def test_cpu_time(self):
+        from supervisor.benchmarks.system import cpu_time
+        if not os.path.exists('/proc/self/stat'):
+            return
+        self.assertTrue(cpu_time(os.getpid()) >= 0)
+
+    def test_cpu_time_no_such_process(self):
+        from supervisor.benchmarks.system import cpu_time
+        self.assertEqual(cpu_time(-1), None)
+
+    def test_make_config(self):
+        from supervisor.benchmarks.system import make_config
+        config = make_config('/tmp/bench', programs=3, chatty=2, rate=0.5,
+                             events=True, listeners=4)
+        self.assertTrue('[program:idle]\n' in config)
+        self.assertTrue('numprocs=3\n' in config)
+        self.assertTrue('chatty.py 0.5 100\n' in config)
+        self.assertTrue('stdout_events_enabled=true\n' in config)
+        self.assertTrue('[eventlistener:listeners]\n' in config)
+        self.assertTrue('file=/tmp/bench/supervisor.sock\n' in config)
+        self.assertTrue('spawn_method=auto\n' in config)
+
+    def test_make_config_spawn_method(self):
+        from supervisor.benchmarks.system import make_config
+        config = make_config('/tmp/bench', programs=1, spawn_method='fork')
+        self.assertTrue('spawn_method=fork\n' in config)
+
+    def test_make_config_idle_only(self):
+        from supervisor.benchmarks.system import make_config
+        config = make_config('/tmp/bench', programs=3)
+        self.assertFalse('[program:chatty]' in config)
+        self.assertFalse('[eventlistener:listeners]' in config)
+
+class RunnerTests(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.stdout = sys.stdout
+        sys.stdout = StringIO()
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+        shutil.rmtree(self.tempdir)
+
+    def test_flatten_skips_metadata_and_non_numbers(self):
+        from supervisor.benchmarks.runner import flatten
+        results = {'metadata': {'time': 1},
+                   'micro': {'notify': {'best': 0.5, 'number': 10}},
+                   'system': {'rpc': {'getState': {'p50': 0.1},
+                                      'flag': True,
+                                      'buckets': [1, 2]}}}
+        self.assertEqual(flatten(results), {'micro.notify.best': 0.5,
+                                            'micro.notify.number': 10,
+                                            'system.rpc.getState.p50': 0.1})
+
+    def test_compare(self):
+        from supervisor.benchmarks.runner import compare
+        old = {'micro': {'a': 2.0, 'b': 0, 'c': 1}}
+        new = {'micro': {'a': 3.0, 'b': 1, 'd': 1}}
+        self.assertEqual(compare(old, new), [('micro.a', 2.0, 3.0, 0.5),
+                                             ('micro.b', 0, 1, None)])
+
+    def test_main_compare(self):
+        from supervisor.benchmarks.runner import main
+        filenames = []
+        for value in (2.0, 3.0):
+            filename = os.path.join(self.tempdir, '%s.json' % value)
+            with open(filename, 'w') as f:
+                json.dump({'micro': {'notify': {'best': value}}}, f)
+            filenames.append(filename)
+        main(['compare'] + filenames)
+        output = sys.stdout.getvalue()
+        self.assertTrue(output.startswith('micro.notify.best'))
+        self.assertTrue('+50.0%' in output)
+
+    def test_main_writes_json(self):
+        from supervisor.benchmarks.runner import main
+        filename = os.path.join(self.tempdir, 'results.json')
+        main(['-b', 'notify', '-s', '0.0001', '-o', filename, 'micro'])
+        with open(filename) as f:
+            results = json.load(f)
+        self.assertEqual(list(results['micro'].keys()), ['notify'])
+        self.assertFalse('system' in results)
+        self.assertTrue(results['metadata']['supervisor_version'])
+        self.assertTrue('results written to' in sys.stdout.getvalue())
+
+    def test_main_options_after_suite(self):
+        from supervisor.benchmarks.runner import main
+        filename = os.path.join(self.tempdir, 'results.json')
+        main(['micro', '-b', 'notify', '-s', '0.0001', '-o', filename])
+        with open(filename) as f:
+            results = json.load(f)
+        self.assertEqual(list(results['micro'].keys()), ['notify'])
+
+    def test_main_unknown_suite(self):
+        from supervisor.benchmarks.runner import main
+        stderr = sys.stderr
+        sys.stderr = StringIO()
+        try:
+            self.assertRaises(SystemExit, main, ['macro'])
+            self.assertTrue("unknown suite 'macro'" in sys.stderr.getvalue())
+        finally:
+            sys.stderr = stderr
@@ -793,3 +793,55 @@ class ProfileOptionsTests(unittest.TestCase):
         sort_options, callers = self._callFUT('cumulative, callers')
         self.assertEqual(['cumulative'], sort_options)
         self.assertTrue(callers)
+
+class EventLoopTests(unittest.TestCase):
+    def _callFUT(self, arg):
+        return datatypes.event_loop(arg)
+
+    def test_native(self):
+        self.assertEqual(self._callFUT('native'), 'native')
+
+    def test_asyncio_is_case_insensitive(self):
+        self.assertEqual(self._callFUT('AsyncIO'), 'asyncio')
+
+    def test_raises_for_bad_value(self):
+        try:
+            self._callFUT('twisted')
+            self.fail()
+        except ValueError as e:
+            self.assertEqual(e.args[0], "invalid 'event_loop' value 'twisted'")
+
+class LogCompressionTests(unittest.TestCase):
+    def _callFUT(self, arg):
+        return datatypes.log_compression(arg)
+
+    def test_none(self):
+        self.assertEqual(self._callFUT('none'), 'none')
+
+    def test_is_case_insensitive(self):
+        self.assertEqual(self._callFUT('Zstd'), 'zstd')
+
+    def test_raises_for_bad_value(self):
+        try:
+            self._callFUT('bzip2')
+            self.fail()
+        except ValueError as e:
+            self.assertEqual(e.args[0],
+                             "invalid 'childlog_compression' value 'bzip2'")
+
+class SpawnMethodTests(unittest.TestCase):
+    def _callFUT(self, arg):
+        return datatypes.spawn_method(arg)
+
+    def test_auto(self):
+        self.assertEqual(self._callFUT('auto'), 'auto')
+
+    def test_fork_is_case_insensitive(self):
+        self.assertEqual(self._callFUT('Fork'), 'fork')
+
+    def test_raises_for_bad_value(self):
+        try:
+            self._callFUT('vfork')
+            self.fail()
+        except ValueError as e:
+            self.assertEqual(e.args[0], "invalid 'spawn_method' value 'vfork'")
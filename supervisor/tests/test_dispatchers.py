@@ -1,8 +1,11 @@
 import unittest
 import os
+import shutil
+import tempfile
 
 from supervisor.compat import as_bytes
 
+from supervisor.tests.base import mock
 from supervisor.tests.base import DummyOptions
 from supervisor.tests.base import DummyProcess
 from supervisor.tests.base import DummyPConfig
@@ -37,6 +40,163 @@ class PDispatcherTests(unittest.TestCase):
         inst = self._makeOne()
         self.assertEqual(inst.flush(), None)
 
+class OutputBufferTests(unittest.TestCase):
+    def _makeOne(self, maxsize=16):
+        from supervisor.dispatchers import OutputBuffer
+        buffer = OutputBuffer(maxsize)
+        buffer.initial_readsize = 4
+        buffer.readsize = 4
+        return buffer
+
+    def _read(self, buffer, data):
+        space = buffer.reserve()
+        space[:len(data)] = data
+        buffer.commit(len(data))
+        return space
+
+    def test_reserve_and_commit(self):
+        buffer = self._makeOne()
+        space = self._read(buffer, b'ab')
+        self.assertEqual(len(space), 4)
+        self.assertEqual(len(buffer), 2)
+        self.assertEqual(buffer.getvalue(), b'ab')
+
+    def test_commit_full_read_doubles_readsize(self):
+        buffer = self._makeOne()
+        self._read(buffer, b'abcd')
+        self.assertEqual(buffer.readsize, 8)
+        self._read(buffer, b'efgh')
+        self.assertEqual(buffer.readsize, 8)
+        self._read(buffer, b'ijklmnop')
+        self._read(buffer, b'q' * 16)
+        self.assertEqual(buffer.readsize, 16)
+        self.assertEqual(buffer.getvalue(), b'abcdefghijklmnop' + b'q' * 16)
+
+    def test_take_returns_view_and_resets_when_empty(self):
+        buffer = self._makeOne()
+        self._read(buffer, b'abc')
+        view = buffer.take(2)
+        self.assertTrue(isinstance(view, memoryview))
+        self.assertEqual(view.tobytes(), b'ab')
+        self.assertEqual((buffer.start, buffer.end), (2, 3))
+        self.assertEqual(buffer.take(1).tobytes(), b'c')
+        self.assertEqual((buffer.start, buffer.end), (0, 0))
+
+    def test_reserve_moves_pending_data_to_front(self):
+        buffer = self._makeOne()
+        self._read(buffer, b'abcd')
+        self._read(buffer, b'efgh')
+        buffer.take(7)
+        storage = buffer.buf
+        space = buffer.reserve()
+        self.assertTrue(buffer.buf is storage)
+        self.assertEqual(len(space), 8)
+        self.assertEqual((buffer.start, buffer.end), (0, 1))
+        self.assertEqual(buffer.getvalue(), b'h')
+
+    def test_reserve_grows_storage_with_views_alive(self):
+        buffer = self._makeOne()
+        self._read(buffer, b'abcd')
+        view = buffer.take(2)
+        space = buffer.reserve()
+        self.assertEqual(len(space), 8)
+        self.assertEqual(view.tobytes(), b'ab')
+        self.assertEqual(buffer.getvalue(), b'cd')
+
+    def test_find(self):
+        buffer = self._makeOne()
+        buffer.append(b'xxabcab')
+        buffer.take(2)
+        self.assertEqual(buffer.find(b'ab'), 0)
+        self.assertEqual(buffer.find(b'ca'), 2)
+        self.assertEqual(buffer.find(b'xx'), -1)
+
+    def test_prefix_at_end(self):
+        buffer = self._makeOne()
+        buffer.append(b'abc<!--XS')
+        self.assertEqual(buffer.prefix_at_end(b'<!--XSUPERVISOR'), 6)
+        self.assertEqual(buffer.prefix_at_end(b'SUPERVISOR'), 1)
+        self.assertEqual(buffer.prefix_at_end(b'<!--'), 0)
+        buffer.take(len(buffer))
+        self.assertEqual(buffer.prefix_at_end(b'<!--'), 0)
+
+    def test_append(self):
+        buffer = self._makeOne()
+        buffer.append(b'a' * 40)
+        self.assertEqual(buffer.getvalue(), b'a' * 40)
+        buffer.clear()
+        self.assertEqual(len(buffer), 0)
+
+class OutputRingTests(unittest.TestCase):
+    def _makeOne(self, maxbytes=8):
+        from supervisor.dispatchers import OutputRing
+        return OutputRing(maxbytes)
+
+    def test_write_grows(self):
+        ring = self._makeOne()
+        ring.write(b'abc')
+        ring.write(memoryview(b'de'))
+        self.assertEqual(len(ring), 5)
+        self.assertEqual(ring.read(), b'abcde')
+        self.assertEqual(ring.first(), 0)
+
+    def test_write_wraps_around(self):
+        ring = self._makeOne()
+        ring.write(b'abcdef')
+        ring.write(b'ghij')
+        self.assertEqual(len(ring), 8)
+        self.assertEqual(ring.written, 10)
+        self.assertEqual(ring.first(), 2)
+        self.assertEqual(ring.read(), b'cdefghij')
+        ring.write(b'klmnopq')
+        self.assertEqual(ring.read(), b'jklmnopq')
+
+    def test_write_more_than_maxbytes(self):
+        ring = self._makeOne()
+        ring.write(b'ab')
+        ring.write(b'0123456789')
+        self.assertEqual(ring.written, 12)
+        self.assertEqual(ring.read(), b'23456789')
+
+    def test_read_range(self):
+        ring = self._makeOne()
+        ring.write(b'abcdefghij')
+        self.assertEqual(ring.read(4, 7), b'efg')
+        self.assertEqual(ring.read(7, 100), b'hij')
+        # no longer kept
+        self.assertEqual(ring.read(0, 4), b'cd')
+        self.assertEqual(ring.read(10), b'')
+
+    def test_tail(self):
+        ring = self._makeOne()
+        ring.write(b'abcdefghij')
+        self.assertEqual(ring.tail(0, 3), [b'hij', 10, True])
+        self.assertEqual(ring.tail(8, 2), [b'ij', 10, False])
+        self.assertEqual(ring.tail(10, 100), [b'', 10, False])
+        # as much as is kept
+        self.assertEqual(ring.tail(8, 100), [b'cdefghij', 10, False])
+
+    def test_lines(self):
+        ring = self._makeOne(maxbytes=14)
+        ring.write(b'one\ntwo\nthree\n')
+        self.assertEqual(ring.lines(2), b'two\nthree\n')
+        self.assertEqual(ring.lines(10), b'one\ntwo\nthree\n')
+        self.assertEqual(ring.lines(0), b'')
+        ring.write(b'fo')
+        # "one" is cut, the last line isn't finished
+        self.assertEqual(ring.lines(10), b'two\nthree\nfo')
+        self.assertEqual(ring.lines(1), b'fo')
+
+    def test_clear(self):
+        ring = self._makeOne()
+        ring.write(b'abcdefghij')
+        ring.clear()
+        self.assertEqual(ring.read(), b'')
+        self.assertEqual(ring.written, 10)
+        ring.write(b'kl')
+        self.assertEqual(ring.read(), b'kl')
+        self.assertEqual(ring.tail(0, 100), [b'kl', 12, False])
+
 class POutputDispatcherTests(unittest.TestCase):
     def setUp(self):
         from supervisor.events import clear
@@ -80,6 +240,14 @@ class POutputDispatcherTests(unittest.TestCase):
         dispatcher.closed = True
         self.assertEqual(dispatcher.readable(), False)
 
+    def test_readable_throttled(self):
+        options = DummyOptions()
+        config = DummyPConfig(options, 'process1', '/bin/process1')
+        process = DummyProcess(config)
+        dispatcher = self._makeOne(process)
+        process.output_throttled = True
+        self.assertEqual(dispatcher.readable(), False)
+
     def test_handle_write_event(self):
         options = DummyOptions()
         config = DummyPConfig(options, 'process1', '/bin/process1')
@@ -96,6 +264,89 @@ class POutputDispatcherTests(unittest.TestCase):
         dispatcher = self._makeOne(process)
         self.assertEqual(dispatcher.handle_read_event(), None)
         self.assertEqual(dispatcher.output_buffer, b'abc')
+        self.assertEqual(process.bytes_read, 3)
+
+    def test_handle_read_event_drains_fd_until_short_read(self):
+        options = DummyOptions()
+        options.readfd_size = 3
+        results = [b'abc', b'def', b'gh', b'ijk']
+        options.readfd = lambda fd: results.pop(0)
+        config = DummyPConfig(options, 'process1', '/bin/process1',
+                              stdout_capture_maxbytes=100)
+        process = DummyProcess(config)
+        dispatcher = self._makeOne(process)
+        options.poller.set_edge_triggered(dispatcher.fd, True)
+        self.assertEqual(dispatcher.handle_read_event(), None)
+        self.assertEqual(dispatcher.output_buffer, b'abcdefgh')
+        self.assertEqual(process.bytes_read, 8)
+        self.assertEqual(results, [b'ijk'])
+        self.assertFalse(dispatcher.closed)
+
+    def test_handle_read_event_level_triggered_reads_once(self):
+        options = DummyOptions()
+        options.readfd_size = 3
+        results = [b'abc', b'def']
+        options.readfd = lambda fd: results.pop(0)
+        config = DummyPConfig(options, 'process1', '/bin/process1',
+                              stdout_capture_maxbytes=100)
+        process = DummyProcess(config)
+        dispatcher = self._makeOne(process)
+        self.assertEqual(dispatcher.handle_read_event(), None)
+        self.assertEqual(dispatcher.output_buffer, b'abc')
+        self.assertEqual(results, [b'def'])
+
+    def test_handle_read_event_stops_draining_when_throttled(self):
+        options = DummyOptions()
+        options.readfd_size = 3
+        results = [b'abc', b'def', b'ghi']
+        options.readfd = lambda fd: results.pop(0)
+        config = DummyPConfig(options, 'process1', '/bin/process1',
+                              stdout_capture_maxbytes=100)
+        process = DummyProcess(config)
+        sizes = []
+        def output_read(size):
+            sizes.append(size)
+            return len(sizes) < 2
+        process.output_read = output_read
+        dispatcher = self._makeOne(process)
+        options.poller.set_edge_triggered(dispatcher.fd, True)
+        self.assertEqual(dispatcher.handle_read_event(), None)
+        self.assertEqual(dispatcher.output_buffer, b'abcdef')
+        self.assertEqual(sizes, [3, 3])
+        self.assertEqual(results, [b'ghi'])
+        self.assertFalse(dispatcher.closed)
+
+    def test_handle_read_event_grows_reads(self):
+        options = DummyOptions()
+        options.readfd_size = 8
+        results = [b'abcd', b'efghijkl', b'mnopqrst', b'u']
+        options.readfd = lambda fd: results.pop(0)
+        config = DummyPConfig(options, 'process1', '/bin/process1',
+                              stdout_logfile='/tmp/foo')
+        process = DummyProcess(config)
+        dispatcher = self._makeOne(process)
+        options.poller.set_edge_triggered(dispatcher.fd, True)
+        dispatcher.buffer.readsize = 4
+        self.assertEqual(dispatcher.handle_read_event(), None)
+        self.assertEqual(results, [])
+        self.assertEqual(dispatcher.buffer.readsize, 8)
+        self.assertEqual(dispatcher.childlog.data,
+                         [b'abcd', b'efghijkl', b'mnopqrst', b'u'])
+        self.assertEqual(process.bytes_read, 21)
+
+    def test_handle_read_event_empty_read_while_draining_does_not_close(self):
+        options = DummyOptions()
+        options.readfd_size = 3
+        results = [b'abc', b'']
+        options.readfd = lambda fd: results.pop(0)
+        config = DummyPConfig(options, 'process1', '/bin/process1',
+                              stdout_capture_maxbytes=100)
+        process = DummyProcess(config)
+        dispatcher = self._makeOne(process)
+        options.poller.set_edge_triggered(dispatcher.fd, True)
+        self.assertEqual(dispatcher.handle_read_event(), None)
+        self.assertEqual(dispatcher.output_buffer, b'abc')
+        self.assertFalse(dispatcher.closed)
 
     def test_handle_read_event_no_data_closes(self):
         options = DummyOptions()
@@ -166,6 +417,53 @@ class POutputDispatcherTests(unittest.TestCase):
         self.assertEqual(dispatcher.childlog.handlers[0].reopened, True)
         self.assertEqual(dispatcher.normallog.handlers[0].reopened, True)
 
+    def test_flushlogs(self):
+        options = DummyOptions()
+        config = DummyPConfig(options, 'process1', '/bin/process1',
+                              stdout_logfile='/tmp/foo')
+        process = DummyProcess(config)
+        dispatcher = self._makeOne(process)
+        dispatcher.flushlogs()
+        self.assertEqual(dispatcher.normallog.handlers[0].flushed, True)
+
+    def test_flushlogs_no_logfile(self):
+        options = DummyOptions()
+        config = DummyPConfig(options, 'process1', '/bin/process1')
+        process = DummyProcess(config)
+        dispatcher = self._makeOne(process)
+        self.assertEqual(dispatcher.normallog, None)
+        dispatcher.flushlogs() # doesn't raise
+
+    def test_ctor_logfile_written_behind(self):
+        options = DummyOptions()
+        config = DummyPConfig(options, 'process1', '/bin/process1',
+                              stdout_logfile='/tmp/foo',
+                              stdout_logfile_buffer_size=65536,
+                              stdout_logfile_flush_interval=3)
+        process = DummyProcess(config)
+        from supervisor import loggers
+        calls = []
+        with mock.patch.object(loggers, 'handle_file',
+                               lambda *args, **kw: calls.append(kw)):
+            self._makeOne(process)
+        self.assertEqual(calls[0]['buffer_size'], 65536)
+        self.assertEqual(calls[0]['flush_interval'], 3)
+        self.assertTrue(calls[0]['flushes'] is options.log_flushes)
+        self.assertTrue(calls[0]['archive'] is options.log_archive)
+
+    def test_ctor_logfile_indexed(self):
+        options = DummyOptions()
+        config = DummyPConfig(options, 'process1', '/bin/process1',
+                              stdout_logfile='/tmp/foo',
+                              stdout_logfile_index_bytes=65536)
+        process = DummyProcess(config)
+        from supervisor import loggers
+        calls = []
+        with mock.patch.object(loggers, 'handle_file',
+                               lambda *args, **kw: calls.append(kw)):
+            self._makeOne(process)
+        self.assertEqual(calls[0]['index_every'], 65536)
+
     def test_record_output_log_non_capturemode(self):
         # stdout/stderr goes to the process log and the main log,
         # in non-capturemode, the data length doesn't matter
@@ -178,11 +476,28 @@ class POutputDispatcherTests(unittest.TestCase):
         dispatcher = self._makeOne(process)
         dispatcher.output_buffer = 'a'
         dispatcher.record_output()
-        self.assertEqual(dispatcher.childlog.data, ['a'])
+        self.assertEqual(dispatcher.childlog.data, [b'a'])
         self.assertEqual(options.logger.data[0],
              "'process1' stdout output:\na")
         self.assertEqual(dispatcher.output_buffer, b'')
 
+    def test_record_output_writes_ring(self):
+        from supervisor.dispatchers import OutputRing
+        options = DummyOptions()
+        config = DummyPConfig(options, 'process1', '/bin/process1',
+                              stdout_capture_maxbytes=100)
+        process = DummyProcess(config)
+        ring = process.output_rings['stdout'] = OutputRing(100)
+        dispatcher = self._makeOne(process)
+        self.assertTrue(dispatcher.ring is ring)
+        self.assertEqual(dispatcher._get_splice_handler(), None)
+        after = b'after' * 10 # longer than a token
+        dispatcher.output_buffer = (b'before<!--XSUPERVISOR:BEGIN-->captured'
+                                    b'<!--XSUPERVISOR:END-->' + after)
+        dispatcher.record_output()
+        # the captured output isn't part of the output of the channel
+        self.assertEqual(ring.read(), b'before' + after)
+
     def test_record_output_emits_stdout_event_when_enabled(self):
         options = DummyOptions()
         config = DummyPConfig(options, 'process1', '/bin/process1',
@@ -289,7 +604,7 @@ class POutputDispatcherTests(unittest.TestCase):
         dispatcher.output_buffer = 'a'
         dispatcher.record_output()
         self.assertEqual(dispatcher.childlog.data, [])
-        self.assertEqual(dispatcher.output_buffer, 'a')
+        self.assertEqual(dispatcher.output_buffer, b'a')
 
     def test_stdout_capturemode_single_buffer(self):
         # mike reported that comm events that took place within a single
@@ -405,6 +720,207 @@ class POutputDispatcherTests(unittest.TestCase):
             except (OSError, IOError):
                 pass
 
+    def test_stdout_capturemode_many_events_in_one_buffer(self):
+        from supervisor.events import ProcessCommunicationEvent
+        from supervisor.events import subscribe
+        events = []
+        subscribe(ProcessCommunicationEvent, events.append)
+        BEGIN_TOKEN = ProcessCommunicationEvent.BEGIN_TOKEN
+        END_TOKEN = ProcessCommunicationEvent.END_TOKEN
+        # more events than the recursion limit would have allowed
+        data = (b'x' + BEGIN_TOKEN + b'hello' + END_TOKEN) * 2000 + b'y'
+        options = DummyOptions()
+        from supervisor.loggers import getLogger
+        options.getLogger = getLogger # actually use real logger
+        config = DummyPConfig(options, 'process1', '/bin/process1',
+                              stdout_capture_maxbytes=1000)
+        process = DummyProcess(config)
+        dispatcher = self._makeOne(process)
+        dispatcher.output_buffer = data
+        dispatcher.record_output()
+        self.assertEqual(len(events), 2000)
+        self.assertEqual(set([e.data for e in events]), set([b'hello']))
+        self.assertEqual(dispatcher.capturemode, False)
+        self.assertEqual(dispatcher.output_buffer, b'y')
+
+    def test_record_output_hands_view_to_childlog(self):
+        options = DummyOptions()
+        config = DummyPConfig(options, 'process1', '/bin/process1',
+                              stdout_logfile='/tmp/foo')
+        process = DummyProcess(config)
+        dispatcher = self._makeOne(process)
+        received = []
+        def info(data, newlines=None):
+            received.append((data, newlines))
+        dispatcher.childlog.info = info
+        dispatcher.output_buffer = b'hello'
+        dispatcher.record_output()
+        self.assertEqual(len(received), 1)
+        self.assertTrue(isinstance(received[0][0], memoryview))
+        self.assertEqual(received[0][0].tobytes(), b'hello')
+        # only counted for an indexed log
+        self.assertEqual(received[0][1], None)
+
+    def test_record_output_counts_newlines_of_indexed_log(self):
+        options = DummyOptions()
+        config = DummyPConfig(options, 'process1', '/bin/process1',
+                              stdout_logfile='/tmp/foo',
+                              stdout_logfile_index_bytes=1024)
+        process = DummyProcess(config)
+        dispatcher = self._makeOne(process)
+        self.assertTrue(dispatcher.indexed)
+        received = []
+        def info(data, newlines=None):
+            received.append((data.tobytes(), newlines))
+        dispatcher.childlog.info = info
+        dispatcher.buffer.append(b'skipped\n')
+        dispatcher.buffer.take(8)
+        dispatcher.output_buffer = b'a\nb\nc'
+        dispatcher.record_output()
+        self.assertEqual(received, [(b'a\nb\nc', 2)])
+
+    def test_record_output_copies_view_for_events(self):
+        from supervisor.events import ProcessLogStdoutEvent
+        from supervisor.events import subscribe
+        events = []
+        subscribe(ProcessLogStdoutEvent, events.append)
+        options = DummyOptions()
+        config = DummyPConfig(options, 'process1', '/bin/process1',
+                              stdout_logfile='/tmp/foo',
+                              stdout_events_enabled=True)
+        process = DummyProcess(config)
+        dispatcher = self._makeOne(process)
+        dispatcher.output_buffer = b'hello'
+        dispatcher.record_output()
+        dispatcher.output_buffer = b'world'
+        dispatcher.record_output()
+        self.assertEqual([e.data for e in events], [b'hello', b'world'])
+
+    def _makeSpliceDispatcher(self, tempdir, **kw):
+        from supervisor.loggers import getLogger
+        options = DummyOptions()
+        options.getLogger = getLogger # actually use real logger
+        logfile = os.path.join(tempdir, 'out.log')
+        config = DummyPConfig(options, 'process1', '/bin/process1',
+                              stdout_logfile=logfile, **kw)
+        process = DummyProcess(config)
+        return self._makeOne(process), logfile
+
+    def test_splice_handler_for_plain_logfile(self):
+        from supervisor import loggers
+        tempdir = tempfile.mkdtemp()
+        try:
+            dispatcher, logfile = self._makeSpliceDispatcher(tempdir)
+            if loggers.splice is None:
+                self.assertEqual(dispatcher.splice_handler, None)
+            else:
+                self.assertTrue(dispatcher.splice_handler is
+                                dispatcher.normallog.handlers[0])
+            dispatcher.normallog.close()
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_no_splice_handler_if_output_goes_elsewhere(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            for kw in ({'stdout_events_enabled': True},
+                       {'stdout_capture_maxbytes': 100},
+                       {'stdout_syslog': True},
+                       {'stdout_logfile_buffer_size': 1024}):
+                dispatcher, logfile = self._makeSpliceDispatcher(tempdir, **kw)
+                self.assertEqual(dispatcher.splice_handler, None)
+                dispatcher.normallog.close()
+            dispatcher, logfile = self._makeSpliceDispatcher(tempdir)
+            dispatcher.process.config.options.strip_ansi = True
+            self.assertEqual(dispatcher._get_splice_handler(), None)
+            dispatcher.log_to_mainlog = True
+            dispatcher.process.config.options.strip_ansi = False
+            self.assertEqual(dispatcher._get_splice_handler(), None)
+            dispatcher.normallog.close()
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_handle_read_event_splices(self):
+        from supervisor import loggers
+        if loggers.splice is None:
+            return
+        tempdir = tempfile.mkdtemp()
+        r, w = os.pipe()
+        try:
+            dispatcher, logfile = self._makeSpliceDispatcher(tempdir)
+            dispatcher.fd = r
+            options = dispatcher.process.config.options
+            options.readfd_size = 4
+            options.poller.set_edge_triggered(r, True)
+            os.write(w, b'hello world\n')
+            self.assertEqual(dispatcher.handle_read_event(), None)
+            self.assertEqual(dispatcher.process.bytes_read, 12)
+            self.assertFalse(dispatcher.closed)
+            with open(logfile, 'rb') as f:
+                self.assertEqual(f.read(), b'hello world\n')
+            os.close(w)
+            w = None
+            dispatcher.handle_read_event()
+            self.assertTrue(dispatcher.closed)
+            dispatcher.normallog.close()
+        finally:
+            os.close(r)
+            if w is not None:
+                os.close(w)
+            shutil.rmtree(tempdir)
+
+    def test_handle_read_event_stops_splicing_when_throttled(self):
+        from supervisor import loggers
+        if loggers.splice is None:
+            return
+        tempdir = tempfile.mkdtemp()
+        r, w = os.pipe()
+        try:
+            dispatcher, logfile = self._makeSpliceDispatcher(tempdir)
+            dispatcher.fd = r
+            options = dispatcher.process.config.options
+            options.readfd_size = 4
+            sizes = []
+            def output_read(size):
+                sizes.append(size)
+                return False
+            dispatcher.process.output_read = output_read
+            os.write(w, b'hello world\n')
+            dispatcher.handle_read_event()
+            self.assertEqual(sizes, [4])
+            self.assertEqual(os.path.getsize(logfile), 4)
+            dispatcher.normallog.close()
+        finally:
+            os.close(r)
+            os.close(w)
+            shutil.rmtree(tempdir)
+
+    def test_handle_read_event_reads_if_splice_fails(self):
+        import errno
+        from supervisor import loggers
+        if loggers.splice is None:
+            return
+        tempdir = tempfile.mkdtemp()
+        try:
+            dispatcher, logfile = self._makeSpliceDispatcher(tempdir)
+            handler = dispatcher.splice_handler
+            def splice(fd, count):
+                raise OSError(errno.EINVAL, 'nope')
+            handler.splice = splice
+            options = dispatcher.process.config.options
+            options.readfd_result = b'hello\n'
+            dispatcher.handle_read_event()
+            self.assertEqual(dispatcher.splice_handler, None)
+            self.assertFalse(dispatcher.closed)
+            self.assertTrue(options.logger.data[0].startswith(
+                'cannot splice output of'))
+            handler.flush()
+            with open(logfile, 'rb') as f:
+                self.assertEqual(f.read(), b'hello\n')
+            dispatcher.normallog.close()
+        finally:
+            shutil.rmtree(tempdir)
+
     def test_strip_ansi(self):
         options = DummyOptions()
         options.strip_ansi = True
@@ -832,6 +1348,7 @@ class PEventListenerDispatcherTests(unittest.TestCase):
         self.assertEqual(options.logger.data[0],
                          'process1: ACKNOWLEDGED -> READY')
         self.assertEqual(process.listener_state, EventListenerStates.READY)
+        self.assertEqual(process.scheduled_transitions, [None])
 
     def test_handle_listener_state_change_acknowledged_gobbles(self):
         options = DummyOptions()
@@ -1144,6 +1661,15 @@ class PEventListenerDispatcherTests(unittest.TestCase):
         dispatcher.reopenlogs()
         self.assertEqual(dispatcher.childlog.handlers[0].reopened, True)
 
+    def test_flushlogs(self):
+        options = DummyOptions()
+        config = DummyPConfig(options, 'process1', '/bin/process1',
+                              stdout_logfile='/tmp/foo')
+        process = DummyProcess(config)
+        dispatcher = self._makeOne(process)
+        dispatcher.flushlogs()
+        self.assertEqual(dispatcher.childlog.handlers[0].flushed, True)
+
     def test_strip_ansi(self):
         options = DummyOptions()
         options.strip_ansi = True
@@ -1210,6 +1736,36 @@ class PEventListenerDispatcherTests(unittest.TestCase):
         self.assertEqual(dispatcher.closed, True)
 
 
+class PPidfdDispatcherTests(unittest.TestCase):
+    def _getTargetClass(self):
+        from supervisor.dispatchers import PPidfdDispatcher
+        return PPidfdDispatcher
+
+    def _makeOne(self, process):
+        return self._getTargetClass()(process, 9, 123)
+
+    def test_readable_writable(self):
+        options = DummyOptions()
+        config = DummyPConfig(options, 'process1', '/bin/process1')
+        process = DummyProcess(config)
+        dispatcher = self._makeOne(process)
+        self.assertTrue(dispatcher.readable())
+        self.assertFalse(dispatcher.writable())
+        dispatcher.close()
+        self.assertFalse(dispatcher.readable())
+
+    def test_handle_read_event_leaves_reaping_to_supervisord(self):
+        options = DummyOptions()
+        options.waitpid_return = 123, 1
+        config = DummyPConfig(options, 'process1', '/bin/process1')
+        process = DummyProcess(config)
+        dispatcher = self._makeOne(process)
+        dispatcher.handle_read_event()
+        self.assertEqual(options.waitpid_pids, [])
+        self.assertEqual(process.finished, None)
+        self.assertTrue(dispatcher.closed)
+        self.assertFalse(dispatcher.readable())
+
 class stripEscapeTests(unittest.TestCase):
     def _callFUT(self, s):
         from supervisor.dispatchers import stripEscapes
@@ -242,6 +242,13 @@ class TestEventTypes(unittest.TestCase):
         self.assertEqual(inst.when, 1)
         self.assertEqual(inst.supervisord, 2)
 
+    def test_ProcessOutputThrottledEvent_attributes(self):
+        from supervisor.events import ProcessOutputThrottledEvent
+        inst = ProcessOutputThrottledEvent(1, 2, 3)
+        self.assertEqual(inst.process, 1)
+        self.assertEqual(inst.pid, 2)
+        self.assertEqual(inst.until, 3)
+
     def test_ProcessGroupAddedEvent_attributes(self):
         from supervisor.events import ProcessGroupAddedEvent
         inst = ProcessGroupAddedEvent('myprocess')
@@ -336,6 +343,20 @@ class TestSerializations(unittest.TestCase):
         self.assertEqual(headers['type'], 'foo', headers)
         self.assertEqual(payload, 'bar')
 
+    def test_process_output_throttled_event(self):
+        options = DummyOptions()
+        pconfig1 = DummyPConfig(options, 'process1', 'process1','/bin/process1',
+                                output_rate_limit=100)
+        process1 = DummyProcess(pconfig1)
+        from supervisor.events import ProcessOutputThrottledEvent
+        event = ProcessOutputThrottledEvent(process1, 1, 1000.5)
+        headers, payload = self._deserialize(event.payload())
+        self.assertEqual(headers, {'processname': 'process1',
+                                   'groupname': '', 'pid': '1',
+                                   'rate': '100', 'burst': '100',
+                                   'until': '1000.5'})
+        self.assertEqual(payload, '')
+
     def test_process_group_added_event(self):
         from supervisor.events import ProcessGroupAddedEvent
         event = ProcessGroupAddedEvent('foo')
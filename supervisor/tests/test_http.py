@@ -73,6 +73,26 @@ class LogtailHandlerTests(HandlerTests, unittest.TestCase):
             self.assertEqual(len(request.producers), 1)
             self.assertEqual(request._done, True)
 
+    def test_handle_request_output_ring(self):
+        from supervisor.dispatchers import OutputRing
+        from supervisor.http import output_ring_producer
+        options = DummyOptions()
+        pconfig = DummyPConfig(options, 'foo', 'foo')
+        supervisord = PopulatedDummySupervisor(options, 'foo', pconfig)
+        process = supervisord.process_groups['foo'].processes['foo']
+        process.output_rings['stderr'] = OutputRing(100)
+        handler = self._makeOne(supervisord)
+        request = DummyRequest('/logtail/foo/stderr', None, None, None)
+        handler.handle_request(request)
+        self.assertEqual(request._error, None)
+        self.assertFalse('Last-Modified' in request.headers)
+        self.assertEqual(request.headers['Content-Type'],
+                         'text/plain;charset=utf-8')
+        self.assertEqual(len(request.producers), 1)
+        self.assertTrue(isinstance(request.producers[0],
+                                   output_ring_producer))
+        self.assertEqual(request._done, True)
+
 class MainLogTailHandlerTests(HandlerTests, unittest.TestCase):
     def _getTargetClass(self):
         from supervisor.http import mainlogtail_handler
@@ -138,6 +158,17 @@ class TailFProducerTests(unittest.TestCase):
         result = producer.more()
         self.assertEqual(result, '==> File truncated <==\n')
 
+    def test_handle_more_one_chunk_at_a_time(self):
+        from supervisor.logreader import CHUNK_SIZE
+        request = DummyRequest('/logtail/foo', None, None, None)
+        f = tempfile.NamedTemporaryFile()
+        producer = self._makeOne(request, f.name, 80)
+        f.write(b'a' * CHUNK_SIZE + b'b' * 10)
+        f.flush()
+        self.assertEqual(producer.more(), b'a' * CHUNK_SIZE)
+        self.assertEqual(producer.more(), b'b' * 10)
+        f.close()
+
     def test_handle_more_fd_closed(self):
         request = DummyRequest('/logtail/foo', None, None, None)
         with tempfile.NamedTemporaryFile() as f:
@@ -185,6 +216,40 @@ class TailFProducerTests(unittest.TestCase):
         finally:
              os.unlink(f.name)
 
+class OutputRingProducerTests(unittest.TestCase):
+    def _makeOne(self, ring, head):
+        from supervisor.http import output_ring_producer
+        request = DummyRequest('/logtail/foo', None, None, None)
+        return output_ring_producer(request, ring, head)
+
+    def _makeRing(self, maxbytes=100):
+        from supervisor.dispatchers import OutputRing
+        return OutputRing(maxbytes)
+
+    def test_handle_more(self):
+        from supervisor import http
+        ring = self._makeRing()
+        ring.write(b'a' * 80)
+        producer = self._makeOne(ring, 10)
+        self.assertEqual(producer.more(), b'a' * 10)
+        self.assertEqual(producer.more(), http.NOT_DONE_YET)
+        ring.write(b'b' * 5)
+        self.assertEqual(producer.more(), b'b' * 5)
+
+    def test_handle_more_skips_output_no_longer_kept(self):
+        ring = self._makeRing(maxbytes=10)
+        producer = self._makeOne(ring, 10)
+        ring.write(b'0123456789abc')
+        self.assertEqual(producer.more(), b'3456789abc')
+
+    def test_handle_more_one_chunk_at_a_time(self):
+        from supervisor.logreader import CHUNK_SIZE
+        ring = self._makeRing(maxbytes=CHUNK_SIZE * 2)
+        producer = self._makeOne(ring, 0)
+        ring.write(b'a' * CHUNK_SIZE + b'b' * 10)
+        self.assertEqual(producer.more(), b'a' * CHUNK_SIZE)
+        self.assertEqual(producer.more(), b'b' * 10)
+
 class DeferringChunkedProducerTests(unittest.TestCase):
     def _getTargetClass(self):
         from supervisor.http import deferring_chunked_producer
@@ -477,6 +542,17 @@ class DeferringHttpChannelTests(unittest.TestCase):
         self.assertTrue(channel.writable(now=later))
         self.assertEqual(channel.last_writable_check, later)
 
+    def test_writable_with_delay_schedules_wakeup_when_not_writable(self):
+        from supervisor.timers import TimerHeap
+        class DummyServer:
+            timers = TimerHeap()
+        channel = self._getTargetClass()(server=DummyServer(), conn=None,
+                                         addr=None)
+        channel.delay = 2
+        channel.last_writable_check = _NOW
+        self.assertFalse(channel.writable(now=_NOW + 1))
+        self.assertEqual(DummyServer.timers.next_deadline(), _NOW + 2)
+
 _NOW = 1470085990
 
 class EncryptedDictionaryAuthorizedTests(unittest.TestCase):
@@ -0,0 +1,197 @@
+"""Test suite for supervisor.logarchive"""
+
+import gzip
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from supervisor.tests.base import DummyLogger
+from supervisor.tests.base import DummyOptions
+
+class SegmentNameTests(unittest.TestCase):
+    def test_segment_name(self):
+        from supervisor.logarchive import segment_name
+        now = time.mktime((2024, 1, 31, 12, 34, 56, 0, 0, -1))
+        self.assertEqual(segment_name('/tmp/app.log', now + 0.5),
+                         '/tmp/app.log.20240131-123456.500000')
+
+class LogArchiveTests(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'app.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _makeOne(self, compression='gzip', budget=0):
+        from supervisor.logarchive import LogArchive
+        options = DummyOptions()
+        options.childlogdir = self.tempdir
+        options.childlog_compression = compression
+        options.childlog_budget = budget
+        options.logger = DummyLogger()
+        return LogArchive(options)
+
+    def _makeSegment(self, rotated, data=b'hello\n', filename=None):
+        from supervisor.logarchive import segment_name
+        path = segment_name(filename or self.filename, rotated)
+        with open(path, 'wb') as f:
+            f.write(data)
+        os.utime(path, (rotated, rotated))
+        return path
+
+    def test_enabled(self):
+        self.assertFalse(self._makeOne('none').enabled())
+        self.assertTrue(self._makeOne('gzip').enabled())
+        self.assertTrue(self._makeOne('none', budget=1024).enabled())
+
+    def test_segments_oldest_first(self):
+        archive = self._makeOne()
+        newer = self._makeSegment(2000)
+        older = self._makeSegment(1000)
+        self._makeSegment(1500, filename=self.filename + '2')
+        with open(self.filename + '.1', 'wb') as f:
+            f.write(b'classic backup')
+        self.assertEqual(archive.segments(self.filename), [older, newer])
+
+    def test_segments_no_directory(self):
+        archive = self._makeOne()
+        self.assertEqual(archive.segments('/nonexistent/app.log'), [])
+
+    def test_archive_compresses(self):
+        archive = self._makeOne()
+        path = self._makeSegment(1000)
+        archive.archive(self.filename, 10)
+        self.assertFalse(os.path.exists(path))
+        with gzip.open(path + '.gz', 'rb') as f:
+            self.assertEqual(f.read(), b'hello\n')
+        # the segment keeps the time of the rotation
+        self.assertEqual(os.stat(path + '.gz').st_mtime, 1000)
+        self.assertEqual(archive.messages.popleft(),
+                         ('debug', 'compressed %s' % path))
+
+    def test_archive_compresses_zstd(self):
+        from supervisor.logarchive import implements_zstd
+        if not implements_zstd():
+            return
+        from supervisor.logarchive import zstd
+        archive = self._makeOne('zstd')
+        path = self._makeSegment(1000)
+        archive.archive(self.filename, 10)
+        with zstd.open(path + '.zst', 'rb') as f:
+            self.assertEqual(f.read(), b'hello\n')
+
+    def test_archive_removes_oldest_beyond_backups(self):
+        archive = self._makeOne('none')
+        paths = [self._makeSegment(rotated) for rotated in (1000, 2000, 3000)]
+        archive.archive(self.filename, 2)
+        self.assertEqual(archive.segments(self.filename), paths[1:])
+
+    def test_archive_removes_index_with_segment(self):
+        archive = self._makeOne()
+        old = self._makeSegment(1000)
+        new = self._makeSegment(2000)
+        for path in (old, new):
+            with open(path + '.idx', 'wb') as f:
+                f.write(b'0.000000 0 0\n')
+        archive.archive(self.filename, 1)
+        self.assertEqual(sorted(os.listdir(self.tempdir)),
+                         [os.path.basename(new) + '.gz',
+                          os.path.basename(new) + '.idx'])
+
+    def test_archive_redoes_compression_cut_short(self):
+        archive = self._makeOne()
+        path = self._makeSegment(1000)
+        with open(path + '.gz.tmp', 'wb') as f:
+            f.write(b'partial')
+        archive.archive(self.filename, 10)
+        self.assertEqual(os.listdir(self.tempdir),
+                         [os.path.basename(path) + '.gz'])
+
+    def test_compress_failure_leaves_segment(self):
+        archive = self._makeOne()
+        path = self._makeSegment(1000)
+        os.chmod(path, 0)
+        if os.access(path, os.R_OK): # running as root
+            return
+        self.assertRaises(IOError, archive.compress, path, 'gzip')
+        self.assertEqual(os.listdir(self.tempdir), [os.path.basename(path)])
+
+    def test_apply_budget(self):
+        archive = self._makeOne('none', budget=25)
+        other = os.path.join(self.tempdir, 'other.log')
+        oldest = self._makeSegment(1000, b'a' * 10)
+        old = self._makeSegment(2000, b'b' * 10, filename=other)
+        new = self._makeSegment(3000, b'c' * 10)
+        with open(self.filename, 'wb') as f:
+            f.write(b'not a segment' * 10)
+        archive.apply_budget()
+        self.assertFalse(os.path.exists(oldest))
+        self.assertTrue(os.path.exists(old))
+        self.assertTrue(os.path.exists(new))
+        self.assertTrue(os.path.exists(self.filename))
+        level, message = archive.messages.popleft()
+        self.assertEqual(level, 'info')
+        self.assertTrue(message.startswith('removed %s' % oldest))
+
+    def test_apply_budget_disabled(self):
+        archive = self._makeOne('none')
+        path = self._makeSegment(1000, b'a' * 10)
+        archive.apply_budget()
+        self.assertTrue(os.path.exists(path))
+
+    def test_add_archives_in_the_background(self):
+        archive = self._makeOne()
+        path = self._makeSegment(1000)
+        archive.add(self.filename, 10)
+        archive.wait()
+        self.assertTrue(os.path.exists(path + '.gz'))
+        self.assertEqual(archive.worker, None)
+        self.assertEqual(len(archive.jobs), 0)
+
+    def test_add_once_per_file(self):
+        archive = self._makeOne()
+        archive._start_worker = lambda: 'worker'
+        archive.add(self.filename, 10)
+        archive.add(self.filename, 10)
+        self.assertEqual(list(archive.jobs), [(self.filename, 10)])
+        self.assertEqual(archive.worker, 'worker')
+
+    def test_work_reports_failures(self):
+        archive = self._makeOne()
+        def archive_fails(filename, backups):
+            raise OSError('disk on fire')
+        archive.archive = archive_fails
+        archive.jobs.append((self.filename, 10))
+        archive.work()
+        self.assertEqual(archive.messages.popleft(),
+                         ('warn', 'failed to archive %s: disk on fire' %
+                          self.filename))
+
+    def test_report(self):
+        archive = self._makeOne()
+        archive.messages.append(('info', 'removed foo'))
+        archive.messages.append(('warn', 'failed to archive bar'))
+        archive.report()
+        logger = archive.options.logger
+        self.assertEqual(logger.data, ['removed foo', 'failed to archive bar'])
+        self.assertEqual(len(archive.messages), 0)
+
+    def test_wait_no_worker(self):
+        archive = self._makeOne()
+        self.assertTrue(archive.wait())
+        self.assertEqual(archive.worker, None)
+
+    def test_wait_times_out(self):
+        import threading
+        archive = self._makeOne()
+        busy = threading.Event()
+        archive.archive = lambda filename, backups: busy.wait()
+        archive.add(self.filename, 10)
+        try:
+            self.assertFalse(archive.wait(0.01))
+        finally:
+            busy.set()
+        self.assertTrue(archive.wait())
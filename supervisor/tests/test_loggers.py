@@ -123,6 +123,22 @@ class BareHandlerTests(HandlerTests, unittest.TestCase):
         self.assertEqual(stream.flushed, False)
         self.assertEqual(stream.written, b'')
 
+    def test_emit_formats_with_fmt(self):
+        stream = StringIO()
+        inst = self._makeOne(stream=stream)
+        inst.setFormat('[%(levelname)s] %(message)s\n')
+        inst.emit(self._makeLogRecord(b'foo'))
+        self.assertEqual(stream.getvalue(), '[INFO] foo\n')
+
+    def test_emit_formats_with_fmt_set_directly(self):
+        stream = StringIO()
+        inst = self._makeOne(stream=stream)
+        inst.setFormat('[%(levelname)s] %(message)s\n')
+        inst.fmt = '%(message)s!\n'
+        inst.emit(self._makeLogRecord(b'foo'))
+        self.assertEqual(stream.getvalue(), 'foo!\n')
+        self.assertEqual(inst.formatter.fmt, '%(message)s!\n')
+
 class FileHandlerTests(HandlerTests, unittest.TestCase):
     def _getTargetClass(self):
         from supervisor.loggers import FileHandler
@@ -205,6 +221,189 @@ class FileHandlerTests(HandlerTests, unittest.TestCase):
         with open(self.filename, 'rb') as f:
             self.assertEqual(f.read(), b'fi\xc3\xad')
 
+    def test_emit_memoryview(self):
+        handler = self._makeOne(self.filename)
+        data = bytearray(b'hello! there')
+        record = self._makeLogRecord(memoryview(data)[:6])
+        handler.emit(record)
+        handler.close()
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), b'hello!')
+
+    def _writePipe(self, data):
+        r, w = os.pipe()
+        os.write(w, data)
+        os.close(w)
+        return r
+
+    def test_splice(self):
+        from supervisor import loggers
+        if loggers.splice is None:
+            return
+        handler = self._makeOne(self.filename)
+        handler.emit(self._makeLogRecord(b'first\n'))
+        r = self._writePipe(b'hello\nworld\n')
+        try:
+            self.assertTrue(handler.can_splice())
+            self.assertEqual(handler.splice(r, 6), 6)
+            self.assertEqual(handler.splice(r, 100), 6)
+            self.assertEqual(handler.splice(r, 100), 0)
+        finally:
+            os.close(r)
+        handler.emit(self._makeLogRecord(b'last\n'))
+        handler.close()
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), b'first\nhello\nworld\nlast\n')
+
+    def test_splice_to_replaced_file_raises(self):
+        from supervisor import loggers
+        if loggers.splice is None:
+            return
+        handler = self._makeOne(self.filename)
+        os.remove(self.filename)
+        with open(self.filename, 'wb'):
+            pass
+        r = self._writePipe(b'hello')
+        try:
+            self.assertRaises(OSError, handler.splice, r, 100)
+        finally:
+            os.close(r)
+            handler.close()
+
+    def test_close_closes_splice_fd(self):
+        from supervisor import loggers
+        if loggers.splice is None:
+            return
+        handler = self._makeOne(self.filename)
+        r = self._writePipe(b'hello')
+        try:
+            handler.splice(r, 100)
+        finally:
+            os.close(r)
+        fd = handler.splice_fd
+        self.assertTrue(fd is not None)
+        handler.close()
+        self.assertEqual(handler.splice_fd, None)
+        self.assertRaises(OSError, os.fstat, fd)
+        self.assertFalse(handler.can_splice())
+
+    def test_cannot_splice_when_written_behind(self):
+        handler = self._makeOne(self.filename, buffer_size=1024)
+        self.assertFalse(handler.can_splice())
+        handler.close()
+
+    def test_cannot_splice_when_indexed(self):
+        handler = self._makeOne(self.filename, index_every=1024)
+        self.assertFalse(handler.can_splice())
+        handler.close()
+
+    def test_emit_writes_index(self):
+        from supervisor.logindex import read_checkpoints
+        with mock.patch('time.time', return_value=100):
+            handler = self._makeOne(self.filename, index_every=4)
+            handler.emit(self._makeLogRecord(b'ab\n'))
+            handler.emit(self._makeLogRecord(b'cd\n'))
+            handler.emit(self._makeLogRecord(b'ef\n'))
+        handler.close()
+        self.assertEqual(read_checkpoints(self.filename + '.idx'),
+                         [(100, 0, 0), (100, 6, 2)])
+        self.assertEqual(handler.index.lines, 3)
+
+    def test_emit_counted_newlines_to_index(self):
+        handler = self._makeOne(self.filename, index_every=4)
+        record = self._makeLogRecord(memoryview(b'ab\ncd\n'))
+        # counted by the dispatcher, which knows where the view is
+        record.newlines = 5
+        handler.emit(record)
+        handler.close()
+        self.assertEqual(handler.index.lines, 5)
+
+    def test_remove_removes_index(self):
+        handler = self._makeOne(self.filename, index_every=4)
+        handler.remove()
+        self.assertFalse(os.path.exists(self.filename + '.idx'))
+        handler.reopen()
+        handler.close()
+        self.assertTrue(os.path.exists(self.filename + '.idx'))
+
+    def test_emit_counts_size(self):
+        with open(self.filename, 'wb') as f:
+            f.write(b'abc')
+        handler = self._makeOne(self.filename)
+        self.assertEqual(handler.size, 3)
+        handler.emit(self._makeLogRecord(b'hello!'))
+        self.assertEqual(handler.size, 9)
+        handler.close()
+
+    def test_emit_writes_behind(self):
+        from supervisor.loggers import FlushSchedule
+        from supervisor.timers import TimerHeap
+        flushes = FlushSchedule(TimerHeap())
+        handler = self._makeOne(self.filename, buffer_size=1024,
+                                flush_interval=1, flushes=flushes)
+        handler.emit(self._makeLogRecord(b'hello!'))
+        self.assertEqual(os.path.getsize(self.filename), 0)
+        self.assertEqual(handler.size, 6)
+        self.assertEqual(len(flushes), 1)
+        handler.flush()
+        self.assertEqual(os.path.getsize(self.filename), 6)
+        self.assertEqual(len(flushes), 0)
+        handler.close()
+
+    def test_emit_writes_behind_until_buffer_is_full(self):
+        handler = self._makeOne(self.filename, buffer_size=8)
+        handler.emit(self._makeLogRecord(b'hello'))
+        self.assertEqual(os.path.getsize(self.filename), 0)
+        handler.emit(self._makeLogRecord(b'world'))
+        self.assertTrue(os.path.getsize(self.filename) >= 5)
+        handler.close()
+        self.assertEqual(os.path.getsize(self.filename), 10)
+
+    def test_emit_writes_behind_without_flush_interval(self):
+        from supervisor.loggers import FlushSchedule
+        from supervisor.timers import TimerHeap
+        flushes = FlushSchedule(TimerHeap())
+        handler = self._makeOne(self.filename, buffer_size=1024,
+                                flush_interval=0, flushes=flushes)
+        handler.emit(self._makeLogRecord(b'hello!'))
+        self.assertEqual(len(flushes), 0)
+        handler.close()
+
+    def test_close_discards_from_flushes(self):
+        from supervisor.loggers import FlushSchedule
+        from supervisor.timers import TimerHeap
+        flushes = FlushSchedule(TimerHeap())
+        handler = self._makeOne(self.filename, buffer_size=1024,
+                                flush_interval=1, flushes=flushes)
+        handler.emit(self._makeLogRecord(b'hello!'))
+        handler.close()
+        self.assertEqual(len(flushes), 0)
+        self.assertEqual(os.path.getsize(self.filename), 6)
+
+    def test_reopen_flushes(self):
+        handler = self._makeOne(self.filename, buffer_size=1024)
+        handler.emit(self._makeLogRecord(b'hello!'))
+        handler.reopen()
+        self.assertEqual(os.path.getsize(self.filename), 6)
+        self.assertEqual(handler.size, 6)
+        handler.close()
+
+    def test_splice_flushes_records_written_behind(self):
+        from supervisor import loggers
+        if loggers.splice is None:
+            return
+        handler = self._makeOne(self.filename, buffer_size=1024)
+        handler.emit(self._makeLogRecord(b'hello '))
+        r = self._writePipe(b'world')
+        try:
+            handler.splice(r, 100)
+        finally:
+            os.close(r)
+        self.assertEqual(handler.size, 11)
+        handler.close()
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), b'hello world')
+
     def test_emit_error(self):
         handler = self._makeOne(self.filename)
         handler.stream.close()
@@ -237,6 +436,15 @@ class StdoutTests(StdoutTestsBase):
         self.assertEqual(handler.stream.name, '/dev/stdout')
         handler.close()
 
+    def test_ctor_with_dev_stdout_not_indexed(self):
+        import stat
+        if stat.S_ISREG(os.stat('/dev/stdout').st_mode):
+            # the test runner redirected it to a file
+            return
+        handler = self._makeOne('/dev/stdout', index_every=1024)
+        self.assertEqual(handler.index, None)
+        handler.close()
+
 class RotatingFileHandlerTests(FileHandlerTests):
 
     def _getTargetClass(self):
@@ -292,6 +500,129 @@ class RotatingFileHandlerTests(FileHandlerTests):
         with open(self.filename+'.2', 'rb') as f:
             self.assertEqual(f.read(), b'a' * 12)
 
+    def _makeArchive(self, compression='none', budget=0):
+        from supervisor.logarchive import LogArchive
+        from supervisor.tests.base import DummyOptions
+        options = DummyOptions()
+        options.childlog_compression = compression
+        options.childlog_budget = budget
+        archive = LogArchive(options)
+        archive.add = lambda filename, backups: archive.jobs.append(
+            (filename, backups))
+        return archive
+
+    def test_emit_does_rollover_to_archive(self):
+        archive = self._makeArchive('gzip')
+        handler = self._makeOne(self.filename, maxBytes=10, backupCount=2,
+                                archive=archive)
+        renamed = []
+        handler._rename = lambda src, tgt: renamed.append((src, tgt)) or (
+            os.rename(src, tgt))
+        with mock.patch('time.time', return_value=1000.5):
+            handler.emit(self._makeLogRecord(b'a' * 12))
+        handler.emit(self._makeLogRecord(b'b' * 4))
+        handler.close()
+        from supervisor.logarchive import segment_name
+        segment = segment_name(self.filename, 1000.5)
+        # a single rename, the rest is left to the archive
+        self.assertEqual(renamed, [(self.filename, segment)])
+        self.assertEqual(list(archive.jobs), [(self.filename, 2)])
+        with open(segment, 'rb') as f:
+            self.assertEqual(f.read(), b'a' * 12)
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), b'b' * 4)
+        self.assertFalse(os.path.exists(self.filename + '.1'))
+
+    def test_emit_does_rollover_active_log_removed(self):
+        archive = self._makeArchive(budget=1024)
+        handler = self._makeOne(self.filename, maxBytes=10, backupCount=2,
+                                archive=archive)
+        os.remove(self.filename)
+        handler.emit(self._makeLogRecord(b'a' * 12))
+        handler.close()
+        self.assertEqual(os.listdir(self.basedir), ['thelog'])
+        self.assertEqual(list(archive.jobs), [(self.filename, 2)])
+
+    def test_emit_does_rollover_moves_index(self):
+        from supervisor.logindex import read_checkpoints
+        handler = self._makeOne(self.filename, maxBytes=10, backupCount=2,
+                                index_every=4)
+        with open(self.filename + '.2.idx', 'wb') as f:
+            f.write(b'left over')
+        handler.emit(self._makeLogRecord(b'a\n' * 6))
+        self.assertTrue(os.path.exists(self.filename + '.1.idx'))
+        handler.emit(self._makeLogRecord(b'b\n' * 6))
+        handler.close()
+        # the index of the log went to .1 and then .2 with it
+        self.assertEqual(read_checkpoints(self.filename + '.2.idx')[0][1:],
+                         (0, 0))
+        self.assertEqual(read_checkpoints(self.filename + '.1.idx')[0][1:],
+                         (0, 0))
+        self.assertEqual(handler.index.lines, 0)
+        self.assertEqual(handler.index.offset, 0)
+
+    def test_emit_does_rollover_removes_left_over_index(self):
+        handler = self._makeOne(self.filename, maxBytes=10, backupCount=2,
+                                index_every=4)
+        with open(self.filename + '.1.idx', 'wb') as f:
+            f.write(b'left over')
+        os.remove(self.filename + '.idx')
+        handler.emit(self._makeLogRecord(b'a' * 12))
+        handler.close()
+        self.assertFalse(os.path.exists(self.filename + '.1.idx'))
+
+    def test_emit_does_rollover_to_archive_moves_index(self):
+        from supervisor.logarchive import segment_name
+        archive = self._makeArchive('gzip')
+        handler = self._makeOne(self.filename, maxBytes=10, backupCount=2,
+                                archive=archive, index_every=4)
+        with mock.patch('time.time', return_value=1000.5):
+            handler.emit(self._makeLogRecord(b'a' * 12))
+        handler.close()
+        segment = segment_name(self.filename, 1000.5)
+        self.assertTrue(os.path.exists(segment + '.idx'))
+        self.assertTrue(os.path.exists(self.filename + '.idx'))
+
+    def test_emit_does_rollover_archive_disabled(self):
+        archive = self._makeArchive()
+        handler = self._makeOne(self.filename, maxBytes=10, backupCount=2,
+                                archive=archive)
+        handler.emit(self._makeLogRecord(b'a' * 12))
+        handler.close()
+        self.assertTrue(os.path.exists(self.filename + '.1'))
+        self.assertEqual(len(archive.jobs), 0)
+
+    def test_emit_does_rollover_no_backups_not_archived(self):
+        archive = self._makeArchive('gzip')
+        handler = self._makeOne(self.filename, maxBytes=10, backupCount=0,
+                                archive=archive)
+        handler.emit(self._makeLogRecord(b'a' * 12))
+        handler.close()
+        self.assertEqual(os.listdir(self.basedir), ['thelog'])
+        self.assertEqual(len(archive.jobs), 0)
+
+    def test_splice_does_rollover(self):
+        from supervisor import loggers
+        if loggers.splice is None:
+            return
+        handler = self._makeOne(self.filename, maxBytes=10, backupCount=2)
+        handler.emit(self._makeLogRecord(b'a' * 4))
+        r = self._writePipe(b'b' * 12)
+        try:
+            self.assertEqual(handler.splice(r, 4), 4) # 8 bytes
+            self.assertFalse(os.path.exists(self.filename + '.1'))
+            self.assertEqual(handler.splice(r, 4), 4) # 12 bytes, do rollover
+            self.assertTrue(os.path.exists(self.filename + '.1'))
+            self.assertEqual(handler.splice_fd, None)
+            self.assertEqual(handler.splice(r, 4), 4)
+        finally:
+            os.close(r)
+        handler.close()
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), b'b' * 4)
+        with open(self.filename + '.1', 'rb') as f:
+            self.assertEqual(f.read(), b'a' * 4 + b'b' * 8)
+
     def test_current_logfile_removed(self):
         handler = self._makeOne(self.filename, maxBytes=6, backupCount=1)
         record = self._makeLogRecord(b'a' * 4)
@@ -372,6 +703,20 @@ class RotatingFileHandlerTests(FileHandlerTests):
         self.assertRaises(OSError, inst.removeAndRename, 'foo', 'bar')
         inst.close()
 
+    def test_emit_does_rollover_of_records_written_behind(self):
+        handler = self._makeOne(self.filename, maxBytes=10, backupCount=2,
+                                buffer_size=1024)
+        record = self._makeLogRecord(b'a' * 6)
+        handler.emit(record)
+        self.assertFalse(os.path.exists(self.filename + '.1'))
+        handler.emit(record)
+        # the buffer was flushed to the backup before the rollover
+        self.assertEqual(os.path.getsize(self.filename + '.1'), 12)
+        self.assertEqual(handler.size, 0)
+        handler.emit(record)
+        handler.close()
+        self.assertEqual(os.path.getsize(self.filename), 6)
+
     def test_doRollover_maxbytes_lte_zero(self):
         inst = self._makeOne(self.filename)
         inst.maxBytes = 0
@@ -379,6 +724,188 @@ class RotatingFileHandlerTests(FileHandlerTests):
         inst.close()
 
 
+class FlushScheduleTests(unittest.TestCase):
+    def _makeOne(self):
+        from supervisor.loggers import FlushSchedule
+        from supervisor.timers import TimerHeap
+        return FlushSchedule(TimerHeap())
+
+    def _makeHandler(self, flush_interval=1, error=None):
+        class Handler:
+            flushed = 0
+            def flush(handler):
+                flushes.discard(handler)
+                if error is not None:
+                    raise error
+                handler.flushed += 1
+            def handleError(handler):
+                handler.error = sys.exc_info()[1]
+        flushes = self.flushes
+        handler = Handler()
+        handler.flush_interval = flush_interval
+        return handler
+
+    def _flushExpired(self, now):
+        for callback in self.flushes.timers.pop_expired(now):
+            callback()
+
+    def setUp(self):
+        self.flushes = self._makeOne()
+
+    def test_add(self):
+        handler = self._makeHandler(flush_interval=5)
+        with mock.patch('time.time', return_value=100):
+            self.flushes.add(handler)
+        # adding it again doesn't postpone its flush
+        with mock.patch('time.time', return_value=103):
+            self.flushes.add(handler)
+        self.assertEqual(self.flushes.deadlines, {handler: 105})
+        self.assertEqual(len(self.flushes), 1)
+        self.assertEqual(self.flushes.timers.next_deadline(), 105)
+
+    def test_discard(self):
+        handler = self._makeHandler()
+        self.flushes.add(handler)
+        self.flushes.discard(handler)
+        self.flushes.discard(handler)
+        self.assertEqual(len(self.flushes), 0)
+        self.assertEqual(len(self.flushes.timers), 0)
+
+    def test_flush_expired(self):
+        early = self._makeHandler(flush_interval=1)
+        late = self._makeHandler(flush_interval=10)
+        with mock.patch('time.time', return_value=100):
+            self.flushes.add(early)
+            self.flushes.add(late)
+        self._flushExpired(101)
+        self.assertEqual(early.flushed, 1)
+        self.assertEqual(late.flushed, 0)
+        self.assertEqual(self.flushes.deadlines, {late: 110})
+        self.assertEqual(self.flushes.timers.next_deadline(), 110)
+
+    def test_flush_error(self):
+        error = OSError(errno.ENOSPC, 'full')
+        handler = self._makeHandler(error=error)
+        with mock.patch('time.time', return_value=100):
+            self.flushes.add(handler)
+        self._flushExpired(101)
+        self.assertEqual(handler.error, error)
+        self.assertEqual(len(self.flushes), 0)
+
+    def test_reschedule(self):
+        early = self._makeHandler(flush_interval=1)
+        late = self._makeHandler(flush_interval=10)
+        with mock.patch('time.time', return_value=100):
+            self.flushes.add(early)
+            self.flushes.add(late)
+        self.flushes.timers.clear()
+        self.flushes.reschedule(100)
+        self.assertEqual(self.flushes.timers.next_deadline(), 101)
+        self.assertEqual(len(self.flushes.timers), 2)
+
+    def test_reschedule_after_clock_moved_backward(self):
+        handler = self._makeHandler(flush_interval=5)
+        with mock.patch('time.time', return_value=100):
+            self.flushes.add(handler)
+        self.flushes.timers.clear()
+        self.flushes.reschedule(50)
+        self.assertEqual(self.flushes.deadlines, {handler: 55})
+        self.assertEqual(self.flushes.timers.next_deadline(), 55)
+
+class AscTimeTests(unittest.TestCase):
+    def _makeOne(self):
+        from supervisor.loggers import AscTime
+        return AscTime()
+
+    def test_call(self):
+        import time
+        asctime = self._makeOne()
+        now = time.mktime((2024, 1, 31, 12, 34, 56, 0, 0, -1))
+        self.assertEqual(asctime(now + 0.789), '2024-01-31 12:34:56,789')
+        self.assertEqual(asctime(now + 1.5), '2024-01-31 12:34:57,500')
+
+    def test_call_reuses_prefix_within_a_second(self):
+        asctime = self._makeOne()
+        with mock.patch('time.strftime', return_value='prefix') as strftime:
+            self.assertEqual(asctime(100.25), 'prefix,250')
+            self.assertEqual(asctime(100.5), 'prefix,500')
+            self.assertEqual(strftime.call_count, 1)
+            asctime(101)
+            # and if the clock moved backward
+            asctime(100.75)
+            self.assertEqual(strftime.call_count, 3)
+
+class FormatterTests(unittest.TestCase):
+    def _makeOne(self, fmt):
+        from supervisor.loggers import Formatter
+        return Formatter(fmt)
+
+    def _makeLogRecord(self, msg, **kw):
+        from supervisor import loggers
+        return loggers.LogRecord(loggers.LevelsByName.WARN, msg, **kw)
+
+    def test_format_positional(self):
+        formatter = self._makeOne('%(levelname)s %(message)s 100%%\n')
+        self.assertEqual(formatter.format, formatter._format_positional)
+        record = self._makeLogRecord('hello %(name)s', name='foo')
+        self.assertEqual(formatter.format(record), 'WARN hello foo 100%\n')
+        # the record doesn't need a dict to be formatted
+        self.assertEqual(record.dictrepr, None)
+
+    def test_format_positional_only_computes_fields_used(self):
+        formatter = self._makeOne('%(message)s')
+        record = self._makeLogRecord(b'hello')
+        self.assertEqual(formatter.format(record), 'hello')
+        self.assertEqual(record.asctime, None)
+
+    def test_format_dict_other_kinds_of_fields(self):
+        formatter = self._makeOne('%(levelname)-5s|%(message)r')
+        self.assertEqual(formatter.format, formatter._format_dict)
+        record = self._makeLogRecord('hello')
+        self.assertEqual(formatter.format(record), "WARN |'hello'")
+
+    def test_format_dict_unknown_field(self):
+        formatter = self._makeOne('%(message)s %(process)s')
+        self.assertEqual(formatter.format, formatter._format_dict)
+        self.assertRaises(KeyError, formatter.format,
+                          self._makeLogRecord('hello'))
+
+    def test_getFormatter_shares_formatters(self):
+        from supervisor.loggers import getFormatter
+        formatter = getFormatter('%(message)s\n')
+        self.assertTrue(getFormatter('%(message)s\n') is formatter)
+        self.assertFalse(getFormatter('%(message)s') is formatter)
+
+class LogRecordTests(unittest.TestCase):
+    def _makeOne(self, msg, **kw):
+        from supervisor import loggers
+        return loggers.LogRecord(loggers.LevelsByName.ERRO, msg, **kw)
+
+    def test_getMessage(self):
+        record = self._makeOne(memoryview(b'hello %(name)s'), name='foo')
+        self.assertEqual(record.getMessage(), 'hello foo')
+        record.kw = {}
+        # it is only formatted once
+        self.assertEqual(record.getMessage(), 'hello foo')
+
+    def test_getLevelName(self):
+        self.assertEqual(self._makeOne('hello').getLevelName(), 'ERRO')
+
+    def test_getAscTime_is_the_time_of_first_use(self):
+        record = self._makeOne('hello')
+        with mock.patch('time.time', return_value=100.5):
+            asctime = record.getAscTime()
+        self.assertTrue(asctime.endswith(',500'))
+        self.assertEqual(record.getAscTime(), asctime)
+
+    def test_asdict(self):
+        record = self._makeOne('hello %(name)s', name='foo')
+        params = record.asdict()
+        self.assertEqual(params['message'], 'hello foo')
+        self.assertEqual(params['levelname'], 'ERRO')
+        self.assertEqual(params['asctime'], record.getAscTime())
+        self.assertTrue(record.asdict() is params)
+
 class BoundIOTests(unittest.TestCase):
     def _getTargetClass(self):
         from supervisor.loggers import BoundIO
@@ -496,6 +1023,23 @@ class LoggerTests(unittest.TestCase):
         logger = self._makeOne(LevelsByName.CRIT, (handler,))
         self.assertRaises(NotImplementedError, logger.getvalue)
 
+    def test_log_makes_one_record_for_all_handlers(self):
+        from supervisor.loggers import LevelsByName
+        handlers = (DummyHandler(LevelsByName.INFO),
+                    DummyHandler(LevelsByName.INFO))
+        logger = self._makeOne(LevelsByName.INFO, handlers)
+        logger.info('hello')
+        self.assertTrue(handlers[0].records[0] is handlers[1].records[0])
+
+    def test_log_no_record_when_no_handler_takes_it(self):
+        from supervisor.loggers import LevelsByName
+        handler = DummyHandler(LevelsByName.WARN)
+        logger = self._makeOne(LevelsByName.DEBG, (handler,))
+        with mock.patch('supervisor.loggers.LogRecord') as LogRecord:
+            logger.debug('hello')
+        self.assertEqual(LogRecord.call_count, 0)
+        self.assertEqual(handler.records, [])
+
 
 class MockSysLog(mock.Mock):
     def __call__(self, *args, **kwargs):
@@ -542,6 +1086,21 @@ class SyslogHandlerTests(HandlerTests, unittest.TestCase):
         handler.emit(record)
         syslog.syslog.assert_called_with('hi!')
 
+    @mock.patch('syslog.syslog', MockSysLog())
+    def test_emit_memoryview(self):
+        handler = self._makeOne()
+        record = self._makeLogRecord(memoryview(b'hello!\nbye!\n'))
+        handler.emit(record)
+        syslog.syslog.assert_called_with('bye!')
+
+    @mock.patch('syslog.syslog', MockSysLog())
+    def test_emit_leaves_record_as_is(self):
+        handler = self._makeOne()
+        record = self._makeLogRecord(b'hello!\nbye!\n')
+        handler.emit(record)
+        # the record may be emitted by other handlers afterwards
+        self.assertEqual(record.asdict()['message'], 'hello!\nbye!\n')
+
     @mock.patch('syslog.syslog', MockSysLog())
     def test_close(self):
         handler = self._makeOne()
@@ -0,0 +1,244 @@
+"""Test suite for supervisor.logindex"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from supervisor.tests.base import mock
+
+class LogIndexTestsBase(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.logfile = os.path.join(self.tempdir, 'app.log')
+        self.index = self.logfile + '.idx'
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _write(self, filename, data, mode='wb'):
+        with open(filename, mode) as f:
+            f.write(data)
+
+    def _read(self, filename):
+        with open(filename, 'rb') as f:
+            return f.read()
+
+class FunctionTests(LogIndexTestsBase):
+    def test_sidecar_name(self):
+        from supervisor.logindex import sidecar_name
+        self.assertEqual(sidecar_name('/tmp/app.log'), '/tmp/app.log.idx')
+
+    def test_read_checkpoints(self):
+        from supervisor.logindex import read_checkpoints
+        self._write(self.index, b'100.5 0 0\n200.25 4096 10\n300')
+        # the last line was cut short
+        self.assertEqual(read_checkpoints(self.index),
+                         [(100.5, 0, 0), (200.25, 4096, 10)])
+
+    def test_read_checkpoints_garbage(self):
+        from supervisor.logindex import read_checkpoints
+        self._write(self.index, b'100.5 0 0\nhello\n')
+        self.assertEqual(read_checkpoints(self.index), [])
+
+    def test_read_checkpoints_no_file(self):
+        from supervisor.logindex import read_checkpoints
+        self.assertEqual(read_checkpoints(self.index), [])
+
+    def test_count_lines(self):
+        from supervisor.logindex import count_lines
+        self._write(self.logfile, b'a\nb\nc\nd')
+        self.assertEqual(count_lines(self.logfile, 0, 7, chunk_size=3), 3)
+        self.assertEqual(count_lines(self.logfile, 2, 4), 1)
+        # the file is shorter than asked
+        self.assertEqual(count_lines(self.logfile, 0, 100), 3)
+
+    def test_range_of_time(self):
+        from supervisor.logindex import range_of_time
+        checkpoints = [(100, 0, 0), (200, 10, 1), (300, 20, 2)]
+        self.assertEqual(range_of_time(checkpoints, 150, 250, 25), (0, 20))
+        self.assertEqual(range_of_time(checkpoints, 200, 200, 25), (10, 20))
+        self.assertEqual(range_of_time(checkpoints, 310, 400, 25), (20, 25))
+        self.assertEqual(range_of_time(checkpoints, 10, 50, 25), (0, 0))
+        # the log is shorter than its index, e.g. written behind
+        self.assertEqual(range_of_time(checkpoints, 250, 400, 15), (10, 15))
+
+    def test_read_lines_max_read(self):
+        from supervisor.logindex import read_lines
+        self._write(self.logfile, b'zero\none\ntwo\n')
+        self.assertEqual(read_lines(self.logfile, [], 0, 3, 4, max_read=7),
+                         b'zero\non')
+        self.assertRaises(ValueError, read_lines, self.logfile, [], 2, 1,
+                          4, max_read=7)
+        self.assertEqual(
+            read_lines(self.logfile, [(100, 5, 1)], 2, 1, 4, max_read=8),
+            b'two\n')
+
+    def test_ranges_of_time(self):
+        from supervisor.logindex import ranges_of_time
+        files = [('log.3', [(50, 0, 0)], 10),
+                 ('log.2', [], 10),
+                 ('log.1', [(100, 0, 0), (150, 5, 1)], 10),
+                 ('log', [(200, 0, 0), (300, 5, 1)], 10)]
+        self.assertEqual(ranges_of_time(files, 250, 400),
+                         [('log', 0, 10)])
+        self.assertEqual(ranges_of_time(files, 310, 400),
+                         [('log', 5, 10)])
+        self.assertEqual(ranges_of_time(files, 160, 250),
+                         [('log.1', 5, 10), ('log', 0, 5)])
+        self.assertEqual(ranges_of_time(files, 120, 130),
+                         [('log.1', 0, 5)])
+        # what is older than a backup without an index is left out
+        self.assertEqual(ranges_of_time(files, 10, 120),
+                         [('log.1', 0, 5)])
+
+    def test_line_checkpoint(self):
+        from supervisor.logindex import line_checkpoint
+        # the second checkpoint is in the middle of line 1
+        checkpoints = [(100, 0, 0), (200, 10, 1), (300, 20, 1), (400, 30, 3)]
+        self.assertEqual(line_checkpoint(checkpoints, 0), (0, 0))
+        self.assertEqual(line_checkpoint(checkpoints, 1), (0, 0))
+        self.assertEqual(line_checkpoint(checkpoints, 2), (20, 1))
+        self.assertEqual(line_checkpoint(checkpoints, 5), (30, 3))
+        self.assertEqual(line_checkpoint([], 5), (0, 0))
+
+    def test_read_lines(self):
+        from supervisor.logindex import read_lines
+        self._write(self.logfile, b'zero\none\ntwo\nthree\nfour')
+        checkpoints = [(100, 0, 0), (200, 9, 2), (300, 13, 3)]
+        for chunk_size in (1, 3, 4096):
+            self.assertEqual(
+                read_lines(self.logfile, checkpoints, 1, 2, chunk_size),
+                b'one\ntwo\n')
+            self.assertEqual(
+                read_lines(self.logfile, checkpoints, 3, 5, chunk_size),
+                b'three\nfour')
+            self.assertEqual(
+                read_lines(self.logfile, [], 0, 1, chunk_size), b'zero\n')
+            self.assertEqual(
+                read_lines(self.logfile, checkpoints, 9, 1, chunk_size), b'')
+            self.assertEqual(
+                read_lines(self.logfile, checkpoints, 1, 0, chunk_size), b'')
+
+class LogIndexTests(LogIndexTestsBase):
+    def _makeOne(self, every=10):
+        from supervisor.logindex import LogIndex
+        return LogIndex(self.index, every)
+
+    def _waitCounted(self, index):
+        while not index.counter.done:
+            time.sleep(0.001)
+
+    def test_open_empty_log(self):
+        self._write(self.logfile, b'')
+        index = self._makeOne()
+        with mock.patch('time.time', return_value=100):
+            index.open(self.logfile, 0)
+        index.close()
+        self.assertEqual(self._read(self.index), b'100.000000 0 0\n')
+
+    def test_open_log_without_index(self):
+        self._write(self.logfile, b'a\nb\nc')
+        os.utime(self.logfile, (50, 50))
+        index = self._makeOne()
+        index.open(self.logfile, 5)
+        self._waitCounted(index)
+        index.close()
+        self.assertEqual(self._read(self.index),
+                         b'0.000000 0 0\n50.000000 5 2\n')
+        self.assertEqual(index.lines, 2)
+        self.assertEqual(index.offset, 5)
+
+    def test_open_counts_lines_in_background(self):
+        from supervisor import logindex
+        self._write(self.logfile, b'a\nb\nc')
+        os.utime(self.logfile, (50, 50))
+        index = self._makeOne(every=2)
+        with mock.patch.object(logindex.LineCounter, 'start'):
+            index.open(self.logfile, 5)
+        with mock.patch('time.time', return_value=100):
+            index.written(b'\nd\n', 5)
+            index.written(b'e\n', 8)
+        # held back until the lines already in the log are counted
+        self.assertEqual(self._read(self.index), b'0.000000 0 0\n')
+        index.counter.run()
+        with mock.patch('time.time', return_value=200):
+            index.written(b'f\n', 10)
+        index.close()
+        self.assertEqual(self._read(self.index),
+                         b'0.000000 0 0\n50.000000 5 2\n'
+                         b'100.000000 8 4\n200.000000 10 5\n')
+        self.assertEqual(index.lines, 6)
+
+    def test_open_counting_fails(self):
+        from supervisor import logindex
+        self._write(self.logfile, b'a\nb\nc')
+        index = self._makeOne(every=2)
+        with mock.patch.object(logindex.LineCounter, 'start'):
+            index.open(self.logfile, 5)
+        os.remove(self.logfile)
+        index.counter.run()
+        index.written(b'\nd\n', 5)
+        index.written(b'e\n', 8)
+        self.assertEqual(index.fd, None)
+        index.close()
+        # readers of the index read the log from its start
+        self.assertEqual(self._read(self.index), b'0.000000 0 0\n')
+
+    def test_open_carries_on_index(self):
+        self._write(self.logfile, b'a\nb\nc\nd\n')
+        self._write(self.index, b'100.000000 0 0\n200.000000 4 2\n')
+        index = self._makeOne()
+        index.open(self.logfile, 8)
+        self._waitCounted(index)
+        self.assertEqual(index.offset, 4)
+        with mock.patch('time.time', return_value=300):
+            index.written(b'e\n', 20)
+        self.assertEqual(index.lines, 5)
+        index.close()
+        self.assertEqual(self._read(self.index),
+                         b'100.000000 0 0\n200.000000 4 2\n'
+                         b'300.000000 20 4\n')
+
+    def test_open_index_of_another_log(self):
+        self._write(self.logfile, b'a\n')
+        self._write(self.index, b'100.000000 0 0\n200.000000 4096 20\n')
+        index = self._makeOne()
+        index.open(self.logfile, 2)
+        self._waitCounted(index)
+        index.close()
+        self.assertEqual(index.lines, 1)
+        self.assertFalse(b'4096' in self._read(self.index))
+
+    def test_written(self):
+        self._write(self.logfile, b'')
+        index = self._makeOne(every=10)
+        with mock.patch('time.time', return_value=100):
+            index.open(self.logfile, 0)
+            index.written(b'12345678\n', 0)
+            index.written(memoryview(b'1\n2\n'), 9)
+        with mock.patch('time.time', return_value=200):
+            index.written(b'x', 13)
+            index.written(b'y', 14)
+        index.close()
+        self.assertEqual(index.lines, 3)
+        self.assertEqual(self._read(self.index),
+                         b'100.000000 0 0\n200.000000 13 3\n')
+
+    def test_written_counted_newlines(self):
+        self._write(self.logfile, b'')
+        index = self._makeOne()
+        index.open(self.logfile, 0)
+        index.written(memoryview(b'1\n2\n'), 0, 2)
+        index.close()
+        self.assertEqual(index.lines, 2)
+
+    def test_remove(self):
+        self._write(self.logfile, b'')
+        index = self._makeOne()
+        index.open(self.logfile, 0)
+        index.remove()
+        self.assertEqual(index.fd, None)
+        self.assertFalse(os.path.exists(self.index))
+        index.remove() # already gone
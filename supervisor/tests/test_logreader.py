@@ -0,0 +1,129 @@
+"""Test suite for supervisor.logreader"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+class LogSliceTests(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'app.log')
+        with open(self.filename, 'wb') as f:
+            f.write(b'0123456789')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _makeOne(self, offset, length):
+        from supervisor.logreader import LogSlice
+        return LogSlice(self.filename, offset, length)
+
+    def _read(self, offset, length):
+        return self._makeOne(offset, length).read()
+
+    def test_ranges(self):
+        self.assertEqual(self._read(2, 3), b'234')
+        self.assertEqual(self._read(8, 10), b'89')
+        self.assertEqual(self._read(20, 10), b'')
+        self.assertEqual(self._read(0, 0), b'0123456789')
+        self.assertEqual(self._read(7, 0), b'789')
+        self.assertEqual(self._read(20, 0), b'')
+        self.assertEqual(self._read(-3, 0), b'789')
+        self.assertEqual(self._read(-30, 0), b'0123456789')
+
+    def test_len(self):
+        self.assertEqual(len(self._makeOne(2, 3)), 3)
+        self.assertEqual(len(self._makeOne(20, 10)), 0)
+
+    def test_bad_arguments(self):
+        for offset, length in ((-1, 1), (1, -1)):
+            try:
+                self._makeOne(offset, length)
+            except ValueError as inst:
+                self.assertEqual(inst.args[0], 'BAD_ARGUMENTS')
+            else:
+                raise AssertionError("Didn't raise")
+
+    def test_no_file(self):
+        os.remove(self.filename)
+        try:
+            self._makeOne(0, 10)
+        except ValueError as inst:
+            self.assertEqual(inst.args[0], 'FAILED')
+        else:
+            raise AssertionError("Didn't raise")
+
+    def test_chunks(self):
+        logslice = self._makeOne(1, 8)
+        self.assertEqual(list(logslice.chunks(3)), [b'123', b'456', b'78'])
+
+    def test_read_closes(self):
+        logslice = self._makeOne(0, 0)
+        logslice.read()
+        self.assertEqual(logslice.fd, None)
+        self.assertEqual(logslice.read(), b'')
+
+    def test_read_after_rotation(self):
+        logslice = self._makeOne(0, 0)
+        os.rename(self.filename, self.filename + '.1')
+        with open(self.filename, 'wb') as f:
+            f.write(b'new log')
+        self.assertEqual(logslice.read(), b'0123456789')
+
+    def test_read_after_truncation(self):
+        logslice = self._makeOne(2, 6)
+        chunks = logslice.chunks(3)
+        self.assertEqual(next(chunks), b'234')
+        with open(self.filename, 'r+b') as f:
+            f.truncate(6)
+        self.assertEqual(list(chunks), [b'5'])
+
+    def test_read_leaves_out_growth(self):
+        logslice = self._makeOne(0, 0)
+        with open(self.filename, 'ab') as f:
+            f.write(b'more')
+        self.assertEqual(logslice.read(), b'0123456789')
+
+    def test_text(self):
+        with open(self.filename, 'wb') as f:
+            f.write(b'a' + u'\u00e9'.encode('utf-8') + b'\xff')
+        self.assertEqual(self._makeOne(0, 0).text(), u'a\u00e9\ufffd')
+
+    def test_text_chunks_cut_character(self):
+        with open(self.filename, 'wb') as f:
+            f.write(b'a' + u'\u00e9'.encode('utf-8') + b'\xff')
+        chunks = list(self._makeOne(0, 0).text_chunks(2))
+        self.assertEqual(b''.join(chunks),
+                         u'a\u00e9\ufffd'.encode('utf-8'))
+
+class LogSlicesTests(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'app.log')
+        with open(self.filename + '.1', 'wb') as f:
+            f.write(b'0123')
+        with open(self.filename, 'wb') as f:
+            f.write(b'4567')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _makeOne(self):
+        from supervisor.logreader import LogSlice
+        from supervisor.logreader import LogSlices
+        return LogSlices([LogSlice(self.filename + '.1', 2, 0),
+                          LogSlice(self.filename, 0, 3)])
+
+    def test_len(self):
+        self.assertEqual(len(self._makeOne()), 5)
+
+    def test_chunks(self):
+        self.assertEqual(list(self._makeOne().chunks(2)),
+                         [b'23', b'45', b'6'])
+
+    def test_read_closes(self):
+        logslices = self._makeOne()
+        self.assertEqual(logslices.read(), b'23456')
+        self.assertEqual([logslice.fd for logslice in logslices.slices],
+                         [None, None])
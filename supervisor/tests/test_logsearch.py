@@ -0,0 +1,301 @@
+"""Test suite for supervisor.logsearch"""
+
+import gzip
+import io
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+class LogFilesTests(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'app.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _write(self, path, data=b'', mtime=None):
+        with open(path, 'wb') as f:
+            f.write(data)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def _callFUT(self, filename, backups):
+        from supervisor.logsearch import log_files
+        return log_files(filename, backups)
+
+    def test_numbered_backups(self):
+        one = self._write(self.filename + '.1')
+        three = self._write(self.filename + '.3')
+        self._write(self.filename + '.1.idx')
+        self.assertEqual(self._callFUT(self.filename, 3),
+                         [three, one, self.filename])
+        self.assertEqual(self._callFUT(self.filename, 2),
+                         [one, self.filename])
+        self.assertEqual(self._callFUT(self.filename, 0), [self.filename])
+
+    def test_segments(self):
+        from supervisor.logarchive import segment_name
+        older = self._write(segment_name(self.filename, 1000) + '.gz',
+                            mtime=1000)
+        newer = self._write(segment_name(self.filename, 2000), mtime=2000)
+        # compressed while the segments were listed
+        self._write(newer + '.gz', mtime=2000)
+        self._write(newer + '.idx', mtime=2000)
+        self._write(segment_name(self.filename, 3000) + '.gz.tmp',
+                    mtime=3000)
+        self.assertEqual(self._callFUT(self.filename, 5),
+                         [older, newer, self.filename])
+        # only the newest backups are searched
+        self.assertEqual(self._callFUT(self.filename, 1),
+                         [newer, self.filename])
+        self.assertEqual(self._callFUT(self.filename, 0), [self.filename])
+
+class OpenLogTests(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'app.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _callFUT(self, path):
+        from supervisor.logsearch import open_log
+        return open_log(path)
+
+    def test_plain(self):
+        with open(self.filename, 'wb') as f:
+            f.write(b'hello\n')
+        f, path = self._callFUT(self.filename)
+        try:
+            self.assertEqual(path, self.filename)
+            self.assertEqual(f.read(), b'hello\n')
+        finally:
+            f.close()
+
+    def test_compressed_since_listed(self):
+        with gzip.open(self.filename + '.gz', 'wb') as f:
+            f.write(b'hello\n')
+        f, path = self._callFUT(self.filename)
+        try:
+            self.assertEqual(path, self.filename + '.gz')
+            self.assertEqual(f.read(), b'hello\n')
+        finally:
+            f.close()
+
+    def test_gone(self):
+        self.assertEqual(self._callFUT(self.filename), (None, None))
+
+    def test_unknown_compression(self):
+        from supervisor import logsearch
+        if '.zst' in logsearch._OPENERS:
+            return # zstd is available
+        with open(self.filename + '.zst', 'wb') as f:
+            f.write(b'not read')
+        self.assertEqual(self._callFUT(self.filename + '.zst'), (None, None))
+
+class IterLinesTests(unittest.TestCase):
+    def _callFUT(self, data, offset=0, max_line=100):
+        from supervisor.logsearch import iter_lines
+        f = io.BytesIO(data[offset:])
+        return list(iter_lines(f, offset, max_line))
+
+    def test_lines(self):
+        self.assertEqual(self._callFUT(b'one\ntwo\nthr'),
+                         [(0, b'one\n', True), (4, b'two\n', True),
+                          (8, b'thr', False)])
+
+    def test_from_offset(self):
+        self.assertEqual(self._callFUT(b'one\ntwo\n', 4),
+                         [(4, b'two\n', True)])
+
+    def test_long_line_in_pieces(self):
+        self.assertEqual(self._callFUT(b'abcdefg\nh\n', max_line=3),
+                         [(0, b'abc', True), (3, b'def', True),
+                          (6, b'g\n', True), (8, b'h\n', True)])
+
+    def test_lines_across_chunks(self):
+        from supervisor.logreader import CHUNK_SIZE
+        data = b'x' * (CHUNK_SIZE - 2) + b'\nyyy\n'
+        lines = self._callFUT(data, max_line=CHUNK_SIZE)
+        self.assertEqual([(offset, len(line)) for offset, line, c in lines],
+                         [(0, CHUNK_SIZE - 1), (CHUNK_SIZE - 1, 4)])
+
+class TokenTests(unittest.TestCase):
+    def test_round_trip(self):
+        from supervisor.logsearch import make_token, parse_token
+        self.assertEqual(parse_token(make_token(12, 34, 56)), (12, 34, 56))
+
+    def test_invalid(self):
+        from supervisor.logsearch import parse_token
+        self.assertRaises(ValueError, parse_token, 'foo')
+        self.assertRaises(ValueError, parse_token, '1:2')
+        self.assertRaises(ValueError, parse_token, '1:-2:3')
+
+class LogSearchTests(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'app.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _makeOne(self, pattern=b'error', backups=1, token='', **kw):
+        from supervisor.logsearch import LogSearch
+        return LogSearch(self.filename, backups, re.compile(pattern),
+                         token, **kw)
+
+    def _write(self, path, data, mode='wb'):
+        with open(path, mode) as f:
+            f.write(data)
+
+    def _lines(self, result):
+        return [(os.path.basename(match['logfile']), match['offset'],
+                 match['line']) for match in result['matches']]
+
+    def test_search_backups_then_log(self):
+        self._write(self.filename + '.1', b'error 1\nok\nerror 2')
+        self._write(self.filename, b'ok\nerror 3\nerror 4')
+        result = self._makeOne().search()
+        self.assertEqual(self._lines(result),
+                         [('app.log.1', 0, 'error 1'),
+                          ('app.log.1', 11, 'error 2'),
+                          ('app.log', 3, 'error 3')])
+        self.assertTrue(result['eof'])
+        # the line being written is searched once it is complete
+        self._write(self.filename, b'\nerror 5\n', 'ab')
+        result = self._makeOne(token=result['token']).search()
+        self.assertEqual(self._lines(result),
+                         [('app.log', 11, 'error 4'),
+                          ('app.log', 19, 'error 5')])
+        result = self._makeOne(token=result['token']).search()
+        self.assertEqual(result['matches'], [])
+        self.assertTrue(result['eof'])
+
+    def test_search_without_backups(self):
+        self._write(self.filename + '.1', b'error 1\n')
+        self._write(self.filename, b'error 2\n')
+        result = self._makeOne(backups=0).search()
+        self.assertEqual(self._lines(result), [('app.log', 0, 'error 2')])
+
+    def test_search_pages(self):
+        self._write(self.filename + '.1', b'error 1\nerror 2\n')
+        self._write(self.filename, b'error 3\nok\nok\nok\nerror 4\n')
+        result = self._makeOne(max_matches=2).search()
+        self.assertEqual(self._lines(result),
+                         [('app.log.1', 0, 'error 1'),
+                          ('app.log.1', 8, 'error 2')])
+        self.assertFalse(result['eof'])
+        result = self._makeOne(token=result['token'], max_bytes=10).search()
+        self.assertEqual(self._lines(result), [('app.log', 0, 'error 3')])
+        self.assertFalse(result['eof'])
+        result = self._makeOne(token=result['token']).search()
+        self.assertEqual(self._lines(result), [('app.log', 17, 'error 4')])
+        self.assertTrue(result['eof'])
+
+    def test_search_pages_by_time(self):
+        self._write(self.filename, b'error 1\nerror 2\n')
+        result = self._makeOne(max_time=0).search()
+        self.assertEqual(self._lines(result), [('app.log', 0, 'error 1')])
+        self.assertFalse(result['eof'])
+        result = self._makeOne(token=result['token']).search()
+        self.assertEqual(self._lines(result), [('app.log', 8, 'error 2')])
+        self.assertTrue(result['eof'])
+
+    def test_search_long_line_in_pieces(self):
+        from supervisor.logsearch import MAX_LINE
+        self._write(self.filename, b'x' * MAX_LINE + b'error\n')
+        result = self._makeOne().search()
+        self.assertEqual(self._lines(result),
+                         [('app.log', MAX_LINE, 'error')])
+
+    def test_stop(self):
+        self._write(self.filename, b'error 1\n')
+        search = self._makeOne()
+        search.stop()
+        search.work()
+        self.assertTrue(search.done)
+        self.assertEqual(search.result, None)
+        self.assertEqual(search.error, None)
+
+    def test_resume_after_rotation(self):
+        self._write(self.filename, b'error 1\n')
+        token = self._makeOne().search()['token']
+        self._write(self.filename, b'error 2\n', 'ab')
+        os.rename(self.filename, self.filename + '.1')
+        self._write(self.filename, b'error 3\n')
+        result = self._makeOne(token=token).search()
+        self.assertEqual(self._lines(result),
+                         [('app.log.1', 8, 'error 2'),
+                          ('app.log', 0, 'error 3')])
+
+    def test_resume_after_rotation_and_compression(self):
+        from supervisor.logarchive import segment_name
+        self._write(self.filename, b'error 1\n')
+        token = self._makeOne().search()['token']
+        self._write(self.filename, b'error 2\n', 'ab')
+        segment = segment_name(self.filename, 1000)
+        with gzip.open(segment + '.gz', 'wb') as f:
+            f.write(b'error 1\nerror 2\n')
+        os.remove(self.filename)
+        self._write(self.filename, b'error 3\n')
+        result = self._makeOne(token=token).search()
+        self.assertEqual(self._lines(result),
+                         [(os.path.basename(segment) + '.gz', 8, 'error 2'),
+                          ('app.log', 0, 'error 3')])
+
+    def test_resume_file_removed(self):
+        self._write(self.filename + '.1', b'error 1\n')
+        self._write(self.filename + '.2', b'error 0\n')
+        token = self._makeOne(backups=2, max_matches=1).search()['token']
+        # the oldest backup is gone, the search goes on with the others
+        os.remove(self.filename + '.2')
+        self._write(self.filename, b'error 2\n')
+        result = self._makeOne(backups=2, token=token).search()
+        self.assertEqual(self._lines(result),
+                         [('app.log.1', 0, 'error 1'),
+                          ('app.log', 0, 'error 2')])
+
+    def test_resume_log_truncated(self):
+        self._write(self.filename, b'error 1\nok\n')
+        token = self._makeOne().search()['token']
+        self._write(self.filename, b'error 2\n')
+        result = self._makeOne(token=token).search()
+        self.assertEqual(self._lines(result), [('app.log', 0, 'error 2')])
+
+    def test_no_log(self):
+        result = self._makeOne().search()
+        self.assertEqual(result, {'matches': [], 'token': '', 'eof': True})
+
+    def test_work(self):
+        self._write(self.filename, b'error 1\n')
+        search = self._makeOne()
+        search.start().join()
+        self.assertTrue(search.done)
+        self.assertEqual(self._lines(search.result),
+                         [('app.log', 0, 'error 1')])
+        self.assertEqual(search.error, None)
+
+    def test_one_search_of_a_log_at_a_time(self):
+        from supervisor.logsearch import LogSearch
+        self._write(self.filename, b'error 1\n')
+        LogSearch.running[self.filename] = self._makeOne()
+        try:
+            self.assertEqual(self._makeOne().start(), None)
+        finally:
+            del LogSearch.running[self.filename]
+        worker = self._makeOne().start()
+        self.assertNotEqual(worker, None)
+        worker.join()
+        # done, the next page can be searched
+        self.assertEqual(LogSearch.running, {})
+
+    def test_work_fails(self):
+        search = self._makeOne(token='bad')
+        search.work()
+        self.assertTrue(search.done)
+        self.assertEqual(search.result, None)
+        self.assertTrue(search.error.startswith('failed to search'))
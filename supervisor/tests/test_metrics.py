@@ -0,0 +1,239 @@
+"""Test suite for supervisor.metrics"""
+
+import os
+import subprocess
+import time
+import unittest
+
+from supervisor.metrics import implements_proc
+from supervisor.tests.base import DummyOptions
+from supervisor.tests.base import DummyPConfig
+from supervisor.tests.base import DummyPGroupConfig
+from supervisor.tests.base import DummyProcess
+from supervisor.tests.base import DummyProcessGroup
+
+# this base class is used instead of unittest.TestCase to hide
+# a TestCase subclass from test runner when the implementation is
+# not available
+SkipTestCase = object
+
+class MetricsTableTests(unittest.TestCase):
+    def _makeOne(self):
+        from supervisor.metrics import MetricsTable
+        return MetricsTable()
+
+    def test_slot_allocates_once(self):
+        table = self._makeOne()
+        self.assertEqual(table.slot(10), 0)
+        self.assertEqual(table.slot(11), 1)
+        self.assertEqual(table.slot(10), 0)
+        self.assertEqual(len(table), 2)
+        self.assertTrue(10 in table)
+        self.assertEqual(sorted(table.pids()), [10, 11])
+
+    def test_remove_reuses_cleared_slot(self):
+        table = self._makeOne()
+        table.slot(10)
+        table.columns['rss'][0] = 4096
+        table.remove(10)
+        self.assertFalse(10 in table)
+        self.assertEqual(table.slot(12), 0)
+        self.assertEqual(table.get(12)['rss'], 0)
+        self.assertEqual(len(table.columns['rss']), 1)
+
+    def test_remove_unknown_pid(self):
+        table = self._makeOne()
+        table.remove(10)
+        self.assertEqual(table.free, [])
+
+    def test_get(self):
+        from supervisor.metrics import FIELDS
+        table = self._makeOne()
+        self.assertEqual(table.get(10), None)
+        slot = table.slot(10)
+        table.columns['num_fds'][slot] = 5
+        sample = table.get(10)
+        self.assertEqual(sorted(sample.keys()), sorted(FIELDS))
+        self.assertEqual(sample['num_fds'], 5)
+
+if implements_proc():
+    ProcessSamplerTestsBase = unittest.TestCase
+else:
+    ProcessSamplerTestsBase = SkipTestCase
+
+class ProcessSamplerTests(ProcessSamplerTestsBase):
+    def setUp(self):
+        self.children = []
+
+    def tearDown(self):
+        for child in self.children:
+            child.kill()
+            child.wait()
+
+    def _makeOne(self, options):
+        from supervisor.metrics import ProcessSampler
+        return ProcessSampler(options)
+
+    def _makeGroup(self, options, *pids):
+        group = DummyProcessGroup(DummyPGroupConfig(options))
+        group.processes = {}
+        for i, pid in enumerate(pids):
+            pconfig = DummyPConfig(options, 'p%d' % i, '/bin/p')
+            process = DummyProcess(pconfig)
+            process.pid = pid
+            group.processes[pconfig.name] = process
+        return group
+
+    def _spawnSleeper(self):
+        child = subprocess.Popen(['sleep', '30'])
+        self.children.append(child)
+        # let it exec() and settle down
+        time.sleep(0.1)
+        return child.pid
+
+    def test_run_disabled(self):
+        options = DummyOptions()
+        sampler = self._makeOne(options)
+        sampler.run([self._makeGroup(options, os.getpid())], 100)
+        self.assertEqual(sampler.passes, 0)
+        self.assertEqual(len(options.timers), 0)
+
+    def test_run_samples_when_due(self):
+        options = DummyOptions()
+        options.metrics_interval = 5
+        sampler = self._makeOne(options)
+        groups = [self._makeGroup(options, os.getpid())]
+        sampler.run(groups, 100)
+        self.assertEqual(sampler.passes, 1)
+        self.assertEqual(options.timers.next_deadline(), 105)
+        sampler.run(groups, 104)
+        self.assertEqual(sampler.passes, 1)
+        sampler.run(groups, 105)
+        self.assertEqual(sampler.passes, 2)
+        self.assertEqual(sampler.last_pass, 105)
+
+    def test_run_samples_when_clock_moved_backward(self):
+        options = DummyOptions()
+        options.metrics_interval = 5
+        sampler = self._makeOne(options)
+        groups = [self._makeGroup(options, os.getpid())]
+        sampler.run(groups, 100)
+        sampler.run(groups, 50)
+        self.assertEqual(sampler.passes, 2)
+        self.assertEqual(sampler.last_pass, 50)
+
+    def test_sample(self):
+        options = DummyOptions()
+        sampler = self._makeOne(options)
+        pid = os.getpid()
+        group = self._makeGroup(options, pid, 0)
+        sampler.sample([group], 100)
+        sample = sampler.get(pid)
+        self.assertEqual(sample['sampled'], 100)
+        self.assertEqual(sample['cpu_percent'], 0)
+        self.assertTrue(sample['utime'] + sample['stime'] > 0)
+        self.assertTrue(sample['rss'] > 0)
+        self.assertTrue(sample['vms'] >= sample['rss'])
+        self.assertTrue(sample['num_fds'] >= 3)
+        self.assertEqual(sampler.get(0), None)
+        self.assertEqual(len(sampler.table), 1)
+
+    def test_sample_computes_cpu_percent(self):
+        options = DummyOptions()
+        sampler = self._makeOne(options)
+        pid = os.getpid()
+        group = self._makeGroup(options, pid)
+        sampler.sample([group], 100)
+        slot = sampler.table.slots[pid]
+        # pretend the previous sample used 1 second less of CPU time
+        state, utime, stime = sampler.states[pid]
+        sampler.states[pid] = (state, utime - int(sampler.clock_ticks), stime)
+        sampler.sample([group], 102)
+        self.assertTrue(sampler.table.columns['cpu_percent'][slot] >= 50)
+
+    def test_sample_forgets_exited_processes(self):
+        options = DummyOptions()
+        sampler = self._makeOne(options)
+        pid = self._spawnSleeper()
+        group = self._makeGroup(options, pid)
+        sampler.sample([group], 100)
+        self.assertTrue(sampler.get(pid) is not None)
+        group.processes['p0'].pid = 0
+        sampler.sample([group], 105)
+        self.assertEqual(sampler.get(pid), None)
+        self.assertEqual(sampler.states, {})
+
+    def test_sample_forgets_pids_that_cannot_be_read(self):
+        options = DummyOptions()
+        sampler = self._makeOne(options)
+        pid = self._spawnSleeper()
+        group = self._makeGroup(options, pid)
+        sampler.sample([group], 100)
+        child = self.children.pop()
+        child.kill()
+        child.wait()
+        sampler.sample([group], 105)
+        self.assertEqual(sampler.get(pid), None)
+
+    def test_sample_skips_unchanged_processes(self):
+        options = DummyOptions()
+        sampler = self._makeOne(options)
+        pid = self._spawnSleeper()
+        group = self._makeGroup(options, pid)
+        reads = []
+        read = sampler.read
+        def counting_read(path, name):
+            reads.append(name)
+            return read(path, name)
+        sampler.read = counting_read
+        sampler.sample([group], 100)
+        self.assertEqual(reads, ['stat', 'statm'])
+        del reads[:]
+        # sleep doesn't use any CPU time while it sleeps
+        sampler.sample([group], 105)
+        self.assertEqual(reads, ['stat'])
+        self.assertEqual(sampler.skipped, 1)
+        self.assertTrue(sampler.get(pid)['rss'] > 0)
+        # but everything is read again now and then
+        del reads[:]
+        sampler.passes = sampler.refresh_every
+        sampler.sample([group], 110)
+        self.assertEqual(reads, ['stat', 'statm'])
+
+    def test_sample_detects_reused_pid(self):
+        options = DummyOptions()
+        sampler = self._makeOne(options)
+        pid = os.getpid()
+        group = self._makeGroup(options, pid)
+        sampler.sample([group], 100)
+        slot = sampler.table.slots[pid]
+        sampler.table.columns['starttime'][slot] = 1
+        sampler.states[pid] = (b'S', -1000000, 0)
+        sampler.sample([group], 105)
+        self.assertEqual(sampler.get(pid)['cpu_percent'], 0)
+
+    def test_read_grows_buffer(self):
+        options = DummyOptions()
+        sampler = self._makeOne(options)
+        sampler.buffers['stat'] = bytearray(4)
+        data = sampler.read('/proc/self/stat', 'stat')
+        self.assertTrue(data.endswith(b'\n'))
+        self.assertTrue(len(sampler.buffers['stat']) > len(data))
+
+    def test_read_missing_file(self):
+        options = DummyOptions()
+        sampler = self._makeOne(options)
+        self.assertEqual(sampler.read('/proc/0/stat', 'stat'), None)
+
+    def test_as_dict(self):
+        options = DummyOptions()
+        options.metrics_interval = 5
+        sampler = self._makeOne(options)
+        sampler.sample([self._makeGroup(options, os.getpid())], 100)
+        data = sampler.as_dict()
+        self.assertEqual(data['available'], True)
+        self.assertEqual(data['interval'], 5)
+        self.assertEqual(data['passes'], 1)
+        self.assertEqual(data['last_pass'], 100)
+        self.assertEqual(data['sampled'], 1)
+        self.assertEqual(data['skipped'], 0)
@@ -1,6 +1,7 @@
 """Test suite for supervisor.options"""
 
 import os
+import time
 import sys
 import tempfile
 import socket
@@ -1187,6 +1188,155 @@ class ServerOptionsTests(unittest.TestCase):
         self.assertEqual(options.server_configs[0]['chmod'], 448) # defaults
         self.assertEqual(options.server_configs[0]['chown'], (-1,-1)) # defaults
 
+    def test_options_epoll_edge_triggered(self):
+        instance = self._makeOne()
+        text = lstrip("""\
+        [supervisord]
+        epoll_edge_triggered=true
+        """)
+        instance.configfile = StringIO(text)
+        instance.realize(args=[])
+        self.assertEqual(instance.epoll_edge_triggered, True)
+
+    def test_options_event_loop(self):
+        from supervisor.poller import implements_asyncio
+        if not implements_asyncio():
+            return
+        instance = self._makeOne()
+        text = lstrip("""\
+        [supervisord]
+        event_loop=asyncio
+        """)
+        instance.configfile = StringIO(text)
+        instance.realize(args=[])
+        self.assertEqual(instance.event_loop, 'asyncio')
+
+    def test_options_max_concurrent_spawns(self):
+        instance = self._makeOne()
+        text = lstrip("""\
+        [supervisord]
+        max_concurrent_spawns=10
+        """)
+        instance.configfile = StringIO(text)
+        instance.realize(args=[])
+        self.assertEqual(instance.max_concurrent_spawns, 10)
+
+    def test_options_max_concurrent_spawns_negative(self):
+        instance = self._makeOne()
+        text = lstrip("""\
+        [supervisord]
+        max_concurrent_spawns=-1
+        """)
+        try:
+            instance.read_config(StringIO(text))
+            self.fail("nothing raised")
+        except ValueError as exc:
+            self.assertEqual(exc.args[0],
+                "[supervisord] section sets invalid max_concurrent_spawns (-1)")
+
+    def test_options_spawn_method(self):
+        instance = self._makeOne()
+        text = lstrip("""\
+        [supervisord]
+        spawn_method=fork
+        """)
+        instance.configfile = StringIO(text)
+        instance.realize(args=[])
+        self.assertEqual(instance.spawn_method, 'fork')
+        self.assertFalse(instance.can_posix_spawn())
+
+    def test_options_metrics_interval(self):
+        instance = self._makeOne()
+        text = lstrip("""\
+        [supervisord]
+        metrics_interval=5
+        """)
+        instance.configfile = StringIO(text)
+        instance.realize(args=[])
+        self.assertEqual(instance.metrics_interval, 5)
+
+    def test_options_metrics_interval_negative(self):
+        instance = self._makeOne()
+        text = lstrip("""\
+        [supervisord]
+        metrics_interval=-1
+        """)
+        try:
+            instance.read_config(StringIO(text))
+            self.fail("nothing raised")
+        except ValueError as exc:
+            self.assertEqual(exc.args[0],
+                "[supervisord] section sets invalid metrics_interval (-1)")
+
+    def test_options_childlog_archive(self):
+        instance = self._makeOne()
+        text = lstrip("""\
+        [supervisord]
+        childlog_compression=GZIP
+        childlog_budget=10GB
+        """)
+        instance.configfile = StringIO(text)
+        instance.realize(args=[])
+        self.assertEqual(instance.childlog_compression, 'gzip')
+        self.assertEqual(instance.childlog_budget, 10 * 1024 ** 3)
+        self.assertTrue(instance.log_archive.enabled())
+
+    def test_options_childlog_compression_bad(self):
+        instance = self._makeOne()
+        text = lstrip("""\
+        [supervisord]
+        childlog_compression=bzip2
+        """)
+        try:
+            instance.read_config(StringIO(text))
+            self.fail("nothing raised")
+        except ValueError as exc:
+            self.assertEqual(exc.args[0],
+                "invalid 'childlog_compression' value 'bzip2'")
+
+    def test_options_childlog_compression_zstd_unavailable(self):
+        instance = self._makeOne()
+        text = lstrip("""\
+        [supervisord]
+        childlog_compression=zstd
+        """)
+        from supervisor import logarchive
+        with patch.object(logarchive, 'implements_zstd',
+                               lambda: False):
+            try:
+                instance.read_config(StringIO(text))
+                self.fail("nothing raised")
+            except ValueError as exc:
+                self.assertEqual(exc.args[0],
+                    "childlog_compression 'zstd' requires Python 3.14 or "
+                    "later or the zstandard package")
+
+    def test_options_spawn_method_bad(self):
+        instance = self._makeOne()
+        text = lstrip("""\
+        [supervisord]
+        spawn_method=vfork
+        """)
+        try:
+            instance.read_config(StringIO(text))
+            self.fail("nothing raised")
+        except ValueError as exc:
+            self.assertEqual(exc.args[0],
+                "invalid 'spawn_method' value 'vfork'")
+
+    def test_options_event_loop_bad(self):
+        instance = self._makeOne()
+        text = lstrip("""\
+        [supervisord]
+        event_loop=twisted
+        """)
+        try:
+            instance.read_config(StringIO(text))
+            self.fail("nothing raised")
+        except ValueError as exc:
+            self.assertEqual(exc.args[0],
+                "invalid 'event_loop' value 'twisted'")
+
     def test_options_afunix_chxxx_values_valid(self):
         instance = self._makeOne()
         text = lstrip("""\
@@ -1444,6 +1594,68 @@ class ServerOptionsTests(unittest.TestCase):
             except OSError:
                 pass
 
+    def test_pidfd_open_returns_None_if_unsupported(self):
+        instance = self._makeOne()
+        with patch('os.pidfd_open', create=True,
+                   side_effect=OSError(errno.ENOSYS, 'ENOSYS')):
+            self.assertEqual(instance.pidfd_open(os.getpid()), None)
+
+    def test_pidfd_open_and_waitpid(self):
+        instance = self._makeOne()
+        pid = os.fork()
+        if pid == 0: # pragma: no cover
+            os._exit(3)
+        pidfd = instance.pidfd_open(pid)
+        try:
+            if pidfd is not None:
+                import select
+                r, w, x = select.select([pidfd], [], [], 10)
+                self.assertEqual(r, [pidfd])
+            for i in range(1000):
+                reaped, sts = instance.waitpid(pid)
+                if reaped:
+                    break
+                time.sleep(0.01) # no pidfd support on this platform
+            self.assertEqual(reaped, pid)
+            self.assertEqual(os.WEXITSTATUS(sts), 3)
+        finally:
+            if pidfd is not None:
+                os.close(pidfd)
+
+    def test_open_signal_wakeup(self):
+        instance = self._makeOne()
+        instance.open_signal_wakeup()
+        wakeup = instance.signal_wakeup
+        try:
+            self.assertTrue(instance.dispatcher_registry.get(wakeup.fd)
+                            is wakeup)
+            instance.signal_receiver.receive(signal.SIGCHLD, None)
+            self.assertEqual(os.read(wakeup.fd, 10), b'\0')
+            instance.open_signal_wakeup() # replaces the old pipe
+            self.assertTrue(wakeup.closed)
+            self.assertFalse(instance.signal_wakeup is wakeup)
+        finally:
+            instance.close_signal_wakeup()
+
+    def test_close_signal_wakeup(self):
+        instance = self._makeOne()
+        instance.open_signal_wakeup()
+        wakeup = instance.signal_wakeup
+        instance.close_signal_wakeup()
+        self.assertEqual(instance.signal_wakeup, None)
+        self.assertTrue(wakeup.closed)
+        self.assertFalse(wakeup.fd in instance.dispatcher_registry)
+        self.assertEqual(instance.signal_receiver._wakeup_fd, None)
+        instance.close_signal_wakeup() # no-op when already closed
+
+    def test_cleanup_closes_signal_wakeup(self):
+        instance = self._makeOne()
+        instance.pidfile = ''
+        instance.open_signal_wakeup()
+        wakeup = instance.signal_wakeup
+        instance.cleanup()
+        self.assertTrue(wakeup.closed)
+
     def test_cleanup_removes_pidfile(self):
         with tempfile.NamedTemporaryFile(delete=False) as f:
             pidfile = f.name
@@ -1507,6 +1719,97 @@ class ServerOptionsTests(unittest.TestCase):
             except OSError:
                 pass
 
+    def test_cleanup_waits_for_log_archive(self):
+        instance = self._makeOne()
+        instance.poller = DummyPoller({})
+        instance.logger = DummyLogger()
+        archive = instance.log_archive
+        from supervisor.logarchive import SHUTDOWN_WAIT
+        waited = []
+        def wait(timeout):
+            waited.append(timeout)
+            return True
+        archive.wait = wait
+        archive.messages.append(('info', 'removed foo'))
+        instance.cleanup()
+        self.assertEqual(waited, [SHUTDOWN_WAIT])
+        self.assertEqual(instance.logger.data, ['removed foo'])
+
+    def test_cleanup_stops_waiting_for_log_archive(self):
+        instance = self._makeOne()
+        instance.poller = DummyPoller({})
+        instance.logger = DummyLogger()
+        instance.log_archive.wait = lambda timeout: False
+        instance.cleanup()
+        self.assertTrue(instance.logger.data[0].startswith(
+            'stopped waiting for rotated logs'))
+
+    def test_open_fds(self):
+        instance = self._makeOne()
+        r, w = os.pipe()
+        try:
+            fds = instance._open_fds(3, max(r, w) + 1)
+            if fds is None: # no /proc
+                return
+            self.assertTrue(r in fds)
+            self.assertTrue(w in fds)
+            self.assertEqual(instance._open_fds(3, min(r, w)).count(r), 0)
+        finally:
+            os.close(r)
+            os.close(w)
+
+    def test_readfd_into(self):
+        instance = self._makeOne()
+        r, w = os.pipe()
+        try:
+            os.write(w, b'hello world')
+            buf = bytearray(8)
+            self.assertEqual(instance.readfd_into(r, memoryview(buf)[3:]), 5)
+            self.assertEqual(bytes(buf), b'\0\0\0hello')
+            self.assertEqual(instance.readfd_into(r, memoryview(buf)), 6)
+            self.assertEqual(bytes(buf[:6]), b' world')
+        finally:
+            os.close(r)
+            os.close(w)
+
+    def test_readfd_into_ebadf(self):
+        instance = self._makeOne()
+        r, w = os.pipe()
+        os.close(r)
+        os.close(w)
+        self.assertEqual(instance.readfd_into(r, memoryview(bytearray(4))), 0)
+
+    def test_close_child_fds(self):
+        instance = self._makeOne()
+        r, w = os.pipe()
+        instance.minfds = max(r, w) + 1
+        pid = os.fork()
+        if pid == 0:
+            try:
+                instance.close_child_fds()
+                try:
+                    os.fstat(w)
+                except OSError:
+                    os._exit(0)
+            finally:
+                os._exit(1)
+        os.close(w)
+        try:
+            status = os.waitpid(pid, 0)[1]
+            self.assertEqual(os.WEXITSTATUS(status), 0)
+            # the child didn't close the parent's fds
+            os.fstat(r)
+        finally:
+            os.close(r)
+
+    @patch('os.closerange', Mock())
+    def test_close_child_fds_without_fd_listing(self):
+        instance = self._makeOne()
+        instance.minfds = 10
+        instance._open_fds = lambda low, high: None
+        instance.close_child_fds()
+        os.closerange.assert_called_with(3, 10)
+
     @patch('os.closerange', Mock())
     def test_cleanup_fds_closes_5_upto_minfds(self):
         instance = self._makeOne()
@@ -1517,6 +1820,52 @@ class ServerOptionsTests(unittest.TestCase):
         f()
         os.closerange.assert_called_with(5, 10)
 
+    def test_posix_spawn(self):
+        if not hasattr(os, 'posix_spawn'):
+            return
+        instance = self._makeOne()
+        instance.minfds = 16
+        instance.spawn_method = 'auto'
+        self.assertTrue(instance.can_posix_spawn())
+        r, w = os.pipe()
+        try:
+            pid = instance.posix_spawn(
+                '/bin/sh', ['/bin/sh', '-c', 'echo $FOO'], {'FOO': 'bar'},
+                [(os.POSIX_SPAWN_DUP2, w, 1)])
+            os.close(w)
+            w = None
+            os.waitpid(pid, 0)
+            self.assertEqual(os.read(r, 100), b'bar\n')
+        finally:
+            os.close(r)
+            if w is not None:
+                os.close(w)
+        self.assertTrue(instance.fds_made_noninheritable)
+
+    def test_make_poller_native(self):
+        instance = self._makeOne()
+        instance.event_loop = 'native'
+        poller = instance.poller
+        instance.make_poller()
+        self.assertTrue(instance.poller is poller)
+
+    def test_make_poller_asyncio(self):
+        from supervisor import poller
+        if not poller.implements_asyncio():
+            return
+        instance = self._makeOne()
+        instance.event_loop = 'asyncio'
+        instance.poller = DummyPoller(None)
+        old = instance.poller
+        instance.make_poller()
+        try:
+            self.assertTrue(old.closed)
+            self.assertTrue(isinstance(instance.poller, poller.AsyncioPoller))
+            self.assertTrue(instance.dispatcher_registry.poller is
+                            instance.poller)
+        finally:
+            instance.poller.close()
+
     def test_close_httpservers(self):
         instance = self._makeOne()
         class Server:
@@ -1683,6 +2032,95 @@ class ServerOptionsTests(unittest.TestCase):
         self.assertEqual(pconfig.redirect_stderr, False)
         self.assertEqual(pconfig.environment,
                          {'KEY1':'val1', 'KEY2':'val2', 'KEY3':'0'})
+        self.assertEqual(pconfig.stdout_logfile_buffer_size, 0)
+        self.assertEqual(pconfig.stdout_logfile_flush_interval, 1)
+        self.assertEqual(pconfig.stdout_logfile_index_bytes, 0)
+        self.assertEqual(pconfig.stdout_ring_bytes, 0)
+        self.assertEqual(pconfig.output_rate_limit, 0)
+        self.assertEqual(pconfig.output_rate_burst, 0)
+
+    def test_processes_from_section_logfile_written_behind(self):
+        instance = self._makeOne()
+        text = lstrip("""\
+        [program:foo]
+        command = /bin/cat
+        stdout_logfile_buffer_size = 64KB
+        stdout_logfile_flush_interval = 5
+        stderr_logfile_buffer_size = 1024
+        stderr_logfile_flush_interval = 0
+        """)
+        from supervisor.options import UnhosedConfigParser
+        config = UnhosedConfigParser()
+        config.read_string(text)
+        pconfig = instance.processes_from_section(config, 'program:foo',
+                                                  'bar')[0]
+        self.assertEqual(pconfig.stdout_logfile_buffer_size, 65536)
+        self.assertEqual(pconfig.stdout_logfile_flush_interval, 5)
+        self.assertEqual(pconfig.stderr_logfile_buffer_size, 1024)
+        self.assertEqual(pconfig.stderr_logfile_flush_interval, 0)
+
+    def test_processes_from_section_logfile_indexed(self):
+        instance = self._makeOne()
+        text = lstrip("""\
+        [program:foo]
+        command = /bin/cat
+        stdout_logfile_index_bytes = 64KB
+        """)
+        from supervisor.options import UnhosedConfigParser
+        config = UnhosedConfigParser()
+        config.read_string(text)
+        pconfig = instance.processes_from_section(config, 'program:foo',
+                                                  'bar')[0]
+        self.assertEqual(pconfig.stdout_logfile_index_bytes, 65536)
+        self.assertEqual(pconfig.stderr_logfile_index_bytes, 0)
+
+    def test_processes_from_section_output_ring(self):
+        instance = self._makeOne()
+        text = lstrip("""\
+        [program:foo]
+        command = /bin/cat
+        stdout_logfile = NONE
+        stdout_ring_bytes = 64KB
+        """)
+        from supervisor.options import UnhosedConfigParser
+        config = UnhosedConfigParser()
+        config.read_string(text)
+        pconfig = instance.processes_from_section(config, 'program:foo',
+                                                  'bar')[0]
+        self.assertEqual(pconfig.stdout_ring_bytes, 65536)
+        self.assertEqual(pconfig.stderr_ring_bytes, 0)
+
+    def test_processes_from_section_output_rate_limit(self):
+        instance = self._makeOne()
+        text = lstrip("""\
+        [program:foo]
+        command = /bin/cat
+        output_rate_limit = 1MB
+        output_rate_burst = 4MB
+        """)
+        from supervisor.options import UnhosedConfigParser
+        config = UnhosedConfigParser()
+        config.read_string(text)
+        pconfig = instance.processes_from_section(config, 'program:foo',
+                                                  'bar')[0]
+        self.assertEqual(pconfig.output_rate_limit, 1 << 20)
+        self.assertEqual(pconfig.output_rate_burst, 4 << 20)
+
+    def test_processes_from_section_negative_flush_interval(self):
+        instance = self._makeOne()
+        text = lstrip("""\
+        [program:foo]
+        command = /bin/cat
+        stdout_logfile_flush_interval = -1
+        """)
+        from supervisor.options import UnhosedConfigParser
+        config = UnhosedConfigParser()
+        config.read_string(text)
+        try:
+            instance.processes_from_section(config, 'program:foo', 'bar')
+            self.fail('nothing raised')
+        except ValueError as e:
+            self.assertTrue('stdout_logfile_flush_interval' in str(e))
 
     def test_processes_from_section_environment_with_escaped_chars(self):
         instance = self._makeOne()
@@ -1973,6 +2411,14 @@ class ServerOptionsTests(unittest.TestCase):
         self.assertEqual(instance.nocleanup, True)
         self.assertEqual(instance.childlogdir, config.expansions['ENV_HOME'])
         self.assertEqual(instance.strip_ansi, False)
+        self.assertEqual(instance.epoll_edge_triggered, False)
+        self.assertEqual(instance.event_loop, 'native')
+        self.assertEqual(instance.max_concurrent_spawns, 0)
+        self.assertEqual(instance.spawn_method, 'auto')
+        self.assertEqual(instance.metrics_interval, 0)
+        self.assertEqual(instance.childlog_compression, 'none')
+        self.assertEqual(instance.childlog_budget, 0)
+        self.assertFalse(instance.log_archive.enabled())
         # inet_http_server
         options = instance.configroot.supervisord
         self.assertEqual(options.server_configs[0]['family'], socket.AF_INET)
@@ -2572,6 +3018,61 @@ class ServerOptionsTests(unittest.TestCase):
         self.assertEqual(dog1.command, '/bin/dog')
         self.assertEqual(dog1.priority, 1)
 
+    def test_process_groups_from_parser_max_concurrent_spawns(self):
+        text = lstrip("""\
+        [program:one]
+        command = /bin/cat
+        max_concurrent_spawns = 3
+
+        [program:two]
+        command = /bin/cat
+
+        [group:thegroup]
+        programs = two
+        max_concurrent_spawns = 2
+
+        [eventlistener:dog]
+        events = PROCESS_COMMUNICATION
+        command = /bin/dog
+        max_concurrent_spawns = 1
+        """)
+        from supervisor.options import UnhosedConfigParser
+        config = UnhosedConfigParser()
+        config.read_string(text)
+        instance = self._makeOne()
+        gconfigs = instance.process_groups_from_parser(config)
+        limits = dict([(g.name, g.max_concurrent_spawns) for g in gconfigs])
+        self.assertEqual(limits, {'one': 3, 'thegroup': 2, 'dog': 1})
+
+    def test_process_groups_from_parser_max_concurrent_spawns_default(self):
+        text = lstrip("""\
+        [program:one]
+        command = /bin/cat
+        """)
+        from supervisor.options import UnhosedConfigParser
+        config = UnhosedConfigParser()
+        config.read_string(text)
+        instance = self._makeOne()
+        gconfigs = instance.process_groups_from_parser(config)
+        self.assertEqual(gconfigs[0].max_concurrent_spawns, 0)
+
+    def test_process_groups_from_parser_max_concurrent_spawns_negative(self):
+        text = lstrip("""\
+        [program:one]
+        command = /bin/cat
+        max_concurrent_spawns = -1
+        """)
+        from supervisor.options import UnhosedConfigParser
+        config = UnhosedConfigParser()
+        config.read_string(text)
+        instance = self._makeOne()
+        try:
+            instance.process_groups_from_parser(config)
+            self.fail('nothing raised')
+        except ValueError as exc:
+            self.assertEqual(exc.args[0], '[program:one] section sets '
+                'invalid max_concurrent_spawns (-1)')
+
     def test_event_listener_pool_disallows_buffer_size_zero(self):
         text = lstrip("""\
         [eventlistener:dog]
@@ -3436,6 +3937,15 @@ class ProcessConfigTests(unittest.TestCase):
         for name in ('stdout_logfile_backups', 'stdout_logfile_maxbytes',
                      'stderr_logfile_backups', 'stderr_logfile_maxbytes'):
             defaults[name] = 10
+        for name in ('stdout_logfile_buffer_size',
+                     'stdout_logfile_flush_interval',
+                     'stderr_logfile_buffer_size',
+                     'stderr_logfile_flush_interval',
+                     'stdout_logfile_index_bytes',
+                     'stderr_logfile_index_bytes',
+                     'stdout_ring_bytes', 'stderr_ring_bytes',
+                     'output_rate_limit', 'output_rate_burst'):
+            defaults[name] = 0
         defaults.update(kw)
         return self._getTargetClass()(*arg, **defaults)
 
@@ -3455,6 +3965,19 @@ class ProcessConfigTests(unittest.TestCase):
         self.assertNotEqual(instance.get_path(), options.get_path())
         self.assertEqual(instance.get_path(), ['/a', '/b', '/c'])
 
+    def test_clear_spawn_plan(self):
+        options = DummyOptions()
+        instance = self._makeOne(options)
+        self.assertEqual(instance.spawn_plan, None)
+        other = self._makeOne(options)
+        instance.spawn_plan = ('/bin/cat', ['cat'], (1, 2, 3, 4))
+        instance.spawn_environment = {'FOO': '1'}
+        # the cache is not part of the config
+        self.assertEqual(instance, other)
+        instance.clear_spawn_plan()
+        self.assertEqual(instance.spawn_plan, None)
+        self.assertEqual(instance.spawn_environment, None)
+
     def test_create_autochildlogs(self):
         options = DummyOptions()
         instance = self._makeOne(options)
@@ -3534,6 +4057,15 @@ class EventListenerConfigTests(unittest.TestCase):
         for name in ('stdout_logfile_backups', 'stdout_logfile_maxbytes',
                      'stderr_logfile_backups', 'stderr_logfile_maxbytes'):
             defaults[name] = 10
+        for name in ('stdout_logfile_buffer_size',
+                     'stdout_logfile_flush_interval',
+                     'stderr_logfile_buffer_size',
+                     'stderr_logfile_flush_interval',
+                     'stdout_logfile_index_bytes',
+                     'stderr_logfile_index_bytes',
+                     'stdout_ring_bytes', 'stderr_ring_bytes',
+                     'output_rate_limit', 'output_rate_burst'):
+            defaults[name] = 0
         defaults.update(kw)
         return self._getTargetClass()(*arg, **defaults)
 
@@ -3582,6 +4114,15 @@ class FastCGIProcessConfigTests(unittest.TestCase):
         for name in ('stdout_logfile_backups', 'stdout_logfile_maxbytes',
                      'stderr_logfile_backups', 'stderr_logfile_maxbytes'):
             defaults[name] = 10
+        for name in ('stdout_logfile_buffer_size',
+                     'stdout_logfile_flush_interval',
+                     'stderr_logfile_buffer_size',
+                     'stderr_logfile_flush_interval',
+                     'stdout_logfile_index_bytes',
+                     'stderr_logfile_index_bytes',
+                     'stdout_ring_bytes', 'stderr_ring_bytes',
+                     'output_rate_limit', 'output_rate_burst'):
+            defaults[name] = 0
         defaults.update(kw)
         return self._getTargetClass()(*arg, **defaults)
 
@@ -3636,6 +4177,15 @@ class ProcessGroupConfigTests(unittest.TestCase):
         self.assertEqual(instance.name, 'whatever')
         self.assertEqual(instance.priority, 999)
         self.assertEqual(instance.process_configs, [])
+        self.assertEqual(instance.max_concurrent_spawns, 0)
+
+    def test_eq_compares_max_concurrent_spawns(self):
+        options = DummyOptions()
+        instance = self._makeOne(options, 'whatever', 999, [])
+        other = self._makeOne(options, 'whatever', 999, [])
+        self.assertEqual(instance, other)
+        other.max_concurrent_spawns = 5
+        self.assertNotEqual(instance, other)
 
     def test_after_setuid(self):
         options = DummyOptions()
@@ -3759,6 +4309,95 @@ class SignalReceiverTests(unittest.TestCase):
         self.assertEqual(sr.get_signal(), signal.SIGCHLD)
         self.assertEqual(sr.get_signal(), None)
 
+    def test_receive_writes_to_wakeup_fd(self):
+        from supervisor.options import SignalReceiver
+        sr = SignalReceiver()
+        r, w = os.pipe()
+        try:
+            sr.set_wakeup_fd(w)
+            sr.receive(signal.SIGCHLD, 'frame')
+            self.assertEqual(os.read(r, 10), b'\0')
+        finally:
+            os.close(r)
+            os.close(w)
+
+    def test_receive_ignores_wakeup_write_error(self):
+        from supervisor.options import SignalReceiver
+        sr = SignalReceiver()
+        r, w = os.pipe()
+        try:
+            sr.set_wakeup_fd(r) # writing to the read end fails
+            sr.receive(signal.SIGCHLD, 'frame')
+            self.assertEqual(sr.get_signal(), signal.SIGCHLD)
+        finally:
+            os.close(r)
+            os.close(w)
+
+    def test_get_signal_wakes_up_again_if_more_signals_queued(self):
+        from supervisor.options import SignalReceiver
+        sr = SignalReceiver()
+        sr.receive(signal.SIGTERM, 'frame')
+        sr.receive(signal.SIGCHLD, 'frame')
+        r, w = os.pipe()
+        try:
+            sr.set_wakeup_fd(w)
+            self.assertEqual(sr.get_signal(), signal.SIGTERM)
+            self.assertEqual(os.read(r, 10), b'\0')
+            self.assertEqual(sr.get_signal(), signal.SIGCHLD)
+            sr.set_wakeup_fd(None)
+            os.write(w, b'x')
+            self.assertEqual(os.read(r, 10), b'x') # nothing else written
+        finally:
+            os.close(r)
+            os.close(w)
+
+    def test_pop_sigchld_time_keeps_first_sigchld(self):
+        from supervisor.options import SignalReceiver
+        sr = SignalReceiver()
+        self.assertEqual(sr.pop_sigchld_time(), None)
+        sr.receive(signal.SIGTERM, 'frame')
+        self.assertEqual(sr.pop_sigchld_time(), None)
+        before = time.time()
+        sr.receive(signal.SIGCHLD, 'frame')
+        first = sr._sigchld_time
+        sr.receive(signal.SIGCHLD, 'frame')
+        self.assertTrue(first >= before)
+        self.assertEqual(sr.pop_sigchld_time(), first)
+        self.assertEqual(sr.pop_sigchld_time(), None)
+
+class SignalWakeupDispatcherTests(unittest.TestCase):
+    def _makeOne(self, options):
+        from supervisor.options import SignalWakeupDispatcher
+        return SignalWakeupDispatcher(options, 7, 8)
+
+    def test_readable_writable(self):
+        dispatcher = self._makeOne(DummyOptions())
+        self.assertTrue(dispatcher.readable())
+        self.assertFalse(dispatcher.writable())
+        dispatcher.close()
+        self.assertFalse(dispatcher.readable())
+
+    def test_handle_read_event(self):
+        options = DummyOptions()
+        options.readfd_result = b'\0\0'
+        dispatcher = self._makeOne(options)
+        self.assertEqual(dispatcher.handle_read_event(), None)
+
+    def test_close_closes_both_ends(self):
+        options = DummyOptions()
+        dispatcher = self._makeOne(options)
+        dispatcher.close()
+        dispatcher.close()
+        self.assertEqual(options.fds_closed, [7, 8])
+
+    def test_handle_error_closes(self):
+        options = DummyOptions()
+        dispatcher = self._makeOne(options)
+        dispatcher.handle_error()
+        self.assertTrue(dispatcher.closed)
+        self.assertTrue(options.logger.data[0].startswith(
+            'uncaptured python exception in <SignalWakeupDispatcher'))
+
 class UnhosedConfigParserTests(unittest.TestCase):
     def _getTargetClass(self):
         from supervisor.options import UnhosedConfigParser
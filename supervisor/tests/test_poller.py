@@ -1,11 +1,16 @@
 import unittest
 import errno
+import os
 import select
 from supervisor.tests.base import Mock
 
 from supervisor.poller import SelectPoller, PollPoller, KQueuePoller
+from supervisor.poller import EPollPoller
 from supervisor.poller import implements_poll, implements_kqueue
+from supervisor.poller import implements_epoll
+from supervisor.poller import AsyncioPoller, implements_asyncio
 from supervisor.tests.base import DummyOptions
+from supervisor.tests.base import DummyDispatcher
 
 # this base class is used instead of unittest.TestCase to hide
 # a TestCase subclass from test runner when the implementation is
@@ -117,6 +122,7 @@ class SelectPollerTests(unittest.TestCase):
         self.assertEqual(options.logger.data[0], 'EBADF encountered in poll')
         self.assertEqual(list(poller.readables), [])
         self.assertEqual(list(poller.writables), [])
+        self.assertEqual(poller.resets, 1)
 
     def test_poll_uncaught_exception(self):
         _select = DummySelect(error=errno.EPERM)
@@ -126,6 +132,315 @@ class SelectPollerTests(unittest.TestCase):
         poller.register_readable(6)
         self.assertRaises(select.error, poller.poll, 1)
 
+class DispatcherRegistryTests(unittest.TestCase):
+
+    def _makeOne(self, options):
+        from supervisor.poller import DispatcherRegistry
+        return DispatcherRegistry(options.poller)
+
+    def test_add_marks_pending(self):
+        options = DummyOptions()
+        registry = self._makeOne(options)
+        dispatcher = DummyDispatcher(readable=True)
+        registry.add(6, dispatcher)
+        self.assertTrue(6 in registry)
+        self.assertTrue(registry.get(6) is dispatcher)
+        self.assertEqual(registry.pending, set([6]))
+        self.assertEqual(options.poller.readables, set())
+
+    def test_update_pending_registers_interest(self):
+        options = DummyOptions()
+        registry = self._makeOne(options)
+        registry.add_dispatchers({6: DummyDispatcher(readable=True),
+                                  7: DummyDispatcher(writable=True),
+                                  8: DummyDispatcher()})
+        registry.update_pending()
+        self.assertEqual(registry.pending, set())
+        self.assertEqual(options.poller.readables, set([6]))
+        self.assertEqual(options.poller.writables, set([7]))
+
+    def test_update_only_pushes_changes(self):
+        options = DummyOptions()
+        registry = self._makeOne(options)
+        dispatcher = DummyDispatcher(readable=True)
+        registry.add(6, dispatcher)
+        registry.update_pending()
+        calls = []
+        options.poller.register_readable = calls.append
+        registry.update(6)
+        self.assertEqual(calls, [])
+        dispatcher._readable = False
+        registry.update(6)
+        self.assertEqual(options.poller.readables, set())
+
+    def test_touch(self):
+        options = DummyOptions()
+        registry = self._makeOne(options)
+        registry.touch(6)
+        self.assertEqual(registry.pending, set())
+        registry.add(6, DummyDispatcher())
+        registry.update_pending()
+        registry.touch(6)
+        self.assertEqual(registry.pending, set([6]))
+
+    def test_remove_unregisters_interest(self):
+        options = DummyOptions()
+        registry = self._makeOne(options)
+        dispatcher = DummyDispatcher(readable=True)
+        registry.add(6, dispatcher)
+        registry.update_pending()
+        registry.remove(6, dispatcher)
+        self.assertFalse(6 in registry)
+        self.assertEqual(options.poller.readables, set())
+
+    def test_remove_ignores_reused_fd(self):
+        options = DummyOptions()
+        registry = self._makeOne(options)
+        old = DummyDispatcher(readable=True)
+        new = DummyDispatcher(readable=True)
+        registry.add(6, old)
+        registry.add(6, new)
+        registry.update_pending()
+        registry.remove_dispatchers({6: old})
+        self.assertTrue(registry.get(6) is new)
+        self.assertEqual(options.poller.readables, set([6]))
+
+    def test_remove_ignores_poller_errors(self):
+        options = DummyOptions()
+        registry = self._makeOne(options)
+        registry.add(6, DummyDispatcher(readable=True))
+        registry.update_pending()
+        def unregister(fd):
+            raise KeyError(fd)
+        options.poller.unregister_readable = unregister
+        registry.remove(6)
+        self.assertFalse(6 in registry)
+
+    def test_update_sockets(self):
+        options = DummyOptions()
+        registry = self._makeOne(options)
+        channel = DummyDispatcher(readable=True)
+        socket_map = {6: channel}
+        registry.update_sockets(socket_map)
+        self.assertTrue(registry.get(6) is channel)
+        self.assertEqual(options.poller.readables, set([6]))
+        channel._writable = True
+        registry.update_sockets(socket_map)
+        self.assertEqual(options.poller.writables, set([6]))
+        del socket_map[6]
+        registry.update_sockets(socket_map)
+        self.assertFalse(6 in registry)
+        self.assertEqual(options.poller.readables, set())
+        self.assertEqual(options.poller.writables, set())
+
+    def test_update_sockets_keeps_process_dispatcher_on_reused_fd(self):
+        options = DummyOptions()
+        registry = self._makeOne(options)
+        socket_map = {6: DummyDispatcher(readable=True)}
+        registry.update_sockets(socket_map)
+        process_dispatcher = DummyDispatcher(readable=True)
+        registry.add(6, process_dispatcher)
+        del socket_map[6]
+        registry.update_sockets(socket_map)
+        self.assertTrue(registry.get(6) is process_dispatcher)
+
+    def test_resync(self):
+        options = DummyOptions()
+        registry = self._makeOne(options)
+        registry.add(6, DummyDispatcher(readable=True))
+        registry.update_pending()
+        options.poller.readables.clear()
+        registry.resync()
+        registry.update_pending()
+        self.assertEqual(options.poller.readables, set([6]))
+
+    def test_update_pending_after_poller_reset(self):
+        options = DummyOptions()
+        registry = self._makeOne(options)
+        registry.add(6, DummyDispatcher(readable=True))
+        registry.update_pending()
+        options.poller.readables.clear()
+        options.poller.resets += 1
+        registry.update_pending()
+        self.assertEqual(options.poller.readables, set([6]))
+
+    def test_add_sets_edge_triggered(self):
+        options = DummyOptions()
+        registry = self._makeOne(options)
+        edge = DummyDispatcher(readable=True)
+        edge.edge_triggered = True
+        registry.add(6, edge)
+        registry.add(7, DummyDispatcher(readable=True))
+        self.assertEqual(options.poller.edge_triggered, set([6]))
+
+if implements_epoll():
+    EPollPollerTestsBase = unittest.TestCase
+else:
+    EPollPollerTestsBase = SkipTestCase
+
+class EPollPollerTests(EPollPollerTestsBase):
+
+    def _makeOne(self, options):
+        return EPollPoller(options)
+
+    def _makeWithDummy(self, options=None, **kw):
+        if options is None:
+            options = DummyOptions()
+        poller = self._makeOne(options)
+        poller._epoll.close()
+        poller._epoll = DummyEPoll(**kw)
+        return poller
+
+    def test_register_readable(self):
+        poller = self._makeWithDummy()
+        poller.register_readable(6)
+        self.assertEqual(poller.readables, set([6]))
+        self.assertEqual(poller._epoll.calls,
+                         [('register', 6, poller.READ)])
+
+    def test_register_writable_after_readable_modifies(self):
+        poller = self._makeWithDummy()
+        poller.register_readable(6)
+        poller.register_writable(6)
+        self.assertEqual(poller._epoll.calls,
+                         [('register', 6, poller.READ),
+                          ('modify', 6, poller.READ | poller.WRITE)])
+
+    def test_unregister_last_interest_unregisters(self):
+        poller = self._makeWithDummy()
+        poller.register_readable(6)
+        poller.register_writable(6)
+        poller.unregister_readable(6)
+        poller.unregister_writable(6)
+        poller.unregister_writable(100) # not registered, ignored
+        self.assertEqual(poller.readables, set())
+        self.assertEqual(poller.writables, set())
+        self.assertEqual(poller._epoll.calls[2:],
+                         [('modify', 6, poller.WRITE),
+                          ('unregister', 6)])
+
+    def test_register_reused_fd_falls_back_to_register(self):
+        poller = self._makeWithDummy(raise_errno_modify=errno.ENOENT)
+        poller.register_readable(6)
+        poller.register_writable(6)
+        self.assertEqual(poller._epoll.calls[-1],
+                         ('register', 6, poller.READ | poller.WRITE))
+
+    def test_register_existing_fd_falls_back_to_modify(self):
+        poller = self._makeWithDummy(raise_errno_register=errno.EEXIST)
+        poller.register_readable(6)
+        self.assertEqual(poller._epoll.calls[-1],
+                         ('modify', 6, poller.READ))
+
+    def test_register_ignores_ebadf(self):
+        options = DummyOptions()
+        poller = self._makeWithDummy(options,
+                                     raise_errno_register=errno.EBADF)
+        poller.register_readable(6)
+        self.assertEqual(poller.readables, set())
+        self.assertEqual(options.logger.data[0],
+                         'EBADF encountered in epoll. Invalid file descriptor 6')
+
+    def test_register_uncaught_exception(self):
+        poller = self._makeWithDummy(raise_errno_register=errno.ENOMEM)
+        self.assertRaises(OSError, poller.register_readable, 6)
+
+    def test_set_edge_triggered_requires_option(self):
+        poller = self._makeWithDummy()
+        poller.set_edge_triggered(6, True)
+        poller.register_readable(6)
+        self.assertEqual(poller._epoll.calls,
+                         [('register', 6, poller.READ)])
+
+    def test_set_edge_triggered(self):
+        options = DummyOptions()
+        options.epoll_edge_triggered = True
+        poller = self._makeWithDummy(options)
+        poller.set_edge_triggered(6, True)
+        poller.register_readable(6)
+        poller.register_writable(6)
+        self.assertEqual(poller._epoll.calls,
+                         [('register', 6, poller.READ | select.EPOLLET),
+                          ('modify', 6, poller.READ | select.EPOLLET |
+                                        poller.WRITE)])
+
+    def test_is_edge_triggered(self):
+        options = DummyOptions()
+        options.epoll_edge_triggered = True
+        poller = self._makeWithDummy(options)
+        poller.set_edge_triggered(6, True)
+        self.assertTrue(poller.is_edge_triggered(6))
+        self.assertFalse(poller.is_edge_triggered(7))
+        # not without the option
+        poller = self._makeWithDummy()
+        poller.set_edge_triggered(6, True)
+        self.assertFalse(poller.is_edge_triggered(6))
+
+    def test_set_edge_triggered_modifies_registered_fd(self):
+        options = DummyOptions()
+        options.epoll_edge_triggered = True
+        poller = self._makeWithDummy(options)
+        poller.register_readable(6)
+        poller.set_edge_triggered(6, True)
+        poller.set_edge_triggered(6, True)
+        poller.set_edge_triggered(6, False)
+        self.assertEqual(poller._epoll.calls,
+                         [('register', 6, poller.READ),
+                          ('modify', 6, poller.READ | select.EPOLLET),
+                          ('modify', 6, poller.READ)])
+
+    def test_poll_returns_readables_and_writables(self):
+        poller = self._makeWithDummy(result=[(6, select.EPOLLIN),
+                                             (7, select.EPOLLHUP),
+                                             (8, select.EPOLLOUT),
+                                             (9, select.EPOLLERR),
+                                             (10, select.EPOLLIN)])
+        poller.register_readable(6)
+        poller.register_readable(7)
+        poller.register_writable(8)
+        poller.register_readable(9)
+        readables, writables = poller.poll(1)
+        self.assertEqual(readables, [6, 7, 9])
+        self.assertEqual(writables, [8])
+        self.assertEqual(poller._epoll.polled, [(1, EPollPoller.max_events)])
+
+    def test_poll_ignores_eintr(self):
+        options = DummyOptions()
+        poller = self._makeWithDummy(options, raise_errno_poll=errno.EINTR)
+        poller.register_readable(6)
+        self.assertEqual(poller.poll(1), ([], []))
+        self.assertEqual(options.logger.data[0], 'EINTR encountered in poll')
+
+    def test_poll_uncaught_exception(self):
+        poller = self._makeWithDummy(raise_errno_poll=errno.EINVAL)
+        poller.register_readable(6)
+        self.assertRaises(OSError, poller.poll, 1)
+
+    def test_poll_with_real_epoll(self):
+        import os
+        r, w = os.pipe()
+        poller = self._makeOne(DummyOptions())
+        try:
+            poller.register_readable(r)
+            self.assertEqual(poller.poll(0), ([], []))
+            os.write(w, b'x')
+            self.assertEqual(poller.poll(0), ([r], []))
+            poller.unregister_readable(r)
+            self.assertEqual(poller.poll(0), ([], []))
+        finally:
+            poller.close()
+            os.close(r)
+            os.close(w)
+
+    def test_close_closes_epoll(self):
+        mock_epoll = Mock()
+        poller = self._makeOne(DummyOptions())
+        poller._epoll.close()
+        poller._epoll = mock_epoll
+        poller.close()
+        mock_epoll.close.assert_called_once_with()
+        self.assertEqual(poller._epoll, None)
+
 if implements_kqueue():
     KQueuePollerTestsBase = unittest.TestCase
 else:
@@ -350,6 +665,106 @@ class PollerPollTests(PollerPollTestsBase):
         self.assertEqual(readables, [7])
         self.assertEqual(select_poll.unregistered, [6])
 
+if implements_asyncio():
+    AsyncioPollerTestsBase = unittest.TestCase
+else:
+    AsyncioPollerTestsBase = SkipTestCase
+
+class AsyncioPollerTests(AsyncioPollerTestsBase):
+
+    def setUp(self):
+        self.options = DummyOptions()
+        self.poller = AsyncioPoller(self.options)
+        self.fds = []
+
+    def tearDown(self):
+        self.poller.close()
+        for fd in self.fds:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def _makePipe(self):
+        r, w = os.pipe()
+        self.fds.extend([r, w])
+        return r, w
+
+    def test_poll_returns_readable(self):
+        r, w = self._makePipe()
+        other_r, other_w = self._makePipe()
+        self.poller.register_readable(r)
+        self.poller.register_readable(other_r)
+        os.write(w, b'x')
+        readables, writables = self.poller.poll(1)
+        self.assertEqual(readables, [r])
+        self.assertEqual(writables, [])
+
+    def test_poll_returns_all_ready_fds(self):
+        r, w = self._makePipe()
+        other_r, other_w = self._makePipe()
+        self.poller.register_readable(r)
+        self.poller.register_readable(other_r)
+        self.poller.register_writable(w)
+        os.write(w, b'x')
+        os.write(other_w, b'x')
+        readables, writables = self.poller.poll(1)
+        self.assertEqual(sorted(readables), sorted([r, other_r]))
+        self.assertEqual(writables, [w])
+
+    def test_poll_timeout(self):
+        r, w = self._makePipe()
+        self.poller.register_readable(r)
+        readables, writables = self.poller.poll(0.01)
+        self.assertEqual(readables, [])
+        self.assertEqual(writables, [])
+
+    def test_unregister_readable(self):
+        r, w = self._makePipe()
+        self.poller.register_readable(r)
+        self.poller.unregister_readable(r)
+        os.write(w, b'x')
+        readables, writables = self.poller.poll(0.01)
+        self.assertEqual(readables, [])
+        self.assertEqual(self.poller.readables, set())
+
+    def test_unregister_writable(self):
+        r, w = self._makePipe()
+        self.poller.register_writable(w)
+        self.poller.unregister_writable(w)
+        readables, writables = self.poller.poll(0.01)
+        self.assertEqual(writables, [])
+        self.assertEqual(self.poller.writables, set())
+
+    def test_register_twice_is_noop(self):
+        r, w = self._makePipe()
+        self.poller.register_readable(r)
+        self.poller.register_readable(r)
+        self.assertEqual(self.poller.readables, set([r]))
+
+    def test_register_closed_fd_logs(self):
+        r, w = self._makePipe()
+        os.close(r)
+        self.poller.register_readable(r)
+        self.assertEqual(len(self.options.logger.data), 1)
+        self.assertTrue(self.options.logger.data[0].endswith(
+            'encountered in asyncio loop. Invalid file descriptor %s' % r))
+
+    def test_poll_runs_callbacks_scheduled_on_loop(self):
+        called = []
+        self.poller.loop.call_soon(called.append, 1)
+        readables, writables = self.poller.poll(0.01)
+        self.assertEqual(called, [1])
+        self.assertEqual(readables, [])
+
+    def test_exception_in_callback_is_logged(self):
+        def fail():
+            raise ValueError('boom')
+        self.poller.loop.call_soon(fail)
+        self.poller.poll(0.01)
+        self.assertEqual(self.options.logger.data,
+                         ['uncaught exception in asyncio loop: boom'])
+
 class DummySelect(object):
     '''
     Fake implementation of select.select()
@@ -436,3 +851,38 @@ class FakeKEvent(object):
     def __init__(self, ident, filter):
         self.ident = ident
         self.filter = filter
+
+class DummyEPoll(object):
+    '''
+    Fake implementation of select.epoll()
+    '''
+    def __init__(self, result=None, raise_errno_poll=None,
+                 raise_errno_register=None, raise_errno_modify=None):
+        self.result = result or []
+        self.errno_poll = raise_errno_poll
+        self.errno_register = raise_errno_register
+        self.errno_modify = raise_errno_modify
+        self.calls = []
+        self.polled = []
+
+    def raise_error(self, err):
+        if not err: return
+        ex = OSError()
+        ex.errno = err
+        raise ex
+
+    def register(self, fd, eventmask):
+        self.raise_error(self.errno_register)
+        self.calls.append(('register', fd, eventmask))
+
+    def modify(self, fd, eventmask):
+        self.raise_error(self.errno_modify)
+        self.calls.append(('modify', fd, eventmask))
+
+    def unregister(self, fd):
+        self.calls.append(('unregister', fd))
+
+    def poll(self, timeout, max_events):
+        self.polled.append((timeout, max_events))
+        self.raise_error(self.errno_poll)
+        return self.result
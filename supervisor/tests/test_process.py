@@ -1,6 +1,7 @@
 import errno
 import os
 import signal
+import shutil
 import tempfile
 import time
 import unittest
@@ -90,6 +91,133 @@ class SubprocessTests(unittest.TestCase):
         self.assertEqual(instance.dispatchers[0].logs_removed, True)
         self.assertEqual(instance.dispatchers[1].logs_removed, False)
 
+    def test_ctor_output_rings(self):
+        options = DummyOptions()
+        config = DummyPConfig(options, 'test', '/test', stderr_ring_bytes=100)
+        instance = self._makeOne(config)
+        self.assertEqual(list(instance.output_rings.keys()), ['stderr'])
+        self.assertEqual(instance.output_rings['stderr'].maxbytes, 100)
+
+    def test_removelogs_clears_output_rings(self):
+        options = DummyOptions()
+        config = DummyPConfig(options, 'test', '/test', stdout_ring_bytes=100)
+        instance = self._makeOne(config)
+        ring = instance.output_rings['stdout']
+        ring.write(b'hello')
+        instance.removelogs()
+        self.assertEqual(ring.read(), b'')
+
+    def test_flushlogs(self):
+        options = DummyOptions()
+        config = DummyPConfig(options, 'test', '/test')
+        instance = self._makeOne(config)
+        instance.dispatchers = {0:DummyDispatcher(readable=True),
+                                1:DummyDispatcher(writable=True)}
+        instance.flushlogs()
+        self.assertEqual(instance.dispatchers[0].logs_flushed, True)
+        self.assertEqual(instance.dispatchers[1].logs_flushed, False)
+
+    def _makeLimited(self, options, rate=100, burst=200):
+        from supervisor.ratelimit import TokenBucket
+        config = DummyPConfig(options, 'test', '/test',
+                              output_rate_limit=rate, output_rate_burst=burst)
+        instance = self._makeOne(config)
+        instance.pid = 11
+        instance.dispatchers = {5:DummyDispatcher(readable=True),
+                                7:DummyDispatcher(readable=True)}
+        options.dispatcher_registry.add_dispatchers(instance.dispatchers)
+        options.dispatcher_registry.update_pending()
+        instance.output_limit = TokenBucket(rate, burst, time.time())
+        return instance
+
+    def test_output_read_without_limit(self):
+        options = DummyOptions()
+        config = DummyPConfig(options, 'test', '/test')
+        instance = self._makeOne(config)
+        self.assertTrue(instance.output_read(1 << 20))
+        self.assertEqual(instance.bytes_read, 1 << 20)
+        self.assertFalse(instance.output_throttled)
+
+    def test_output_read_within_limit(self):
+        options = DummyOptions()
+        instance = self._makeLimited(options)
+        self.assertTrue(instance.output_read(100))
+        self.assertTrue(instance.output_read(0))
+        self.assertEqual(instance.bytes_read, 100)
+        self.assertFalse(instance.output_throttled)
+
+    def test_output_read_over_limit_throttles(self):
+        from supervisor import events
+        L = []
+        events.subscribe(events.ProcessOutputThrottledEvent, L.append)
+        options = DummyOptions()
+        instance = self._makeLimited(options)
+        self.assertFalse(instance.output_read(300))
+        self.assertTrue(instance.output_throttled)
+        self.assertEqual(instance.throttled, 1)
+        self.assertTrue(instance in options.output_resumes)
+        # paying back the debt of 100 bytes and refilling 200 takes 3s
+        deadline = options.timers.next_deadline()
+        self.assertTrue(2.5 < deadline - instance.throttled_since <= 3)
+        # every dispatcher must be looked at again
+        self.assertEqual(options.dispatcher_registry.pending, set([5, 7]))
+        self.assertEqual(len(L), 1)
+        self.assertTrue(L[0].process is instance)
+        self.assertEqual(L[0].pid, 11)
+        self.assertEqual(L[0].until, deadline)
+        self.assertTrue(options.logger.data[0].startswith(
+            'throttled output of test for'))
+
+    def test_throttle_output_twice_counts_once(self):
+        options = DummyOptions()
+        instance = self._makeLimited(options)
+        instance.throttle_output(100, 105)
+        instance.throttle_output(101, 110)
+        self.assertEqual(instance.throttled, 1)
+        self.assertEqual(instance.throttled_since, 100)
+        self.assertEqual(options.timers.next_deadline(), 110)
+        self.assertEqual(len(options.timers), 1)
+
+    def test_resume_output(self):
+        options = DummyOptions()
+        instance = self._makeLimited(options)
+        instance.throttle_output(100, 105)
+        options.dispatcher_registry.update_pending()
+        instance.resume_output(104)
+        self.assertFalse(instance.output_throttled)
+        self.assertEqual(instance.throttled_since, None)
+        self.assertEqual(instance.throttled_time, 4)
+        self.assertFalse(instance in options.output_resumes)
+        self.assertEqual(options.dispatcher_registry.pending, set([5, 7]))
+        # resuming a process that isn't throttled does nothing
+        instance.resume_output(110)
+        self.assertEqual(instance.throttled_time, 4)
+
+    def test_spawn_as_parent_makes_output_limit(self):
+        options = DummyOptions()
+        options.forkpid = 10
+        config = DummyPConfig(options, 'good', '/good/filename',
+                              output_rate_limit=1000)
+        instance = self._makeOne(config)
+        instance.spawn()
+        self.assertEqual(instance.output_limit.rate, 1000)
+        self.assertEqual(instance.output_limit.burst, 1000)
+
+    def test_finish_reads_output_of_throttled_process(self):
+        options = DummyOptions()
+        instance = self._makeLimited(options)
+        instance.dispatchers = {5:DummyDispatcher(readable=True)}
+        instance.throttle_output(time.time(), time.time() + 10)
+        instance.killing = True
+        from supervisor.states import ProcessStates
+        instance.state = ProcessStates.STOPPING
+        drained = []
+        instance.drain = lambda: drained.append(instance.output_throttled)
+        instance.finish(11, 1)
+        self.assertEqual(drained, [False])
+        self.assertEqual(instance.output_limit, None)
+        self.assertEqual(len(options.output_resumes), 0)
+
     def test_drain(self):
         options = DummyOptions()
         config = DummyPConfig(options, 'test', '/test',
@@ -180,6 +308,95 @@ class SubprocessTests(unittest.TestCase):
             self.assertEqual(args[0], f.name)
             self.assertEqual(args[1], [basename, 'foo'])
 
+    def test_get_execv_args_caches_spawn_plan(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            dirs = [os.path.join(tempdir, d) for d in ('a', 'b', 'c')]
+            for dirname in dirs:
+                os.mkdir(dirname)
+            filename = os.path.join(dirs[2], 'prog')
+            with open(filename, 'w'):
+                pass
+            options = DummyOptions()
+            stats = []
+            def stat(filename):
+                stats.append(filename)
+                return os.stat(filename)
+            options.stat = stat
+            config = DummyPConfig(options, 'prog', 'prog foo')
+            config.get_path = lambda: dirs
+            instance = self._makeOne(config)
+            args = instance.get_execv_args()
+            self.assertEqual(args, (filename, ['prog', 'foo']))
+            self.assertEqual(len(stats), 3)
+            # the returned argv can be changed without changing the plan
+            args[1].append('bar')
+            del stats[:]
+            args = instance.get_execv_args()
+            self.assertEqual(args, (filename, ['prog', 'foo']))
+            self.assertEqual(stats, [filename])
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_get_execv_args_spawn_plan_invalidated_by_new_file(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            dirs = [os.path.join(tempdir, d) for d in ('a', 'b')]
+            for dirname in dirs:
+                os.mkdir(dirname)
+            old = os.path.join(dirs[1], 'prog')
+            with open(old, 'w'):
+                pass
+            options = DummyOptions()
+            config = DummyPConfig(options, 'prog', 'prog')
+            config.get_path = lambda: dirs
+            instance = self._makeOne(config)
+            self.assertEqual(instance.get_execv_args()[0], old)
+            # replaced by a new file, as done by package managers
+            new = os.path.join(dirs[0], 'prog')
+            with open(new, 'w'):
+                pass
+            os.rename(new, old)
+            key = config.spawn_plan[2]
+            self.assertEqual(instance.get_execv_args()[0], old)
+            self.assertNotEqual(config.spawn_plan[2], key)
+            # removed, and found in another directory of $PATH
+            os.unlink(old)
+            with open(new, 'w'):
+                pass
+            self.assertEqual(instance.get_execv_args()[0], new)
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_get_execv_args_missing_file_not_cached(self):
+        options = DummyOptions()
+        config = DummyPConfig(options, 'notthere', '/notthere')
+        instance = self._makeOne(config)
+        instance.get_execv_args()
+        self.assertEqual(config.spawn_plan, None)
+
+    def test_get_environment_is_cached(self):
+        options = DummyOptions()
+        config = DummyPConfig(options, 'cat', '/bin/cat',
+                              environment={'FOO': 'bar'})
+        instance = self._makeOne(config)
+        env = instance._get_environment()
+        self.assertEqual(env['FOO'], 'bar')
+        self.assertTrue(instance._get_environment() is env)
+        config.clear_spawn_plan()
+        self.assertFalse(instance._get_environment() is env)
+
+    def test_get_environment_follows_os_environ(self):
+        options = DummyOptions()
+        config = DummyPConfig(options, 'cat', '/bin/cat')
+        instance = self._makeOne(config)
+        env = instance._get_environment()
+        with patch.dict(os.environ, {'_SUPERVISOR_TEST_': '1'}):
+            changed = instance._get_environment()
+            self.assertEqual(changed['_SUPERVISOR_TEST_'], '1')
+        self.assertFalse('_SUPERVISOR_TEST_' in instance._get_environment())
+        self.assertEqual(instance._get_environment(), env)
+
     def test_record_spawnerr(self):
         options = DummyOptions()
         config = DummyPConfig(options, 'test', '/test')
@@ -366,7 +583,7 @@ class SubprocessTests(unittest.TestCase):
         self.assertEqual(options.child_pipes_closed, None)
         self.assertEqual(options.pgrp_set, True)
         self.assertEqual(len(options.duped), 3)
-        self.assertEqual(len(options.fds_closed), options.minfds - 3)
+        self.assertTrue(options.child_fds_closed)
         self.assertEqual(options.privsdropped, 1)
         self.assertEqual(options.execv_args,
                          ('/good/filename', ['/good/filename']) )
@@ -389,7 +606,7 @@ class SubprocessTests(unittest.TestCase):
         self.assertEqual(options.child_pipes_closed, None)
         self.assertEqual(options.pgrp_set, True)
         self.assertEqual(len(options.duped), 3)
-        self.assertEqual(len(options.fds_closed), options.minfds - 3)
+        self.assertTrue(options.child_fds_closed)
         self.assertEqual(options.written,
              {2: "supervisor: couldn't setuid to 1: failure reason\n"
                  "supervisor: child process was not spawned\n"})
@@ -409,7 +626,7 @@ class SubprocessTests(unittest.TestCase):
         self.assertEqual(options.child_pipes_closed, None)
         self.assertEqual(options.pgrp_set, True)
         self.assertEqual(len(options.duped), 3)
-        self.assertEqual(len(options.fds_closed), options.minfds - 3)
+        self.assertTrue(options.child_fds_closed)
         self.assertEqual(options.execv_args,
                          ('/good/filename', ['/good/filename']) )
         self.assertEqual(options.changed_directory, True)
@@ -451,7 +668,7 @@ class SubprocessTests(unittest.TestCase):
         self.assertEqual(options.child_pipes_closed, None)
         self.assertEqual(options.pgrp_set, True)
         self.assertEqual(len(options.duped), 3)
-        self.assertEqual(len(options.fds_closed), options.minfds - 3)
+        self.assertTrue(options.child_fds_closed)
         self.assertEqual(options.execv_args, None)
         out = {2: "supervisor: couldn't chdir to /tmp: ENOENT\n"
                   "supervisor: child process was not spawned\n"}
@@ -473,7 +690,7 @@ class SubprocessTests(unittest.TestCase):
         self.assertEqual(options.child_pipes_closed, None)
         self.assertEqual(options.pgrp_set, True)
         self.assertEqual(len(options.duped), 3)
-        self.assertEqual(len(options.fds_closed), options.minfds - 3)
+        self.assertTrue(options.child_fds_closed)
         out = {2: "supervisor: couldn't exec /good/filename: EPERM\n"
                   "supervisor: child process was not spawned\n"}
         self.assertEqual(options.written, out)
@@ -492,7 +709,7 @@ class SubprocessTests(unittest.TestCase):
         self.assertEqual(options.child_pipes_closed, None)
         self.assertEqual(options.pgrp_set, True)
         self.assertEqual(len(options.duped), 3)
-        self.assertEqual(len(options.fds_closed), options.minfds - 3)
+        self.assertTrue(options.child_fds_closed)
         msg = options.written[2] # dict, 2 is fd #
         head = "supervisor: couldn't exec /good/filename:"
         self.assertTrue(msg.startswith(head))
@@ -518,6 +735,8 @@ class SubprocessTests(unittest.TestCase):
         instance = self._makeOne(config)
         class Dummy:
             name = 'dummy'
+            def schedule_transition(self, process, when):
+                pass
         instance.group = Dummy()
         instance.group.config = Dummy()
         result = instance.spawn()
@@ -545,7 +764,7 @@ class SubprocessTests(unittest.TestCase):
         self.assertEqual(options.child_pipes_closed, None)
         self.assertEqual(options.pgrp_set, True)
         self.assertEqual(len(options.duped), 2)
-        self.assertEqual(len(options.fds_closed), options.minfds - 3)
+        self.assertTrue(options.child_fds_closed)
         self.assertEqual(options.privsdropped, 1)
         self.assertEqual(options.execv_args,
                          ('/good/filename', ['/good/filename']) )
@@ -578,6 +797,154 @@ class SubprocessTests(unittest.TestCase):
         from supervisor.states import ProcessStates
         self.assertEqual(instance.state, ProcessStates.STARTING)
 
+    def test_spawn_as_parent_registers_dispatchers(self):
+        options = DummyOptions()
+        options.forkpid = 10
+        config = DummyPConfig(options, 'good', '/good/filename')
+        instance = self._makeOne(config)
+        instance.spawn()
+        registry = options.dispatcher_registry
+        for fd, dispatcher in instance.dispatchers.items():
+            self.assertTrue(registry.get(fd) is dispatcher)
+        self.assertEqual(sorted(registry.pending), [4, 5, 7])
+
+    def test_spawn_as_parent_registers_pidfd(self):
+        options = DummyOptions()
+        options.forkpid = 10
+        options.pidfd_open_result = 9
+        config = DummyPConfig(options, 'good', '/good/filename')
+        instance = self._makeOne(config)
+        instance.spawn()
+        dispatcher = instance.pidfd_dispatcher
+        self.assertEqual(dispatcher.fd, 9)
+        self.assertEqual(dispatcher.pid, 10)
+        self.assertTrue(options.dispatcher_registry.get(9) is dispatcher)
+        self.assertFalse(9 in instance.dispatchers)
+
+    def test_spawn_as_parent_without_pidfd_support(self):
+        options = DummyOptions()
+        options.forkpid = 10
+        config = DummyPConfig(options, 'good', '/good/filename')
+        instance = self._makeOne(config)
+        instance.spawn()
+        self.assertEqual(instance.pidfd_dispatcher, None)
+
+    def test_spawn_records_fork_time(self):
+        options = DummyOptions()
+        options.forkpid = 10
+        config = DummyPConfig(options, 'good', '/good/filename')
+        instance = self._makeOne(config)
+        instance.spawn()
+        spawns = options.spawn_scheduler.spawns
+        self.assertEqual(list(spawns.keys()), ['fork'])
+        self.assertEqual(spawns['fork']['count'], 1)
+
+    def test_spawn_with_posix_spawn(self):
+        if not hasattr(os, 'posix_spawn'):
+            return
+        options = DummyOptions()
+        options.spawn_method = 'auto'
+        options.forkpid = 10
+        config = DummyPConfig(options, 'good', '/good/filename')
+        instance = self._makeOne(config)
+        result = instance.spawn()
+        self.assertEqual(result, 10)
+        filename, argv, env, file_actions = options.posix_spawn_args
+        self.assertEqual((filename, argv),
+                         ('/good/filename', ['/good/filename']))
+        self.assertEqual(env['SUPERVISOR_PROCESS_NAME'], 'good')
+        pipes = instance.pipes
+        self.assertEqual(file_actions, [
+            (os.POSIX_SPAWN_DUP2, pipes['child_stdin'], 0),
+            (os.POSIX_SPAWN_DUP2, pipes['child_stdout'], 1),
+            (os.POSIX_SPAWN_DUP2, pipes['child_stderr'], 2),
+            ])
+        self.assertEqual(options.pgrp_set, None)
+        self.assertEqual(len(options.child_pipes_closed), 6)
+        self.assertEqual(options.logger.data[0], "spawned: 'good' with pid 10")
+        self.assertEqual(instance.pid, 10)
+        self.assertEqual(options.spawn_scheduler.spawns['posix_spawn']['count'],
+                         1)
+        from supervisor.states import ProcessStates
+        self.assertEqual(instance.state, ProcessStates.STARTING)
+
+    def test_spawn_with_posix_spawn_stderr_redirected(self):
+        if not hasattr(os, 'posix_spawn'):
+            return
+        options = DummyOptions()
+        options.spawn_method = 'auto'
+        options.forkpid = 10
+        config = DummyPConfig(options, 'good', '/good/filename',
+                              redirect_stderr=True)
+        instance = self._makeOne(config)
+        instance.spawn()
+        file_actions = options.posix_spawn_args[3]
+        stdout = instance.pipes['child_stdout']
+        self.assertEqual(file_actions[1:], [(os.POSIX_SPAWN_DUP2, stdout, 1),
+                                            (os.POSIX_SPAWN_DUP2, stdout, 2)])
+
+    def test_spawn_uses_fork_when_program_needs_it(self):
+        if not hasattr(os, 'posix_spawn'):
+            return
+        for kw in ({'uid': 1}, {'directory': '/tmp'}, {'umask': 0o22}):
+            options = DummyOptions()
+            options.spawn_method = 'auto'
+            options.forkpid = 10
+            config = DummyPConfig(options, 'good', '/good/filename', **kw)
+            instance = self._makeOne(config)
+            instance.spawn()
+            self.assertEqual(options.posix_spawn_args, None)
+            self.assertEqual(list(options.spawn_scheduler.spawns.keys()),
+                             ['fork'])
+
+    def test_spawn_with_posix_spawn_fail(self):
+        if not hasattr(os, 'posix_spawn'):
+            return
+        options = DummyOptions()
+        options.spawn_method = 'auto'
+        options.posix_spawn_exception = OSError(errno.ENOENT,
+                                                os.strerror(errno.ENOENT))
+        config = DummyPConfig(options, 'good', '/good/filename')
+        instance = self._makeOne(config)
+        from supervisor.states import ProcessStates
+        instance.state = ProcessStates.BACKOFF
+        result = instance.spawn()
+        self.assertEqual(result, None)
+        msg = "couldn't exec /good/filename: ENOENT"
+        self.assertEqual(instance.spawnerr, msg)
+        self.assertEqual(options.logger.data[0], "spawnerr: %s" % msg)
+        self.assertEqual(len(options.parent_pipes_closed), 6)
+        self.assertEqual(len(options.child_pipes_closed), 6)
+        self.assertEqual(instance.pid, 0)
+        self.assertEqual(instance.state, ProcessStates.BACKOFF)
+
+    def test_spawn_with_posix_spawn_fail_eagain(self):
+        if not hasattr(os, 'posix_spawn'):
+            return
+        options = DummyOptions()
+        options.spawn_method = 'auto'
+        options.posix_spawn_exception = OSError(errno.EAGAIN,
+                                                os.strerror(errno.EAGAIN))
+        config = DummyPConfig(options, 'good', '/good/filename')
+        instance = self._makeOne(config)
+        result = instance.spawn()
+        self.assertEqual(result, None)
+        self.assertEqual(instance.spawnerr,
+                         "Too many processes in process table to spawn 'good'")
+
+    def test_spawn_with_posix_spawn_bad_environment(self):
+        if not hasattr(os, 'posix_spawn'):
+            return
+        options = DummyOptions()
+        options.spawn_method = 'auto'
+        options.posix_spawn_exception = ValueError('embedded null byte')
+        config = DummyPConfig(options, 'good', '/good/filename')
+        instance = self._makeOne(config)
+        result = instance.spawn()
+        self.assertEqual(result, None)
+        self.assertEqual(instance.spawnerr,
+                         "couldn't exec /good/filename: embedded null byte")
+
     def test_spawn_redirect_stderr(self):
         options = DummyOptions()
         options.forkpid = 10
@@ -607,6 +974,17 @@ class SubprocessTests(unittest.TestCase):
         instance.killing = True
         self.assertRaises(OSError, instance.write, sent)
 
+    def test_write_marks_stdin_dispatcher_pending(self):
+        options = DummyOptions()
+        config = DummyPConfig(options, 'output', '/bin/cat')
+        instance = self._makeOne(config)
+        options.forkpid = 1
+        instance.spawn()
+        registry = options.dispatcher_registry
+        registry.update_pending()
+        instance.write('foo')
+        self.assertEqual(registry.pending, set([instance.pipes['stdin']]))
+
     def test_write_dispatcher_closed(self):
         executable = '/bin/cat'
         options = DummyOptions()
@@ -959,6 +1337,32 @@ class SubprocessTests(unittest.TestCase):
         self.assertEqual(options.kills[-11], signal.SIGKILL)
         self.assertEqual(L, []) # no event because we didn't change state
 
+    def test_kill_uses_pidfd(self):
+        from supervisor.dispatchers import PPidfdDispatcher
+        options = DummyOptions()
+        config = DummyPConfig(options, 'test', '/test')
+        instance = self._makeOne(config)
+        instance.pid = 11
+        instance.pidfd_dispatcher = PPidfdDispatcher(instance, 9, 11)
+        from supervisor.states import ProcessStates
+        instance.state = ProcessStates.RUNNING
+        instance.kill(signal.SIGTERM)
+        self.assertEqual(options.pidfd_kills, {9: signal.SIGTERM})
+        self.assertEqual(options.kills, {})
+
+    def test_kill_with_killasgroup_does_not_use_pidfd(self):
+        from supervisor.dispatchers import PPidfdDispatcher
+        options = DummyOptions()
+        config = DummyPConfig(options, 'test', '/test', killasgroup=True)
+        instance = self._makeOne(config)
+        instance.pid = 11
+        instance.pidfd_dispatcher = PPidfdDispatcher(instance, 9, 11)
+        from supervisor.states import ProcessStates
+        instance.state = ProcessStates.STOPPING
+        instance.kill(signal.SIGKILL)
+        self.assertEqual(options.kills, {-11: signal.SIGKILL})
+        self.assertEqual(options.pidfd_kills, {})
+
     def test_stopasgroup(self):
         options = DummyOptions()
         config = DummyPConfig(options, 'test', '/test', stopasgroup=True)
@@ -1004,6 +1408,19 @@ class SubprocessTests(unittest.TestCase):
         self.assertTrue(instance.pid in options.kills)
         self.assertEqual(options.kills[instance.pid], signal.SIGWINCH)
 
+    def test_signal_uses_pidfd(self):
+        from supervisor.dispatchers import PPidfdDispatcher
+        options = DummyOptions()
+        config = DummyPConfig(options, 'test', '/test')
+        instance = self._makeOne(config)
+        instance.pid = 11
+        instance.pidfd_dispatcher = PPidfdDispatcher(instance, 9, 11)
+        from supervisor.states import ProcessStates
+        instance.state = ProcessStates.RUNNING
+        instance.signal(signal.SIGWINCH)
+        self.assertEqual(options.pidfd_kills, {9: signal.SIGWINCH})
+        self.assertEqual(options.kills, {})
+
     def test_signal_from_running_error_ESRCH(self):
         options = DummyOptions()
         config = DummyPConfig(options, 'test', '/test')
@@ -1083,6 +1500,53 @@ class SubprocessTests(unittest.TestCase):
         self.assertEqual(event.extra_values, [('pid', 123)])
         self.assertEqual(event.from_state, ProcessStates.STOPPING)
 
+    def test_finish_removes_dispatchers_from_registry(self):
+        options = DummyOptions()
+        config = DummyPConfig(options, 'notthere', '/notthere')
+        instance = self._makeOne(config)
+        options.forkpid = 123
+        instance.spawn()
+        registry = options.dispatcher_registry
+        registry.update_pending()
+        self.assertEqual(len(registry), 3)
+        self.assertEqual(options.poller.readables, set([5, 7]))
+        instance.killing = True
+        from supervisor.states import ProcessStates
+        instance.state = ProcessStates.STOPPING
+        instance.finish(123, 1)
+        self.assertEqual(len(registry), 0)
+        self.assertEqual(options.poller.readables, set())
+
+    def test_finish_flushes_logs(self):
+        options = DummyOptions()
+        config = DummyPConfig(options, 'notthere', '/notthere')
+        instance = self._makeOne(config)
+        dispatcher = DummyDispatcher(readable=True)
+        instance.dispatchers = {0:dispatcher}
+        instance.pid = 123
+        instance.killing = True
+        from supervisor.states import ProcessStates
+        instance.state = ProcessStates.STOPPING
+        instance.finish(123, 1)
+        self.assertTrue(dispatcher.logs_flushed)
+
+    def test_finish_closes_pidfd(self):
+        options = DummyOptions()
+        options.pidfd_open_result = 9
+        config = DummyPConfig(options, 'notthere', '/notthere')
+        instance = self._makeOne(config)
+        options.forkpid = 123
+        instance.spawn()
+        dispatcher = instance.pidfd_dispatcher
+        instance.killing = True
+        from supervisor.states import ProcessStates
+        instance.state = ProcessStates.STOPPING
+        instance.finish(123, 1)
+        self.assertEqual(instance.pidfd_dispatcher, None)
+        self.assertTrue(dispatcher.closed)
+        self.assertFalse(9 in options.dispatcher_registry)
+        self.assertTrue(9 in options.fds_closed)
+
     def test_finish_running_state_exit_expected(self):
         options = DummyOptions()
         config = DummyPConfig(options, 'notthere', '/notthere',
@@ -1359,6 +1823,36 @@ class SubprocessTests(unittest.TestCase):
         self.assertEqual(event.from_state, ProcessStates.STOPPED)
         self.assertEqual(state_when_event_emitted, ProcessStates.STARTING)
 
+    def test_transition_stopped_queues_spawn_when_limit_reached(self):
+        from supervisor.states import ProcessStates, SupervisorStates
+        options = DummyOptions()
+        options.mood = SupervisorStates.RUNNING
+        options.max_concurrent_spawns = 1
+        pconfig1 = DummyPConfig(options, 'process1', '/bin/process1')
+        process1 = self._makeOne(pconfig1)
+        process1.spawn()
+        self.assertEqual(process1.state, ProcessStates.STARTING)
+        pconfig2 = DummyPConfig(options, 'process2', '/bin/process2')
+        process2 = self._makeOne(pconfig2)
+        process2.transition()
+        self.assertEqual(process2.state, ProcessStates.STOPPED)
+        self.assertTrue(options.spawn_scheduler.is_queued(process2))
+        # process1 becomes RUNNING, which lets process2 be spawned
+        process1.change_state(ProcessStates.RUNNING)
+        options.spawn_scheduler.dispatch()
+        self.assertEqual(process2.state, ProcessStates.STARTING)
+        self.assertFalse(options.spawn_scheduler.is_queued(process2))
+
+    def test_transition_stopped_administrative_stop_doesnt_autostart(self):
+        from supervisor.states import ProcessStates, SupervisorStates
+        options = DummyOptions()
+        options.mood = SupervisorStates.RUNNING
+        pconfig = DummyPConfig(options, 'process', '/bin/process')
+        process = self._makeOne(pconfig)
+        process.administrative_stop = True
+        process.transition()
+        self.assertEqual(process.state, ProcessStates.STOPPED)
+
     def test_transition_exited_to_starting_supervisor_stopping(self):
         from supervisor import events
         emitted_events = []
@@ -1727,6 +2221,105 @@ class SubprocessTests(unittest.TestCase):
         self.assertEqual(instance.backoff, 1)
         self.assertTrue(instance.delay > 0)
 
+    def test_change_state_schedules_transition(self):
+        from supervisor.states import ProcessStates
+        options = DummyOptions()
+        config = DummyPConfig(options, 'test', '/test')
+        instance = self._makeOne(config)
+        instance.state = ProcessStates.RUNNING
+        before = time.time()
+        instance.change_state(ProcessStates.EXITED)
+        deadline = options.timers.next_deadline()
+        self.assertTrue(before <= deadline <= time.time())
+        self.assertEqual(options.timers.pop_expired(deadline),
+                         [instance.transition])
+
+    def test_change_state_tracks_starting_processes(self):
+        from supervisor.states import ProcessStates
+        options = DummyOptions()
+        config = DummyPConfig(options, 'test', '/test')
+        instance = self._makeOne(config)
+        instance.change_state(ProcessStates.STARTING)
+        self.assertEqual(options.spawn_scheduler.as_dict()['starting'], 1)
+        instance.change_state(ProcessStates.RUNNING)
+        self.assertEqual(options.spawn_scheduler.as_dict()['starting'], 0)
+
+    def test_request_spawn_spawns(self):
+        options = DummyOptions()
+        config = DummyPConfig(options, 'test', '/test')
+        instance = self._makeOne(config)
+        spawned = []
+        instance.spawn = lambda: spawned.append(True)
+        self.assertTrue(instance.request_spawn())
+        self.assertEqual(spawned, [True])
+
+    def test_request_spawn_queued(self):
+        options = DummyOptions()
+        options.max_concurrent_spawns = 1
+        config = DummyPConfig(options, 'test', '/test')
+        instance = self._makeOne(config)
+        other = self._makeOne(DummyPConfig(options, 'other', '/other'))
+        from supervisor.states import ProcessStates
+        other.change_state(ProcessStates.STARTING)
+        spawned = []
+        instance.spawn = lambda: spawned.append(True)
+        self.assertFalse(instance.request_spawn())
+        self.assertEqual(spawned, [])
+        self.assertTrue(options.spawn_scheduler.is_queued(instance))
+
+    def test_schedule_transition_delegates_to_group(self):
+        options = DummyOptions()
+        config = DummyPConfig(options, 'test', '/test')
+        instance = self._makeOne(config)
+        gconfig = DummyPGroupConfig(options)
+        instance.group = DummyProcessGroup(gconfig)
+        instance.schedule_transition(10)
+        self.assertEqual(instance.group.scheduled_transitions,
+                         [(instance, 10)])
+        self.assertEqual(len(options.timers), 0)
+
+    def test_transition_schedules_startsecs_deadline(self):
+        from supervisor.states import ProcessStates
+        options = DummyOptions()
+        config = DummyPConfig(options, 'test', '/test', startsecs=10)
+        instance = self._makeOne(config)
+        instance.state = ProcessStates.STARTING
+        instance.laststart = time.time()
+        instance.transition()
+        self.assertEqual(instance.state, ProcessStates.STARTING)
+        self.assertEqual(options.timers.next_deadline(),
+                         instance.laststart + 10)
+
+    def test_transition_schedules_stopwaitsecs_deadline(self):
+        from supervisor.states import ProcessStates
+        options = DummyOptions()
+        config = DummyPConfig(options, 'test', '/test')
+        instance = self._makeOne(config)
+        instance.state = ProcessStates.STOPPING
+        instance.delay = time.time() + 10
+        instance.transition()
+        self.assertEqual(options.timers.next_deadline(), instance.delay)
+
+    def test_transition_schedules_backoff_deadline(self):
+        from supervisor.states import ProcessStates
+        options = DummyOptions()
+        config = DummyPConfig(options, 'test', '/test')
+        instance = self._makeOne(config)
+        instance.state = ProcessStates.BACKOFF
+        instance.backoff = 1
+        instance.delay = time.time() + 10
+        instance.transition()
+        self.assertEqual(options.timers.next_deadline(), instance.delay)
+
+    def test_transition_running_schedules_nothing(self):
+        from supervisor.states import ProcessStates
+        options = DummyOptions()
+        config = DummyPConfig(options, 'test', '/test')
+        instance = self._makeOne(config)
+        instance.state = ProcessStates.RUNNING
+        instance.transition()
+        self.assertEqual(len(options.timers), 0)
+
 class FastCGISubprocessTests(unittest.TestCase):
     def _getTargetClass(self):
         from supervisor.process import FastCGISubprocess
@@ -1769,7 +2362,7 @@ class FastCGISubprocessTests(unittest.TestCase):
         self.assertEqual(options.duped[7], 0)
         self.assertEqual(options.duped[instance.pipes['child_stdout']], 1)
         self.assertEqual(options.duped[instance.pipes['child_stderr']], 2)
-        self.assertEqual(len(options.fds_closed), options.minfds - 3)
+        self.assertTrue(options.child_fds_closed)
 
     def test_prepare_child_fds_stderr_redirected(self):
         options = DummyOptions()
@@ -1785,7 +2378,24 @@ class FastCGISubprocessTests(unittest.TestCase):
         self.assertEqual(result, None)
         self.assertEqual(len(options.duped), 2)
         self.assertEqual(options.duped[13], 0)
-        self.assertEqual(len(options.fds_closed), options.minfds - 3)
+        self.assertTrue(options.child_fds_closed)
+
+    def test_spawn_with_posix_spawn(self):
+        if not hasattr(os, 'posix_spawn'):
+            return
+        options = DummyOptions()
+        options.spawn_method = 'auto'
+        options.forkpid = 10
+        config = DummyPConfig(options, 'good', '/good/filename')
+        instance = self._makeOne(config)
+        sock_config = DummySocketConfig(7)
+        gconfig = DummyFCGIGroupConfig(options, 'whatever', 999, None,
+                                       sock_config)
+        instance.group = DummyFCGIProcessGroup(gconfig)
+        result = instance.spawn()
+        self.assertEqual(result, 10)
+        file_actions = options.posix_spawn_args[3]
+        self.assertEqual(file_actions[0], (os.POSIX_SPAWN_DUP2, 7, 0))
 
     def test_before_spawn_gets_socket_ref(self):
         options = DummyOptions()
@@ -1890,6 +2500,33 @@ class ProcessGroupBaseTests(unittest.TestCase):
         group.processes = { 'process1': process1 }
         group.before_remove()  # shouldn't raise
 
+    def test_before_remove_cancels_scheduled_transitions(self):
+        options = DummyOptions()
+        pconfig1 = DummyPConfig(options, 'process1', 'process1','/bin/process1')
+        process1 = DummyProcess(pconfig1)
+        gconfig = DummyPGroupConfig(options, pconfigs=[pconfig1])
+        group = self._makeOne(gconfig)
+        group.processes = { 'process1': process1 }
+        options.timers.schedule(10, process1, process1.transition)
+        group.before_remove()
+        self.assertEqual(options.timers.next_deadline(), None)
+
+    def test_before_remove_cancels_queued_spawns(self):
+        options = DummyOptions()
+        options.max_concurrent_spawns = 1
+        pconfig1 = DummyPConfig(options, 'process1', 'process1','/bin/process1')
+        process1 = DummyProcess(pconfig1)
+        gconfig = DummyPGroupConfig(options, pconfigs=[pconfig1])
+        group = self._makeOne(gconfig)
+        group.processes = { 'process1': process1 }
+        from supervisor.states import ProcessStates
+        other = DummyProcess(DummyPConfig(options, 'other', '/bin/other'))
+        options.spawn_scheduler.state_changed(
+            other, ProcessStates.STOPPED, ProcessStates.STARTING)
+        self.assertFalse(options.spawn_scheduler.request(process1))
+        group.before_remove()
+        self.assertFalse(options.spawn_scheduler.is_queued(process1))
+
     def test_stop_all(self):
         from supervisor.states import ProcessStates
         options = DummyOptions()
@@ -1992,6 +2629,16 @@ class ProcessGroupTests(ProcessGroupBaseTests):
         self.assertTrue('supervisor.process.ProcessGroup' in s)
         self.assertTrue(s.endswith('named whatever>'), s)
 
+    def test_schedule_transition_schedules_process(self):
+        options = DummyOptions()
+        pconfig1 = DummyPConfig(options, 'process1', 'process1','/bin/process1')
+        process1 = DummyProcess(pconfig1)
+        gconfig = DummyPGroupConfig(options, pconfigs=[pconfig1])
+        group = self._makeOne(gconfig)
+        group.schedule_transition(process1, 10)
+        self.assertEqual(options.timers.pop_expired(10),
+                         [process1.transition])
+
     def test_transition(self):
         options = DummyOptions()
         from supervisor.states import ProcessStates
@@ -2265,9 +2912,30 @@ class EventListenerPoolTests(ProcessGroupBaseTests):
             config = gconfig
         process1.group = DummyGroup
         pool._acceptEvent(event)
+        options.timers.clear()
         pool.transition()
         self.assertEqual(process1.transitioned, True)
         self.assertEqual(pool.event_buffer, [event]) # not popped
+        self.assertEqual(options.timers.next_deadline(),
+                         pool.last_dispatch + 5)
+
+    def test_schedule_transition_schedules_pool(self):
+        options = DummyOptions()
+        pconfig1 = DummyPConfig(options, 'process1', 'process1','/bin/process1')
+        process1 = DummyProcess(pconfig1)
+        gconfig = DummyPGroupConfig(options, pconfigs=[pconfig1])
+        pool = self._makeOne(gconfig)
+        pool.schedule_transition(process1, 10)
+        self.assertEqual(options.timers.pop_expired(10), [pool.transition])
+
+    def test__acceptEvent_schedules_transition(self):
+        options = DummyOptions()
+        gconfig = DummyPGroupConfig(options)
+        pool = self._makeOne(gconfig)
+        pool._acceptEvent(DummyEvent())
+        self.assertTrue(options.timers.next_deadline() <= time.time())
+        self.assertEqual(options.timers.pop_expired(time.time()),
+                         [pool.transition])
 
     def test_transition_event_proc_running_with_dispatch_throttle_ready(self):
         options = DummyOptions()
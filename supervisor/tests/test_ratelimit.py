@@ -0,0 +1,118 @@
+"""Test suite for supervisor.ratelimit"""
+
+import unittest
+
+class TokenBucketTests(unittest.TestCase):
+    def _makeOne(self, rate=100, burst=200, now=0):
+        from supervisor.ratelimit import TokenBucket
+        return TokenBucket(rate, burst, now)
+
+    def test_starts_full(self):
+        bucket = self._makeOne()
+        self.assertEqual(bucket.tokens, 200)
+        self.assertEqual(bucket.refilled_at(0), 0)
+
+    def test_consume(self):
+        bucket = self._makeOne()
+        self.assertTrue(bucket.consume(150, 0))
+        self.assertFalse(bucket.consume(50, 0))
+        self.assertEqual(bucket.tokens, 0)
+
+    def test_consume_goes_into_debt(self):
+        bucket = self._makeOne()
+        self.assertFalse(bucket.consume(300, 0))
+        self.assertEqual(bucket.tokens, -100)
+        # the debt is paid back before the budget refills
+        self.assertEqual(bucket.refilled_at(0), 3)
+
+    def test_refill(self):
+        bucket = self._makeOne()
+        bucket.consume(200, 0)
+        bucket.refill(1)
+        self.assertEqual(bucket.tokens, 100)
+        # never more than burst
+        bucket.refill(10)
+        self.assertEqual(bucket.tokens, 200)
+
+    def test_refill_after_clock_moved_backward(self):
+        bucket = self._makeOne(now=100)
+        bucket.consume(200, 100)
+        bucket.refill(50)
+        self.assertEqual(bucket.tokens, 0)
+        self.assertEqual(bucket.updated, 50)
+        bucket.refill(51)
+        self.assertEqual(bucket.tokens, 100)
+
+    def test_refilled_at(self):
+        bucket = self._makeOne()
+        bucket.consume(200, 0)
+        self.assertEqual(bucket.refilled_at(1), 2)
+
+class ResumeScheduleTests(unittest.TestCase):
+    def _makeOne(self):
+        from supervisor.ratelimit import ResumeSchedule
+        from supervisor.timers import TimerHeap
+        return ResumeSchedule(TimerHeap())
+
+    def _makeProcess(self, schedule):
+        class Process:
+            resumed = None
+            # like Subprocess, compares equal to any other process
+            def __eq__(self, other):
+                return True
+            __hash__ = None
+            def resume_output(self, now=None):
+                self.resumed = now
+                schedule.discard(self)
+        return Process()
+
+    def _resumeExpired(self, schedule, now):
+        for callback in schedule.timers.pop_expired(now):
+            callback()
+
+    def test_add_and_discard(self):
+        schedule = self._makeOne()
+        a, b = self._makeProcess(schedule), self._makeProcess(schedule)
+        schedule.add(a, 100, 105)
+        self.assertTrue(a in schedule)
+        self.assertFalse(b in schedule)
+        schedule.add(a, 101, 106)
+        self.assertEqual(len(schedule), 1)
+        self.assertEqual(len(schedule.timers), 1)
+        self.assertEqual(schedule.timers.next_deadline(), 106)
+        schedule.discard(b)
+        schedule.discard(a)
+        self.assertEqual(len(schedule), 0)
+        self.assertEqual(len(schedule.timers), 0)
+
+    def test_resume_expired(self):
+        schedule = self._makeOne()
+        early = self._makeProcess(schedule)
+        late = self._makeProcess(schedule)
+        schedule.add(early, 100, 102)
+        schedule.add(late, 100, 105)
+        self._resumeExpired(schedule, 101)
+        self.assertTrue(early in schedule)
+        self._resumeExpired(schedule, 102)
+        self.assertFalse(early in schedule)
+        self.assertTrue(late in schedule)
+        self.assertEqual(late.resumed, None)
+        self.assertEqual(schedule.timers.next_deadline(), 105)
+
+    def test_reschedule(self):
+        schedule = self._makeOne()
+        process = self._makeProcess(schedule)
+        schedule.add(process, 100, 105)
+        schedule.timers.clear()
+        schedule.reschedule(101)
+        self.assertTrue(process in schedule)
+        self.assertEqual(schedule.timers.next_deadline(), 105)
+
+    def test_reschedule_after_clock_moved_backward(self):
+        schedule = self._makeOne()
+        process = self._makeProcess(schedule)
+        schedule.add(process, 100, 105)
+        schedule.timers.clear()
+        schedule.reschedule(50)
+        self.assertEqual(process.resumed, 50)
+        self.assertEqual(len(schedule), 0)
@@ -129,6 +129,142 @@ class SupervisorNamespaceXMLRPCInterfaceTests(TestBase):
         self.assertEqual(interface.getPID(), options.get_pid())
         self.assertEqual(interface.update_text, 'getPID')
 
+    def test_getReapStats(self):
+        supervisord = DummySupervisor()
+        supervisord.reap_stats.record(2, 0, 0.5, 100)
+        interface = self._makeOne(supervisord)
+        data = interface.getReapStats()
+        self.assertEqual(interface.update_text, 'getReapStats')
+        self.assertEqual(data['batches'], 1)
+        self.assertEqual(data['reaped'], 2)
+        self.assertEqual(data['max_lag'], 0.5)
+        self.assertEqual(supervisord.reap_stats.reaped, 2)
+
+    def test_getReapStats_caps_counters(self):
+        supervisord = DummySupervisor()
+        supervisord.reap_stats.record(2, 0, 0.5, 100)
+        supervisord.reap_stats.reaped = 1 << 40
+        interface = self._makeOne(supervisord)
+        data = interface.getReapStats()
+        self.assertEqual(data['reaped'], (1 << 31) - 1)
+        self.assertEqual(data['batches'], 1)
+
+    def test_getReapStats_reset(self):
+        supervisord = DummySupervisor()
+        supervisord.reap_stats.record(2, 0, 0.5, 100)
+        interface = self._makeOne(supervisord)
+        data = interface.getReapStats(True)
+        self.assertEqual(data['reaped'], 2)
+        self.assertEqual(supervisord.reap_stats.reaped, 0)
+        self.assertEqual(interface.getReapStats()['reaped'], 0)
+
+    def test_getLoopStats(self):
+        options = DummyOptions()
+        pconfig = DummyPConfig(options, 'process1', '/bin/process1')
+        supervisord = PopulatedDummySupervisor(options, 'gname', pconfig)
+        supervisord.set_procattr('process1', 'bytes_read', 10)
+        supervisord.set_procattr('process1', 'read_time', 0.5)
+        supervisord.set_procattr('process1', 'throttled', 2)
+        supervisord.set_procattr('process1', 'throttled_time', 1.5)
+        supervisord.loop_stats.record_iteration(1, 0.002)
+        interface = self._makeOne(supervisord)
+        data = interface.getLoopStats()
+        self.assertEqual(interface.update_text, 'getLoopStats')
+        self.assertEqual(data['iterations'], 1)
+        self.assertEqual(data['latency_counts'][1], 1)
+        self.assertEqual(data['processes'],
+                         [{'name': 'process1', 'group': 'gname',
+                           'bytes_read': 10, 'read_time': 0.5,
+                           'throttled': 2, 'throttled_time': 1.5}])
+        self.assertEqual(supervisord.loop_stats.iterations, 1)
+
+    def test_getLoopStats_caps_large_counters(self):
+        from supervisor.compat import xmlrpclib
+        options = DummyOptions()
+        pconfig = DummyPConfig(options, 'process1', '/bin/process1')
+        supervisord = PopulatedDummySupervisor(options, 'gname', pconfig)
+        supervisord.set_procattr('process1', 'bytes_read', 1 << 40)
+        interface = self._makeOne(supervisord)
+        data = interface.getLoopStats()
+        self.assertEqual(data['processes'][0]['bytes_read'], xmlrpclib.MAXINT)
+
+    def test_getLoopStats_reset(self):
+        options = DummyOptions()
+        pconfig = DummyPConfig(options, 'process1', '/bin/process1')
+        supervisord = PopulatedDummySupervisor(options, 'gname', pconfig)
+        supervisord.set_procattr('process1', 'bytes_read', 10)
+        supervisord.set_procattr('process1', 'throttled', 2)
+        supervisord.loop_stats.record_iteration(1, 0.002)
+        interface = self._makeOne(supervisord)
+        data = interface.getLoopStats(True)
+        self.assertEqual(data['iterations'], 1)
+        self.assertEqual(data['processes'][0]['bytes_read'], 10)
+        data = interface.getLoopStats()
+        self.assertEqual(data['iterations'], 0)
+        self.assertEqual(data['processes'][0]['bytes_read'], 0)
+        self.assertEqual(data['processes'][0]['throttled'], 0)
+
+    def test_getSpawnQueue(self):
+        from supervisor.states import ProcessStates
+        options = DummyOptions()
+        options.max_concurrent_spawns = 1
+        pconfig = DummyPConfig(options, 'foo', '/bin/foo', priority=3)
+        supervisord = PopulatedDummySupervisor(options, 'gname', pconfig)
+        starting = DummyProcess(DummyPConfig(options, 'bar', '/bin/bar'))
+        options.spawn_scheduler.state_changed(
+            starting, ProcessStates.STOPPED, ProcessStates.STARTING)
+        process = supervisord.process_groups['gname'].processes['foo']
+        process.group = supervisord.process_groups['gname']
+        options.spawn_scheduler.request(process)
+        interface = self._makeOne(supervisord)
+        data = interface.getSpawnQueue()
+        self.assertEqual(interface.update_text, 'getSpawnQueue')
+        self.assertEqual(data['max_concurrent_spawns'], 1)
+        self.assertEqual(data['starting'], 1)
+        self.assertEqual(data['queued'], 1)
+        self.assertEqual(data['queue'],
+                         [{'name': 'foo', 'group': 'gname', 'priority': 3}])
+
+    def _setSample(self, supervisord, pid, **values):
+        table = supervisord.process_sampler.table
+        slot = table.slot(pid)
+        for name, value in values.items():
+            table.columns[name][slot] = value
+
+    def test_getProcessMetrics(self):
+        from supervisor.compat import xmlrpclib
+        options = DummyOptions()
+        options.metrics_interval = 5
+        pconfig1 = DummyPConfig(options, 'foo', '/bin/foo')
+        pconfig2 = DummyPConfig(options, 'bar', '/bin/bar')
+        supervisord = PopulatedDummySupervisor(options, 'gname',
+                                               pconfig1, pconfig2)
+        processes = supervisord.process_groups['gname'].processes
+        processes['foo'].pid = 11
+        processes['bar'].pid = 0
+        self._setSample(supervisord, 11, sampled=100, utime=1.5, stime=0.5,
+                        cpu_percent=12.5, rss=8 * 1024 * 1024,
+                        vms=2 ** 50, shared=4096, num_fds=7)
+        supervisord.process_sampler.passes = 3
+        interface = self._makeOne(supervisord)
+        data = interface.getProcessMetrics()
+        self.assertEqual(interface.update_text, 'getProcessMetrics')
+        self.assertEqual(data['interval'], 5)
+        self.assertEqual(data['passes'], 3)
+        self.assertEqual(data['processes'], [{
+            'name': 'foo',
+            'group': 'gname',
+            'pid': 11,
+            'cpu_percent': 12.5,
+            'utime': 1.5,
+            'stime': 0.5,
+            'rss_kb': 8192,
+            'vms_kb': xmlrpclib.MAXINT,
+            'shared_kb': 4,
+            'num_fds': 7,
+            'sampled': 100,
+            }])
+
     def test_readLog_aliased_to_deprecated_readMainLog(self):
         supervisord = DummySupervisor()
         interface = self._makeOne(supervisord)
@@ -177,6 +313,38 @@ class SupervisorNamespaceXMLRPCInterfaceTests(TestBase):
         finally:
             os.remove(logfile)
 
+    def test_readLog_large_read_is_streamed(self):
+        from supervisor.logreader import CHUNK_SIZE
+        from supervisor.logreader import LogSlice
+        supervisord = DummySupervisor()
+        interface = self._makeOne(supervisord)
+        logfile = supervisord.options.logfile
+        try:
+            with open(logfile, 'wb') as f:
+                f.write(b'x' * (CHUNK_SIZE + 1))
+            data = interface.readLog(offset=0, length=0)
+            self.assertEqual(data, 'x' * (CHUNK_SIZE + 1))
+            # the XML-RPC handler calls the streamed variant instead
+            self.assertEqual(interface.readLog.streamed, '_sliceLog')
+            data = interface._sliceLog(offset=0, length=0)
+            self.assertTrue(isinstance(data, LogSlice))
+            self.assertEqual(len(data), CHUNK_SIZE + 1)
+            data.close()
+        finally:
+            os.remove(logfile)
+
+    def test_readLog_not_utf8(self):
+        supervisord = DummySupervisor()
+        interface = self._makeOne(supervisord)
+        logfile = supervisord.options.logfile
+        try:
+            with open(logfile, 'wb') as f:
+                f.write(b'a\xffb')
+            data = interface.readLog(offset=0, length=0)
+            self.assertEqual(data, u'a\ufffdb')
+        finally:
+            os.remove(logfile)
+
     def test_clearLog_unreadable(self):
         from supervisor import xmlrpc
         supervisord = DummySupervisor()
@@ -234,6 +402,22 @@ class SupervisorNamespaceXMLRPCInterfaceTests(TestBase):
         value = interface.reloadConfig()
         self.assertEqual(value, [[['added'], ['changed'], ['dropped']]])
 
+    def test_reloadConfig_clears_spawn_plans(self):
+        options = DummyOptions()
+        pconfig = DummyPConfig(options, 'foo', '/bin/foo')
+        pconfig.spawn_plan = ('/bin/foo', ['/bin/foo'], (1, 2, 3, 4))
+        pconfig.spawn_environment = {}
+        process = DummyProcess(pconfig)
+        gconfig = DummyPGroupConfig(options, 'foo', pconfigs=[pconfig])
+        group = DummyProcessGroup(gconfig)
+        group.processes = {'foo': process}
+        supervisord = DummySupervisor(options, process_groups={'foo': group})
+        supervisord.diff_to_active = lambda : [[], [], []]
+        interface = self._makeOne(supervisord)
+        interface.reloadConfig()
+        self.assertEqual(pconfig.spawn_plan, None)
+        self.assertEqual(pconfig.spawn_environment, None)
+
     def test_reloadConfig_process_config_raises_ValueError(self):
         from supervisor import xmlrpc
         options = DummyOptions()
@@ -472,6 +656,68 @@ class SupervisorNamespaceXMLRPCInterfaceTests(TestBase):
         self.assertEqual(process.spawned, True)
         self.assertEqual(interface.update_text, 'startProcess')
 
+    def test_startProcess_queued_nowait(self):
+        options = DummyOptions()
+        options.max_concurrent_spawns = 1
+        pconfig = DummyPConfig(options, 'foo', __file__, autostart=False)
+        from supervisor.process import ProcessStates
+        supervisord = PopulatedDummySupervisor(options, 'foo', pconfig)
+        supervisord.set_procattr('foo', 'state', ProcessStates.STOPPED)
+        starting = DummyProcess(DummyPConfig(options, 'bar', __file__))
+        options.spawn_scheduler.state_changed(
+            starting, ProcessStates.STOPPED, ProcessStates.STARTING)
+        interface = self._makeOne(supervisord)
+        result = interface.startProcess('foo', wait=False)
+        self.assertEqual(result, True)
+        process = supervisord.process_groups['foo'].processes['foo']
+        self.assertEqual(process.spawned, False)
+        self.assertTrue(options.spawn_scheduler.is_queued(process))
+
+    def test_startProcess_queued_waits_until_running(self):
+        from supervisor import http
+        options = DummyOptions()
+        options.max_concurrent_spawns = 1
+        pconfig = DummyPConfig(options, 'foo', __file__, autostart=False)
+        from supervisor.process import ProcessStates
+        supervisord = PopulatedDummySupervisor(options, 'foo', pconfig)
+        supervisord.set_procattr('foo', 'state', ProcessStates.STOPPED)
+        starting = DummyProcess(DummyPConfig(options, 'bar', __file__))
+        options.spawn_scheduler.state_changed(
+            starting, ProcessStates.STOPPED, ProcessStates.STARTING)
+        process = supervisord.process_groups['foo'].processes['foo']
+        def spawn():
+            process.spawned = True
+            process.state = ProcessStates.STARTING
+        process.spawn = spawn
+        interface = self._makeOne(supervisord)
+        callback = interface.startProcess('foo')
+        self.assertEqual(callback(), http.NOT_DONE_YET)
+        options.spawn_scheduler.state_changed(
+            starting, ProcessStates.STARTING, ProcessStates.RUNNING)
+        options.spawn_scheduler.dispatch()
+        self.assertEqual(process.spawned, True)
+        self.assertEqual(callback(), http.NOT_DONE_YET)
+        process.state = ProcessStates.RUNNING
+        self.assertEqual(callback(), True)
+
+    def test_startProcess_queued_spawnerr(self):
+        from supervisor import xmlrpc
+        options = DummyOptions()
+        options.max_concurrent_spawns = 1
+        pconfig = DummyPConfig(options, 'foo', __file__, autostart=False)
+        from supervisor.process import ProcessStates
+        supervisord = PopulatedDummySupervisor(options, 'foo', pconfig)
+        supervisord.set_procattr('foo', 'state', ProcessStates.STOPPED)
+        starting = DummyProcess(DummyPConfig(options, 'bar', __file__))
+        options.spawn_scheduler.state_changed(
+            starting, ProcessStates.STOPPED, ProcessStates.STARTING)
+        process = supervisord.process_groups['foo'].processes['foo']
+        interface = self._makeOne(supervisord)
+        callback = interface.startProcess('foo')
+        options.spawn_scheduler.cancel(process)
+        process.spawnerr = 'abc'
+        self._assertRPCError(xmlrpc.Faults.SPAWN_ERROR, callback)
+
     def test_startProcess_abnormal_term_process_not_running(self):
         options = DummyOptions()
         pconfig = DummyPConfig(options, 'foo', __file__, autostart=False)
@@ -728,6 +974,44 @@ class SupervisorNamespaceXMLRPCInterfaceTests(TestBase):
         interface = self._makeOne(supervisord)
         self._assertRPCError(Faults.NOT_RUNNING, interface.stopProcess, 'foo')
 
+    def test_stopProcess_cancels_queued_spawn(self):
+        from supervisor.states import ProcessStates
+        options = DummyOptions()
+        options.max_concurrent_spawns = 1
+        pconfig = DummyPConfig(options, 'foo', '/bin/foo')
+        supervisord = PopulatedDummySupervisor(options, 'foo', pconfig)
+        supervisord.set_procattr('foo', 'state', ProcessStates.STOPPED)
+        starting = DummyProcess(DummyPConfig(options, 'bar', '/bin/bar'))
+        options.spawn_scheduler.state_changed(
+            starting, ProcessStates.STOPPED, ProcessStates.STARTING)
+        process = supervisord.process_groups['foo'].processes['foo']
+        self.assertFalse(options.spawn_scheduler.request(process))
+        interface = self._makeOne(supervisord)
+        self.assertEqual(interface.stopProcess('foo'), True)
+        self.assertFalse(options.spawn_scheduler.is_queued(process))
+        self.assertTrue(process.administrative_stop)
+        self.assertFalse(process.stop_called)
+        self.assertEqual(process.state, ProcessStates.STOPPED)
+
+    def test_stopProcess_cancels_queued_spawn_after_exit(self):
+        from supervisor.states import ProcessStates
+        options = DummyOptions()
+        options.max_concurrent_spawns = 1
+        pconfig = DummyPConfig(options, 'foo', '/bin/foo')
+        supervisord = PopulatedDummySupervisor(options, 'foo', pconfig)
+        supervisord.set_procattr('foo', 'state', ProcessStates.EXITED)
+        starting = DummyProcess(DummyPConfig(options, 'bar', '/bin/bar'))
+        options.spawn_scheduler.state_changed(
+            starting, ProcessStates.STOPPED, ProcessStates.STARTING)
+        process = supervisord.process_groups['foo'].processes['foo']
+        self.assertFalse(options.spawn_scheduler.request(process))
+        interface = self._makeOne(supervisord)
+        self.assertEqual(interface.stopProcess('foo'), True)
+        self.assertFalse(options.spawn_scheduler.is_queued(process))
+        self.assertEqual(process.state, ProcessStates.STOPPED)
+        self.assertEqual(interface.getProcessInfo('foo')['statename'],
+                         'STOPPED')
+
     def test_stopProcess_failed(self):
         from supervisor.xmlrpc import Faults
         options = DummyOptions()
@@ -822,6 +1106,34 @@ class SupervisorNamespaceXMLRPCInterfaceTests(TestBase):
         interface.stopProcess('foo:*')
         self.assertEqual(interface.update_text, 'stopProcessGroup')
 
+    def test_stopAllProcesses_includes_queued_spawns(self):
+        options = DummyOptions()
+        options.max_concurrent_spawns = 1
+        pconfig1 = DummyPConfig(options, 'process1', '/bin/foo', priority=1)
+        pconfig2 = DummyPConfig(options, 'process2', '/bin/foo2', priority=2)
+        from supervisor.process import ProcessStates
+        supervisord = PopulatedDummySupervisor(options, 'foo', pconfig1,
+                                               pconfig2)
+        supervisord.set_procattr('process1', 'state', ProcessStates.STARTING)
+        supervisord.set_procattr('process2', 'state', ProcessStates.STOPPED)
+        processes = supervisord.process_groups['foo'].processes
+        options.spawn_scheduler.state_changed(
+            processes['process1'], ProcessStates.STOPPED,
+            ProcessStates.STARTING)
+        options.spawn_scheduler.request(processes['process2'])
+        interface = self._makeOne(supervisord)
+        callback = interface.stopAllProcesses()
+        from supervisor import http
+        value = http.NOT_DONE_YET
+        while 1:
+            value = callback()
+            if value is not http.NOT_DONE_YET:
+                break
+        self.assertEqual([r['name'] for r in value],
+                         ['process1', 'process2'])
+        self.assertFalse(
+            options.spawn_scheduler.is_queued(processes['process2']))
+
     def test_stopAllProcesses(self):
         options = DummyOptions()
         pconfig1 = DummyPConfig(options, 'process1', '/bin/foo', priority=1)
@@ -1188,6 +1500,16 @@ class SupervisorNamespaceXMLRPCInterfaceTests(TestBase):
         self.assertEqual(configs[0]['inuse'], True)
         self.assertEqual(configs[0]['stderr_logfile'], 'auto')
         self.assertEqual(configs[0]['stdout_logfile_backups'], 0)
+        self.assertEqual(configs[0]['stdout_logfile_buffer_size'], 0)
+        self.assertEqual(configs[0]['stdout_logfile_flush_interval'], 1)
+        self.assertEqual(configs[0]['stderr_logfile_buffer_size'], 0)
+        self.assertEqual(configs[0]['stderr_logfile_flush_interval'], 1)
+        self.assertEqual(configs[0]['stdout_logfile_index_bytes'], 0)
+        self.assertEqual(configs[0]['stderr_logfile_index_bytes'], 0)
+        self.assertEqual(configs[0]['stdout_ring_bytes'], 0)
+        self.assertEqual(configs[0]['stderr_ring_bytes'], 0)
+        self.assertEqual(configs[0]['output_rate_limit'], 0)
+        self.assertEqual(configs[0]['output_rate_burst'], 0)
         assert 'test_rpcinterfaces.py' in configs[0]['command']
 
         self.assertEqual(configs[1]['autostart'], True)
@@ -1347,6 +1669,24 @@ class SupervisorNamespaceXMLRPCInterfaceTests(TestBase):
         self.assertEqual(data['exitstatus'], 0)
         self.assertEqual(data['spawnerr'], '')
         self.assertTrue(data['description'].startswith('pid 111'))
+        # no sample of the process
+        self.assertFalse('rss_kb' in data)
+
+    def test_getProcessInfo_includes_metrics(self):
+        options = DummyOptions()
+        config = DummyPConfig(options, 'foo', '/bin/foo')
+        process = DummyProcess(config)
+        process.pid = 111
+        pgroup_config = DummyPGroupConfig(options, name='foo')
+        pgroup = DummyProcessGroup(pgroup_config)
+        pgroup.processes = {'foo':process}
+        supervisord = DummySupervisor(process_groups={'foo':pgroup})
+        self._setSample(supervisord, 111, rss=2048, num_fds=4)
+        interface = self._makeOne(supervisord)
+        data = interface.getProcessInfo('foo')
+        self.assertEqual(data['rss_kb'], 2)
+        self.assertEqual(data['num_fds'], 4)
+        self.assertEqual(data['cpu_percent'], 0)
 
     def test_getProcessInfo_logfile_NONE(self):
         options = DummyOptions()
@@ -1621,6 +1961,297 @@ class SupervisorNamespaceXMLRPCInterfaceTests(TestBase):
         finally:
             os.remove(logfile)
 
+    def _makeIndexedLog(self, index_bytes=4):
+        import shutil
+        import tempfile
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        logfile = os.path.join(tempdir, 'foo.log')
+        with open(logfile, 'wb') as f:
+            f.write(b'zero\none\ntwo\nthree\n')
+        with open(logfile + '.idx', 'wb') as f:
+            f.write(b'100 0 0\n200 5 1\n300 13 3\n')
+        options = DummyOptions()
+        pconfig = DummyPConfig(options, 'foo', '/bin/foo',
+                               stdout_logfile=logfile,
+                               stdout_logfile_index_bytes=index_bytes)
+        supervisord = PopulatedDummySupervisor(options, 'foo', pconfig)
+        return self._makeOne(supervisord)
+
+    def test_readProcessLogByTime(self):
+        interface = self._makeIndexedLog()
+        data = interface.readProcessLogByTime('foo', 'stdout', 250, 250)
+        self.assertEqual(interface.update_text, 'readProcessLogByTime')
+        self.assertEqual(data, 'one\ntwo\n')
+        data = interface.readProcessLogByTime('foo', 'stdout', 200, 400)
+        self.assertEqual(data, 'one\ntwo\nthree\n')
+        data = interface.readProcessLogByTime('foo', 'stdout', 10, 50)
+        self.assertEqual(data, '')
+
+    def test_readProcessLogByTime_backups(self):
+        interface = self._makeIndexedLog()
+        config = interface.supervisord.process_groups['foo'].processes[
+            'foo'].config
+        config.stdout_logfile_backups = 2
+        logfile = config.stdout_logfile
+        with open(logfile + '.1', 'wb') as f:
+            f.write(b'minus two\nminus one\n')
+        with open(logfile + '.1.idx', 'wb') as f:
+            f.write(b'10 0 0\n50 10 1\n')
+        data = interface.readProcessLogByTime('foo', 'stdout', 60, 150)
+        self.assertEqual(data, 'minus one\nzero\n')
+        data = interface.readProcessLogByTime('foo', 'stdout', 0, 20)
+        self.assertEqual(data, 'minus two\n')
+        # not read without backups
+        config.stdout_logfile_backups = 0
+        data = interface.readProcessLogByTime('foo', 'stdout', 60, 150)
+        self.assertEqual(data, 'zero\n')
+
+    def test_readProcessLogByTime_compressed_backup(self):
+        from supervisor import xmlrpc
+        from supervisor.logarchive import segment_name
+        interface = self._makeIndexedLog()
+        config = interface.supervisord.process_groups['foo'].processes[
+            'foo'].config
+        config.stdout_logfile_backups = 1
+        segment = segment_name(config.stdout_logfile, 50)
+        with open(segment + '.gz', 'wb') as f:
+            f.write(b'not read')
+        with open(segment + '.idx', 'wb') as f:
+            f.write(b'10 0 0\n')
+        self._assertRPCError(xmlrpc.Faults.FAILED,
+                             interface.readProcessLogByTime,
+                             'foo', 'stdout', 50, 150)
+        # the range is in the log itself
+        data = interface.readProcessLogByTime('foo', 'stdout', 100, 150)
+        self.assertEqual(data, 'zero\n')
+
+    def test_readProcessLogByTime_not_indexed(self):
+        from supervisor import xmlrpc
+        interface = self._makeIndexedLog(index_bytes=0)
+        self._assertRPCError(xmlrpc.Faults.FAILED,
+                             interface.readProcessLogByTime,
+                             'foo', 'stdout', 100, 200)
+
+    def test_readProcessLogByTime_badargs(self):
+        from supervisor import xmlrpc
+        interface = self._makeIndexedLog()
+        self._assertRPCError(xmlrpc.Faults.BAD_ARGUMENTS,
+                             interface.readProcessLogByTime,
+                             'foo', 'stdin', 100, 200)
+        self._assertRPCError(xmlrpc.Faults.BAD_ARGUMENTS,
+                             interface.readProcessLogByTime,
+                             'foo', 'stdout', 200, 100)
+        self._assertRPCError(xmlrpc.Faults.BAD_NAME,
+                             interface.readProcessLogByTime,
+                             'bar', 'stdout', 100, 200)
+        self._assertRPCError(xmlrpc.Faults.NO_FILE,
+                             interface.readProcessLogByTime,
+                             'foo', 'stderr', 100, 200)
+
+    def test_readProcessLogLines(self):
+        interface = self._makeIndexedLog()
+        data = interface.readProcessLogLines('foo', 'stdout', 1, 2)
+        self.assertEqual(interface.update_text, 'readProcessLogLines')
+        self.assertEqual(data, 'one\ntwo\n')
+        data = interface.readProcessLogLines('foo', 'stdout', 3, 10)
+        self.assertEqual(data, 'three\n')
+
+    def test_readProcessLogLines_not_indexed(self):
+        from supervisor import xmlrpc
+        # the index is left over from when the log was indexed
+        interface = self._makeIndexedLog(index_bytes=0)
+        self._assertRPCError(xmlrpc.Faults.FAILED,
+                             interface.readProcessLogLines,
+                             'foo', 'stdout', 2, 1)
+
+    def test_readProcessLogLines_caps_count(self):
+        from supervisor import rpcinterface
+        interface = self._makeIndexedLog()
+        max_lines = rpcinterface.MAX_LINES
+        rpcinterface.MAX_LINES = 2
+        try:
+            data = interface.readProcessLogLines('foo', 'stdout', 0, 10)
+        finally:
+            rpcinterface.MAX_LINES = max_lines
+        self.assertEqual(data, 'zero\none\n')
+
+    def test_readProcessLogLines_too_far_from_checkpoint(self):
+        from supervisor import xmlrpc
+        from supervisor import rpcinterface
+        interface = self._makeIndexedLog()
+        read_lines = rpcinterface.read_lines
+        def read_little(*args):
+            return read_lines(*args, max_read=2)
+        rpcinterface.read_lines = read_little
+        try:
+            self._assertRPCError(xmlrpc.Faults.FAILED,
+                                 interface.readProcessLogLines,
+                                 'foo', 'stdout', 2, 1)
+        finally:
+            rpcinterface.read_lines = read_lines
+
+    def test_readProcessLogLines_badargs(self):
+        from supervisor import xmlrpc
+        interface = self._makeIndexedLog()
+        self._assertRPCError(xmlrpc.Faults.BAD_ARGUMENTS,
+                             interface.readProcessLogLines,
+                             'foo', 'stdout', -1, 2)
+        self._assertRPCError(xmlrpc.Faults.BAD_ARGUMENTS,
+                             interface.readProcessLogLines,
+                             'foo', 'stdout', 0, -2)
+
+    def _makeSearchableLog(self):
+        import shutil
+        import tempfile
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        logfile = os.path.join(tempdir, 'foo.log')
+        with open(logfile + '.1', 'wb') as f:
+            f.write(b'Error 1\nok\n')
+        with open(logfile, 'wb') as f:
+            f.write(b'error 2\nok\nerror 3\n')
+        options = DummyOptions()
+        pconfig = DummyPConfig(options, 'foo', '/bin/foo',
+                               stdout_logfile=logfile,
+                               stdout_logfile_backups=1)
+        supervisord = PopulatedDummySupervisor(options, 'foo', pconfig)
+        return self._makeOne(supervisord)
+
+    def _search(self, interface, pattern, options):
+        from supervisor import http
+        callback = interface.searchProcessLog('foo', 'stdout', pattern,
+                                              options)
+        self.assertEqual(interface.update_text, 'searchProcessLog')
+        for i in range(1000):
+            result = callback()
+            if result is not http.NOT_DONE_YET:
+                return result
+            time.sleep(0.01)
+        self.fail('the search never ended')
+
+    def _lines(self, result):
+        return [(os.path.basename(match['logfile']), match['offset'],
+                 match['line']) for match in result['matches']]
+
+    def test_searchProcessLog(self):
+        interface = self._makeSearchableLog()
+        result = self._search(interface, 'error', {})
+        self.assertEqual(self._lines(result),
+                         [('foo.log', 0, 'error 2'),
+                          ('foo.log', 11, 'error 3')])
+        self.assertTrue(result['eof'])
+
+    def test_searchProcessLog_options(self):
+        interface = self._makeSearchableLog()
+        result = self._search(interface, 'error',
+                              {'ignore_case': True, 'max_matches': 2})
+        self.assertEqual(self._lines(result),
+                         [('foo.log.1', 0, 'Error 1'),
+                          ('foo.log', 0, 'error 2')])
+        self.assertFalse(result['eof'])
+        result = self._search(interface, 'error',
+                              {'token': result['token'], 'backups': False})
+        self.assertEqual(self._lines(result), [('foo.log', 11, 'error 3')])
+        self.assertTrue(result['eof'])
+
+    def test_searchProcessLog_badargs(self):
+        from supervisor import xmlrpc
+        interface = self._makeSearchableLog()
+        for pattern, options in [('(', {}),
+                                 ('error', []),
+                                 ('error', {'foo': 1}),
+                                 ('error', {'token': 'bad'}),
+                                 ('error', {'max_matches': 'bad'}),
+                                 ('error', {'max_matches': 0}),
+                                 ('error', {'max_bytes': -1})]:
+            self._assertRPCError(xmlrpc.Faults.BAD_ARGUMENTS,
+                                 interface.searchProcessLog,
+                                 'foo', 'stdout', pattern, options)
+        self._assertRPCError(xmlrpc.Faults.BAD_ARGUMENTS,
+                             interface.searchProcessLog,
+                             'foo', 'stdin', 'error', {})
+        from supervisor.logsearch import MAX_PATTERN
+        self._assertRPCError(xmlrpc.Faults.BAD_ARGUMENTS,
+                             interface.searchProcessLog,
+                             'foo', 'stdout', 'x' * (MAX_PATTERN + 1), {})
+
+    def test_searchProcessLog_no_file(self):
+        from supervisor import xmlrpc
+        options = DummyOptions()
+        pconfig = DummyPConfig(options, 'foo', '/bin/foo')
+        supervisord = PopulatedDummySupervisor(options, 'foo', pconfig)
+        interface = self._makeOne(supervisord)
+        self._assertRPCError(xmlrpc.Faults.NO_FILE,
+                             interface.searchProcessLog,
+                             'foo', 'stdout', 'error', {})
+
+    def test_searchProcessLog_busy(self):
+        from supervisor import xmlrpc
+        from supervisor.logsearch import LogSearch
+        interface = self._makeSearchableLog()
+        logfile = interface.supervisord.process_groups['foo'].processes[
+            'foo'].config.stdout_logfile
+        LogSearch.running[logfile] = None
+        try:
+            self._assertRPCError(xmlrpc.Faults.BUSY,
+                                 interface.searchProcessLog,
+                                 'foo', 'stdout', 'error', {})
+        finally:
+            del LogSearch.running[logfile]
+
+    def test_searchProcessLog_caps_offsets(self):
+        from supervisor.logsearch import LogSearch
+        interface = self._makeSearchableLog()
+        def search(self):
+            return {'matches': [{'logfile': self.filename,
+                                 'offset': 1 << 32, 'line': 'error'}],
+                    'token': '', 'eof': True}
+        original = LogSearch.search
+        LogSearch.search = search
+        try:
+            result = self._search(interface, 'error', {})
+        finally:
+            LogSearch.search = original
+        self.assertEqual(result['matches'][0]['offset'], (1 << 31) - 1)
+
+    def test_searchProcessLog_hard_stop(self):
+        import threading
+        from supervisor import rpcinterface
+        from supervisor import xmlrpc
+        from supervisor.logsearch import LogSearch
+        interface = self._makeSearchableLog()
+        searches = []
+        release = threading.Event()
+        def search(self):
+            searches.append(self)
+            release.wait()
+        original = LogSearch.search, rpcinterface.HARD_STOP
+        LogSearch.search = search
+        rpcinterface.HARD_STOP = 0
+        try:
+            callback = interface.searchProcessLog('foo', 'stdout', 'error',
+                                                  {})
+            self._assertRPCError(xmlrpc.Faults.FAILED, callback)
+        finally:
+            release.set()
+            LogSearch.search, rpcinterface.HARD_STOP = original
+        for i in range(1000):
+            if searches and searches[0].done:
+                break
+            time.sleep(0.01)
+        self.assertTrue(searches[0].stopped)
+
+    def test_searchProcessLog_fails(self):
+        from supervisor import xmlrpc
+        interface = self._makeSearchableLog()
+        logfile = interface.supervisord.process_groups['foo'].processes[
+            'foo'].config.stdout_logfile
+        os.remove(logfile + '.1')
+        os.mkdir(logfile + '.1')
+        self._assertRPCError(xmlrpc.Faults.FAILED, self._search,
+                             interface, 'error', {})
+
     def test_tailProcessStdoutLog_bad_name(self):
         from supervisor import xmlrpc
         supervisord = DummySupervisor()
@@ -1855,6 +2486,69 @@ class SupervisorNamespaceXMLRPCInterfaceTests(TestBase):
         self.assertEqual(offset, 0)
         self.assertEqual(data, '')
 
+    def _makeOutputRing(self):
+        from supervisor.dispatchers import OutputRing
+        options = DummyOptions()
+        pconfig = DummyPConfig(options, 'foo', '/bin/foo')
+        supervisord = PopulatedDummySupervisor(options, 'foo', pconfig)
+        process = supervisord.process_groups['foo'].processes['foo']
+        ring = process.output_rings['stdout'] = OutputRing(16)
+        ring.write(b'zero\none\ntwo\nthree\n')
+        return self._makeOne(supervisord), ring
+
+    def test_tailProcessOutput(self):
+        interface, ring = self._makeOutputRing()
+        data, offset, overflow = interface.tailProcessOutput('foo', 'stdout',
+                                                             0, 6)
+        self.assertEqual(interface.update_text, 'tailProcessOutput')
+        self.assertEqual(data, 'three\n')
+        self.assertEqual(offset, 19)
+        self.assertEqual(overflow, True)
+        ring.write(b'four\n')
+        data, offset, overflow = interface.tailProcessOutput('foo', 'stdout',
+                                                             offset, 5)
+        self.assertEqual([data, offset, overflow], ['four\n', 24, False])
+
+    def test_tailProcessOutput_offsets_wrap_around(self):
+        interface, ring = self._makeOutputRing()
+        ring.written += 1 << 31
+        data, offset, overflow = interface.tailProcessOutput('foo', 'stdout',
+                                                             0, 6)
+        self.assertEqual(offset, 19)
+        ring.write(b'four\n')
+        data, offset, overflow = interface.tailProcessOutput('foo', 'stdout',
+                                                             offset, 5)
+        self.assertEqual([data, offset, overflow], ['four\n', 24, False])
+
+    def test_tailProcessOutput_no_ring(self):
+        from supervisor import xmlrpc
+        interface, ring = self._makeOutputRing()
+        self._assertRPCError(xmlrpc.Faults.FAILED,
+                             interface.tailProcessOutput, 'foo', 'stderr',
+                             0, 10)
+        self._assertRPCError(xmlrpc.Faults.BAD_ARGUMENTS,
+                             interface.tailProcessOutput, 'foo', 'stdin',
+                             0, 10)
+        self._assertRPCError(xmlrpc.Faults.BAD_NAME,
+                             interface.tailProcessOutput, 'bar', 'stdout',
+                             0, 10)
+
+    def test_readProcessOutputLines(self):
+        interface, ring = self._makeOutputRing()
+        data = interface.readProcessOutputLines('foo', 'stdout', 2)
+        self.assertEqual(interface.update_text, 'readProcessOutputLines')
+        self.assertEqual(data, 'two\nthree\n')
+        # "zero" is no longer kept whole
+        data = interface.readProcessOutputLines('foo', 'stdout', 10)
+        self.assertEqual(data, 'one\ntwo\nthree\n')
+
+    def test_readProcessOutputLines_bad_count(self):
+        from supervisor import xmlrpc
+        interface, ring = self._makeOutputRing()
+        self._assertRPCError(xmlrpc.Faults.BAD_ARGUMENTS,
+                             interface.readProcessOutputLines, 'foo',
+                             'stdout', -1)
+
     def test_clearProcessLogs_bad_name_no_group(self):
         from supervisor import xmlrpc
         options = DummyOptions()
@@ -0,0 +1,243 @@
+"""Test suite for supervisor.scheduler"""
+
+import unittest
+
+from supervisor.states import ProcessStates
+from supervisor.states import SupervisorStates
+from supervisor.tests.base import DummyOptions
+from supervisor.tests.base import DummyPConfig
+from supervisor.tests.base import DummyPGroupConfig
+from supervisor.tests.base import DummyProcess
+from supervisor.tests.base import DummyProcessGroup
+
+class SpawnSchedulerTests(unittest.TestCase):
+    def _getTargetClass(self):
+        from supervisor.scheduler import SpawnScheduler
+        return SpawnScheduler
+
+    def _makeOne(self, options):
+        return self._getTargetClass()(options)
+
+    def _makeProcess(self, options, name, priority=999, group=None):
+        pconfig = DummyPConfig(options, name, '/bin/' + name,
+                               priority=priority)
+        process = DummyProcess(pconfig, state=ProcessStates.STOPPED)
+        process.group = group
+        return process
+
+    def _makeGroup(self, options, name, max_concurrent_spawns=0):
+        gconfig = DummyPGroupConfig(options, name,
+                                    max_concurrent_spawns=max_concurrent_spawns)
+        return DummyProcessGroup(gconfig)
+
+    def _start(self, scheduler, process):
+        scheduler.state_changed(process, process.state, ProcessStates.STARTING)
+        process.state = ProcessStates.STARTING
+
+    def _finish(self, scheduler, process, state=ProcessStates.RUNNING):
+        scheduler.state_changed(process, process.state, state)
+        process.state = state
+
+    def test_request_without_limit_never_queues(self):
+        options = DummyOptions()
+        scheduler = self._makeOne(options)
+        for i in range(10):
+            process = self._makeProcess(options, 'p%d' % i)
+            self.assertTrue(scheduler.request(process))
+            self._start(scheduler, process)
+        data = scheduler.as_dict()
+        self.assertEqual(data['starting'], 10)
+        self.assertEqual(data['queued'], 0)
+
+    def test_request_over_global_limit_queues(self):
+        options = DummyOptions()
+        options.max_concurrent_spawns = 2
+        scheduler = self._makeOne(options)
+        processes = [self._makeProcess(options, 'p%d' % i) for i in range(3)]
+        for process in processes[:2]:
+            self.assertTrue(scheduler.request(process))
+            self._start(scheduler, process)
+        self.assertFalse(scheduler.request(processes[2]))
+        self.assertTrue(scheduler.is_queued(processes[2]))
+        # requesting again doesn't queue it twice
+        self.assertFalse(scheduler.request(processes[2]))
+        self.assertEqual(len(scheduler.queue), 1)
+        self.assertEqual(options.logger.data,
+                         ['queued spawn of p2 (2 starting, 1 queued)'])
+
+    def test_request_queues_behind_queued_processes(self):
+        options = DummyOptions()
+        options.max_concurrent_spawns = 1
+        scheduler = self._makeOne(options)
+        a, b, c = [self._makeProcess(options, n) for n in 'abc']
+        self.assertTrue(scheduler.request(a))
+        self._start(scheduler, a)
+        self.assertFalse(scheduler.request(b))
+        self._finish(scheduler, a)
+        # a slot is free, but b was waiting for it first
+        self.assertFalse(scheduler.request(c))
+        self.assertEqual([e[2] for e in scheduler.queue], [b, c])
+
+    def test_request_over_group_limit_queues(self):
+        options = DummyOptions()
+        scheduler = self._makeOne(options)
+        limited = self._makeGroup(options, 'limited', max_concurrent_spawns=1)
+        other = self._makeGroup(options, 'other')
+        a = self._makeProcess(options, 'a', group=limited)
+        b = self._makeProcess(options, 'b', group=limited)
+        c = self._makeProcess(options, 'c', group=other)
+        self.assertTrue(scheduler.request(a))
+        self._start(scheduler, a)
+        self.assertFalse(scheduler.request(b))
+        # the queue only holds processes of the full group
+        self.assertFalse(scheduler.request(c))
+        self.assertEqual(scheduler.group_starting, {'limited': 1})
+
+    def test_dispatch_spawns_in_priority_order(self):
+        options = DummyOptions()
+        options.max_concurrent_spawns = 1
+        scheduler = self._makeOne(options)
+        running = self._makeProcess(options, 'running')
+        low = self._makeProcess(options, 'low', priority=10)
+        high = self._makeProcess(options, 'high', priority=1)
+        self.assertTrue(scheduler.request(running))
+        self._start(scheduler, running)
+        self.assertFalse(scheduler.request(low))
+        self.assertFalse(scheduler.request(high))
+        scheduler.dispatch()
+        self.assertFalse(high.spawned)
+        self._finish(scheduler, running)
+        # DummyProcess.spawn() doesn't go through change_state()
+        def spawn(process=high):
+            process.spawned = True
+            self._start(scheduler, process)
+        high.spawn = spawn
+        scheduler.dispatch()
+        self.assertTrue(high.spawned)
+        self.assertFalse(low.spawned)
+        self.assertFalse(scheduler.is_queued(high))
+        self.assertTrue(scheduler.is_queued(low))
+        self.assertEqual(scheduler.dispatched, 1)
+
+    def test_dispatch_skips_full_groups(self):
+        options = DummyOptions()
+        options.max_concurrent_spawns = 3
+        scheduler = self._makeOne(options)
+        limited = self._makeGroup(options, 'limited', max_concurrent_spawns=1)
+        a = self._makeProcess(options, 'a', priority=1, group=limited)
+        b = self._makeProcess(options, 'b', priority=1, group=limited)
+        c = self._makeProcess(options, 'c', priority=2)
+        self.assertTrue(scheduler.request(a))
+        self._start(scheduler, a)
+        self.assertFalse(scheduler.request(b))
+        self.assertFalse(scheduler.request(c))
+        scheduler.dispatch()
+        self.assertFalse(b.spawned)
+        self.assertTrue(c.spawned)
+        self.assertTrue(scheduler.is_queued(b))
+
+    def test_dispatch_skips_processes_that_cannot_be_spawned(self):
+        options = DummyOptions()
+        options.max_concurrent_spawns = 1
+        scheduler = self._makeOne(options)
+        a, b = [self._makeProcess(options, n) for n in 'ab']
+        self._start(scheduler, a)
+        self.assertFalse(scheduler.request(b))
+        self._finish(scheduler, a)
+        # e.g. a process that has a pid but no state change seen yet
+        b.pid = 11
+        scheduler.dispatch()
+        self.assertFalse(b.spawned)
+        self.assertFalse(scheduler.is_queued(b))
+
+    def test_dispatch_does_nothing_when_shutting_down(self):
+        options = DummyOptions()
+        options.max_concurrent_spawns = 1
+        scheduler = self._makeOne(options)
+        a, b = [self._makeProcess(options, n) for n in 'ab']
+        self.assertTrue(scheduler.request(a))
+        self._start(scheduler, a)
+        self.assertFalse(scheduler.request(b))
+        self._finish(scheduler, a)
+        options.mood = SupervisorStates.SHUTDOWN
+        scheduler.dispatch()
+        self.assertFalse(b.spawned)
+        self.assertTrue(scheduler.is_queued(b))
+
+    def test_state_changed_releases_slot_on_failure(self):
+        options = DummyOptions()
+        scheduler = self._makeOne(options)
+        group = self._makeGroup(options, 'g')
+        process = self._makeProcess(options, 'a', group=group)
+        self._start(scheduler, process)
+        self.assertEqual(scheduler.group_starting, {'g': 1})
+        self._finish(scheduler, process, ProcessStates.BACKOFF)
+        self.assertEqual(scheduler.starting, {})
+        self.assertEqual(scheduler.group_starting, {})
+
+    def test_state_changed_cancels_queued_process(self):
+        options = DummyOptions()
+        options.max_concurrent_spawns = 1
+        scheduler = self._makeOne(options)
+        a, b = [self._makeProcess(options, n) for n in 'ab']
+        self._start(scheduler, a)
+        b.state = ProcessStates.BACKOFF
+        self.assertFalse(scheduler.request(b))
+        self._finish(scheduler, b, ProcessStates.FATAL)
+        self.assertFalse(scheduler.is_queued(b))
+        self.assertEqual(scheduler.queue, [])
+
+    def test_cancel(self):
+        options = DummyOptions()
+        options.max_concurrent_spawns = 1
+        scheduler = self._makeOne(options)
+        a, b = [self._makeProcess(options, n) for n in 'ab']
+        self._start(scheduler, a)
+        self.assertFalse(scheduler.request(b))
+        self.assertTrue(scheduler.cancel(b))
+        self.assertFalse(scheduler.cancel(b))
+        self.assertEqual(scheduler.queue, [])
+
+    def test_clear(self):
+        options = DummyOptions()
+        options.max_concurrent_spawns = 1
+        scheduler = self._makeOne(options)
+        a, b = [self._makeProcess(options, n) for n in 'ab']
+        self._start(scheduler, a)
+        self.assertFalse(scheduler.request(b))
+        scheduler.clear()
+        self.assertEqual(scheduler.as_dict()['starting'], 0)
+        self.assertEqual(scheduler.as_dict()['queued'], 0)
+        self.assertTrue(scheduler.request(b))
+
+    def test_as_dict(self):
+        options = DummyOptions()
+        options.max_concurrent_spawns = 1
+        scheduler = self._makeOne(options)
+        group = self._makeGroup(options, 'g')
+        a = self._makeProcess(options, 'a')
+        b = self._makeProcess(options, 'b', priority=5, group=group)
+        self._start(scheduler, a)
+        self.assertFalse(scheduler.request(b))
+        self.assertEqual(scheduler.as_dict(), {
+            'max_concurrent_spawns': 1,
+            'starting': 1,
+            'queued': 1,
+            'max_queued': 1,
+            'dispatched': 0,
+            'queue': [{'name': 'b', 'group': 'g', 'priority': 5}],
+            'spawns': {},
+            })
+
+    def test_record_spawn(self):
+        options = DummyOptions()
+        scheduler = self._makeOne(options)
+        scheduler.record_spawn('fork', 0.5)
+        scheduler.record_spawn('fork', 0.25)
+        scheduler.record_spawn('posix_spawn', 0.125)
+        self.assertEqual(scheduler.as_dict()['spawns'], {
+            'fork': {'count': 2, 'time': 0.75, 'max_time': 0.5},
+            'posix_spawn': {'count': 1, 'time': 0.125, 'max_time': 0.125},
+            })
+        scheduler.clear()
+        self.assertEqual(scheduler.as_dict()['spawns'], {})
@@ -532,6 +532,14 @@ class TestDefaultControllerPlugin(unittest.TestCase):
         self.assertEqual(lines[0], 'NO_FILE: ERROR (no log file)')
         self.assertEqual(plugin.ctl.exitstatus, LSBInitExitStatuses.GENERIC)
 
+    def test_tail_no_file_output_ring(self):
+        plugin = self._makeOne()
+        result = plugin.do_tail('-14 RING stderr')
+        self.assertEqual(result, None)
+        lines = plugin.ctl.stdout.getvalue().split('\n')
+        self.assertEqual(lines, ['stderr output', '', ''])
+        self.assertEqual(plugin.ctl.exitstatus, LSBInitExitStatuses.SUCCESS)
+
     def test_tail_failed(self):
         plugin = self._makeOne()
         result = plugin.do_tail('FAILED')
@@ -133,6 +133,7 @@ class SupervisordTests(unittest.TestCase):
         supervisord = self._makeOne(options)
         supervisord.main()
         self.assertEqual(options.fds_cleaned_up, False)
+        self.assertEqual(options.poller_made, True)
         self.assertEqual(options.rlimits_set, True)
         self.assertEqual(options.parse_criticals, ['setuid_called'])
         self.assertEqual(options.parse_warnings, [])
@@ -147,6 +148,25 @@ class SupervisordTests(unittest.TestCase):
         self.assertEqual(options.pidfile_written, True)
         self.assertEqual(options.cleaned_up, True)
 
+    def test_main_clears_spawn_queue(self):
+        from supervisor.states import ProcessStates
+        options = DummyOptions()
+        options.max_concurrent_spawns = 1
+        options.test = True
+        options.first = True
+        supervisord = self._makeOne(options)
+        starting = DummyProcess(DummyPConfig(options, 'foo', '/bin/foo'))
+        queued = DummyProcess(DummyPConfig(options, 'bar', '/bin/bar'),
+                              state=ProcessStates.STOPPED)
+        scheduler = options.spawn_scheduler
+        scheduler.state_changed(starting, ProcessStates.STOPPED,
+                                ProcessStates.STARTING)
+        self.assertFalse(scheduler.request(queued))
+        supervisord.main()
+        self.assertEqual(scheduler.starting, {})
+        self.assertFalse(scheduler.is_queued(queued))
+        self.assertFalse(queued.spawned)
+
     def test_main_notfirst(self):
         options = DummyOptions()
         pconfig = DummyPConfig(options, 'foo', '/bin/foo', '/tmp')
@@ -157,6 +177,7 @@ class SupervisordTests(unittest.TestCase):
         supervisord = self._makeOne(options)
         supervisord.main()
         self.assertEqual(options.fds_cleaned_up, True)
+        self.assertEqual(options.poller_made, True)
         self.assertFalse(hasattr(options, 'rlimits_set'))
         self.assertEqual(options.parse_criticals, ['setuid_called'])
         self.assertEqual(options.parse_warnings, [])
@@ -183,29 +204,69 @@ class SupervisordTests(unittest.TestCase):
         options.pidhistory = {1:process}
         supervisord = self._makeOne(options)
 
-        supervisord.reap(once=True)
+        supervisord.reap()
         self.assertEqual(process.finished, (1,1))
+        self.assertEqual(options.pidhistory, {})
+
+    def test_reap_nothing_to_reap(self):
+        options = DummyOptions()
+        supervisord = self._makeOne(options)
+        supervisord.reap()
+        self.assertEqual(options.waitpid_pids, [-1])
+        self.assertEqual(supervisord.reap_stats.batches, 0)
 
-    def test_reap_recursionguard(self):
+    def test_reap_drains_all_children_in_one_batch(self):
         options = DummyOptions()
+        results = [(pid, 0) for pid in range(1, 501)]
+        def waitpid(pid=-1):
+            if results:
+                return results.pop(0)
+            return None, None
+        options.waitpid = waitpid
+        processes = {}
+        for pid in range(1, 501):
+            pconfig = DummyPConfig(options, 'process%s' % pid, '/bin/foo')
+            processes[pid] = DummyProcess(pconfig)
+        options.pidhistory = dict(processes)
         supervisord = self._makeOne(options)
-        result = supervisord.reap(once=True, recursionguard=100)
-        self.assertEqual(result, None)
 
-    def test_reap_more_than_once(self):
+        supervisord.reap()
+        for pid, process in processes.items():
+            self.assertEqual(process.finished, (pid, 0))
+        self.assertEqual(options.pidhistory, {})
+        stats = supervisord.reap_stats
+        self.assertEqual(stats.batches, 1)
+        self.assertEqual(stats.reaped, 500)
+        self.assertEqual(stats.last_batch_size, 500)
+        self.assertEqual(stats.max_batch_size, 500)
+
+    def test_reap_records_lag_since_sigchld(self):
+        import time
         options = DummyOptions()
         options.waitpid_return = 1, 1
+        options.sigchld_time = time.time() - 2
         pconfig = DummyPConfig(options, 'process', '/bin/foo', '/tmp')
         process = DummyProcess(pconfig)
-        process.drained = False
-        process.killing = True
-        process.laststop = None
-        process.waitstatus = None, None
         options.pidhistory = {1:process}
         supervisord = self._makeOne(options)
 
-        supervisord.reap(recursionguard=99)
-        self.assertEqual(process.finished, (1,1))
+        supervisord.reap()
+        stats = supervisord.reap_stats
+        self.assertTrue(2 <= stats.last_lag < 10, stats.last_lag)
+        self.assertEqual(stats.max_lag, stats.last_lag)
+        self.assertEqual(options.sigchld_time, None)
+
+    def test_reap_without_sigchld_has_no_lag(self):
+        options = DummyOptions()
+        options.waitpid_return = 1, 1
+        pconfig = DummyPConfig(options, 'process', '/bin/foo', '/tmp')
+        process = DummyProcess(pconfig)
+        options.pidhistory = {1:process}
+        supervisord = self._makeOne(options)
+
+        supervisord.reap()
+        self.assertEqual(supervisord.reap_stats.last_lag, 0)
+        self.assertEqual(supervisord.reap_stats.reaped, 1)
 
     def test_reap_unknown_pid(self):
         options = DummyOptions()
@@ -219,10 +280,11 @@ class SupervisordTests(unittest.TestCase):
         options.pidhistory = {1: process}
         supervisord = self._makeOne(options)
 
-        supervisord.reap(once=True)
+        supervisord.reap()
         self.assertEqual(process.finished, None)
         self.assertEqual(options.logger.data[0],
                          'reaped unknown pid 2 (exit status 0)')
+        self.assertEqual(supervisord.reap_stats.unknown, 1)
 
     def test_handle_sigterm(self):
         options = DummyOptions()
@@ -380,11 +442,18 @@ class SupervisordTests(unittest.TestCase):
                 'uid': None, 'stdout_logfile': None, 'stdout_capture_maxbytes': 0,
                 'stdout_events_enabled': False,
                 'stdout_logfile_backups': 0, 'stdout_logfile_maxbytes': 0,
+                'stdout_logfile_buffer_size': 0,
+                'stdout_logfile_flush_interval': 1,
+                'stdout_logfile_index_bytes': 0, 'stdout_ring_bytes': 0,
                 'stdout_syslog': False,
                 'stderr_logfile': None, 'stderr_capture_maxbytes': 0,
                 'stderr_events_enabled': False,
                 'stderr_logfile_backups': 0, 'stderr_logfile_maxbytes': 0,
+                'stderr_logfile_buffer_size': 0,
+                'stderr_logfile_flush_interval': 1,
+                'stderr_logfile_index_bytes': 0, 'stderr_ring_bytes': 0,
                 'stderr_syslog': False,
+                'output_rate_limit': 0, 'output_rate_burst': 0,
                 'redirect_stderr': False,
                 'stopsignal': None, 'stopwaitsecs': 10,
                 'stopasgroup': False,
@@ -449,11 +518,18 @@ class SupervisordTests(unittest.TestCase):
                 'uid': None, 'stdout_logfile': None, 'stdout_capture_maxbytes': 0,
                 'stdout_events_enabled': False,
                 'stdout_logfile_backups': 0, 'stdout_logfile_maxbytes': 0,
+                'stdout_logfile_buffer_size': 0,
+                'stdout_logfile_flush_interval': 1,
+                'stdout_logfile_index_bytes': 0, 'stdout_ring_bytes': 0,
                 'stdout_syslog': False,
                 'stderr_logfile': None, 'stderr_capture_maxbytes': 0,
                 'stderr_events_enabled': False,
                 'stderr_logfile_backups': 0, 'stderr_logfile_maxbytes': 0,
+                'stderr_logfile_buffer_size': 0,
+                'stderr_logfile_flush_interval': 1,
+                'stderr_logfile_index_bytes': 0, 'stderr_ring_bytes': 0,
                 'stderr_syslog': False,
+                'output_rate_limit': 0, 'output_rate_burst': 0,
                 'redirect_stderr': False,
                 'stopsignal': None, 'stopwaitsecs': 10,
                 'stopasgroup': False,
@@ -565,9 +641,11 @@ class SupervisordTests(unittest.TestCase):
 
         self.assertEqual(supervisord.process_groups, {})
 
+        supervisord.transition_all = False
         result = supervisord.add_process_group(gconfig)
         self.assertEqual(list(supervisord.process_groups.keys()), ['foo'])
         self.assertTrue(result)
+        self.assertTrue(supervisord.transition_all)
 
         group = supervisord.process_groups['foo']
         result = supervisord.add_process_group(gconfig)
@@ -613,6 +691,28 @@ class SupervisordTests(unittest.TestCase):
         self.assertEqual(list(supervisord.process_groups.keys()), ['foo'])
         self.assertTrue(not result)
 
+    def test_get_sorted_groups_is_cached(self):
+        options = DummyOptions()
+        supervisord = self._makeOne(options)
+        pconfig = DummyPConfig(options, 'foo', '/bin/foo', '/tmp')
+        gconfig1 = DummyPGroupConfig(options, 'foo', pconfigs=[pconfig],
+                                     priority=2)
+        gconfig2 = DummyPGroupConfig(options, 'bar', pconfigs=[pconfig],
+                                     priority=1)
+        supervisord.add_process_group(gconfig1)
+        groups = supervisord.get_sorted_groups()
+        self.assertEqual([g.config.name for g in groups], ['foo'])
+        self.assertTrue(supervisord.get_sorted_groups() is groups)
+
+        supervisord.add_process_group(gconfig2)
+        groups = supervisord.get_sorted_groups()
+        self.assertEqual([g.config.name for g in groups], ['bar', 'foo'])
+        self.assertTrue(supervisord.get_sorted_groups() is groups)
+
+        supervisord.remove_process_group('bar')
+        groups = supervisord.get_sorted_groups()
+        self.assertEqual([g.config.name for g in groups], ['foo'])
+
     def test_remove_process_group_event(self):
         from supervisor import events
         L = []
@@ -675,7 +775,7 @@ class SupervisordTests(unittest.TestCase):
         readable = DummyDispatcher(readable=True)
         writable = DummyDispatcher(writable=True)
         error = DummyDispatcher(writable=True, error=OSError)
-        pgroup.dispatchers = {6:readable, 7:writable, 8:error}
+        options.dispatcher_registry.add_dispatchers({6:readable, 7:writable, 8:error})
         supervisord.process_groups = {'foo': pgroup}
         options.test = True
         supervisord.runforever()
@@ -684,6 +784,266 @@ class SupervisordTests(unittest.TestCase):
         self.assertEqual(writable.write_event_handled, True)
         self.assertEqual(error.error_handled, True)
 
+    def test_runforever_reaps_process_seen_through_pidfd(self):
+        import time
+        from supervisor.dispatchers import PPidfdDispatcher
+        options = DummyOptions()
+        options.poller.result = [9], []
+        options.waitpid_return = 123, 0
+        options.sigchld_time = time.time() - 2
+        supervisord = self._makeOne(options)
+        pconfig = DummyPConfig(options, 'foo', '/bin/foo')
+        process = DummyProcess(pconfig)
+        options.pidhistory = {123: process}
+        dispatcher = PPidfdDispatcher(process, 9, 123)
+        options.dispatcher_registry.add(9, dispatcher)
+        options.test = True
+        supervisord.runforever()
+        self.assertTrue(dispatcher.closed)
+        self.assertEqual(options.waitpid_pids, [-1, -1])
+        self.assertEqual(process.finished, (123, 0))
+        stats = supervisord.reap_stats
+        self.assertEqual(stats.batches, 1)
+        self.assertEqual(stats.reaped, 1)
+        self.assertTrue(stats.last_lag >= 2)
+
+    def test_runforever_only_updates_pending_dispatchers(self):
+        options = DummyOptions()
+        supervisord = self._makeOne(options)
+        readable = DummyDispatcher(readable=True)
+        options.dispatcher_registry.add(6, readable)
+        options.dispatcher_registry.update_pending()
+        calls = []
+        def readable_called():
+            calls.append(1)
+            return True
+        readable.readable = readable_called
+        options.test = True
+        supervisord.runforever()
+        self.assertEqual(calls, [])
+        self.assertEqual(options.poller.readables, set([6]))
+
+    def test_runforever_transitions_all_groups_first(self):
+        options = DummyOptions()
+        supervisord = self._makeOne(options)
+        gconfig = DummyPGroupConfig(options)
+        pgroup = DummyProcessGroup(gconfig)
+        supervisord.process_groups = {'foo': pgroup}
+        stale = []
+        options.timers.schedule(0, object(), lambda: stale.append(1))
+        options.test = True
+        supervisord.runforever()
+        self.assertTrue(pgroup.transitioned)
+        self.assertFalse(supervisord.transition_all)
+        self.assertEqual(stale, [])
+        # only the wakeup for the next tick is left
+        self.assertEqual(len(options.timers), 1)
+        self.assertTrue(options.timers.next_deadline() > time.time())
+
+    def test_runforever_only_calls_expired_transitions(self):
+        options = DummyOptions()
+        supervisord = self._makeOne(options)
+        gconfig = DummyPGroupConfig(options)
+        pgroup = DummyProcessGroup(gconfig)
+        supervisord.process_groups = {'foo': pgroup}
+        supervisord.transition_all = False
+        supervisord.lastmood = options.mood
+        calls = []
+        options.timers.schedule(0, 'expired', lambda: calls.append('expired'))
+        options.timers.schedule(time.time() + 3600, 'pending',
+                                lambda: calls.append('pending'))
+        options.test = True
+        supervisord.runforever()
+        self.assertFalse(pgroup.transitioned)
+        self.assertEqual(calls, ['expired'])
+        # the pending transition and the wakeup for the next tick
+        self.assertEqual(len(options.timers), 2)
+
+    def test_runforever_reaps_before_transition(self):
+        options = DummyOptions()
+        supervisord = self._makeOne(options)
+        supervisord.transition_all = False
+        supervisord.lastmood = options.mood
+        pconfig = DummyPConfig(options, 'foo', '/bin/foo',)
+        process = DummyProcess(pconfig)
+        options.pidhistory = {1: process}
+        options.waitpid_return = 1, 1
+        def finish(pid, sts):
+            options.timers.schedule(0, process, process.transition)
+        process.finish = finish
+        options.test = True
+        supervisord.runforever()
+        self.assertTrue(process.transitioned)
+
+    def test_runforever_transitions_all_groups_after_clock_rollback(self):
+        options = DummyOptions()
+        supervisord = self._makeOne(options)
+        gconfig = DummyPGroupConfig(options)
+        pgroup = DummyProcessGroup(gconfig)
+        supervisord.process_groups = {'foo': pgroup}
+        supervisord.transition_all = False
+        supervisord.lastmood = options.mood
+        supervisord.lasttransition = time.time() + 3600
+        options.test = True
+        supervisord.runforever()
+        self.assertTrue(pgroup.transitioned)
+        self.assertTrue(supervisord.lasttransition < time.time() + 3600)
+
+    def test_runforever_transitions_all_groups_after_mood_change(self):
+        from supervisor.states import SupervisorStates
+        options = DummyOptions()
+        supervisord = self._makeOne(options)
+        gconfig = DummyPGroupConfig(options)
+        pgroup = DummyProcessGroup(gconfig)
+        supervisord.process_groups = {'foo': pgroup}
+        supervisord.transition_all = False
+        supervisord.lastmood = SupervisorStates.FATAL
+        options.mood = SupervisorStates.RUNNING
+        options.test = True
+        supervisord.runforever()
+        self.assertTrue(pgroup.transitioned)
+        self.assertEqual(supervisord.lastmood, SupervisorStates.RUNNING)
+
+    def test_runforever_dispatches_queued_spawns(self):
+        from supervisor.states import ProcessStates
+        options = DummyOptions()
+        options.max_concurrent_spawns = 1
+        supervisord = self._makeOne(options)
+        starting = DummyProcess(DummyPConfig(options, 'foo', '/bin/foo'))
+        queued = DummyProcess(DummyPConfig(options, 'bar', '/bin/bar'),
+                              state=ProcessStates.STOPPED)
+        scheduler = options.spawn_scheduler
+        scheduler.state_changed(starting, ProcessStates.STOPPED,
+                                ProcessStates.STARTING)
+        self.assertFalse(scheduler.request(queued))
+        scheduler.state_changed(starting, ProcessStates.STARTING,
+                                ProcessStates.RUNNING)
+        supervisord.lastmood = options.mood
+        options.test = True
+        supervisord.runforever()
+        self.assertTrue(queued.spawned)
+        self.assertFalse(scheduler.is_queued(queued))
+
+    def test_runforever_samples_processes(self):
+        options = DummyOptions()
+        supervisord = self._makeOne(options)
+        pconfig = DummyPConfig(options, 'foo', '/bin/foo')
+        gconfig = DummyPGroupConfig(options, pconfigs=[pconfig])
+        pgroup = DummyProcessGroup(gconfig)
+        supervisord.process_groups = {'foo': pgroup}
+        calls = []
+        supervisord.process_sampler.run = lambda *args: calls.append(args)
+        options.test = True
+        supervisord.runforever()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0][0], [pgroup])
+
+    def test_runforever_flushes_logs_that_are_due(self):
+        options = DummyOptions()
+        supervisord = self._makeOne(options)
+        supervisord.transition_all = False
+        supervisord.lastmood = options.mood
+        flushed = []
+        class Handler:
+            def flush(self):
+                flushed.append(self)
+        due, later = Handler(), Handler()
+        due.flush_interval, later.flush_interval = -1, 3600
+        options.log_flushes.add(due)
+        options.log_flushes.add(later)
+        options.test = True
+        supervisord.runforever()
+        self.assertEqual(flushed, [due])
+        self.assertEqual(list(options.log_flushes.deadlines), [later])
+
+    def test_runforever_reschedules_log_flushes(self):
+        options = DummyOptions()
+        supervisord = self._makeOne(options)
+        class Handler:
+            flush_interval = 3600
+        handler = Handler()
+        options.log_flushes.add(handler)
+        deadline = options.log_flushes.deadlines[handler]
+        options.test = True
+        supervisord.runforever()
+        # the timers were cleared to transition every group
+        self.assertEqual(options.timers.entries[id(handler)][0], deadline)
+
+    def test_runforever_resumes_output_that_is_due(self):
+        options = DummyOptions()
+        supervisord = self._makeOne(options)
+        supervisord.transition_all = False
+        supervisord.lastmood = options.mood
+        resumed = []
+        class Process:
+            def resume_output(self, now=None):
+                resumed.append(self)
+                options.output_resumes.discard(self)
+        due, later = Process(), Process()
+        now = time.time()
+        options.output_resumes.add(due, now - 2, now - 1)
+        options.output_resumes.add(later, now, now + 3600)
+        options.test = True
+        supervisord.runforever()
+        self.assertEqual(resumed, [due])
+        self.assertFalse(due in options.output_resumes)
+        self.assertTrue(later in options.output_resumes)
+
+    def test_runforever_reschedules_output_resumes(self):
+        options = DummyOptions()
+        supervisord = self._makeOne(options)
+        class Process:
+            pass
+        process = Process()
+        now = time.time()
+        options.output_resumes.add(process, now, now + 3600)
+        options.test = True
+        supervisord.runforever()
+        # the timers were cleared to transition every group
+        resume = options.output_resumes.entries[id(process)][3]
+        self.assertEqual(options.timers.entries[id(resume)][0], now + 3600)
+
+    def test_runforever_reports_log_archive(self):
+        options = DummyOptions()
+        supervisord = self._makeOne(options)
+        options.log_archive.messages.append(('warn', 'failed to archive foo'))
+        options.test = True
+        supervisord.runforever()
+        self.assertTrue('failed to archive foo' in options.logger.data)
+
+    def test_runforever_records_loop_stats(self):
+        options = DummyOptions()
+        options.poller.result = [6], [7]
+        supervisord = self._makeOne(options)
+        pconfig = DummyPConfig(options, 'foo', '/bin/foo',)
+        process = DummyProcess(pconfig)
+        readable = DummyDispatcher(readable=True)
+        readable.process = process
+        writable = DummyDispatcher(writable=True)
+        options.dispatcher_registry.add_dispatchers({6:readable, 7:writable})
+        options.test = True
+        supervisord.runforever()
+        data = supervisord.loop_stats.as_dict()
+        self.assertEqual(data['iterations'], 1)
+        self.assertEqual(sum(data['latency_counts']), 1)
+        counters = data['dispatchers']['DummyDispatcher']
+        self.assertEqual(counters['read_events'], 1)
+        self.assertEqual(counters['write_events'], 1)
+        self.assertEqual(process.read_time, counters['read_time'])
+
+    def test_runforever_unregisters_dispatcher_no_longer_readable(self):
+        options = DummyOptions()
+        options.poller.result = [6], []
+        supervisord = self._makeOne(options)
+        dispatcher = DummyDispatcher(readable=True)
+        options.dispatcher_registry.add(6, dispatcher)
+        def handle_read_event():
+            dispatcher._readable = False
+        dispatcher.handle_read_event = handle_read_event
+        options.test = True
+        supervisord.runforever()
+        self.assertEqual(options.poller.readables, set())
+
     def test_runforever_select_dispatcher_exitnow_via_read(self):
         options = DummyOptions()
         options.poller.result = [6], []
@@ -693,7 +1053,7 @@ class SupervisordTests(unittest.TestCase):
         pgroup = DummyProcessGroup(gconfig)
         from supervisor.medusa import asyncore_25 as asyncore
         exitnow = DummyDispatcher(readable=True, error=asyncore.ExitNow)
-        pgroup.dispatchers = {6:exitnow}
+        options.dispatcher_registry.add_dispatchers({6:exitnow})
         supervisord.process_groups = {'foo': pgroup}
         options.test = True
         self.assertRaises(asyncore.ExitNow, supervisord.runforever)
@@ -707,7 +1067,7 @@ class SupervisordTests(unittest.TestCase):
         pgroup = DummyProcessGroup(gconfig)
         from supervisor.medusa import asyncore_25 as asyncore
         exitnow = DummyDispatcher(readable=True, error=asyncore.ExitNow)
-        pgroup.dispatchers = {6:exitnow}
+        options.dispatcher_registry.add_dispatchers({6:exitnow})
         supervisord.process_groups = {'foo': pgroup}
         options.test = True
         self.assertRaises(asyncore.ExitNow, supervisord.runforever)
@@ -720,7 +1080,7 @@ class SupervisordTests(unittest.TestCase):
         gconfig = DummyPGroupConfig(options, pconfigs=[pconfig])
         pgroup = DummyProcessGroup(gconfig)
         notimpl = DummyDispatcher(readable=True, error=NotImplementedError)
-        pgroup.dispatchers = {6:notimpl}
+        options.dispatcher_registry.add_dispatchers({6:notimpl})
         supervisord.process_groups = {'foo': pgroup}
         options.test = True
         supervisord.runforever()
@@ -734,7 +1094,7 @@ class SupervisordTests(unittest.TestCase):
         gconfig = DummyPGroupConfig(options, pconfigs=[pconfig])
         pgroup = DummyProcessGroup(gconfig)
         notimpl = DummyDispatcher(readable=True, error=NotImplementedError)
-        pgroup.dispatchers = {6:notimpl}
+        options.dispatcher_registry.add_dispatchers({6:notimpl})
         supervisord.process_groups = {'foo': pgroup}
         options.test = True
         supervisord.runforever()
@@ -813,6 +1173,7 @@ class SupervisordTests(unittest.TestCase):
         self.assertEqual(supervisord.ticks[60], 0)
         self.assertEqual(supervisord.ticks[3600], 0)
         self.assertEqual(len(L), 0)
+        self.assertEqual(options.timers.next_deadline(), 5)
 
         supervisord.tick(now=6)
         self.assertEqual(supervisord.ticks[5], 5)
@@ -834,3 +1195,83 @@ class SupervisordTests(unittest.TestCase):
         self.assertEqual(supervisord.ticks[3600], 3600)
         self.assertEqual(len(L), 6)
         self.assertEqual(L[-1].__class__, events.Tick3600Event)
+
+class LoopStatsTests(unittest.TestCase):
+    def _makeOne(self):
+        from supervisor.supervisord import LoopStats
+        return LoopStats()
+
+    def test_record_iteration_histogram(self):
+        stats = self._makeOne()
+        stats.record_iteration(1, 0.0005)
+        stats.record_iteration(1, 0.001)
+        stats.record_iteration(0, 0.2)
+        stats.record_iteration(0, 60)
+        data = stats.as_dict()
+        self.assertEqual(data['iterations'], 4)
+        self.assertEqual(data['poll_time'], 2)
+        self.assertEqual(data['max_latency'], 60)
+        self.assertEqual(data['latency_counts'], [2, 0, 0, 0, 0, 1, 0, 0, 1])
+        self.assertEqual(len(data['latency_counts']),
+                         len(data['latency_buckets']) + 1)
+
+    def test_record_read_and_write(self):
+        class Dispatcher:
+            pass
+        class Process:
+            read_time = 0
+        dispatcher = Dispatcher()
+        stats = self._makeOne()
+        stats.record_read(dispatcher, 1)
+        dispatcher.process = Process()
+        stats.record_read(dispatcher, 2)
+        stats.record_write(dispatcher, 4)
+        self.assertEqual(dispatcher.process.read_time, 2)
+        self.assertEqual(stats.as_dict()['dispatchers'],
+                         {'Dispatcher': {'read_events': 2, 'read_time': 3,
+                                         'write_events': 1, 'write_time': 4}})
+
+    def test_reset(self):
+        stats = self._makeOne()
+        stats.record_iteration(1, 0.5)
+        stats.record_write(object(), 1)
+        stats.reset(now=42)
+        data = stats.as_dict()
+        self.assertEqual(data['since'], 42)
+        self.assertEqual(data['iterations'], 0)
+        self.assertEqual(data['dispatchers'], {})
+        self.assertEqual(sum(data['latency_counts']), 0)
+
+class ReapStatsTests(unittest.TestCase):
+    def _makeOne(self):
+        from supervisor.supervisord import ReapStats
+        return ReapStats()
+
+    def test_as_dict_empty(self):
+        stats = self._makeOne()
+        data = stats.as_dict()
+        self.assertEqual(data['batches'], 0)
+        self.assertEqual(data['reaped'], 0)
+        self.assertEqual(data['mean_lag'], 0)
+
+    def test_record(self):
+        stats = self._makeOne()
+        stats.record(3, 1, 0.5, 100)
+        stats.record(1, 0, 0.25, 101)
+        data = stats.as_dict()
+        self.assertEqual(data['batches'], 2)
+        self.assertEqual(data['reaped'], 4)
+        self.assertEqual(data['unknown'], 1)
+        self.assertEqual(data['last_batch_size'], 1)
+        self.assertEqual(data['max_batch_size'], 3)
+        self.assertEqual(data['last_lag'], 0.25)
+        self.assertEqual(data['max_lag'], 0.5)
+        self.assertEqual(data['mean_lag'], 0.375)
+        self.assertEqual(data['last_reap'], 101)
+
+    def test_reset(self):
+        stats = self._makeOne()
+        stats.record(3, 1, 0.5, 100)
+        stats.reset()
+        self.assertEqual(stats.as_dict()['reaped'], 0)
+        self.assertEqual(stats.as_dict()['max_lag'], 0)
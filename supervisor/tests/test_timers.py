@@ -0,0 +1,80 @@
+"""Test suite for supervisor.timers"""
+
+import unittest
+
+class TimerHeapTests(unittest.TestCase):
+    def _getTargetClass(self):
+        from supervisor.timers import TimerHeap
+        return TimerHeap
+
+    def _makeOne(self):
+        return self._getTargetClass()()
+
+    def test_empty(self):
+        timers = self._makeOne()
+        self.assertEqual(len(timers), 0)
+        self.assertEqual(timers.next_deadline(), None)
+        self.assertEqual(timers.pop_expired(100), [])
+
+    def test_pop_expired_returns_callbacks_in_deadline_order(self):
+        timers = self._makeOne()
+        a, b, c = object(), object(), object()
+        timers.schedule(30, a, 'a')
+        timers.schedule(10, b, 'b')
+        timers.schedule(20, c, 'c')
+        self.assertEqual(timers.next_deadline(), 10)
+        self.assertEqual(timers.pop_expired(20), ['b', 'c'])
+        self.assertEqual(len(timers), 1)
+        self.assertEqual(timers.next_deadline(), 30)
+
+    def test_pop_expired_skips_wakeup_only_subjects(self):
+        timers = self._makeOne()
+        subject = object()
+        timers.schedule(10, subject)
+        self.assertEqual(timers.next_deadline(), 10)
+        self.assertEqual(timers.pop_expired(10), [])
+        self.assertEqual(len(timers), 0)
+
+    def test_schedule_keeps_earlier_deadline(self):
+        timers = self._makeOne()
+        subject = object()
+        timers.schedule(10, subject, 'cb')
+        timers.schedule(20, subject, 'cb')
+        self.assertEqual(timers.next_deadline(), 10)
+        timers.schedule(5, subject, 'cb')
+        self.assertEqual(timers.next_deadline(), 5)
+        self.assertEqual(len(timers), 1)
+        self.assertEqual(timers.pop_expired(100), ['cb'])
+
+    def test_schedule_after_pop(self):
+        timers = self._makeOne()
+        subject = object()
+        timers.schedule(10, subject, 'cb')
+        self.assertEqual(timers.pop_expired(10), ['cb'])
+        timers.schedule(20, subject, 'cb')
+        self.assertEqual(timers.next_deadline(), 20)
+
+    def test_cancel(self):
+        timers = self._makeOne()
+        a, b = object(), object()
+        timers.schedule(10, a, 'a')
+        timers.schedule(20, b, 'b')
+        timers.cancel(a)
+        timers.cancel(object()) # not scheduled, ignored
+        self.assertEqual(timers.next_deadline(), 20)
+        self.assertEqual(timers.pop_expired(100), ['b'])
+
+    def test_clear(self):
+        timers = self._makeOne()
+        timers.schedule(10, object(), 'a')
+        timers.clear()
+        self.assertEqual(len(timers), 0)
+        self.assertEqual(timers.next_deadline(), None)
+
+    def test_timeout(self):
+        timers = self._makeOne()
+        self.assertEqual(timers.timeout(100, 1), 1)
+        timers.schedule(100.25, object())
+        self.assertEqual(timers.timeout(100, 1), 0.25)
+        self.assertEqual(timers.timeout(99, 1), 1)
+        self.assertEqual(timers.timeout(101, 1), 0)
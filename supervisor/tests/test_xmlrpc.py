@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 
 from supervisor.tests.base import DummySupervisor
@@ -6,6 +8,17 @@ from supervisor.tests.base import DummySupervisorRPCNamespace
 
 from supervisor.compat import xmlrpclib
 from supervisor.compat import httplib
+from supervisor.compat import as_bytes
+
+def _makeLogSlice(data):
+    from supervisor.logreader import LogSlice
+    fd, filename = tempfile.mkstemp()
+    try:
+        os.write(fd, data)
+        os.close(fd)
+        return LogSlice(filename, 0, 0)
+    finally:
+        os.remove(filename)
 
 class GetFaultDescriptionTests(unittest.TestCase):
     def test_returns_description_for_known_fault(self):
@@ -52,6 +65,55 @@ class XMLRPCMarshallingTests(unittest.TestCase):
         data = xmlrpc.xmlrpc_marshal(fault)
         self.assertEqual(data, xmlrpclib.dumps(fault))
 
+class XMLRPCStringProducerTests(unittest.TestCase):
+    def _makeOne(self, logslice):
+        from supervisor.xmlrpc import xmlrpc_string_producer
+        return xmlrpc_string_producer(logslice)
+
+    def test_more(self):
+        from supervisor.logreader import CHUNK_SIZE
+        from supervisor import xmlrpc
+        # the characters around the end of the first chunk are cut
+        text = u'\u00e9<&>' * CHUNK_SIZE
+        logslice = _makeLogSlice(text.encode('utf-8'))
+        producer = self._makeOne(logslice)
+        parts = []
+        while 1:
+            data = producer.more()
+            if not data:
+                break
+            parts.append(data)
+        self.assertTrue(len(parts) > 3)
+        self.assertEqual(b''.join(parts),
+                         as_bytes(xmlrpc.xmlrpc_marshal(text)))
+        self.assertEqual(logslice.fd, None)
+        self.assertEqual(producer.more(), b'')
+
+    def test_more_not_utf8(self):
+        from supervisor.logreader import CHUNK_SIZE
+        from supervisor import xmlrpc
+        # a character cut by the end of the first chunk, and bytes that
+        # aren't UTF-8, are decoded as when the slice is read at once
+        data = b'x' * (CHUNK_SIZE - 1) + u'\u00e9'.encode('utf-8') + b'\xff'
+        producer = self._makeOne(_makeLogSlice(data))
+        parts = []
+        while 1:
+            part = producer.more()
+            if not part:
+                break
+            parts.append(part)
+        text = _makeLogSlice(data).text()
+        self.assertEqual(text, u'x' * (CHUNK_SIZE - 1) + u'\u00e9\ufffd')
+        self.assertEqual(b''.join(parts),
+                         as_bytes(xmlrpc.xmlrpc_marshal(text)))
+
+    def test_more_empty(self):
+        from supervisor import xmlrpc
+        producer = self._makeOne(_makeLogSlice(b''))
+        data = producer.more() + producer.more()
+        self.assertEqual(data, as_bytes(xmlrpc.xmlrpc_marshal('')))
+        self.assertEqual(producer.more(), b'')
+
 class XMLRPCHandlerTests(unittest.TestCase):
     def _getTargetClass(self):
         from supervisor.xmlrpc import supervisor_xmlrpc_handler
@@ -246,6 +308,27 @@ class XMLRPCHandlerTests(unittest.TestCase):
         self.assertEqual(len(request.producers), 0)
         self.assertEqual(request._done, False)
 
+    def test_continue_request_value_is_log_slice(self):
+        from supervisor.logreader import CHUNK_SIZE
+        from supervisor.xmlrpc import xmlrpc_string_producer
+        class DummyRPCNamespace(object):
+            def read(self):
+                return _makeLogSlice(b'x' * (CHUNK_SIZE + 1))
+        supervisor = DummySupervisor()
+        subinterfaces = [('ns1', DummyRPCNamespace())]
+        handler = self._makeOne(supervisor, subinterfaces)
+        data = xmlrpclib.dumps((), 'ns1.read')
+        request = DummyRequest('/what/ever', None, None, None)
+        handler.continue_request(data, request)
+        self.assertEqual(len(request.producers), 1)
+        producer = request.producers[0]
+        self.assertTrue(isinstance(producer, xmlrpc_string_producer))
+        self.assertEqual(request._done, True)
+        self.assertEqual(request.headers['Content-Type'], 'text/xml')
+        # the length of the response isn't known before it is sent
+        self.assertFalse('Content-Length' in request.headers)
+        producer.logslice.close()
+
     def test_iterparse_loads_methodcall(self):
         s = """<?xml version="1.0"?>
         <methodCall>
@@ -416,6 +499,36 @@ class TraverseTests(unittest.TestCase):
         result = xmlrpc.traverse(root, 'a.hello', ["there"])
         self.assertEqual(result, "Hello there")
 
+    def _makeStreamedRoot(self, data):
+        class Root:
+            pass
+        class A:
+            def _slice(self):
+                return _makeLogSlice(data)
+            def read(self):
+                return 'read'
+            read.streamed = '_slice'
+        root = Root()
+        root.a = A()
+        return root
+
+    def test_streamed(self):
+        from supervisor import xmlrpc
+        from supervisor.logreader import CHUNK_SIZE
+        from supervisor.logreader import LogSlice
+        root = self._makeStreamedRoot(b'x' * (CHUNK_SIZE + 1))
+        result = xmlrpc.traverse(root, 'a.read', [])
+        self.assertEqual(result, 'read')
+        result = xmlrpc.traverse(root, 'a.read', [], streamed=True)
+        self.assertTrue(isinstance(result, LogSlice))
+        result.close()
+
+    def test_streamed_small_read(self):
+        from supervisor import xmlrpc
+        root = self._makeStreamedRoot(b'hello')
+        result = xmlrpc.traverse(root, 'a.read', [], streamed=True)
+        self.assertEqual(result, 'hello')
+
 class SupervisorTransportTests(unittest.TestCase):
     def _getTargetClass(self):
         from supervisor.xmlrpc import SupervisorTransport
@@ -744,6 +857,19 @@ class TestSystemNamespaceRPCInterface(unittest.TestCase):
         results = inst.multicall(calls)
         self.assertEqual(results, [])
 
+    def test_multicall_doesnt_stream(self):
+        from supervisor.logreader import CHUNK_SIZE
+        class DummyNamespace(object):
+            def _stream(self):
+                return _makeLogSlice(b'x' * (CHUNK_SIZE + 1))
+            def read(self):
+                """ @return string result"""
+                return 'hello'
+            read.streamed = '_stream'
+        inst = self._makeOne([('ns1', DummyNamespace())])
+        results = inst.multicall([{'methodName': 'ns1.read'}])
+        self.assertEqual(results, ['hello'])
+
     def test_multicall_performs_noncallback_functions_serially(self):
         class DummyNamespace(object):
             def say(self, name):
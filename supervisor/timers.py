@@ -0,0 +1,76 @@
+import heapq
+
+class TimerHeap:
+    '''
+    Deadlines registered by processes, event listener pools and deferred
+    HTTP channels with the main loop.  The main loop sleeps in the poller
+    until the earliest deadline and then only calls back the subjects
+    whose deadlines have expired instead of transitioning everything.
+
+    Each subject has at most one pending deadline.  Scheduling a subject
+    again keeps the earlier of the two deadlines; an entry that has been
+    superseded or cancelled stays in the heap and is skipped when it
+    reaches the top.
+    '''
+
+    def __init__(self):
+        self.heap = []
+        self.entries = {} # id(subject) -> (when, seq)
+        self.seq = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def schedule(self, when, subject, callback=None):
+        """ Call callback (if not None) once time.time() reaches when.
+        If subject already has an earlier deadline, this is a no-op. """
+        key = id(subject)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] <= when:
+            return
+        self.seq += 1
+        self.entries[key] = (when, self.seq)
+        # the subject is kept in the heap entry so that its id cannot be
+        # reused by another object while the entry is pending
+        heapq.heappush(self.heap, (when, self.seq, subject, callback))
+
+    def cancel(self, subject):
+        self.entries.pop(id(subject), None)
+
+    def clear(self):
+        self.heap = []
+        self.entries.clear()
+
+    def next_deadline(self):
+        """ Return the earliest pending deadline or None """
+        heap = self.heap
+        while heap:
+            when, seq, subject, callback = heap[0]
+            if self.entries.get(id(subject)) == (when, seq):
+                return when
+            heapq.heappop(heap)
+        return None
+
+    def timeout(self, now, maximum):
+        """ Return the number of seconds the main loop may sleep, which
+        is never more than maximum """
+        deadline = self.next_deadline()
+        if deadline is None:
+            return maximum
+        return max(0, min(maximum, deadline - now))
+
+    def pop_expired(self, now):
+        """ Remove the subjects whose deadlines are at or before now and
+        return their callbacks in deadline order """
+        heap = self.heap
+        entries = self.entries
+        callbacks = []
+        while heap and heap[0][0] <= now:
+            when, seq, subject, callback = heapq.heappop(heap)
+            key = id(subject)
+            if entries.get(key) != (when, seq):
+                continue
+            del entries[key]
+            if callback is not None:
+                callbacks.append(callback)
+        return callbacks
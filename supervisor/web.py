@@ -190,6 +190,14 @@ class MeldView:
         return self.root.clone()
 
 class TailView(MeldView):
+    def _tailOutputRing(self, rpcinterface, processname, length):
+        # a process without a log file may keep its output in memory
+        try:
+            return rpcinterface.tailProcessOutput(processname, 'stdout',
+                                                  0, length)[0]
+        except RPCError:
+            return 'No file for %s' % processname
+
     def render(self):
         supervisord = self.context.supervisord
         form = self.context.form
@@ -211,7 +219,8 @@ class TailView(MeldView):
                                                              limit, offset)
                 except RPCError as e:
                     if e.code == Faults.NO_FILE:
-                        tail = 'No file for %s' % processname
+                        tail = self._tailOutputRing(rpcinterface,
+                                                    processname, -limit)
                     else:
                         tail = 'ERROR: unexpected rpc fault [%d] %s' % (
                             e.code, e.text)
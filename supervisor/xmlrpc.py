@@ -22,6 +22,8 @@ from supervisor.medusa.xmlrpc_handler import xmlrpc_handler
 from supervisor.medusa import producers
 
 from supervisor.http import NOT_DONE_YET
+from supervisor.logreader import CHUNK_SIZE
+from supervisor.logreader import LogSlice
 
 class Faults:
     UNKNOWN_METHOD = 1
@@ -42,6 +44,7 @@ class Faults:
     ALREADY_ADDED = 90
     STILL_RUNNING = 91
     CANT_REREAD = 92
+    BUSY = 100
 
 def getFaultDescription(code):
     for faultname in Faults.__dict__:
@@ -151,6 +154,34 @@ def xmlrpc_marshal(value):
         body = xmlrpclib.dumps(value)
     return body
 
+class xmlrpc_string_producer:
+    """ A medusa producer of the response of a method that returned a
+    LogSlice, i.e. a string read from a log.  The slice is read, decoded
+    and escaped one chunk at a time as the response is sent instead of
+    being marshalled at once, so a large read doesn't need memory in
+    proportion to its length.  Escaping the bytes of UTF-8 text is the
+    same as escaping the text, the markup characters are all ASCII. """
+
+    def __init__(self, logslice):
+        self.logslice = logslice
+        self.chunks = logslice.text_chunks()
+        body = xmlrpc_marshal('')
+        end = body.index('</string>')
+        self.head = as_bytes(body[:end])
+        self.tail = as_bytes(body[end:])
+
+    def more(self):
+        if self.head:
+            data, self.head = self.head, b''
+            return data
+        for chunk in self.chunks:
+            return (chunk.replace(b'&', b'&amp;')
+                         .replace(b'<', b'&lt;')
+                         .replace(b'>', b'&gt;'))
+        self.logslice.close()
+        data, self.tail = self.tail, b''
+        return data
+
 class SystemNamespaceRPCInterface:
     def __init__(self, namespaces):
         self.namespaces = {}
@@ -423,6 +454,14 @@ class supervisor_xmlrpc_handler(xmlrpc_handler):
                 pushproducer = request.channel.push_with_producer
                 pushproducer(DeferredXMLRPCResponse(request, value))
 
+            elif isinstance(value, LogSlice):
+                # a large read of a log is sent as it is read; its
+                # length isn't known until then, so the response is
+                # chunked or ends when the connection is closed
+                request['Content-Type'] = 'text/xml'
+                request.push(xmlrpc_string_producer(value))
+                request.done()
+
             else:
                 # if we get anything but a function, it implies that this
                 # response doesn't need to be deferred, we can service it
@@ -443,9 +482,9 @@ class supervisor_xmlrpc_handler(xmlrpc_handler):
             request.error(500)
 
     def call(self, method, params):
-        return traverse(self.rpcinterface, method, params)
+        return traverse(self.rpcinterface, method, params, streamed=True)
 
-def traverse(ob, method, params):
+def traverse(ob, method, params, streamed=False):
     dotted_parts = method.split('.')
     # security (CVE-2017-11610, don't allow object traversal)
     if len(dotted_parts) != 2:
@@ -465,11 +504,25 @@ def traverse(ob, method, params):
     if not isinstance(func, types.MethodType):
         raise RPCError(Faults.UNKNOWN_METHOD)
 
+    streamer = getattr(func, 'streamed', None)
+    if streamed and streamer is not None:
+        # the variant of the method that returns a large read of a log
+        # as a LogSlice, to be sent as it is read
+        func = getattr(rpcinterface, streamer)
+
     try:
-        return func(*params)
+        value = func(*params)
     except TypeError:
         raise RPCError(Faults.INCORRECT_PARAMETERS)
 
+    if isinstance(value, LogSlice) and len(value) <= CHUNK_SIZE:
+        # not worth streaming
+        try:
+            value = value.text()
+        except ValueError as inst:
+            raise RPCError(getattr(Faults, inst.args[0]))
+    return value
+
 class SupervisorTransport(xmlrpclib.Transport):
     """
     Provides a Transport for xmlrpclib that uses